@@ -0,0 +1,486 @@
+"""Local performance benchmark for the API.
+
+Runs the FastAPI app in-process against the in-memory DynamoDB / S3 of
+local_aws.py (or the SQLite + file backend with --storage local) and a fake
+LLM, seeds synthetic users through the API itself (so stats, search index
+and caches are built the way production builds them), then replays every
+endpoint and reports per endpoint:
+
+    p50 / p95 latency, DynamoDB and S3 calls, items scanned, bytes read
+    (DynamoDB item bytes + S3 object bytes) and LLM tokens
+
+taken from the same traces TimingMiddleware logs in production. Backend
+counts are deterministic for a given seed, so --compare can gate on them;
+latency is reported but only gated when --latency-tolerance is given.
+
+    python bench.py
+    python bench.py --users 5 --episodes 20 --plots 15 --characters 30 --posts 500
+    python bench.py --json before.json
+    python bench.py --compare before.json      # exit 1 on regressions
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+import tempfile
+from urllib.parse import quote
+
+# main.py requires these at import time; the benchmark never talks to AWS
+for _key, _value in {
+    "SECRET_KEY": "bench-secret-key-bench-secret-key",
+    "COGNITO_REGION": "ap-northeast-2",
+    "COGNITO_USER_POOL_ID": "ap-northeast-2_bench",
+    "COGNITO_CLIENT_ID": "bench",
+    "COGNITO_CLIENT_SECRET": "bench",
+    "REDIRECT_URI": "http://localhost:8000/authorize",
+    "AWS_ACCESS_KEY_ID": "bench",
+    "AWS_SECRET_ACCESS_KEY": "bench",
+    "S3_BUCKET": "bench",
+    "STORAGE_BACKEND": "memory",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import jwt as pyjwt
+from fastapi.testclient import TestClient
+
+import main
+import storage
+import telemetry
+
+_WORDS = (
+    "그날 밤 바람이 창문을 두드렸다 그녀는 오래된 편지를 꺼내 읽었다 기억은 생각보다 선명했다 "
+    "우리는 약속을 지키지 못했다 골목 끝에서 누군가 이름을 불렀다 비가 그치면 떠나자고 했다 "
+    "아무도 대답하지 않았다 시계 소리만 방 안을 채웠다 정말 괜찮아 물어보고 싶었다 거짓말 하지 마"
+).split()
+_PLACES = ("거실", "옥상", "학교 복도", "지하철역", "병원 로비", "카페", "바닷가", "사무실")
+
+# ?fields= lists of the list views (posts / comments as sent by src/api)
+_LIST_FIELDS = {
+    "works": "local_id,title,type,created_at",
+    "plots": "local_id,title,order_index",
+    "posts": ("local_id,post_id,author_sub,author_name,author_color,work_id,work_title,episode_title,"
+              "work_type,post_title,description,tags,view_count,like_count,comment_count,created_at,"
+              "content_preview"),
+    "comments": ("local_id,comment_id,post_id,author_sub,author_name,author_color,text,like_count,"
+                 "created_at,parent_comment_id"),
+}
+
+
+# ---------------------------------------------------------------------------
+# Fakes
+# ---------------------------------------------------------------------------
+
+def install_storage(store: storage.Storage) -> None:
+    """Rebind every table global and the S3 client in main to store."""
+    for attr, value in list(vars(main).items()):
+        if attr.endswith("_table") and getattr(value, "name", None) in storage.TABLES:
+            setattr(main, attr, store.table(value.name))
+    main._s3 = store.blobs
+
+
+def install_fake_llm(latency: float) -> None:
+    async def fake_llm_invoke(system_prompt: str, user_content: str) -> str:
+        with telemetry.timed("llm", "chat", "fake") as info:
+            await asyncio.sleep(latency)
+            # ~2 characters per token for Korean text
+            info["tokens"] = (len(system_prompt) + len(user_content)) // 2
+        return "요약: " + user_content[:80]
+
+    main._llm_invoke = fake_llm_invoke
+
+
+def client_for(sub: str) -> TestClient:
+    token = pyjwt.encode({"sub": sub, "email": f"{sub}@bench.local"}, main._JWT_SECRET,
+                         algorithm=main._JWT_ALGORITHM)
+    client = TestClient(main.app, raise_server_exceptions=True)
+    client.headers["Authorization"] = f"Bearer {token}"
+    return client
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 12)))
+
+
+def plot_doc(rng: random.Random, names: list[str], blocks: int) -> dict:
+    """A screenplay-style TipTap document with dialogue from the given characters."""
+    content = [{"type": "sceneHeading", "content": [{"type": "text", "text": rng.choice(_PLACES)}]}]
+    speakers = rng.sample(names, min(len(names), rng.randint(2, 4))) if names else []
+    for _ in range(blocks):
+        if speakers and rng.random() < 0.6:
+            content.append({"type": "dialogue", "attrs": {"characterName": rng.choice(speakers)},
+                            "content": [{"type": "text", "text": _sentence(rng)}]})
+        else:
+            content.append({"type": rng.choice(("narration", "stageDirection")),
+                            "content": [{"type": "text", "text": _sentence(rng)}]})
+    return {"type": "doc", "content": content}
+
+
+def _text(rng: random.Random, kb: float) -> str:
+    """One sentence, or sentences adding up to about kb KB of UTF-8."""
+    parts = [_sentence(rng)]
+    while len(" ".join(parts).encode()) < kb * 1024:
+        parts.append(_sentence(rng))
+    return " ".join(parts)
+
+
+def _sync(client: TestClient, operations: list[dict]) -> None:
+    for start in range(0, len(operations), main._SYNC_MAX_OPERATIONS):
+        response = client.post("/sync", json={"operations": operations[start:start + main._SYNC_MAX_OPERATIONS]})
+        response.raise_for_status()
+
+
+def seed(args, rng: random.Random) -> dict:
+    """Create users × works × episodes × plots × characters, posts and comments.
+
+    Returns the ids of the first user's first work, which the scenarios use;
+    its plots are also summarized so the work summary has input.
+    """
+    ids = iter(range(1, 10**9))
+    target: dict = {}
+    clients = [client_for(f"bench-user-{u}") for u in range(args.users)]
+    for u, client in enumerate(clients):
+        for w in range(args.works):
+            work_id = next(ids)
+            names = [f"인물{c + 1}" for c in range(args.characters)]
+            ops = [{"op": "create", "entity": "work", "id": work_id,
+                    "data": {"title": f"작품 {u}-{w}", "type": "plot", "planning_doc": _text(rng, args.planning_kb)}}]
+            character_ids = []
+            for c, name in enumerate(names):
+                character_ids.append(next(ids))
+                ops.append({"op": "create", "entity": "character", "id": character_ids[-1],
+                            "data": {"work_id": work_id, "name": name, "memo": _sentence(rng)}})
+            for c in range(1, len(character_ids)):
+                ops.append({"op": "create", "entity": "relation", "id": next(ids),
+                            "data": {"work_id": work_id, "from_character_id": character_ids[c - 1],
+                                     "to_character_id": character_ids[c], "relation_name": "친구"}})
+            plots = []
+            for e in range(args.episodes):
+                episode_id = next(ids)
+                ops.append({"op": "create", "entity": "episode", "id": episode_id,
+                            "data": {"work_id": work_id, "title": f"{e + 1}화", "order_index": e}})
+                for p in range(args.plots):
+                    plots.append((episode_id, next(ids)))
+                    ops.append({"op": "create", "entity": "plot", "id": plots[-1][1],
+                                "data": {"episode_id": episode_id, "title": f"플롯 {p + 1}", "order_index": p}})
+            _sync(client, ops)
+            for _, plot_id in plots:
+                client.put(f"/plots/{plot_id}/content",
+                           content=json.dumps(plot_doc(rng, names, args.blocks), ensure_ascii=False)
+                           ).raise_for_status()
+            if u == 0 and w == 0:
+                # summarize_work reads the plot summaries
+                for _, plot_id in plots:
+                    client.post(f"/plots/{plot_id}/summarize").raise_for_status()
+                target = {"work_id": work_id, "episode_id": plots[0][0] if plots else None,
+                          "plot_id": plots[0][1] if plots else None,
+                          "character_id": character_ids[0] if character_ids else None,
+                          "names": names}
+
+    post_ids = []
+    for n in range(args.posts):
+        u = n % args.users
+        post_id = next(ids)
+        post_ids.append((f"bench-user-{u}", post_id))
+        clients[u].post("/posts", json={
+            "post_id": post_id, "work_id": 0, "work_title": f"작품 {u}", "post_title": _sentence(rng)[:30],
+            "description": _sentence(rng), "tags": ["벤치"],
+            "content_preview": {"text": _sentence(rng)},
+            "content_snapshot": plot_doc(rng, ["인물1", "인물2"], args.blocks),
+        }).raise_for_status()
+        for _ in range(args.comments):
+            clients[(u + 1) % args.users].post(f"/posts/{quote(f'bench-user-{u}#{post_id}')}/comments",
+                                               json={"comment_id": next(ids), "text": _sentence(rng)}
+                                               ).raise_for_status()
+    target["post"] = post_ids[0] if post_ids else None
+    return target
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+def scenarios(target: dict, rng: random.Random) -> list[tuple[str, str, str, dict]]:
+    """(name, method, path, request kwargs) per benchmarked endpoint."""
+    w, e, p, c = target["work_id"], target["episode_id"], target["plot_id"], target["character_id"]
+    query = "바람이 창문"
+    rows = [
+        ("works",               "GET",   "/works", {}),
+        ("works ?fields",       "GET",   "/works", {"params": {"fields": _LIST_FIELDS["works"]}}),
+        ("episodes",            "GET",   f"/works/{w}/episodes", {}),
+        ("plots",               "GET",   f"/episodes/{e}/plots", {}),
+        ("plots ?fields",       "GET",   f"/episodes/{e}/plots", {"params": {"fields": _LIST_FIELDS["plots"]}}),
+        ("plot content",        "GET",   f"/plots/{p}/content", {}),
+        ("save plot content",   "PUT",   f"/plots/{p}/content",
+         {"content": json.dumps(plot_doc(rng, target["names"], 20), ensure_ascii=False)}),
+        # versions 1 (seed) and 2+ (the saves above) exist by now
+        ("plot versions",       "GET",   f"/plots/{p}/versions", {}),
+        ("plot version",        "GET",   f"/plots/{p}/versions/2", {}),
+        ("version diff",        "GET",   f"/plots/{p}/versions/diff",
+         {"params": {"from_version": 1, "to_version": 2}}),
+        ("sync",                "POST",  "/sync",
+         {"json": {"operations": [{"op": "update", "entity": "plot", "id": p, "data": {"title": "수정"}},
+                                  {"op": "update", "entity": "episode", "id": e, "data": {"title": "수정"}}]}}),
+        ("characters",          "GET",   f"/works/{w}/characters", {}),
+        ("relations",           "GET",   f"/works/{w}/relations", {}),
+        ("graph layout",        "GET",   f"/graph-layout/{w}", {}),
+        ("auto layout",         "GET",   f"/graph-layout/{w}/auto", {}),
+        ("work stats",          "GET",   f"/works/{w}/stats", {}),
+        ("character analytics", "GET",   f"/works/{w}/character-analytics", {}),
+        ("character dialogues", "GET",   f"/characters/{c}/dialogues", {}),
+        ("summarize character", "POST",  f"/characters/{c}/summarize", {"json": {}}),
+        ("summarize plot",      "POST",  f"/plots/{p}/summarize", {}),
+        ("summarize chapter",   "POST",  f"/episodes/{e}/summarize", {"json": {}}),
+        ("summarize work",      "POST",  f"/works/{w}/summarize", {"json": {}}),
+        ("search",              "GET",   "/search", {"params": {"q": query}}),
+        ("export txt",          "GET",   f"/works/{w}/export", {"params": {"format": "txt"}}),
+        ("posts",               "GET",   "/posts", {}),
+        ("posts ?fields",       "GET",   "/posts", {"params": {"fields": _LIST_FIELDS["posts"]}}),
+        ("my posts",            "GET",   "/posts/mine", {}),
+    ]
+    if target.get("post"):
+        author, post_id = target["post"]
+        rows += [
+            ("post content",  "GET",  f"/posts/{post_id}/content", {}),
+            ("post comments", "GET",  f"/posts/{quote(f'{author}#{post_id}')}/comments", {}),
+            ("post comments ?fields", "GET", f"/posts/{quote(f'{author}#{post_id}')}/comments",
+             {"params": {"fields": _LIST_FIELDS["comments"]}}),
+            ("post like",     "POST", f"/posts/{post_id}/like", {}),
+        ]
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+class _Capture(logging.Handler):
+    """Collects the JSON lines TimingMiddleware writes to the "timing" logger."""
+
+    def __init__(self):
+        super().__init__()
+        self.records: list[dict] = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.getMessage()))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)] if ordered else 0.0
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    if args.storage == "local":
+        install_storage(storage.local_storage(tempfile.mkdtemp(prefix="plot-editor-bench-")))
+    else:
+        install_storage(storage.memory_storage())
+    install_fake_llm(args.llm_latency)
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    timing = logging.getLogger("timing")
+    timing.setLevel(logging.INFO)
+    timing.propagate = False
+    started = time.perf_counter()
+    target = seed(args, rng)
+    seed_seconds = time.perf_counter() - started
+
+    client = client_for("bench-user-0")
+    capture = _Capture()
+    timing.addHandler(capture)
+    results = {}
+    try:
+        for name, method, path, kwargs in scenarios(target, rng):
+            for _ in range(args.warmup):
+                client.request(method, path, **kwargs)
+            capture.records.clear()
+            statuses, response_bytes = set(), 0
+            for _ in range(args.repeat):
+                response = client.request(method, path, **kwargs)
+                statuses.add(response.status_code)
+                response_bytes += len(response.content)
+            latencies = [r["duration_ms"] for r in capture.records]
+            totals: dict = {}
+            for r in capture.records:
+                for service, summary in r["backend"].items():
+                    for field, value in summary.items():
+                        if field != "ms":
+                            key = f"{service}_{field}"
+                            totals[key] = totals.get(key, 0) + value
+            results[name] = {
+                "method": method, "route": capture.records[-1]["route"] if capture.records else path,
+                "status": sorted(statuses),
+                "p50_ms": round(_percentile(latencies, 0.50), 2),
+                "p95_ms": round(_percentile(latencies, 0.95), 2),
+                "p95_total_ms": round(_percentile([r["total_ms"] for r in capture.records], 0.95), 2),
+                "response_bytes": round(response_bytes / max(1, args.repeat), 2),
+                # per request averages
+                **{k: round(v / max(1, len(capture.records)), 2) for k, v in sorted(totals.items())},
+            }
+    finally:
+        timing.removeHandler(capture)
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+        "seed_seconds": round(seed_seconds, 2),
+        "endpoints": results,
+        "serialization": serialization(args.repeat),
+    }
+
+
+def serialization(repeat: int) -> dict:
+    """FastAPI's default rendering (jsonable_encoder + JSONResponse) vs main._JSONResponse
+    on the raw items of each list table, full and with the list view's ?fields=."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    def median_ms(fn) -> float:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - started) * 1000)
+        return _percentile(times, 0.5)
+
+    rows = {}
+    for name, table in (("works", main._works_table), ("plots", main._plots_table),
+                        ("characters", main._characters_table), ("posts", main._posts_table),
+                        ("comments", main._comments_table)):
+        items = main._scan_all(table)
+        fields = _LIST_FIELDS.get(name)
+        selected = main._select_fields(items, fields.split(",")) if fields else items
+        rows[name] = {
+            "items": len(items),
+            "default_ms": round(median_ms(lambda: JSONResponse(jsonable_encoder(items)).body), 2),
+            "orjson_ms": round(median_ms(lambda: main._JSONResponse(items).body), 2),
+            "bytes": len(main._JSONResponse(items).body),
+            "fields_bytes": len(main._JSONResponse(selected).body),
+        }
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+_COLUMNS = (
+    ("p50 ms", "p50_ms"), ("p95 ms", "p95_ms"), ("ddb calls", "dynamodb_calls"),
+    ("scanned", "dynamodb_scanned"), ("ddb KB", "dynamodb_bytes"), ("s3 calls", "s3_calls"),
+    ("s3 KB", "s3_bytes"), ("tokens", "llm_tokens"), ("resp KB", "response_bytes"),
+)
+# deterministic counters that --compare gates on
+_GATED = ("dynamodb_calls", "dynamodb_scanned", "dynamodb_bytes", "s3_calls", "s3_bytes", "llm_tokens",
+          "response_bytes")
+
+
+def _cell(row: dict, key: str) -> str:
+    value = row.get(key, 0)
+    if key.endswith("_bytes"):
+        value = value / 1024
+    return f"{value:.1f}" if isinstance(value, float) or key.endswith("_bytes") else str(value)
+
+
+def report(result: dict, baseline: dict | None = None) -> list[str]:
+    """Print the table; with a baseline, also the change per column. Returns regressions."""
+    config = result["config"]
+    print(f"users={config['users']} works={config['works']} episodes={config['episodes']} "
+          f"plots={config['plots']} characters={config['characters']} posts={config['posts']} "
+          f"repeat={config['repeat']} (seeded in {result['seed_seconds']}s)")
+    header = f"{'endpoint':<24}" + "".join(f"{title:>11}" for title, _ in _COLUMNS)
+    print(header)
+    print("-" * len(header))
+    regressions = []
+    base_rows = (baseline or {}).get("endpoints", {})
+    shape = ("users", "works", "episodes", "plots", "characters", "blocks", "posts", "comments", "seed",
+             "storage", "planning_kb")
+    if baseline and any(baseline["config"].get(k) != config[k] for k in shape):
+        print("warning: the baseline was generated with a different data set")
+    for name, row in result["endpoints"].items():
+        flag = "" if row["status"] == [200] else f"  status {row['status']}"
+        print(f"{name:<24}" + "".join(f"{_cell(row, key):>11}" for _, key in _COLUMNS) + flag)
+        base = base_rows.get(name)
+        if base is None:
+            continue
+        deltas = []
+        for _, key in _COLUMNS:
+            old, new = base.get(key, 0), row.get(key, 0)
+            deltas.append(f"{(new - old) / old * 100:+.0f}%" if old else ("" if not new else "new"))
+        print(f"{'  vs baseline':<24}" + "".join(f"{d:>11}" for d in deltas))
+        for key in _GATED:
+            old, new = base.get(key, 0), row.get(key, 0)
+            if new > old * (1 + config["tolerance"]) and new - old > 0.5:
+                regressions.append(f"{name}: {key} {old} -> {new}")
+        if config["latency_tolerance"] is not None and base.get("p95_ms"):
+            if row["p95_ms"] > base["p95_ms"] * (1 + config["latency_tolerance"]):
+                regressions.append(f"{name}: p95_ms {base['p95_ms']} -> {row['p95_ms']}")
+    _report_serialization(result["serialization"])
+    return regressions
+
+
+def _report_serialization(rows: dict) -> None:
+    print()
+    print(f"{'serialization':<24}{'items':>11}{'default ms':>11}{'orjson ms':>11}{'speedup':>11}"
+          f"{'KB':>11}{'?fields KB':>11}")
+    for name, row in rows.items():
+        speedup = row["default_ms"] / row["orjson_ms"] if row["orjson_ms"] else 0.0
+        print(f"{name:<24}{row['items']:>11}{row['default_ms']:>11.2f}{row['orjson_ms']:>11.2f}"
+              f"{speedup:>10.1f}x{row['bytes'] / 1024:>11.1f}{row['fields_bytes'] / 1024:>11.1f}")
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=3, help="users seeded (each with the same tree)")
+    parser.add_argument("--works", type=int, default=1, help="works per user")
+    parser.add_argument("--episodes", type=int, default=10, help="episodes per work")
+    parser.add_argument("--plots", type=int, default=8, help="plots per episode")
+    parser.add_argument("--characters", type=int, default=12, help="characters per work")
+    parser.add_argument("--blocks", type=int, default=30, help="text blocks per plot")
+    parser.add_argument("--planning-kb", type=float, default=0,
+                        help="planning doc size per work (0: one sentence); over ATTR_SPILL_BYTES it moves to S3")
+    parser.add_argument("--posts", type=int, default=60, help="community posts across all users")
+    parser.add_argument("--comments", type=int, default=2, help="comments per post")
+    parser.add_argument("--repeat", type=int, default=20, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests per endpoint")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="fake LLM delay in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--storage", choices=("memory", "local"), default="memory",
+                        help="in-memory fakes, or the SQLite + file backend in a temporary directory")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline results file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed growth of call / scan / byte counts against the baseline")
+    parser.add_argument("--latency-tolerance", type=float, default=None,
+                        help="also gate on p95 growth (e.g. 0.5 = +50%%); off by default")
+    args = parser.parse_args(argv)
+    if args.users < 1 or args.works < 1 or args.episodes < 1 or args.plots < 1 or args.characters < 1:
+        parser.error("users, works, episodes, plots and characters must be at least 1")
+
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = report(result, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if regressions:
+        print("\nregressions:")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
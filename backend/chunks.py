@@ -0,0 +1,113 @@
+"""Content-addressed chunks for stored documents (plot content, post snapshots).
+
+A document is a dict with one list of blocks: "content" (a TipTap document),
+"scenes" (a plot snapshot) or "paragraphs" (a novel snapshot). split() cuts
+that list into chunks and names each chunk by the hash of its canonical JSON,
+so identical chunks are stored once however many documents contain them. A
+manifest lists a document's chunk hashes in order, plus its other keys.
+
+Boundaries are placed before every scene (a scene heading, a heading or a
+snapshot scene), and otherwise after a block whose checksum picks it once the
+chunk has MIN_BYTES, or before a block that would take it past MAX_BYTES.
+They depend on the blocks around them only, so an edit changes the chunk it
+is in and leaves the rest of the document's chunks, and their hashes, alone.
+"""
+
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+BLOCK_FIELDS = ("content", "scenes", "paragraphs")
+SECTION_TYPES = {"sceneHeading", "heading"}
+MIN_BYTES = 2 * 1024
+MAX_BYTES = 32 * 1024
+BOUNDARY_EVERY = 8      # past MIN_BYTES, one block in this many ends a chunk
+
+
+def _canonical(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+
+
+def digest(blob: bytes) -> str:
+    return hashlib.sha256(blob).hexdigest()[:32]
+
+
+def _starts_section(block) -> bool:
+    return isinstance(block, dict) and (block.get("type") in SECTION_TYPES or "scene_heading" in block)
+
+
+def split(doc) -> tuple[dict, dict[str, bytes]] | None:
+    """(manifest, {hash: chunk}) for doc, or None when doc has no block list.
+
+    A chunk is the canonical JSON array of its blocks; the manifest is
+    {"field": ..., "meta": "<JSON of the other keys>", "chunks": [hash, ...]}.
+    """
+    if not isinstance(doc, dict):
+        return None
+    field = next((f for f in BLOCK_FIELDS if isinstance(doc.get(f), list)), None)
+    if field is None:
+        return None
+
+    groups, current, size = [], [], 0
+    for block in doc[field]:
+        encoded = _canonical(block)
+        if current and (_starts_section(block) or size + len(encoded) > MAX_BYTES):
+            groups.append(current)
+            current, size = [], 0
+        current.append(encoded)
+        size += len(encoded) + 1
+        if size >= MIN_BYTES and zlib.crc32(encoded) % BOUNDARY_EVERY == 0:
+            groups.append(current)
+            current, size = [], 0
+    if current:
+        groups.append(current)
+
+    blobs, hashes = {}, []
+    for group in groups:
+        blob = b"[" + b",".join(group) + b"]"
+        h = digest(blob)
+        blobs[h] = blob
+        hashes.append(h)
+    meta = _canonical({k: v for k, v in doc.items() if k != field}).decode()
+    return {"field": field, "meta": meta, "chunks": hashes}, blobs
+
+
+def encode(manifest: dict, blobs: dict[str, bytes]) -> bytes:
+    """The document's JSON, joined from its chunks without parsing them."""
+    blocks = b",".join(inner for inner in (blobs[h][1:-1] for h in manifest["chunks"]) if inner)
+    meta = manifest["meta"].encode()[1:-1]
+    field = _canonical(manifest["field"])
+    return b"{" + meta + (b"," if meta else b"") + field + b":[" + blocks + b"]}"
+
+
+class Cache:
+    """Thread-safe LRU of chunks, bounded by total bytes. Chunks never change
+    under their hash, so a cached chunk is never stale."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> bytes | None:
+        with self._lock:
+            blob = self._items.get(key)
+            if blob is not None:
+                self._items.move_to_end(key)
+            return blob
+
+    def put(self, key, blob: bytes) -> None:
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = blob
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
@@ -0,0 +1,332 @@
+"""Central authority for real-time collaborative editing of a plot.
+
+Follows the prosemirror-collab protocol. Per plot, the server keeps a version
+number and the log of steps accepted since the last snapshot. A client sends
+the steps it made on top of the version it has seen; they are accepted only
+if that version is current, then broadcast to every client, the sender
+included as confirmation. A client that was behind gets a "reject", receives
+the steps it missed in the broadcasts that follow, rebases its own steps on
+top of them and sends them again.
+
+Steps are opaque JSON here: ProseMirror applies them in the browser, and the
+server cannot replay them. The merged document is persisted from snapshots
+instead. Every SNAPSHOT_STEPS steps, or every SNAPSHOT_SECONDS while edits are
+pending, one client is asked for its document at a version it has confirmed.
+All clients at a version hold the same document, so any one of them will do.
+When an editor leaves with steps pending, a remaining one is asked at once,
+and a client should send an unrequested snapshot of its confirmed version
+before it closes, since the last one to leave cannot be asked. On shutdown
+every room with pending steps is asked and given SHUTDOWN_WAIT seconds.
+
+A document saved outside the room (a plain save, a restore, an upload) goes
+through Hub.overwrite(): the room is reset to that document under a new
+version and every client gets a fresh "init", so the room's next snapshot
+builds on the outside save instead of overwriting it. Steps not yet
+snapshotted are dropped, like the edits of any save that lost a race.
+
+Messages are JSON text frames:
+
+    client -> server
+        {"type": "steps", "version": v, "steps": [...], "client_id": c}
+        {"type": "snapshot", "version": v, "doc": {...}}
+    server -> client
+        {"type": "init", "doc": {...}, "doc_version": d, "version": v,
+         "steps": [...], "client_ids": [...]}      doc at d, then steps d..v;
+                                                   sent again after an outside save
+        {"type": "steps", "version": v, "steps": [...], "client_ids": [...]}
+        {"type": "reject", "version": v}
+        {"type": "snapshot_request", "version": v}
+        {"type": "presence", "clients": n}
+        {"type": "error", "detail": "..."}
+
+Rooms live in one process; every editor of a plot must reach the same one.
+"""
+
+import asyncio
+import logging
+import time
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_STEPS = 100      # steps after which a snapshot is requested
+SNAPSHOT_SECONDS = 10.0   # pending steps older than this get a snapshot request
+MAX_PENDING_STEPS = 5000  # steps are refused beyond this many unsnapshotted ones
+MAX_BATCH_STEPS = 500     # steps per message
+PEER_QUEUE = 256          # outgoing messages buffered per client before it is dropped
+CLOSE_GRACE = 30.0        # seconds an empty room waits for editors to reconnect
+SHUTDOWN_WAIT = 2.0       # seconds shutdown waits for requested snapshots
+
+
+def _encode(message: dict) -> str:
+    return orjson.dumps(message).decode()
+
+
+class Peer:
+    """One connection. Messages are queued and written by run(), so a slow
+    client never holds up a broadcast; one that falls PEER_QUEUE behind is
+    disconnected and resynchronizes from init when it reconnects."""
+
+    def __init__(self, send, close):
+        self._send = send
+        self._close = close
+        self._queue: asyncio.Queue = asyncio.Queue(PEER_QUEUE)
+        self.dropped = False
+
+    def post(self, message: str) -> None:
+        if self.dropped:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            self._end()
+
+    def stop(self) -> None:
+        if not self.dropped:
+            self._end()
+
+    def _end(self) -> None:
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def run(self) -> None:
+        while True:
+            message = await self._queue.get()
+            if message is None:
+                break
+            await self._send(message)
+        if self.dropped:
+            await self._close(1013)
+
+
+class Room:
+    def __init__(self, hub: "Hub", key):
+        self.hub = hub
+        self.key = key
+        self.peers: set[Peer] = set()
+        self.doc: dict = {}
+        self.doc_version = 0          # version of self.doc
+        self.version = 0
+        self.steps: list = []         # steps doc_version..version
+        self.client_ids: list = []
+        self.saved_version = 0
+        self.requested_version = 0    # version of the last snapshot request
+        self.changed_at = 0.0         # when the first unsnapshotted step arrived
+        self.loading: asyncio.Task | None = None
+        self._saving: asyncio.Task | None = None
+        self._writing = asyncio.Lock()  # held by snapshot saves and outside saves
+        self._timer: asyncio.Task | None = None
+        self._expiry: asyncio.Task | None = None
+
+    # -- membership --
+
+    def join(self, peer: Peer) -> None:
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._tick())
+        self.peers.add(peer)
+        peer.post(self._init())
+        self._presence()
+
+    def _init(self) -> str:
+        return _encode({
+            "type": "init", "doc": self.doc, "doc_version": self.doc_version,
+            "version": self.version, "steps": self.steps, "client_ids": self.client_ids,
+        })
+
+    def leave(self, peer: Peer) -> None:
+        self.peers.discard(peer)
+        peer.stop()
+        if self.peers:
+            self._presence()
+            if self.steps:
+                self._request_snapshot()    # before the steps rest with fewer editors
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._expiry = asyncio.create_task(self._expire())
+
+    def _presence(self) -> None:
+        self._broadcast({"type": "presence", "clients": len(self.peers)})
+
+    def _broadcast(self, message: dict) -> None:
+        text = _encode(message)
+        for peer in self.peers:
+            peer.post(text)
+
+    # -- protocol --
+
+    def receive(self, peer: Peer, message) -> None:
+        kind = message.get("type") if isinstance(message, dict) else None
+        if kind == "steps":
+            self._receive_steps(peer, message)
+        elif kind == "snapshot":
+            self._receive_snapshot(peer, message)
+        else:
+            peer.post(_encode({"type": "error", "detail": "알 수 없는 메시지입니다."}))
+
+    def _receive_steps(self, peer: Peer, message: dict) -> None:
+        version, steps = message.get("version"), message.get("steps")
+        if not isinstance(version, int) or not isinstance(steps, list) or not steps:
+            peer.post(_encode({"type": "error", "detail": "version 과 steps 가 필요합니다."}))
+            return
+        if len(steps) > MAX_BATCH_STEPS:
+            peer.post(_encode({"type": "error", "detail": f"steps 는 한 번에 {MAX_BATCH_STEPS}개까지입니다."}))
+            return
+        if version != self.version:
+            peer.post(_encode({"type": "reject", "version": self.version}))
+            return
+        if len(self.steps) + len(steps) > MAX_PENDING_STEPS:
+            # Refuse until a snapshot lets the log be trimmed; the client
+            # retries like after a reject.
+            peer.post(_encode({"type": "reject", "version": self.version}))
+            self._request_snapshot(peer)
+            return
+        client_ids = [message.get("client_id")] * len(steps)
+        if not self.steps:
+            self.changed_at = time.monotonic()
+        self.steps.extend(steps)
+        self.client_ids.extend(client_ids)
+        self.version += len(steps)
+        self._broadcast({"type": "steps", "version": self.version, "steps": steps, "client_ids": client_ids})
+        if self.version - max(self.doc_version, self.requested_version) >= SNAPSHOT_STEPS:
+            self._request_snapshot(peer)
+
+    def _receive_snapshot(self, peer: Peer, message: dict) -> None:
+        version, doc = message.get("version"), message.get("doc")
+        if not isinstance(version, int) or not isinstance(doc, dict):
+            peer.post(_encode({"type": "error", "detail": "version 과 doc 이 필요합니다."}))
+            return
+        if version <= self.doc_version or version > self.version:
+            return      # stale, or from a client that is ahead of the log
+        del self.steps[:version - self.doc_version]
+        del self.client_ids[:version - self.doc_version]
+        self.doc, self.doc_version = doc, version
+        self.changed_at = time.monotonic() if self.steps else 0.0
+        if self._saving is None:
+            self._saving = asyncio.create_task(self._save())
+
+    def _request_snapshot(self, peer: Peer | None = None) -> None:
+        if peer is None or peer not in self.peers:
+            peer = next(iter(self.peers), None)
+        if peer is None:
+            return
+        self.requested_version = self.version
+        peer.post(_encode({"type": "snapshot_request", "version": self.version}))
+
+    # -- persistence --
+
+    async def _save(self) -> None:
+        try:
+            while self.saved_version < self.doc_version:
+                version, doc = self.doc_version, self.doc
+                try:
+                    async with self._writing:
+                        if version <= self.saved_version:
+                            continue    # an outside save superseded it
+                        await self.hub.persist(self.key, doc)
+                except Exception:
+                    logger.exception("collab snapshot save failed for %s", self.key)
+                    return
+                self.saved_version = max(self.saved_version, version)
+        finally:
+            self._saving = None
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(SNAPSHOT_SECONDS / 2)
+            if self.steps and time.monotonic() - self.changed_at >= SNAPSHOT_SECONDS:
+                self._request_snapshot()
+
+    async def _expire(self) -> None:
+        await asyncio.sleep(self.hub.close_grace)
+        if self.peers:
+            return
+        if self.steps:
+            logger.warning("collab room %s closed with %d unsaved steps", self.key, len(self.steps))
+        if self.hub.rooms.get(self.key) is self:
+            del self.hub.rooms[self.key]
+
+    async def flush(self) -> None:
+        if self._saving is not None:
+            await self._saving
+
+    def reset(self, doc: dict) -> None:
+        """Start over from doc, saved outside the room, under a new version."""
+        if self.steps:
+            logger.warning("collab room %s reset by an outside save; %d unsaved steps dropped",
+                           self.key, len(self.steps))
+        self.version += 1
+        self.doc, self.doc_version = doc, self.version
+        self.saved_version = self.requested_version = self.version
+        self.steps, self.client_ids = [], []
+        self.changed_at = 0.0
+        text = self._init()
+        for peer in self.peers:
+            peer.post(text)
+
+
+class Hub:
+    """The rooms of this process. load(key) and persist(key, doc) are
+    coroutines that read and write the stored document."""
+
+    def __init__(self, load, persist, close_grace: float = CLOSE_GRACE):
+        self.load = load
+        self.persist = persist
+        self.close_grace = close_grace
+        self.rooms: dict = {}
+
+    async def join(self, key, peer: Peer) -> Room:
+        room = self.rooms.get(key)
+        if room is None:
+            room = self.rooms[key] = Room(self, key)
+            room.loading = asyncio.create_task(self._open(room))
+        try:
+            await room.loading
+        except Exception:
+            if self.rooms.get(key) is room:
+                del self.rooms[key]
+            raise
+        room.join(peer)
+        return room
+
+    async def _open(self, room: Room) -> None:
+        room.doc = await self.load(room.key)
+
+    async def overwrite(self, key, doc: dict, write):
+        """Run write(), a coroutine function saving doc outside the room, and
+        reset the plot's open room (if any) to doc. Returns write()'s result."""
+        room = self.rooms.get(key)
+        if room is None:
+            return await write()
+        try:
+            await room.loading
+        except Exception:
+            return await write()
+        room.reset(doc)
+        async with room._writing:       # after a snapshot save in progress
+            return await write()
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.rooms),
+            "clients": sum(len(room.peers) for room in self.rooms.values()),
+            "pending_steps": sum(len(room.steps) for room in self.rooms.values()),
+        }
+
+    async def shutdown(self) -> None:
+        """Ask for snapshots of pending steps, then wait for the saves."""
+        rooms = list(self.rooms.values())
+        waiting = [room for room in rooms if room.steps and room.peers]
+        for room in waiting:
+            room._request_snapshot()
+        deadline = time.monotonic() + SHUTDOWN_WAIT
+        while any(room.steps for room in waiting) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*(room.flush() for room in rooms))
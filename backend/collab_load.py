@@ -0,0 +1,282 @@
+"""Load test for the collaborative editing channel (/plots/{id}/collab).
+
+Opens --editors WebSocket editors on each of --docs plots. Every editor types
+--rate steps per second in small batches and follows the prosemirror-collab
+client rules: send unconfirmed steps on top of the confirmed version, wait
+for the missing steps after a reject, answer snapshot requests once it has
+nothing unconfirmed, and send a snapshot before hanging up. Steps are synthetic; the server never looks inside them.
+
+By default the app runs in-process under uvicorn on the memory backend of
+bench.py, so nothing touches AWS. --url points the editors at a running
+server instead (plots 1..--docs must exist for the token's user).
+
+Reported: steps accepted per second, reject rate, confirmation latency (send
+to own steps coming back, p50/p95/p99), broadcast messages received,
+snapshots saved, dropped connections, and whether every editor of a plot
+saw the same step log.
+
+    python collab_load.py
+    python collab_load.py --docs 4 --editors 50 --rate 5 --duration 20
+    python collab_load.py --url ws://localhost:8000 --token <jwt>
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+import websockets
+
+import bench  # sets the environment main.py needs and seeds through the API
+import collab
+import main
+
+_BATCH = (1, 4)        # steps per local edit
+
+
+class Editor:
+    def __init__(self, name: str, rng: random.Random):
+        self.name = name
+        self.rng = rng
+        self.version = 0
+        self.unconfirmed: list = []
+        self.sent_at: float | None = None   # when the in-flight batch was sent
+        self.blocked = False                # rejected: wait for the steps we miss
+        self.snapshot_wanted = False
+        self.log = hashlib.sha256()
+        self.latencies: list[float] = []
+        self.rejects = 0
+        self.received = 0
+        self.snapshots = 0
+        self.dropped = False
+        self.typed = 0
+
+    def _doc(self) -> dict:
+        text = f"{self.name} v{self.version} {self.log.hexdigest()[:12]}"
+        return {"type": "doc", "content": [{"type": "narration", "content": [{"type": "text", "text": text}]}]}
+
+    async def _send(self, ws) -> None:
+        if self.sent_at is not None or self.blocked or not self.unconfirmed:
+            return
+        self.sent_at = time.perf_counter()
+        await ws.send(json.dumps({
+            "type": "steps", "version": self.version, "steps": self.unconfirmed[:collab.MAX_BATCH_STEPS],
+            "client_id": self.name,
+        }))
+
+    async def _snapshot(self, ws) -> None:
+        if self.snapshot_wanted and not self.unconfirmed:
+            self.snapshot_wanted = False
+            self.snapshots += 1
+            await ws.send(json.dumps({"type": "snapshot", "version": self.version, "doc": self._doc()}))
+
+    async def _receive(self, ws) -> None:
+        async for text in ws:
+            message = json.loads(text)
+            self.received += 1
+            kind = message["type"]
+            if kind == "init":
+                self.version = message["version"]
+                for step, client_id in zip(message["steps"], message["client_ids"]):
+                    self.log.update(f"{client_id}:{step['n']}".encode())
+            elif kind == "steps":
+                for step, client_id in zip(message["steps"], message["client_ids"]):
+                    self.log.update(f"{client_id}:{step['n']}".encode())
+                self.version = message["version"]
+                own = sum(1 for client_id in message["client_ids"] if client_id == self.name)
+                if own:
+                    del self.unconfirmed[:own]
+                    self.latencies.append(time.perf_counter() - self.sent_at)
+                    self.sent_at = None
+                self.blocked = False
+                await self._snapshot(ws)
+                await self._send(ws)
+            elif kind == "reject":
+                self.rejects += 1
+                self.sent_at = None
+                # Behind: the missing steps are on their way. Level with the
+                # server: it is refusing steps until a snapshot arrives.
+                self.blocked = message["version"] != self.version
+                if not self.blocked:
+                    await asyncio.sleep(0.05)
+                    await self._send(ws)
+            elif kind == "snapshot_request":
+                self.snapshot_wanted = True
+                await self._snapshot(ws)
+
+    async def _type(self, ws, rate: float, duration: float) -> None:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(rate / sum(_BATCH) * 2))
+            for _ in range(self.rng.randint(*_BATCH)):
+                self.typed += 1
+                self.unconfirmed.append({"n": self.typed, "stepType": "replace"})
+            await self._send(ws)
+
+    async def run(self, url: str, rate: float, duration: float, drain: float, finished: "Barrier") -> None:
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                receiver = asyncio.create_task(self._receive(ws))
+                await self._type(ws, rate, duration)
+                # Let the in-flight steps settle, then hang up together with
+                # the other editors of the plot so all logs end at one version.
+                deadline = time.perf_counter() + drain
+                while self.unconfirmed and time.perf_counter() < deadline and not receiver.done():
+                    await asyncio.sleep(0.05)
+                await finished.wait(self)
+                await asyncio.sleep(0.5)
+                self.snapshot_wanted = True     # the last editor out cannot be asked
+                await self._snapshot(ws)
+                receiver.cancel()
+        except websockets.ConnectionClosed:
+            self.dropped = True
+        finally:
+            finished.arrive(self)
+
+
+class Barrier:
+    """Released once all n editors of a plot have arrived."""
+
+    def __init__(self, n: int):
+        self.waiting = n
+        self.arrived: set = set()
+        self.done = asyncio.Event()
+
+    def arrive(self, editor: Editor) -> None:
+        if editor.name not in self.arrived:
+            self.arrived.add(editor.name)
+            if len(self.arrived) >= self.waiting:
+                self.done.set()
+
+    async def wait(self, editor: Editor) -> None:
+        self.arrive(editor)
+        await self.done.wait()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return bench._percentile(values, q)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning",
+                                           ws_max_size=64 * 1024 * 1024))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def _seed(docs: int) -> tuple[str, object]:
+    client = bench.client_for("collab-load")
+    client.post("/works", json={"work_id": 1, "title": "동시 편집", "type": "plot"})
+    client.post("/works/1/episodes", json={"episode_id": 1, "title": "1화"})
+    for plot_id in range(1, docs + 1):
+        client.post("/episodes/1/plots", json={"plot_id": plot_id, "title": f"플롯 {plot_id}"})
+    return client.headers["Authorization"][7:], client
+
+
+async def _run_editors(args, base: str, token: str) -> list[list[Editor]]:
+    rng = random.Random(args.seed)
+    rooms = [[Editor(f"d{d}e{e}", random.Random(rng.random())) for e in range(args.editors)]
+             for d in range(1, args.docs + 1)]
+    tasks = []
+    for plot_id, editors in enumerate(rooms, start=1):
+        finished = Barrier(len(editors))
+        for editor in editors:
+            url = f"{base}/plots/{plot_id}/collab?token={token}"
+            tasks.append(editor.run(url, args.rate, args.duration, args.drain, finished))
+    await asyncio.gather(*tasks)
+    return rooms
+
+
+def report(rooms: list[list[Editor]], elapsed: float, snapshots_saved: int | None) -> dict:
+    editors = [editor for room in rooms for editor in room]
+    latencies = [s * 1000 for editor in editors for s in editor.latencies]
+    confirmed = sum(editor.typed - len(editor.unconfirmed) for editor in editors)
+    sends = len(latencies) + sum(editor.rejects for editor in editors)
+    converged = all(len({editor.log.hexdigest() for editor in room if not editor.dropped}) <= 1 for room in rooms)
+    result = {
+        "docs": len(rooms),
+        "editors": len(editors),
+        "seconds": round(elapsed, 2),
+        "steps_confirmed": confirmed,
+        "steps_per_s": round(confirmed / elapsed, 1),
+        "unconfirmed_at_end": sum(len(editor.unconfirmed) for editor in editors),
+        "reject_rate": round(sum(editor.rejects for editor in editors) / sends, 3) if sends else 0.0,
+        "confirm_p50_ms": round(_percentile(latencies, 0.50), 1),
+        "confirm_p95_ms": round(_percentile(latencies, 0.95), 1),
+        "confirm_p99_ms": round(_percentile(latencies, 0.99), 1),
+        "messages_received": sum(editor.received for editor in editors),
+        "snapshots_sent": sum(editor.snapshots for editor in editors),
+        "snapshots_saved": snapshots_saved,
+        "dropped": sum(editor.dropped for editor in editors),
+        "converged": converged,
+    }
+    width = max(len(key) for key in result)
+    for key, value in result.items():
+        print(f"{key:<{width}}  {value}")
+    return result
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=2, help="plots edited at the same time")
+    parser.add_argument("--editors", type=int, default=25, help="editors per plot")
+    parser.add_argument("--rate", type=float, default=4.0, help="steps per second per editor")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of typing")
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to wait for in-flight steps")
+    parser.add_argument("--snapshot-steps", type=int, default=collab.SNAPSHOT_STEPS,
+                        help="in-process server: steps between snapshot requests")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="ws(s):// base URL of a running server")
+    parser.add_argument("--token", help="JWT for --url")
+    parser.add_argument("--json", help="write the result to this file")
+    args = parser.parse_args(argv)
+
+    client = server = None
+    if args.url:
+        if not args.token:
+            parser.error("--url needs --token")
+        base, token = args.url.rstrip("/"), args.token
+    else:
+        collab.SNAPSHOT_STEPS = args.snapshot_steps
+        token, client = _seed(args.docs)
+        port = _free_port()
+        server, thread = _serve(port)
+        base = f"ws://127.0.0.1:{port}"
+
+    started = time.perf_counter()
+    rooms = asyncio.run(_run_editors(args, base, token))
+    elapsed = time.perf_counter() - started
+
+    snapshots_saved = None
+    if server is not None:
+        server.should_exit = True
+        thread.join()
+        snapshots_saved = sum(
+            len(client.get(f"/plots/{plot_id}/versions", params={"limit": 1000}).json()["versions"])
+            for plot_id in range(1, args.docs + 1)
+        )
+    result = report(rooms, elapsed, snapshots_saved)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["converged"] and not result["dropped"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
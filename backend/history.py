@@ -0,0 +1,76 @@
+"""Block-level deltas between TipTap documents, for plot version history.
+
+A document is compared as its list of top-level blocks (scene headings,
+dialogue, narration ...), each block serialized canonically. A delta is
+
+    {"ops": [["=", n] | ["-", n] | ["+", [blocks]], ...], "meta": {...}}
+
+copy n blocks, skip n blocks, insert blocks; "meta" carries the top-level
+keys other than "content" and is present only when they changed. An edit to
+one block therefore costs that block, not the document.
+"""
+
+import json
+from difflib import SequenceMatcher
+
+
+def _canonical(block) -> str:
+    return json.dumps(block, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def _meta(doc: dict) -> dict:
+    return {k: v for k, v in doc.items() if k != "content"}
+
+
+def _opcodes(old: dict, new: dict):
+    a = [_canonical(b) for b in old.get("content") or []]
+    b = [_canonical(b) for b in new.get("content") or []]
+    return SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+
+
+def make_delta(old: dict, new: dict) -> dict:
+    """The delta that turns old into new."""
+    blocks = new.get("content") or []
+    ops: list = []
+    for tag, i1, i2, j1, j2 in _opcodes(old, new):
+        if tag == "equal":
+            ops.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            ops.append(["-", i2 - i1])
+        if j2 > j1:
+            ops.append(["+", blocks[j1:j2]])
+    delta: dict = {"ops": ops}
+    if _meta(old) != _meta(new):
+        delta["meta"] = _meta(new)
+    return delta
+
+
+def apply_delta(doc: dict, delta: dict) -> dict:
+    blocks = doc.get("content") or []
+    out: list = []
+    pos = 0
+    for op, arg in delta["ops"]:
+        if op == "=":
+            out.extend(blocks[pos:pos + arg])
+            pos += arg
+        elif op == "-":
+            pos += arg
+        else:
+            out.extend(arg)
+    result = dict(delta["meta"] if "meta" in delta else _meta(doc))
+    if out or "content" in doc:
+        result["content"] = out
+    return result
+
+
+def diff(old: dict, new: dict) -> list[dict]:
+    """Changed block ranges: {"op": insert|delete|replace, "old": [start, end],
+    "new": [start, end], "before": [blocks], "after": [blocks]}."""
+    old_blocks = old.get("content") or []
+    new_blocks = new.get("content") or []
+    return [
+        {"op": tag, "old": [i1, i2], "new": [j1, j2],
+         "before": old_blocks[i1:i2], "after": new_blocks[j1:j2]}
+        for tag, i1, i2, j1, j2 in _opcodes(old, new) if tag != "equal"
+    ]
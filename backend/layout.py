@@ -0,0 +1,73 @@
+"""Force-directed auto-layout for the character relation graph.
+
+Fruchterman–Reingold with every pairwise repulsion computed as one NumPy
+array operation per iteration, so a few hundred characters lay out in
+milliseconds. Output coordinates are React Flow positions centred on the
+same point the GraphView uses for its initial circle.
+"""
+
+import numpy as np
+
+CENTER = (300.0, 250.0)
+NODE_SPACING = 160.0        # ideal edge length in px
+ITERATIONS = 120
+GRAVITY = 1.0               # pulls disconnected components toward the centre
+
+
+def force_layout(node_ids: list[str], edges: list[tuple[str, str]],
+                 iterations: int = ITERATIONS) -> dict[str, dict]:
+    """Positions {node_id: {"x", "y"}} for the given nodes and undirected edges.
+
+    Deterministic: the same graph always produces the same layout.
+    """
+    n = len(node_ids)
+    if n == 0:
+        return {}
+    if n == 1:
+        return {node_ids[0]: {"x": CENTER[0], "y": CENTER[1]}}
+
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    pairs = {tuple(sorted((index[a], index[b]))) for a, b in edges
+             if a in index and b in index and a != b}
+    src, dst = (np.array(side, dtype=np.intp) for side in zip(*pairs)) if pairs else \
+        (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+
+    k = 1.0                                   # layout in unit spacing, scaled at the end
+    angle = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    radius = np.sqrt(n) * k / 2
+    x = (np.cos(angle) * radius).astype(np.float32)
+    y = (np.sin(angle) * radius).astype(np.float32)
+    temperature = radius
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        dx = x[:, None] - x[None, :]                          # (n, n)
+        dy = y[:, None] - y[None, :]
+        dist2 = np.maximum(dx * dx + dy * dy, 1e-4)
+        # repulsion k²/d along the unit vector = k² * delta / d²
+        force = np.divide(k * k, dist2, out=dist2)
+        np.fill_diagonal(force, 0.0)
+        disp_x = (dx * force).sum(axis=1)
+        disp_y = (dy * force).sum(axis=1)
+
+        if len(src):
+            ex, ey = x[src] - x[dst], y[src] - y[dst]
+            length = np.maximum(np.sqrt(ex * ex + ey * ey), 0.01) / k   # d²/k along the unit vector
+            disp_x += np.bincount(dst, ex * length, n) - np.bincount(src, ex * length, n)
+            disp_y += np.bincount(dst, ey * length, n) - np.bincount(src, ey * length, n)
+
+        disp_x -= GRAVITY * x
+        disp_y -= GRAVITY * y
+        step = np.maximum(np.sqrt(disp_x * disp_x + disp_y * disp_y), 1e-9)
+        scale = np.minimum(step, temperature) / step
+        x += disp_x * scale
+        y += disp_y * scale
+        temperature -= cooling
+
+    pos = np.column_stack((x, y))
+    pos -= pos.mean(axis=0)
+    pos = pos * NODE_SPACING + CENTER
+    return {
+        node_id: {"x": round(float(x), 1), "y": round(float(y), 1)}
+        for node_id, (x, y) in zip(node_ids, pos)
+    }
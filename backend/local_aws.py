@@ -0,0 +1,1175 @@
+"""Local stand-ins for the DynamoDB Table resource and the S3 client.
+
+Only the subset of the boto3 surface that main.py uses is implemented, but
+that subset behaves like the real service: expressions are parsed and
+evaluated, numbers come back as Decimal, scans paginate at 1 MB, queries go
+through the key/index and ClientError is raised with the same error codes.
+
+    MemoryTable / MemoryS3   in-process dicts (bench.py)
+    SQLiteTable / FileS3     a SQLite file and a directory tree, for
+                             self-hosting and network-free runs
+
+Every call is reported to an ``on_call(service, operation, resource, seconds,
+response)`` hook with the response shape boto3 returns (errors as
+{"Error": {"Code": ...}}), plus ResponseMetadata.BytesRead for DynamoDB
+reads, which the real service does not report.
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+_PAGE_BYTES = 1024 * 1024
+_MISSING = object()
+
+
+def _client_error(code: str, message: str, operation: str, status: int = 400) -> ClientError:
+    return ClientError(
+        {"Error": {"Code": code, "Message": message},
+         "ResponseMetadata": {"HTTPStatusCode": status}},
+        operation,
+    )
+
+
+def _to_dynamo(value):
+    """Mimic the boto3 TypeSerializer: ints become Decimal, floats are rejected."""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_dynamo(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {_to_dynamo(v) for v in value}
+    raise TypeError(f"Unsupported type {type(value)} for value {value!r}")
+
+
+def _item_size(item: dict) -> int:
+    return len(json.dumps(item, default=str, ensure_ascii=False).encode())
+
+
+# ---------------------------------------------------------------------------
+# Expression parsing
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"\s*(?:(<>|<=|>=|[=<>(),.\[\]+-])|(#[A-Za-z0-9_]+)|(:[A-Za-z0-9_]+)|(\d+)|([A-Za-z_][A-Za-z0-9_]*))")
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "REMOVE", "ADD", "DELETE"}
+
+
+def _tokenize(expr: str) -> list[tuple[str, str]]:
+    tokens, pos = [], 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        m = _TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"Invalid expression near {expr[pos:]!r}")
+        pos = m.end()
+        op, alias, value, number, name = m.groups()
+        if op:
+            tokens.append(("op", op))
+        elif alias:
+            tokens.append(("alias", alias))
+        elif value:
+            tokens.append(("value", value))
+        elif number:
+            tokens.append(("number", number))
+        elif name.upper() in _KEYWORDS:
+            tokens.append(("kw", name.upper()))
+        else:
+            tokens.append(("name", name))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expr: str, names: dict | None, values: dict | None):
+        self.tokens = _tokenize(expr)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    # -- token helpers --------------------------------------------------------
+    def peek(self, offset: int = 0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, text=None):
+        tok = self.peek()
+        if (kind and tok[0] != kind) or (text and tok[1] != text):
+            raise ValueError(f"Expected {text or kind}, got {tok[1]!r}")
+        self.pos += 1
+        return tok
+
+    def accept(self, kind, text=None) -> bool:
+        tok = self.peek()
+        if tok[0] == kind and (text is None or tok[1] == text):
+            self.pos += 1
+            return True
+        return False
+
+    def done(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    # -- operands ---------------------------------------------------------------
+    def path(self) -> tuple:
+        parts = [self._name()]
+        while True:
+            if self.accept("op", "."):
+                parts.append(self._name())
+            elif self.accept("op", "["):
+                parts.append(int(self.take("number")[1]))
+                self.take("op", "]")
+            else:
+                return ("path", tuple(parts))
+
+    def _name(self) -> str:
+        kind, text = self.take()
+        if kind == "alias":
+            if text not in self.names:
+                raise ValueError(f"Undefined ExpressionAttributeName {text}")
+            return self.names[text]
+        if kind == "name":
+            return text
+        raise ValueError(f"Expected attribute name, got {text!r}")
+
+    def value(self) -> tuple:
+        text = self.take("value")[1]
+        if text not in self.values:
+            raise ValueError(f"Undefined ExpressionAttributeValue {text}")
+        return ("const", _to_dynamo(self.values[text]))
+
+    def operand(self) -> tuple:
+        kind, text = self.peek()
+        if kind == "value":
+            return self.value()
+        if kind == "name" and self.peek(1) == ("op", "("):
+            fn = text.lower()
+            self.pos += 2
+            if fn == "size":
+                arg = self.path()
+                self.take("op", ")")
+                return ("size", arg)
+            if fn == "if_not_exists":
+                p = self.path()
+                self.take("op", ",")
+                default = self.update_value()
+                self.take("op", ")")
+                return ("if_not_exists", p, default)
+            if fn == "list_append":
+                a = self.update_value()
+                self.take("op", ",")
+                b = self.update_value()
+                self.take("op", ")")
+                return ("list_append", a, b)
+            raise ValueError(f"Unsupported function {text}")
+        return self.path()
+
+    def update_value(self) -> tuple:
+        left = self.operand()
+        if self.peek() in (("op", "+"), ("op", "-")):
+            op = self.take()[1]
+            return ("arith", op, left, self.operand())
+        return left
+
+    # -- conditions -------------------------------------------------------------
+    def condition(self) -> tuple:
+        node = self._and()
+        while self.accept("kw", "OR"):
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self) -> tuple:
+        node = self._not()
+        while self.accept("kw", "AND"):
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self) -> tuple:
+        if self.accept("kw", "NOT"):
+            return ("not", self._not())
+        return self._primary()
+
+    def _primary(self) -> tuple:
+        if self.accept("op", "("):
+            node = self.condition()
+            self.take("op", ")")
+            return node
+        kind, text = self.peek()
+        if kind == "name" and self.peek(1) == ("op", "(") and text.lower() != "size":
+            fn = text.lower()
+            self.pos += 2
+            p = self.path()
+            if fn in ("attribute_exists", "attribute_not_exists"):
+                self.take("op", ")")
+                return (fn, p)
+            self.take("op", ",")
+            arg = self.operand()
+            self.take("op", ")")
+            if fn in ("begins_with", "contains", "attribute_type"):
+                return (fn, p, arg)
+            raise ValueError(f"Unsupported function {text}")
+        left = self.operand()
+        if self.accept("kw", "BETWEEN"):
+            low = self.operand()
+            self.take("kw", "AND")
+            return ("between", left, low, self.operand())
+        if self.accept("kw", "IN"):
+            self.take("op", "(")
+            options = [self.operand()]
+            while self.accept("op", ","):
+                options.append(self.operand())
+            self.take("op", ")")
+            return ("in", left, options)
+        op = self.take("op")[1]
+        if op not in ("=", "<>", "<", "<=", ">", ">="):
+            raise ValueError(f"Unexpected operator {op}")
+        return ("cmp", op, left, self.operand())
+
+    # -- update expressions ---------------------------------------------------------
+    def update(self) -> list[tuple]:
+        actions = []
+        while not self.done():
+            clause = self.take("kw")[1]
+            while True:
+                if clause == "SET":
+                    p = self.path()
+                    self.take("op", "=")
+                    actions.append(("set", p, self.update_value()))
+                elif clause == "REMOVE":
+                    actions.append(("remove", self.path()))
+                elif clause in ("ADD", "DELETE"):
+                    p = self.path()
+                    actions.append((clause.lower(), p, self.value()))
+                else:
+                    raise ValueError(f"Unknown update clause {clause}")
+                if not self.accept("op", ","):
+                    break
+        return actions
+
+    def projection(self) -> list[tuple]:
+        paths = [self.path()]
+        while self.accept("op", ","):
+            paths.append(self.path())
+        return paths
+
+
+def _compile(expr, names, values, mode: str):
+    """Parse an expression string (or a boto3 ``conditions`` object)."""
+    if expr is None:
+        return None
+    if not isinstance(expr, str):
+        from boto3.dynamodb.conditions import ConditionExpressionBuilder
+        built = ConditionExpressionBuilder().build_expression(expr, is_key_condition=(mode == "key"))
+        names = {**(names or {}), **built.attribute_name_placeholders}
+        values = {**(values or {}), **built.attribute_value_placeholders}
+        expr = built.condition_expression
+    parser = _Parser(expr, names, values)
+    if mode == "update":
+        result = parser.update()
+    elif mode == "projection":
+        result = parser.projection()
+    else:
+        result = parser.condition()
+    if not parser.done():
+        raise ValueError(f"Unexpected trailing tokens in {expr!r}")
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Expression evaluation
+# ---------------------------------------------------------------------------
+
+def _get_path(item, parts):
+    cur = item
+    for part in parts:
+        if isinstance(part, int):
+            if not isinstance(cur, list) or part >= len(cur):
+                return _MISSING
+            cur = cur[part]
+        else:
+            if not isinstance(cur, dict) or part not in cur:
+                return _MISSING
+            cur = cur[part]
+    return cur
+
+
+def _set_path(item, parts, value):
+    cur = item
+    for part in parts[:-1]:
+        cur = cur[part] if isinstance(part, int) else cur.get(part, _MISSING)
+        if cur is _MISSING:
+            raise _client_error("ValidationException",
+                                "The document path provided in the update expression is invalid for update",
+                                "UpdateItem")
+    last = parts[-1]
+    if isinstance(last, int):
+        if last >= len(cur):
+            cur.append(value)
+        else:
+            cur[last] = value
+    else:
+        cur[last] = value
+
+
+def _remove_path(item, parts):
+    parent = _get_path(item, parts[:-1]) if len(parts) > 1 else item
+    if parent is _MISSING:
+        return
+    last = parts[-1]
+    if isinstance(last, int):
+        if isinstance(parent, list) and last < len(parent):
+            parent.pop(last)
+    elif isinstance(parent, dict):
+        parent.pop(last, None)
+
+
+def _operand(node, item):
+    kind = node[0]
+    if kind == "const":
+        return node[1]
+    if kind == "path":
+        return _get_path(item, node[1])
+    if kind == "size":
+        val = _get_path(item, node[1][1])
+        return _MISSING if val is _MISSING else Decimal(len(val))
+    if kind == "if_not_exists":
+        val = _get_path(item, node[1][1])
+        return _operand(node[2], item) if val is _MISSING else val
+    if kind == "list_append":
+        return list(_operand(node[1], item)) + list(_operand(node[2], item))
+    if kind == "arith":
+        left, right = _operand(node[2], item), _operand(node[3], item)
+        if not isinstance(left, Decimal) or not isinstance(right, Decimal):
+            raise _client_error("ValidationException",
+                                "An operand in the update expression has an incorrect data type",
+                                "UpdateItem")
+        return left + right if node[1] == "+" else left - right
+    raise ValueError(f"Bad operand {node}")
+
+
+def _comparable(a, b) -> bool:
+    if a is _MISSING or b is _MISSING:
+        return False
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b)
+    return (isinstance(a, Decimal) and isinstance(b, Decimal)) or type(a) is type(b)
+
+
+def _evaluate(node, item) -> bool:
+    kind = node[0]
+    if kind == "and":
+        return _evaluate(node[1], item) and _evaluate(node[2], item)
+    if kind == "or":
+        return _evaluate(node[1], item) or _evaluate(node[2], item)
+    if kind == "not":
+        return not _evaluate(node[1], item)
+    if kind == "attribute_exists":
+        return _get_path(item, node[1][1]) is not _MISSING
+    if kind == "attribute_not_exists":
+        return _get_path(item, node[1][1]) is _MISSING
+    if kind == "begins_with":
+        val, prefix = _get_path(item, node[1][1]), _operand(node[2], item)
+        return isinstance(val, (str, bytes)) and type(val) is type(prefix) and val.startswith(prefix)
+    if kind == "contains":
+        val, needle = _get_path(item, node[1][1]), _operand(node[2], item)
+        if isinstance(val, str):
+            return isinstance(needle, str) and needle in val
+        if isinstance(val, (list, set)):
+            return needle in val
+        return False
+    if kind == "attribute_type":
+        return False
+    if kind == "between":
+        val, low, high = (_operand(n, item) for n in node[1:])
+        return _comparable(val, low) and _comparable(val, high) and low <= val <= high
+    if kind == "in":
+        val = _operand(node[1], item)
+        return any(_comparable(val, o) and val == o for o in (_operand(n, item) for n in node[2]))
+    if kind == "cmp":
+        op, left, right = node[1], _operand(node[2], item), _operand(node[3], item)
+        if op == "<>":
+            return left is not _MISSING and not (_comparable(left, right) and left == right)
+        if not _comparable(left, right):
+            return False
+        return {"=": left == right, "<": left < right, "<=": left <= right,
+                ">": left > right, ">=": left >= right}[op]
+    raise ValueError(f"Bad condition {node}")
+
+
+def _apply_update(item: dict, actions: list[tuple]) -> None:
+    for action in actions:
+        kind, parts = action[0], action[1][1]
+        if kind == "set":
+            _set_path(item, parts, copy.deepcopy(_operand(action[2], item)))
+        elif kind == "remove":
+            _remove_path(item, parts)
+        elif kind == "add":
+            delta, current = action[2][1], _get_path(item, parts)
+            if isinstance(delta, set):
+                _set_path(item, parts, (set() if current is _MISSING else set(current)) | delta)
+            else:
+                _set_path(item, parts, (Decimal(0) if current is _MISSING else current) + delta)
+        elif kind == "delete":
+            current = _get_path(item, parts)
+            if current is not _MISSING:
+                remaining = set(current) - action[2][1]
+                if remaining:
+                    _set_path(item, parts, remaining)
+                else:
+                    _remove_path(item, parts)
+
+
+def _project(item: dict, paths: list[tuple] | None) -> dict:
+    if not paths:
+        return item
+    out: dict = {}
+    for _, parts in paths:
+        val = _get_path(item, parts)
+        if val is _MISSING:
+            continue
+        cur = out
+        for part in parts[:-1]:
+            cur = cur.setdefault(part, {})
+        cur[parts[-1]] = copy.deepcopy(val)
+    return out
+
+
+def _key_equality(node, attr: str):
+    """Pull the ``attr = :value`` term out of a key condition."""
+    if node[0] == "cmp" and node[1] == "=" and node[2] == ("path", (attr,)):
+        return node[3][1]
+    if node[0] == "and":
+        found = _key_equality(node[1], attr)
+        return found if found is not _MISSING else _key_equality(node[2], attr)
+    return _MISSING
+
+
+# DynamoDB Table
+# ---------------------------------------------------------------------------
+
+def _capacity(size: int, unit: int) -> float:
+    return float(max(1, math.ceil(size / unit)))
+
+
+class MemoryTable:
+    """A DynamoDB ``Table`` resource backed by a dict.
+
+    ``indexes`` maps a GSI name to ``(hash_key, range_key_or_None)``. Items
+    are kept through _load / _store / _remove / _rows / _rows_where inside
+    _transaction(), which SQLiteTable overrides to persist them.
+    """
+
+    def __init__(self, name: str, hash_key: str, range_key: str | None = None,
+                 indexes: dict | None = None, on_call=None):
+        self.name = self.table_name = name
+        self.hash_key, self.range_key = hash_key, range_key
+        self.indexes = dict(indexes or {})
+        self.on_call = on_call
+        self._items: dict = {}
+        self._lock = threading.RLock()
+
+    # -- storage ------------------------------------------------------------------
+    def _transaction(self):
+        return self._lock
+
+    def _load(self, key: tuple):
+        return self._items.get(key)
+
+    def _store(self, key: tuple, item: dict) -> None:
+        self._items[key] = item
+
+    def _remove(self, key: tuple) -> None:
+        self._items.pop(key, None)
+
+    def _rows(self) -> list[dict]:
+        return list(self._items.values())
+
+    def _rows_where(self, attr: str, value, index: str | None) -> list[dict]:
+        """Items whose hash key (of the table or of ``index``) equals value."""
+        return [r for r in self._rows() if r.get(attr, _MISSING) == value]
+
+    # -- helpers ------------------------------------------------------------------
+    def _key_of(self, item: dict) -> tuple:
+        if self.hash_key not in item or (self.range_key and self.range_key not in item):
+            raise _client_error("ValidationException",
+                                "One of the required keys was not given a value", "PutItem")
+        return (item[self.hash_key], item[self.range_key]) if self.range_key else (item[self.hash_key],)
+
+    def _key_dict(self, item: dict, index: str | None = None) -> dict:
+        attrs = [self.hash_key] + ([self.range_key] if self.range_key else [])
+        if index:
+            attrs += [a for a in self.indexes[index] if a and a not in attrs]
+        return {a: item[a] for a in attrs if a in item}
+
+    @staticmethod
+    def _order(hash_value) -> int:
+        return int(hashlib.md5(str(hash_value).encode()).hexdigest(), 16)
+
+    def _report(self, operation: str, started: float, response: dict) -> dict:
+        if self.on_call:
+            self.on_call("dynamodb", operation, self.name, time.perf_counter() - started, response)
+        return response
+
+    def _check(self, current, condition, names, values, operation, started):
+        if condition is None:
+            return
+        node = _compile(condition, names, values, "condition")
+        if not _evaluate(node, current or {}):
+            self._report(operation, started, {"Error": {"Code": "ConditionalCheckFailedException"}})
+            raise _client_error("ConditionalCheckFailedException",
+                                "The conditional request failed", operation)
+
+    def _consumed(self, table: str, wanted, units: float) -> dict:
+        # With telemetry attached every call reports it, as instrument_boto3 asks for.
+        if (wanted or ("TOTAL" if self.on_call else "NONE")) == "NONE":
+            return {}
+        return {"ConsumedCapacity": {"TableName": table, "CapacityUnits": units}}
+
+    # -- single item ------------------------------------------------------------------
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues="NONE", ReturnConsumedCapacity=None, **_):
+        started = time.perf_counter()
+        item = _to_dynamo(Item)
+        with self._transaction():
+            key = self._key_of(item)
+            old = self._load(key)
+            self._check(old, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, "PutItem", started)
+            self._store(key, copy.deepcopy(item))
+        response = self._consumed(self.name, ReturnConsumedCapacity, _capacity(_item_size(item), 1024))
+        if ReturnValues == "ALL_OLD" and old is not None:
+            response["Attributes"] = copy.deepcopy(old)
+        return self._report("PutItem", started, response)
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None,
+                 ConsistentRead=False, ReturnConsumedCapacity=None, **_):
+        started = time.perf_counter()
+        item = self._load(self._key_of(_to_dynamo(Key)))
+        item = copy.deepcopy(item) if item is not None else None
+        size = _item_size(item) if item else 0
+        response = self._consumed(self.name, ReturnConsumedCapacity,
+                                  _capacity(size, 4096) * (1.0 if ConsistentRead else 0.5))
+        if item is not None:
+            response["Item"] = _project(item, _compile(ProjectionExpression, ExpressionAttributeNames,
+                                                       None, "projection"))
+        response["ResponseMetadata"] = {"BytesRead": size}
+        return self._report("GetItem", started, response)
+
+    def update_item(self, Key, UpdateExpression=None, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ReturnValues="NONE", ReturnConsumedCapacity=None, **_):
+        started = time.perf_counter()
+        key_item = _to_dynamo(Key)
+        with self._transaction():
+            key = self._key_of(key_item)
+            old = self._load(key)
+            self._check(old, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, "UpdateItem", started)
+            new = copy.deepcopy(old) if old is not None else dict(key_item)
+            if UpdateExpression:
+                _apply_update(new, _compile(UpdateExpression, ExpressionAttributeNames,
+                                            ExpressionAttributeValues, "update"))
+            self._store(key, new)
+        response = self._consumed(self.name, ReturnConsumedCapacity, _capacity(_item_size(new), 1024))
+        if ReturnValues == "ALL_NEW":
+            response["Attributes"] = copy.deepcopy(new)
+        elif ReturnValues == "ALL_OLD" and old is not None:
+            response["Attributes"] = copy.deepcopy(old)
+        elif ReturnValues in ("UPDATED_NEW", "UPDATED_OLD"):
+            src = new if ReturnValues == "UPDATED_NEW" else (old or {})
+            response["Attributes"] = {k: copy.deepcopy(v) for k, v in src.items()
+                                      if (old or {}).get(k, _MISSING) != new.get(k, _MISSING)}
+        return self._report("UpdateItem", started, response)
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE", ReturnConsumedCapacity=None, **_):
+        started = time.perf_counter()
+        with self._transaction():
+            key = self._key_of(_to_dynamo(Key))
+            old = self._load(key)
+            self._check(old, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, "DeleteItem", started)
+            self._remove(key)
+        response = self._consumed(self.name, ReturnConsumedCapacity, 1.0)
+        if ReturnValues == "ALL_OLD" and old is not None:
+            response["Attributes"] = copy.deepcopy(old)
+        return self._report("DeleteItem", started, response)
+
+    # -- multi item ------------------------------------------------------------------
+    def _page(self, candidates, operation, started, FilterExpression, ProjectionExpression,
+              ExpressionAttributeNames, ExpressionAttributeValues, Limit, Select,
+              ReturnConsumedCapacity, index):
+        filt = _compile(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues, "condition")
+        proj = _compile(ProjectionExpression, ExpressionAttributeNames, None, "projection")
+        items, scanned, size, last = [], 0, 0, None
+        for item in candidates:
+            scanned += 1
+            size += _item_size(item)
+            if filt is None or _evaluate(filt, item):
+                items.append(_project(copy.deepcopy(item), proj))
+            if (Limit and scanned >= Limit) or size >= _PAGE_BYTES:
+                last = item
+                break
+        response = {"Count": len(items), "ScannedCount": scanned,
+                    "ResponseMetadata": {"BytesRead": size}}
+        if Select != "COUNT":
+            response["Items"] = items
+        if last is not None:
+            response["LastEvaluatedKey"] = self._key_dict(last, index)
+        response.update(self._consumed(self.name, ReturnConsumedCapacity, _capacity(size, 4096) * 0.5))
+        return self._report(operation, started, response)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None, Segment=None,
+             TotalSegments=None, Select=None, IndexName=None, ReturnConsumedCapacity=None, **_):
+        started = time.perf_counter()
+        rows = self._rows()
+        if IndexName:
+            self._require_index(IndexName, "Scan")
+            rows = [r for r in rows if all(a in r for a in self.indexes[IndexName] if a)]
+        rows.sort(key=lambda r: (self._order(r[self.hash_key]), str(r.get(self.range_key, ""))))
+        if TotalSegments:
+            rows = [r for r in rows
+                    if self._order(r[self.hash_key]) * TotalSegments >> 128 == Segment]
+        if ExclusiveStartKey:
+            start = _to_dynamo(ExclusiveStartKey)
+            marker = (self._order(start[self.hash_key]), str(start.get(self.range_key, "")))
+            rows = [r for r in rows
+                    if (self._order(r[self.hash_key]), str(r.get(self.range_key, ""))) > marker]
+        return self._page(rows, "Scan", started, FilterExpression, ProjectionExpression,
+                          ExpressionAttributeNames, ExpressionAttributeValues, Limit, Select,
+                          ReturnConsumedCapacity, IndexName)
+
+    def _require_index(self, name, operation):
+        if name not in self.indexes:
+            raise _client_error("ValidationException",
+                                "The table does not have the specified index: " + name, operation)
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+              Limit=None, ExclusiveStartKey=None, ScanIndexForward=True, Select=None,
+              ReturnConsumedCapacity=None, **_):
+        started = time.perf_counter()
+        if IndexName:
+            self._require_index(IndexName, "Query")
+            hash_attr, range_attr = self.indexes[IndexName]
+        else:
+            hash_attr, range_attr = self.hash_key, self.range_key
+        key_node = _compile(KeyConditionExpression, ExpressionAttributeNames,
+                            ExpressionAttributeValues, "key")
+        hash_value = _key_equality(key_node, hash_attr)
+        if hash_value is _MISSING:
+            raise _client_error("ValidationException",
+                                "Query condition missed key schema element: " + hash_attr, "Query")
+        rows = [r for r in self._rows_where(hash_attr, hash_value, IndexName)
+                if (range_attr is None or range_attr in r) and _evaluate(key_node, r)]
+
+        def sort_key(r):
+            return (r.get(range_attr) if range_attr else 0, str(r.get(self.range_key, "")))
+        rows.sort(key=sort_key, reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            start = sort_key(_to_dynamo(ExclusiveStartKey))
+            rows = [r for r in rows if (sort_key(r) < start if not ScanIndexForward else sort_key(r) > start)]
+        return self._page(rows, "Query", started, FilterExpression, ProjectionExpression,
+                          ExpressionAttributeNames, ExpressionAttributeValues, Limit, Select,
+                          ReturnConsumedCapacity, IndexName)
+
+    # -- batches ------------------------------------------------------------------
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _MemoryBatchWriter(self, overwrite_by_pkeys)
+
+    def _batch_write(self, requests: list[dict]) -> None:
+        started = time.perf_counter()
+        size = 0
+        with self._transaction():
+            for req in requests:
+                if "PutRequest" in req:
+                    item = _to_dynamo(req["PutRequest"]["Item"])
+                    self._store(self._key_of(item), copy.deepcopy(item))
+                    size += _item_size(item)
+                else:
+                    self._remove(self._key_of(_to_dynamo(req["DeleteRequest"]["Key"])))
+        self._report("BatchWriteItem", started, {
+            "UnprocessedItems": {},
+            "ConsumedCapacity": [{"TableName": self.name,
+                                  "CapacityUnits": _capacity(size, 1024) + len(requests) - 1}],
+        })
+
+    def batch_get(self, keys: list[dict], ProjectionExpression=None, ExpressionAttributeNames=None):
+        """Equivalent of ``BatchGetItem`` against this table (100 keys per call)."""
+        proj = _compile(ProjectionExpression, ExpressionAttributeNames, None, "projection")
+        found = []
+        for start in range(0, len(keys), 100):
+            started = time.perf_counter()
+            size = 0
+            for key in keys[start:start + 100]:
+                item = self._load(self._key_of(_to_dynamo(key)))
+                if item is not None:
+                    size += _item_size(item)
+                    found.append(_project(copy.deepcopy(item), proj))
+            self._report("BatchGetItem", started, {"Count": len(found),
+                                                  "ResponseMetadata": {"BytesRead": size}})
+        return found
+
+
+class _MemoryBatchWriter:
+    def __init__(self, table: MemoryTable, overwrite_by_pkeys):
+        self._table = table
+        self._pkeys = overwrite_by_pkeys
+        self._buffer: list[dict] = []
+
+    def put_item(self, Item):
+        self._add({"PutRequest": {"Item": Item}})
+
+    def delete_item(self, Key):
+        self._add({"DeleteRequest": {"Key": Key}})
+
+    def _add(self, request):
+        if self._pkeys:
+            body = request.get("PutRequest", {}).get("Item") or request["DeleteRequest"]["Key"]
+            marker = [body.get(k) for k in self._pkeys]
+            self._buffer = [r for r in self._buffer
+                            if [(r.get("PutRequest", {}).get("Item") or r["DeleteRequest"]["Key"]).get(k)
+                                for k in self._pkeys] != marker]
+        self._buffer.append(request)
+        if len(self._buffer) >= 25:
+            self._flush()
+
+    def _flush(self):
+        while self._buffer:
+            chunk, self._buffer = self._buffer[:25], self._buffer[25:]
+            self._table._batch_write(chunk)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._flush()
+
+
+# ---------------------------------------------------------------------------
+# SQLite
+# ---------------------------------------------------------------------------
+
+def _encode(value):
+    """Item value → DynamoDB JSON (the attribute-value format of the wire protocol)."""
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, Decimal):
+        return {"N": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"B": base64.b64encode(value).decode()}
+    if isinstance(value, dict):
+        return {"M": {k: _encode(v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return {"L": [_encode(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        sample = next(iter(value))
+        if isinstance(sample, str):
+            return {"SS": sorted(value)}
+        if isinstance(sample, Decimal):
+            return {"NS": sorted(str(v) for v in value)}
+        return {"BS": sorted(base64.b64encode(v).decode() for v in value)}
+    raise TypeError(f"Unsupported type {type(value)} for value {value!r}")
+
+
+def _decode(value: dict):
+    (tag, inner), = value.items()
+    if tag == "S" or tag == "BOOL":
+        return inner
+    if tag == "N":
+        return Decimal(inner)
+    if tag == "NULL":
+        return None
+    if tag == "M":
+        return {k: _decode(v) for k, v in inner.items()}
+    if tag == "L":
+        return [_decode(v) for v in inner]
+    if tag == "B":
+        return base64.b64decode(inner)
+    if tag == "SS":
+        return set(inner)
+    if tag == "NS":
+        return {Decimal(v) for v in inner}
+    return {base64.b64decode(v) for v in inner}
+
+
+def _sql_key(value):
+    """Key attribute → SQLite value that sorts like DynamoDB (numbers numerically)."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+class SQLiteDatabase:
+    """One SQLite file shared by the tables of a local storage backend.
+
+    A single connection is shared across threads behind a lock; writes that
+    read first (conditions, updates, ADD counters) run in BEGIN IMMEDIATE
+    transactions so they stay atomic across processes too.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.lock = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute("COMMIT")
+
+    def execute(self, sql: str, params=()) -> list:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+
+class SQLiteTable(MemoryTable):
+    """The MemoryTable surface persisted in SQLite.
+
+    Each DynamoDB table is one SQL table keyed by (hash, range) with the item
+    stored as DynamoDB JSON; every GSI gets its own key columns and SQL index,
+    so GetItem and Query (table or index) are index lookups, not scans.
+    """
+
+    def __init__(self, db: SQLiteDatabase, name: str, hash_key: str, range_key: str | None = None,
+                 indexes: dict | None = None, on_call=None):
+        super().__init__(name, hash_key, range_key, indexes, on_call)
+        self._db = db
+        self._sql = '"' + name.replace('"', '""') + '"'
+        self._gsi_columns = {index: (f'"{index}:hash"', f'"{index}:range"') for index in self.indexes}
+        db.execute(f"CREATE TABLE IF NOT EXISTS {self._sql} "
+                   "(h NOT NULL, r NOT NULL, item TEXT NOT NULL, PRIMARY KEY (h, r)) WITHOUT ROWID")
+        existing = {row[1] for row in db.execute(f"PRAGMA table_info({self._sql})")}
+        added = False
+        for index, columns in self._gsi_columns.items():
+            for column in columns:
+                if column.strip('"') not in existing:
+                    db.execute(f"ALTER TABLE {self._sql} ADD COLUMN {column}")
+                    added = True
+            db.execute(f'CREATE INDEX IF NOT EXISTS "{name}.{index}" ON {self._sql} ({columns[0]}, {columns[1]})')
+        if added:
+            # index added to an existing table: fill its key columns
+            with self._transaction():
+                for item in self._rows():
+                    self._store(self._key_of(item), item)
+
+    def _transaction(self):
+        return self._db.transaction()
+
+    def _sql_row(self, key: tuple) -> tuple:
+        return _sql_key(key[0]), _sql_key(key[1]) if len(key) > 1 else ""
+
+    def _load(self, key: tuple):
+        rows = self._db.execute(f"SELECT item FROM {self._sql} WHERE h = ? AND r = ?", self._sql_row(key))
+        return {k: _decode(v) for k, v in json.loads(rows[0][0]).items()} if rows else None
+
+    def _store(self, key: tuple, item: dict) -> None:
+        columns, values = ["h", "r", "item"], [*self._sql_row(key),
+                                                json.dumps({k: _encode(v) for k, v in item.items()},
+                                                           ensure_ascii=False)]
+        for index, (h, r) in self._gsi_columns.items():
+            index_hash, index_range = self.indexes[index]
+            if index_hash in item and (not index_range or index_range in item):
+                columns += [h, r]
+                values += [_sql_key(item[index_hash]), _sql_key(item[index_range]) if index_range else ""]
+        self._db.execute(f"INSERT OR REPLACE INTO {self._sql} ({', '.join(columns)}) "
+                         f"VALUES ({', '.join('?' * len(values))})", values)
+
+    def _remove(self, key: tuple) -> None:
+        self._db.execute(f"DELETE FROM {self._sql} WHERE h = ? AND r = ?", self._sql_row(key))
+
+    def _decode_rows(self, rows) -> list[dict]:
+        return [{k: _decode(v) for k, v in json.loads(row[0]).items()} for row in rows]
+
+    def _rows(self) -> list[dict]:
+        return self._decode_rows(self._db.execute(f"SELECT item FROM {self._sql}"))
+
+    def _rows_where(self, attr: str, value, index: str | None) -> list[dict]:
+        h, r = self._gsi_columns[index] if index else ("h", "r")
+        return self._decode_rows(self._db.execute(
+            f"SELECT item FROM {self._sql} WHERE {h} = ? ORDER BY {r}", (_sql_key(value),)))
+
+
+# ---------------------------------------------------------------------------
+# S3
+# ---------------------------------------------------------------------------
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
+
+    def read(self, amt: int | None = None) -> bytes:
+        end = len(self._data) if amt is None else self._pos + amt
+        chunk = self._data[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class MemoryS3:
+    """An S3 client backed by a dict (one namespace per bucket).
+
+    Objects are kept through _get / _put / _delete / _list, which FileS3
+    overrides to store them on disk.
+    """
+
+    def __init__(self, on_call=None):
+        self.on_call = on_call
+        self._objects: dict = {}
+        self._lock = threading.RLock()
+
+    # -- storage ------------------------------------------------------------------
+    def _get(self, bucket: str, key: str, with_data: bool = True) -> dict | None:
+        with self._lock:
+            return self._objects.get((bucket, key))
+
+    def _put(self, bucket: str, key: str, obj: dict) -> None:
+        with self._lock:
+            self._objects[(bucket, key)] = obj
+
+    def _delete(self, bucket: str, key: str) -> None:
+        with self._lock:
+            self._objects.pop((bucket, key), None)
+
+    def _list(self, bucket: str, prefix: str) -> list[tuple[str, dict]]:
+        """Sorted (key, object without data) pairs under prefix."""
+        with self._lock:
+            return sorted((k, obj) for (b, k), obj in self._objects.items()
+                          if b == bucket and k.startswith(prefix))
+
+    # -- helpers ------------------------------------------------------------------
+    def _report(self, operation, started, response, bucket=""):
+        if self.on_call:
+            self.on_call("s3", operation, bucket, time.perf_counter() - started, response)
+        return response
+
+    @staticmethod
+    def _missing(operation):
+        return _client_error("NoSuchKey", "The specified key does not exist.", operation, 404)
+
+    # -- objects ------------------------------------------------------------------
+    def put_object(self, Bucket, Key, Body=b"", ContentType="binary/octet-stream", Metadata=None, **_):
+        started = time.perf_counter()
+        data = Body.encode() if isinstance(Body, str) else (Body.read() if hasattr(Body, "read") else bytes(Body))
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        self._put(Bucket, Key, {
+            "data": data, "ContentLength": len(data), "ContentType": ContentType,
+            "Metadata": dict(Metadata or {}), "ETag": etag, "LastModified": datetime.now(timezone.utc),
+        })
+        return self._report("PutObject", started, {"ETag": etag, "ContentLength": len(data)}, Bucket)
+
+    def get_object(self, Bucket, Key, **_):
+        started = time.perf_counter()
+        obj = self._get(Bucket, Key)
+        if obj is None:
+            self._report("GetObject", started, {"Error": {"Code": "NoSuchKey"}}, Bucket)
+            raise self._missing("GetObject")
+        response = {
+            "Body": _Body(obj["data"]), "ContentLength": len(obj["data"]),
+            "ContentType": obj["ContentType"], "ETag": obj["ETag"],
+            "LastModified": obj["LastModified"], "Metadata": dict(obj["Metadata"]),
+        }
+        return self._report("GetObject", started, response, Bucket)
+
+    def head_object(self, Bucket, Key, **_):
+        started = time.perf_counter()
+        obj = self._get(Bucket, Key, with_data=False)
+        if obj is None:
+            self._report("HeadObject", started, {"Error": {"Code": "404"}}, Bucket)
+            raise _client_error("404", "Not Found", "HeadObject", 404)
+        return self._report("HeadObject", started, {
+            "ContentLength": obj["ContentLength"], "ContentType": obj["ContentType"],
+            "ETag": obj["ETag"], "LastModified": obj["LastModified"], "Metadata": dict(obj["Metadata"]),
+        }, Bucket)
+
+    def delete_object(self, Bucket, Key, **_):
+        started = time.perf_counter()
+        self._delete(Bucket, Key)
+        return self._report("DeleteObject", started, {}, Bucket)
+
+    def delete_objects(self, Bucket, Delete, **_):
+        started = time.perf_counter()
+        objects = Delete.get("Objects", [])
+        if len(objects) > 1000:
+            raise _client_error("MalformedXML", "Too many objects", "DeleteObjects")
+        for obj in objects:
+            self._delete(Bucket, obj["Key"])
+        response = {"Errors": []}
+        if not Delete.get("Quiet"):
+            response["Deleted"] = [{"Key": o["Key"]} for o in objects]
+        return self._report("DeleteObjects", started, response, Bucket)
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective="COPY", Metadata=None, **_):
+        started = time.perf_counter()
+        src_bucket, src_key = (CopySource["Bucket"], CopySource["Key"]) if isinstance(CopySource, dict) \
+            else CopySource.split("/", 1)
+        obj = self._get(src_bucket, src_key)
+        if obj is None:
+            raise self._missing("CopyObject")
+        copied = dict(obj, LastModified=datetime.now(timezone.utc))
+        if MetadataDirective == "REPLACE":
+            copied["Metadata"] = dict(Metadata or {})
+        self._put(Bucket, Key, copied)
+        return self._report("CopyObject", started, {"CopyObjectResult": {"ETag": obj["ETag"]}}, Bucket)
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, StartAfter=None, MaxKeys=1000, **_):
+        started = time.perf_counter()
+        listed = self._list(Bucket, Prefix)
+        marker = ContinuationToken or StartAfter
+        if marker:
+            listed = [(k, obj) for k, obj in listed if k > marker]
+        page = listed[:MaxKeys]
+        contents = [{"Key": k, "Size": obj["ContentLength"], "ETag": obj["ETag"],
+                     "LastModified": obj["LastModified"]} for k, obj in page]
+        response = {"KeyCount": len(page), "IsTruncated": len(listed) > MaxKeys, "Prefix": Prefix}
+        if contents:
+            response["Contents"] = contents
+        if len(listed) > MaxKeys:
+            response["NextContinuationToken"] = page[-1][0]
+        return self._report("ListObjectsV2", started, response, Bucket)
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, HttpMethod=None):
+        params = Params or {}
+        return (f"memory://{params.get('Bucket', '')}/{params.get('Key', '')}"
+                f"?method={ClientMethod}&expires={int(time.time()) + ExpiresIn}")
+
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600):
+        return {"url": f"memory://{Bucket}?expires={int(time.time()) + ExpiresIn}",
+                "fields": {**(Fields or {}), "key": Key}}
+
+
+class FileS3(MemoryS3):
+    """The MemoryS3 surface on the local filesystem.
+
+    Object bytes live at <root>/objects/<bucket>/<key>; content type, user
+    metadata and ETag in a JSON sidecar at <root>/meta/<bucket>/<key>.json.
+    Files are written to a temporary name and renamed, so readers never see
+    a partial object.
+    """
+
+    def __init__(self, root: str, on_call=None):
+        super().__init__(on_call)
+        self.root = os.path.abspath(root)
+
+    def _paths(self, bucket: str, key: str) -> tuple[str, str]:
+        parts = key.split("/")
+        if not key or key.startswith("/") or any(p in ("", ".", "..") for p in parts[:-1]) \
+                or parts[-1] in (".", "..") or "\0" in key:
+            raise _client_error("InvalidArgument", f"Unsupported object key {key!r}", "PutObject")
+        bucket = bucket or "_"
+        return (os.path.join(self.root, "objects", bucket, *parts),
+                os.path.join(self.root, "meta", bucket, *parts) + ".json")
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @staticmethod
+    def _read_meta(meta_path: str) -> dict | None:
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        meta["LastModified"] = datetime.fromisoformat(meta["LastModified"])
+        return meta
+
+    def _get(self, bucket: str, key: str, with_data: bool = True) -> dict | None:
+        data_path, meta_path = self._paths(bucket, key)
+        meta = self._read_meta(meta_path)
+        if meta is None:
+            return None
+        if with_data:
+            try:
+                with open(data_path, "rb") as f:
+                    meta["data"] = f.read()
+            except FileNotFoundError:
+                return None
+        return meta
+
+    def _put(self, bucket: str, key: str, obj: dict) -> None:
+        data_path, meta_path = self._paths(bucket, key)
+        meta = {k: v for k, v in obj.items() if k != "data"}
+        meta["LastModified"] = meta["LastModified"].isoformat()
+        with self._lock:
+            self._write(data_path, obj["data"])
+            self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode())
+
+    def _delete(self, bucket: str, key: str) -> None:
+        with self._lock:
+            for path in self._paths(bucket, key):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _list(self, bucket: str, prefix: str) -> list[tuple[str, dict]]:
+        base = os.path.join(self.root, "meta", bucket or "_")
+        # walk only the deepest directory the prefix pins down
+        start = os.path.join(base, *prefix.split("/")[:-1])
+        found = []
+        for directory, _, files in os.walk(start):
+            for name in files:
+                if not name.endswith(".json") or name.startswith(".tmp-"):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name[:-5]), base).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    meta = self._read_meta(os.path.join(directory, name))
+                    if meta is not None:
+                        found.append((key, meta))
+        return sorted(found)
@@ -1,8 +1,17 @@
+import asyncio
+import bisect
+import functools
+import hashlib
+import hmac
 import json
 import logging
 import os
+import re
 import sys
 import traceback
+import uuid
+from collections import Counter, deque
+from contextlib import asynccontextmanager
 
 # Lambda 환경에서 Linux 호환 패키지를 사용 (pip --platform으로 빌드된 manylinux 바이너리)
 _lambda_pkg = os.path.join(os.path.dirname(__file__), "lambda_package")
@@ -10,18 +19,33 @@ if os.path.isdir(_lambda_pkg) and _lambda_pkg not in sys.path:
     sys.path.insert(0, _lambda_pkg)
 
 from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from urllib.parse import quote
 
-import boto3
 import jwt as pyjwt
+import orjson
 from authlib.integrations.starlette_client import OAuth
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, WebSocket
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse, Response
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
 
+import chunks
+import collab
+import history
+import passages
+import resilience
+import search
+import storage
+import telemetry
+import writebehind
+from manuscript import WRITERS
+from telemetry import ContextThreadPoolExecutor
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
@@ -76,95 +100,2288 @@ def _extract_dialogues(nodes: list, target_name: str) -> list[str]:
     return result
 
 
-def _extract_plain_text(nodes: list) -> str:
-    """Recursively extract all text content from TipTap JSON nodes."""
-    parts = []
-    for node in nodes:
-        if node.get("type") == "text":
-            parts.append(node.get("text", ""))
-        elif node.get("content"):
-            parts.append(_extract_plain_text(node["content"]))
-    return "".join(parts)
+def _extract_plain_text(nodes: list, sep: str = "") -> str:
+    """Recursively extract all text content from TipTap JSON nodes.
+
+    sep is placed between block nodes (e.g. "\n" keeps paragraphs apart).
+    """
+    parts = []
+    for node in nodes:
+        if node.get("type") == "text":
+            parts.append(node.get("text", ""))
+        elif node.get("content"):
+            parts.append(_extract_plain_text(node["content"], sep))
+    inline = all(node.get("type") in ("text", "hardBreak") for node in nodes)
+    return "".join(parts) if inline else sep.join(parts)
+
+
+_LLM_MODEL = "gpt-4o-mini"
+
+
+async def _llm_invoke(system_prompt: str, user_content: str) -> str:
+    """One chat completion; returns the reply text."""
+    openai_key = os.getenv("OPENAI_API_KEY", "")
+    if not openai_key:
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY 가 설정되지 않았습니다.")
+
+    from langchain_openai import ChatOpenAI
+    from langchain_core.messages import SystemMessage, HumanMessage
+
+    # resilience.aretry is the only retry layer, so every attempt is timed.
+    llm = ChatOpenAI(model=_LLM_MODEL, api_key=openai_key, max_retries=0)
+
+    async def attempt():
+        with telemetry.timed("llm", "chat", _LLM_MODEL) as info:
+            response = await llm.ainvoke([
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=user_content),
+            ])
+            info["tokens"] = (getattr(response, "usage_metadata", None) or {}).get("total_tokens", 0)
+        return response
+
+    try:
+        response = await resilience.aretry(attempt)
+    except Exception as e:
+        if resilience.is_throttling(e):
+            raise HTTPException(status_code=503, detail="AI 요청이 많아 처리하지 못했습니다. 잠시 후 다시 시도하세요.",
+                                headers={"Retry-After": "5"})
+        raise
+    return response.content
+
+
+# ---------------------------------------------------------------------------
+# App setup
+# ---------------------------------------------------------------------------
+
+def _json_default(value):
+    """DynamoDB types orjson does not know: numbers come back as Decimal, string sets as set."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class _JSONResponse(ORJSONResponse):
+    """orjson rendering with Decimal / set support.
+
+    Handlers that return this directly skip FastAPI's jsonable_encoder pass,
+    which is the slow part for long lists of raw DynamoDB items.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    yield
+    await _collab.shutdown()
+    await _plot_writes.close()
+
+
+app = FastAPI(title="Plot Editor Auth", default_response_class=_JSONResponse, lifespan=_lifespan)
+
+
+from fastapi import Request as _Request
+from fastapi.responses import JSONResponse
+
+
+@app.exception_handler(Exception)
+async def _unhandled_exception_handler(request: _Request, exc: Exception):
+    logger.error(
+        "Unhandled exception: %s %s\n%s",
+        request.method,
+        request.url.path,
+        traceback.format_exc(),
+    )
+    return JSONResponse(status_code=500, content={"detail": str(exc)})
+
+
+@app.exception_handler(ClientError)
+async def _client_error_handler(request: _Request, exc: ClientError):
+    """Throttling that outlasted botocore's retries is a 503 the client can retry."""
+    if resilience.is_throttling(exc):
+        logger.warning("Throttled: %s %s: %s", request.method, request.url.path, exc)
+        return JSONResponse(status_code=503, content={"detail": "요청이 많아 처리하지 못했습니다. 잠시 후 다시 시도하세요."},
+                            headers={"Retry-After": "1"})
+    return await _unhandled_exception_handler(request, exc)
+
+
+_allowed_origins = [o.strip() for o in os.getenv(
+    "ALLOWED_ORIGINS",
+    "http://localhost:1420,http://localhost:5173,https://plot-editor.vercel.app",
+).split(",") if o.strip()]
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=_allowed_origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+app.add_middleware(
+    SessionMiddleware,
+    secret_key=_require_env("SECRET_KEY"),
+    same_site="none",
+    https_only=True,
+)
+# Outermost, so CORS/session work is included in the request time.
+app.add_middleware(telemetry.TimingMiddleware)
+
+# ---------------------------------------------------------------------------
+# Cognito OIDC client
+# ---------------------------------------------------------------------------
+
+_region = _require_env("COGNITO_REGION")
+_pool_id = _require_env("COGNITO_USER_POOL_ID")
+_metadata_url = (
+    f"https://cognito-idp.{_region}.amazonaws.com/{_pool_id}"
+    "/.well-known/openid-configuration"
+)
+
+oauth = OAuth()
+oauth.register(
+    name="oidc",
+    client_id=_require_env("COGNITO_CLIENT_ID"),
+    client_secret=_require_env("COGNITO_CLIENT_SECRET"),
+    server_metadata_url=_metadata_url,
+    client_kwargs={"scope": "phone openid email"},
+)
+
+# ---------------------------------------------------------------------------
+# Storage (DynamoDB + S3 by default; see storage.py for STORAGE_BACKEND)
+# ---------------------------------------------------------------------------
+
+_storage = storage.open_storage(_region)
+_users_table      = _storage.table("users")
+_works_table      = _storage.table("works")
+_episodes_table   = _storage.table("episodes")
+_plots_table      = _storage.table("plots")
+_characters_table = _storage.table("characters")
+_relations_table  = _storage.table("character_relations")
+_graph_table      = _storage.table("graph_layouts")
+_posts_table      = _storage.table("posts")
+_comments_table   = _storage.table("comments")
+_search_table     = _storage.table("search_index")
+_stats_table      = _storage.table("work_stats")
+_versions_table   = _storage.table("plot_versions")
+_tombstones_table = _storage.table("tombstones")
+_idempotency_table = _storage.table("idempotency_keys")
+_chunks_table     = _storage.table("content_chunks")
+_manifests_table  = _storage.table("content_manifests")
+
+_s3 = _storage.blobs
+_S3_BUCKET = os.getenv("S3_BUCKET", "")
+
+# ---------------------------------------------------------------------------
+# Batch helpers
+# ---------------------------------------------------------------------------
+
+_S3_DELETE_BATCH = 1000     # DeleteObjects limit
+_FILTER_IN_LIMIT = 100      # max operands of an IN (...) filter
+_ORPHAN_S3_GRACE = timedelta(hours=1)
+
+
+def _scan_all(table, **kwargs) -> list[dict]:
+    """Scan every page — a single Scan call stops at 1 MB."""
+    items = []
+    while True:
+        res = table.scan(**kwargs)
+        items.extend(res.get("Items", []))
+        if "LastEvaluatedKey" not in res:
+            return items
+        kwargs["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+
+
+def _scan_user_items(table, sub: str, projection: str, field: str | None = None,
+                     values: list | None = None) -> list[dict]:
+    """Scan a user's items, optionally restricted to ``field IN values``.
+
+    The IN list is chunked to the 100-operand limit so N parents cost
+    ceil(N / 100) scans instead of one scan per parent.
+    """
+    if field is None:
+        return _scan_all(
+            table,
+            FilterExpression="user_sub = :s",
+            ProjectionExpression=projection,
+            ExpressionAttributeValues={":s": sub},
+        )
+    items = []
+    for start in range(0, len(values), _FILTER_IN_LIMIT):
+        chunk = values[start:start + _FILTER_IN_LIMIT]
+        placeholders = {f":v{i}": v for i, v in enumerate(chunk)}
+        items.extend(_scan_all(
+            table,
+            FilterExpression=f"user_sub = :s AND {field} IN ({', '.join(placeholders)})",
+            ProjectionExpression=projection,
+            ExpressionAttributeValues={":s": sub, **placeholders},
+        ))
+    return items
+
+
+def _batch_delete(table, key_name: str, keys: list[str]) -> int:
+    """Delete items with BatchWriteItem, 25 keys per request.
+
+    boto3's batch_writer buffers requests into 25-item BatchWriteItem calls and
+    re-sends anything returned in UnprocessedItems until it is accepted.
+    """
+    with table.batch_writer(overwrite_by_pkeys=[key_name]) as batch:
+        for key in keys:
+            batch.delete_item(Key={key_name: key})
+    return len(keys)
+
+
+def _s3_delete_keys(keys: list[str]) -> int:
+    """Delete S3 objects with DeleteObjects, 1000 keys per request."""
+    deleted = 0
+    for start in range(0, len(keys), _S3_DELETE_BATCH):
+        chunk = keys[start:start + _S3_DELETE_BATCH]
+        res = _s3.delete_objects(
+            Bucket=_S3_BUCKET,
+            Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+        )
+        errors = res.get("Errors", [])
+        for err in errors:
+            logger.warning("S3 delete failed for key %s: %s", err.get("Key"), err.get("Message"))
+        deleted += len(chunk) - len(errors)
+    return deleted
+
+
+def _plot_s3_key(sub: str, plot_local_id) -> str:
+    return f"plots/{sub}/{int(plot_local_id)}.json"
+
+
+def _load_plot_doc(sub: str, plot_local_id) -> dict:
+    """TipTap document of a plot; {} when nothing has been saved yet."""
+    pending = _plot_writes.get((sub, int(plot_local_id)))
+    if pending is not None:
+        return json.loads(pending or b"{}")
+    body = _load_manifest(sub, "plot", plot_local_id)
+    if body is not None:
+        return orjson.loads(body)
+    try:
+        obj = _s3.get_object(Bucket=_S3_BUCKET, Key=_plot_s3_key(sub, plot_local_id))
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return {}
+        raise
+    return json.loads(obj["Body"].read() or b"{}")
+
+
+def _delete_plots(sub: str, plots: list[dict]) -> dict:
+    """Remove plot items, their documents and their search postings."""
+    return {
+        "plots": _batch_delete(_plots_table, "plot_id", [p["plot_id"] for p in plots]),
+        "s3_objects": _s3_delete_keys([_plot_s3_key(sub, p["local_id"]) for p in plots]),
+        "manifests": _drop_manifests(sub, [_manifest_key(sub, "plot", p["local_id"]) for p in plots]),
+        "postings": _unindex_plots(sub, [int(p["local_id"]) for p in plots]),
+        "versions": _delete_history(sub, [int(p["local_id"]) for p in plots]),
+    }
+
+
+def _cascade_delete_episode(sub: str, episode_id: int, work_id=None) -> dict:
+    """Delete every plot (item + S3 document) belonging to an episode.
+
+    With the episode's work_id its stats are also taken out of the work totals.
+    """
+    plots = _scan_user_items(_plots_table, sub, "plot_id, local_id", "episode_id", [episode_id])
+    result = _delete_plots(sub, plots)
+    result["attr_objects"] = _s3_delete_keys(_list_s3_keys(_attr_prefix(sub, "episodes", episode_id)))
+    if work_id is not None:
+        _discount_episode_stats(sub, int(work_id), episode_id)
+    logger.info("Cascade delete episode %s#%s: %s", sub, episode_id, result)
+    return result
+
+
+def _cascade_delete_work(sub: str, work_id: int) -> dict:
+    """Delete every child of a work: episodes, plots, S3 documents,
+    characters, relations and the graph layout."""
+    episodes = _scan_user_items(_episodes_table, sub, "episode_id, local_id, chapter_summary_ref",
+                                "work_id", [work_id])
+    ep_ids = [int(ep["local_id"]) for ep in episodes]
+    plots = _scan_user_items(_plots_table, sub, "plot_id, local_id", "episode_id", ep_ids) if ep_ids else []
+    characters = _scan_user_items(_characters_table, sub, "character_id", "work_id", [work_id])
+    relations = _scan_user_items(_relations_table, sub, "relation_id", "work_id", [work_id])
+
+    result = _delete_plots(sub, plots)
+    result["episodes"] = _batch_delete(_episodes_table, "episode_id", [ep["episode_id"] for ep in episodes])
+    result["characters"] = _batch_delete(_characters_table, "character_id",
+                                         [c["character_id"] for c in characters])
+    result["relations"] = _batch_delete(_relations_table, "relation_id",
+                                        [r["relation_id"] for r in relations])
+    _graph_table.delete_item(Key={"layout_id": f"{sub}#{work_id}"})
+    result["stats_rows"] = _delete_work_stats(sub, work_id)
+    _s3_delete_keys([_analytics_key(sub, work_id)])
+    result["attr_objects"] = _s3_delete_keys(
+        _list_s3_keys(_attr_prefix(sub, "works", work_id)) + [k for ep in episodes for k in _attr_keys(ep)])
+    logger.info("Cascade delete work %s#%s: %s", sub, work_id, result)
+    return result
+
+
+def _list_s3_keys(prefix: str, older_than: datetime | None = None) -> list[str]:
+    keys = []
+    kwargs = {"Bucket": _S3_BUCKET, "Prefix": prefix}
+    while True:
+        res = _s3.list_objects_v2(**kwargs)
+        for obj in res.get("Contents", []):
+            if older_than is None or obj["LastModified"] < older_than:
+                keys.append(obj["Key"])
+        if not res.get("IsTruncated"):
+            return keys
+        kwargs["ContinuationToken"] = res["NextContinuationToken"]
+
+
+def _sweep_orphans(sub: str, dry_run: bool = False) -> dict:
+    """Find (and unless dry_run, delete) a user's items whose parent is gone.
+
+    Items and S3 objects written less than _ORPHAN_S3_GRACE ago are skipped,
+    since a child may be synced just before its parent and a plot's content
+    uploaded before its metadata item; a skipped item still counts as a live
+    parent. Spilled attribute values, history checkpoints, content manifests
+    and chunks nothing live points to are swept under the same cutoff.
+    """
+    cutoff = datetime.now(timezone.utc) - _ORPHAN_S3_GRACE
+
+    def settled(item: dict) -> bool:
+        return (item.get("updated_at") or item.get("saved_at") or "") < cutoff.isoformat()
+
+    works = _scan_user_items(_works_table, sub, "local_id, planning_doc_ref, work_summary_ref")
+    work_ids = {int(w["local_id"]) for w in works}
+    episodes = _scan_user_items(_episodes_table, sub, "episode_id, local_id, work_id, chapter_summary_ref, updated_at")
+    live_eps = [ep for ep in episodes if int(ep["work_id"]) in work_ids or not settled(ep)]
+    ep_ids = {int(ep["local_id"]) for ep in live_eps}
+    plots = _scan_user_items(_plots_table, sub, "plot_id, local_id, episode_id, updated_at")
+    live_plots = [p for p in plots if int(p["episode_id"]) in ep_ids or not settled(p)]
+    live_plot_keys = {_plot_s3_key(sub, p["local_id"]) for p in live_plots}
+    characters = _scan_user_items(_characters_table, sub, "character_id, work_id, updated_at")
+    relations = _scan_user_items(_relations_table, sub, "relation_id, work_id, updated_at")
+    layouts = _scan_all(
+        _graph_table,
+        FilterExpression="begins_with(layout_id, :p)",
+        ProjectionExpression="layout_id, updated_at",
+        ExpressionAttributeValues={":p": f"{sub}#"},
+    )
+    posts = _scan_all(
+        _posts_table,
+        FilterExpression="author_sub = :s",
+        ProjectionExpression="local_id, content_preview_ref",
+        ExpressionAttributeValues={":s": sub},
+    )
+    live_attr_keys = {k for item in [*works, *live_eps, *posts] for k in _attr_keys(item)}
+    live_plot_ids = {int(p["local_id"]) for p in live_plots}
+    versions = _scan_all(
+        _versions_table,
+        FilterExpression="begins_with(version_key, :p)",
+        ProjectionExpression="version_key, #v, s3_key, saved_at",
+        ExpressionAttributeNames={"#v": "version"},
+        ExpressionAttributeValues={":p": f"{sub}#"},
+    )
+    dead_versions = [v for v in versions
+                     if int(v["version_key"].rsplit("#", 1)[-1]) not in live_plot_ids and settled(v)]
+    live_checkpoints = {v["s3_key"] for v in versions if v.get("s3_key")} - {v.get("s3_key") for v in dead_versions}
+
+    orphans = {
+        "episodes": [ep["episode_id"] for ep in episodes if int(ep["local_id"]) not in ep_ids],
+        "plots": [p["plot_id"] for p in plots if int(p["local_id"]) not in live_plot_ids],
+        "characters": [c["character_id"] for c in characters
+                       if int(c["work_id"]) not in work_ids and settled(c)],
+        "relations": [r["relation_id"] for r in relations
+                      if int(r["work_id"]) not in work_ids and settled(r)],
+        "graph_layouts": [
+            l["layout_id"] for l in layouts
+            if settled(l) and (not l["layout_id"].rsplit("#", 1)[-1].isdigit()
+                               or int(l["layout_id"].rsplit("#", 1)[-1]) not in work_ids)
+        ],
+        "s3_objects": [
+            k for k in _list_s3_keys(f"plots/{sub}/", cutoff)
+            if k not in live_plot_keys
+        ],
+        "attr_objects": [
+            k for k in _list_s3_keys(f"attrs/{sub}/", cutoff)
+            if k not in live_attr_keys
+        ],
+        "plot_versions": [{"version_key": v["version_key"], "version": v["version"]} for v in dead_versions],
+        "history_objects": [
+            k for k in _list_s3_keys(f"history/{sub}/", cutoff)
+            if k not in live_checkpoints
+        ],
+        # direct uploads never completed (the presigned POST expires long before)
+        "upload_objects": _list_s3_keys(f"uploads/{sub}/", cutoff),
+    }
+    if not dry_run:
+        _batch_delete(_episodes_table, "episode_id", orphans["episodes"])
+        _batch_delete(_plots_table, "plot_id", orphans["plots"])
+        _batch_delete(_characters_table, "character_id", orphans["characters"])
+        _batch_delete(_relations_table, "relation_id", orphans["relations"])
+        _batch_delete(_graph_table, "layout_id", orphans["graph_layouts"])
+        with _versions_table.batch_writer(overwrite_by_pkeys=["version_key", "version"]) as batch:
+            for key in orphans["plot_versions"]:
+                batch.delete_item(Key=key)
+        _s3_delete_keys(orphans["s3_objects"] + orphans["attr_objects"] + orphans["history_objects"]
+                        + orphans["upload_objects"])
+    counts = {name: len(keys) for name, keys in orphans.items()}
+    live_manifests = {_manifest_key(sub, "plot", i) for i in live_plot_ids} | {
+        _manifest_key(sub, "post", p["local_id"]) for p in posts}
+    counts.update(_sweep_chunks(sub, live_manifests, dry_run))
+    logger.info("Orphan sweep for %s (dry_run=%s): %s", sub, dry_run, counts)
+    return counts
+
+# ---------------------------------------------------------------------------
+# Field selection
+# ---------------------------------------------------------------------------
+# List endpoints take ?fields=a,b,c. The attributes are fetched with a
+# ProjectionExpression (aliased, so reserved words like "name" work) and the
+# response carries only the requested ones.
+
+_FIELD_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_MAX_FIELDS = 40
+
+
+def _parse_fields(fields: str | None) -> list[str] | None:
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    if not names or len(names) > _MAX_FIELDS or not all(_FIELD_NAME.fullmatch(n) for n in names):
+        raise HTTPException(status_code=400, detail="fields 는 쉼표로 구분한 속성 이름 목록이어야 합니다.")
+    return names
+
+
+def _projection(fields: list[str] | None, *required: str) -> dict:
+    """ProjectionExpression kwargs for fields plus attributes the handler itself needs."""
+    if fields is None:
+        return {}
+    names = list(dict.fromkeys([*fields, *required, *(_attr_ref(f) for f in fields if f in _LARGE_ATTRS)]))
+    return {
+        "ProjectionExpression": ", ".join(f"#f{i}" for i in range(len(names))),
+        "ExpressionAttributeNames": {f"#f{i}": name for i, name in enumerate(names)},
+    }
+
+
+def _select_fields(items: list[dict], fields: list[str] | None) -> list[dict]:
+    """Trim items to fields, keeping the pointers of spilled large attributes."""
+    if fields is None:
+        return items
+    keep = [*fields, *(_attr_ref(f) for f in fields if f in _LARGE_ATTRS)]
+    return [{k: item[k] for k in keep if k in item} for item in items]
+
+# ---------------------------------------------------------------------------
+# Large attributes
+# ---------------------------------------------------------------------------
+# planning_doc, work_summary, chapter_summary and content_preview have no size
+# bound. A value whose JSON is over _ATTR_SPILL_BYTES is written to S3 under
+# attrs/{sub}/{kind}/{local_id}/ and the item keeps only "<attr>_ref":
+# {"key", "bytes"}, so scans and list reads pay for the pointer. List
+# responses (/works, /works/{id}/episodes, /changes) carry only
+# "<attr>_ref": {"bytes"} (_attr_pointers); the value is read with
+# GET /works/{id} or GET /episodes/{id}, and handlers that use the value
+# call _hydrate_attrs.
+
+_LARGE_ATTRS = ("planning_doc", "work_summary", "chapter_summary", "content_preview")
+_ATTR_SPILL_BYTES = int(os.getenv("ATTR_SPILL_BYTES", "8192"))
+_ATTR_FETCH_WORKERS = 8
+
+
+def _attr_ref(attr: str) -> str:
+    return f"{attr}_ref"
+
+
+def _attr_prefix(sub: str, kind: str, local_id) -> str:
+    return f"attrs/{sub}/{kind}/{local_id}/"
+
+
+def _spill_attr(sub: str, kind: str, local_id, attr: str, value) -> dict | None:
+    """Upload value if it is over the threshold and return its pointer; None keeps it inline.
+
+    The key includes a content hash, so a pointer never sees its object
+    overwritten and the superseded object can be deleted after the write.
+    """
+    body = orjson.dumps(value, default=_json_default)
+    if len(body) <= _ATTR_SPILL_BYTES:
+        return None
+    key = f"{_attr_prefix(sub, kind, local_id)}{attr}.{hashlib.sha256(body).hexdigest()[:16]}.json"
+    _s3.put_object(Bucket=_S3_BUCKET, Key=key, Body=body, ContentType="application/json")
+    return {"key": key, "bytes": len(body)}
+
+
+def _spill_item(sub: str, kind: str, local_id, item: dict) -> dict:
+    """Replace the item's oversized large attributes with pointers (PutItem path)."""
+    for attr in _LARGE_ATTRS:
+        if attr in item:
+            ref = _spill_attr(sub, kind, local_id, attr, item[attr])
+            if ref is not None:
+                item[_attr_ref(attr)] = ref
+                del item[attr]
+    return item
+
+
+def _large_attr_update(sub: str, kind: str, local_id, values: dict) -> tuple[list[str], list[str], dict]:
+    """SET and REMOVE clauses storing each value inline or behind a pointer (UpdateItem path)."""
+    sets, removes, expr_values = [], [], {}
+    for i, (attr, value) in enumerate(values.items()):
+        ref = _spill_attr(sub, kind, local_id, attr, value)
+        if ref is None:
+            sets.append(f"{attr} = :la{i}")
+            removes.append(_attr_ref(attr))
+            expr_values[f":la{i}"] = value
+        else:
+            sets.append(f"{_attr_ref(attr)} = :la{i}")
+            removes.append(attr)
+            expr_values[f":la{i}"] = ref
+    return sets, removes, expr_values
+
+
+def _update_expression(sets: list[str], removes: list[str]) -> str:
+    return "SET " + ", ".join(sets) + (" REMOVE " + ", ".join(removes) if removes else "")
+
+
+def _attr_keys(item: dict) -> list[str]:
+    """S3 keys referenced by an item's large-attribute pointers."""
+    return [item[_attr_ref(a)]["key"] for a in _LARGE_ATTRS if isinstance(item.get(_attr_ref(a)), dict)]
+
+
+def _update_entity(table, key: dict, update: dict) -> None:
+    """Stamped update_item (see _stamped), then delete the S3 values whose
+    pointers it replaced or removed."""
+    old = table.update_item(Key=key, ReturnValues="UPDATED_OLD", **_stamped(update)).get("Attributes") or {}
+    live = {v["key"] for v in update.get("ExpressionAttributeValues", {}).values()
+            if isinstance(v, dict) and "key" in v}
+    stale = [k for k in _attr_keys(old) if k not in live]
+    if stale:
+        try:
+            _s3_delete_keys(stale)
+        except Exception:
+            logger.warning("Superseded attribute delete failed for %s:\n%s", key, traceback.format_exc())
+
+
+def _set_large_attr(table, key: dict, sub: str, kind: str, local_id, attr: str, value) -> None:
+    sets, removes, values = _large_attr_update(sub, kind, local_id, {attr: value})
+    _update_entity(table, key, {"UpdateExpression": _update_expression(sets, removes),
+                                "ExpressionAttributeValues": values})
+
+
+def _attr_pointers(items: list[dict]) -> list[dict]:
+    """Reduce the large-attribute pointers in items to {"bytes"} for a response."""
+    for item in items:
+        for attr in _LARGE_ATTRS:
+            ref = item.get(_attr_ref(attr))
+            if isinstance(ref, dict):
+                item[_attr_ref(attr)] = {"bytes": ref.get("bytes", 0)}
+    return items
+
+
+def _hydrate_attrs(items: list[dict]) -> list[dict]:
+    """Replace every large-attribute pointer in items with its value, fetched concurrently."""
+    pending = [(item, attr) for item in items for attr in _LARGE_ATTRS if _attr_ref(attr) in item]
+    if not pending:
+        return items
+
+    def fetch(job):
+        item, attr = job
+        ref = item.pop(_attr_ref(attr))
+        try:
+            obj = _s3.get_object(Bucket=_S3_BUCKET, Key=ref["key"])
+            item[attr] = json.loads(obj["Body"].read())
+        except ClientError:
+            logger.warning("Large attribute %s missing at %s", attr, ref.get("key"))
+
+    with ContextThreadPoolExecutor(max_workers=_ATTR_FETCH_WORKERS) as pool:
+        list(pool.map(fetch, pending))
+    return items
+
+# ---------------------------------------------------------------------------
+# Direct S3 transfers
+# ---------------------------------------------------------------------------
+# Large plot documents and post snapshots go straight between the browser and
+# S3 with presigned URLs instead of through the function (API Gateway payload
+# limit, billed Lambda time). An upload goes to a staging key of its own,
+# uploads/{sub}/{upload_id}.json, through a presigned POST whose policy caps
+# the size (content-length-range); the client then calls the matching
+# /complete endpoint with the upload_id, which checks the upload and moves it
+# into chunks or the document's key. A bad or abandoned upload never touches
+# the saved document; stale staging objects are left to _sweep_orphans.
+# The bucket needs a CORS rule allowing POST/GET from FRONTEND_URL.
+
+_PRESIGNED_URL_TTL = int(os.getenv("PRESIGNED_URL_TTL", "300"))
+_DIRECT_UPLOAD_MAX_BYTES = int(os.getenv("DIRECT_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+# GET .../content redirects to a presigned URL above this size
+_CONTENT_PROXY_MAX_BYTES = int(os.getenv("CONTENT_PROXY_MAX_BYTES", str(1024 * 1024)))
+
+
+def _presigned_url(client_method: str, key: str) -> dict:
+    return {
+        "url": _s3.generate_presigned_url(client_method, Params={"Bucket": _S3_BUCKET, "Key": key},
+                                          ExpiresIn=_PRESIGNED_URL_TTL),
+        "method": "GET",
+        "expires_in": _PRESIGNED_URL_TTL,
+    }
+
+
+def _presigned_upload(sub: str) -> dict:
+    """Presigned POST to a new staging key, limited to _DIRECT_UPLOAD_MAX_BYTES."""
+    upload_id = uuid.uuid4().hex
+    post = _s3.generate_presigned_post(
+        Bucket=_S3_BUCKET,
+        Key=_upload_s3_key(sub, upload_id),
+        Fields={"Content-Type": "application/json"},
+        Conditions=[{"Content-Type": "application/json"},
+                    ["content-length-range", 1, _DIRECT_UPLOAD_MAX_BYTES]],
+        ExpiresIn=_PRESIGNED_URL_TTL,
+    )
+    return {"upload_id": upload_id, "url": post["url"], "method": "POST", "fields": post["fields"],
+            "expires_in": _PRESIGNED_URL_TTL}
+
+
+def _upload_s3_key(sub: str, upload_id: str) -> str:
+    return f"uploads/{sub}/{upload_id}.json"
+
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _head_content(key: str) -> dict | None:
+    try:
+        return _s3.head_object(Bucket=_S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+async def _upload_key(sub: str, request: Request) -> str:
+    """Staging key of the upload named by the /complete body {"upload_id"}."""
+    try:
+        upload_id = (await request.json()).get("upload_id")
+    except (ValueError, AttributeError):
+        upload_id = None
+    if not isinstance(upload_id, str) or not _UPLOAD_ID.fullmatch(upload_id):
+        raise HTTPException(status_code=400, detail="upload_id 가 올바르지 않습니다.")
+    return _upload_s3_key(sub, upload_id)
+
+
+def _read_upload(key: str) -> bytes:
+    """Body of a finished direct upload. Missing and oversized uploads are
+    rejected; an oversized one is deleted (it is only the staging copy)."""
+    head = _head_content(key)
+    if head is None:
+        raise HTTPException(status_code=404, detail="업로드된 콘텐츠가 없습니다.")
+    if int(head["ContentLength"]) > _DIRECT_UPLOAD_MAX_BYTES:
+        _s3_delete_keys([key])
+        raise HTTPException(status_code=413, detail="콘텐츠가 너무 큽니다.")
+    return _s3.get_object(Bucket=_S3_BUCKET, Key=key)["Body"].read()
+
+
+def _content_response(key: str, missing: bytes | None = b"{}"):
+    """Proxy a JSON object, or redirect to a presigned GET when it is large.
+    A missing object is answered with ``missing``, or 404 when that is None."""
+    from fastapi.responses import Response
+    try:
+        obj = _s3.get_object(Bucket=_S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            if missing is None:
+                raise HTTPException(status_code=404, detail="콘텐츠를 찾을 수 없습니다.")
+            return Response(content=missing, media_type="application/json")
+        logger.error("S3 get failed for key %s:\n%s", key, traceback.format_exc())
+        raise
+    if int(obj.get("ContentLength", 0)) > _CONTENT_PROXY_MAX_BYTES:
+        url = _presigned_url("get_object", key)["url"]
+        # local backends hand out memory:// URLs, which a browser can't follow
+        if url.startswith(("https://", "http://")):
+            obj["Body"].close()
+            return RedirectResponse(url=url, status_code=307)
+    return Response(content=obj["Body"].read(), media_type="application/json")
+
+# ---------------------------------------------------------------------------
+# Content chunks
+# ---------------------------------------------------------------------------
+# Plot documents and post snapshots are stored as content-addressed chunks
+# (chunks.py): every chunk once per user at chunks/{sub}/{hash}.json, and the
+# document as a manifest row in content_manifests ({sub}#{kind}#{local_id}).
+# content_chunks counts, per chunk, the manifests that use it. A save uploads
+# only the chunks the previous manifest lacked and swaps the manifest with one
+# PutItem, whose old value says exactly which chunks to release, so the counts
+# stay right under concurrent saves. A chunk no manifest uses is deleted by
+# _sweep_orphans after _ORPHAN_S3_GRACE unused; the row is marked ``deleting``
+# while its object goes, and a save that takes the chunk back meanwhile clears
+# the mark, which tells the sweep to put the object back and keep the row.
+# Documents saved before chunks existed have no manifest and are read from
+# their old key until resaved.
+
+_CHUNK_WORKERS = 8
+_chunk_cache = chunks.Cache(int(os.getenv("CHUNK_CACHE_BYTES", str(32 * 1024 * 1024))))
+
+
+def _chunk_s3_key(sub: str, h: str) -> str:
+    return f"chunks/{sub}/{h}.json"
+
+
+def _manifest_key(sub: str, kind: str, local_id) -> str:
+    return f"{sub}#{kind}#{int(local_id)}"
+
+
+def _each_chunk(fn, jobs: list[tuple]) -> list:
+    if len(jobs) <= 1:
+        return [fn(*job) for job in jobs]
+    with ContextThreadPoolExecutor(max_workers=_CHUNK_WORKERS) as pool:
+        return list(pool.map(lambda job: fn(*job), jobs))
+
+
+def _acquire_chunk(sub: str, h: str, blob: bytes) -> bool:
+    """Count one more manifest using a chunk and upload it unless it is
+    stored and in use. True when it was uploaded. The count is given back if
+    the upload fails."""
+    key = {"chunk_key": f"{sub}#{h}"}
+    old = _chunks_table.update_item(
+        Key=key,
+        UpdateExpression="SET #b = :b ADD #r :one REMOVE released_at, deleting",
+        ExpressionAttributeNames={"#b": "bytes", "#r": "refs"},
+        ExpressionAttributeValues={":b": len(blob), ":one": 1},
+        ReturnValues="ALL_OLD",
+    ).get("Attributes") or {}
+    if old.get("stored") and int(old.get("refs", 0)) > 0:
+        return False
+    # A released chunk is uploaded again in case a sweep is deleting it.
+    try:
+        _s3.put_object(Bucket=_S3_BUCKET, Key=_chunk_s3_key(sub, h), Body=blob, ContentType="application/json")
+        _chunks_table.update_item(Key=key, UpdateExpression="SET stored = :t", ExpressionAttributeValues={":t": True})
+    except Exception:
+        _release_chunk(sub, h)
+        raise
+    _chunk_cache.put((sub, h), blob)
+    return True
+
+
+def _acquire_chunks(sub: str, blobs: dict[str, bytes], hashes) -> int:
+    """_acquire_chunk each of hashes; the number uploaded. When one fails the
+    others are released again before its error is raised, so a failed save
+    holds no counts."""
+    hashes = list(hashes)
+
+    def acquire(h):
+        try:
+            return _acquire_chunk(sub, h, blobs[h])
+        except Exception as e:
+            return e
+
+    results = dict(zip(hashes, _each_chunk(acquire, [(h,) for h in hashes])))
+    failed = [r for r in results.values() if isinstance(r, Exception)]
+    if failed:
+        _release_chunks(sub, Counter(h for h, r in results.items() if not isinstance(r, Exception)))
+        raise failed[0]
+    return sum(results.values())
+
+
+def _reference_chunk(sub: str, h: str, count: int = 1) -> None:
+    """Count count more manifests using a chunk that is already stored."""
+    _chunks_table.update_item(
+        Key={"chunk_key": f"{sub}#{h}"},
+        UpdateExpression="ADD #r :n REMOVE released_at, deleting",
+        ExpressionAttributeNames={"#r": "refs"},
+        ExpressionAttributeValues={":n": count},
+    )
+
+
+def _release_chunk(sub: str, h: str, count: int = 1) -> None:
+    key = {"chunk_key": f"{sub}#{h}"}
+    left = _chunks_table.update_item(
+        Key=key,
+        UpdateExpression="ADD #r :n",
+        ExpressionAttributeNames={"#r": "refs"},
+        ExpressionAttributeValues={":n": -count},
+        ReturnValues="UPDATED_NEW",
+    )["Attributes"]["refs"]
+    if left > 0:
+        return
+    try:
+        _chunks_table.update_item(
+            Key=key,
+            UpdateExpression="SET released_at = :t",
+            ConditionExpression="#r <= :zero",
+            ExpressionAttributeNames={"#r": "refs"},
+            ExpressionAttributeValues={":t": _now(), ":zero": 0},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def _release_chunks(sub: str, counts: Counter) -> None:
+    _each_chunk(_release_chunk, [(sub, h, n) for h, n in counts.items() if n > 0])
+
+
+def _save_manifest(sub: str, kind: str, local_id, doc) -> dict | None:
+    """Store doc as chunks and make it the content of kind/local_id.
+
+    Returns the manifest it replaced ({} when there was none), or None when
+    doc has no block list to chunk and nothing was stored.
+    """
+    split = chunks.split(doc)
+    if split is None:
+        return None
+    manifest, blobs = split
+    key = _manifest_key(sub, kind, local_id)
+    held = set((_manifests_table.get_item(Key={"manifest_key": key}, ProjectionExpression="chunks")
+                .get("Item") or {}).get("chunks") or [])
+    new = set(manifest["chunks"])
+    uploaded = _acquire_chunks(sub, blobs, new - held)
+    old = _manifests_table.put_item(
+        Item={"manifest_key": key, **manifest, "doc_bytes": sum(len(blobs[h]) for h in manifest["chunks"]),
+              "saved_at": _now()},
+        ReturnValues="ALL_OLD",
+    ).get("Attributes") or {}
+    # The manifest now holds every chunk in new. Usually old is what was read
+    # above and this only releases the chunks the save dropped; after a
+    # concurrent save it settles the difference.
+    delta = Counter(new & held)
+    delta.subtract(set(old.get("chunks") or []))
+    retaken = [h for h, n in delta.items() if n > 0]
+    uploaded += _acquire_chunks(sub, blobs, retaken)
+    _release_chunks(sub, Counter({h: -n for h, n in delta.items() if n < 0}))
+
+    telemetry.METRICS.inc("content_chunks_written_total", {"kind": kind}, uploaded)
+    telemetry.METRICS.inc("content_chunks_reused_total", {"kind": kind}, len(new) - uploaded)
+    return old
+
+
+def _drop_manifests(sub: str, keys: list[str]) -> int:
+    """Delete documents' manifests and release their chunks."""
+    released, dropped = Counter(), 0
+    for key in keys:
+        old = _manifests_table.delete_item(Key={"manifest_key": key}, ReturnValues="ALL_OLD").get("Attributes")
+        if old:
+            released.update(set(old.get("chunks") or []))
+            dropped += 1
+    _release_chunks(sub, released)
+    return dropped
+
+
+def _fetch_chunks(sub: str, hashes: list[str]) -> dict[str, bytes]:
+    blobs, missing = {}, []
+    for h in dict.fromkeys(hashes):
+        blob = _chunk_cache.get((sub, h))
+        if blob is None:
+            missing.append(h)
+        else:
+            blobs[h] = blob
+
+    def fetch(h):
+        blob = _s3.get_object(Bucket=_S3_BUCKET, Key=_chunk_s3_key(sub, h))["Body"].read()
+        _chunk_cache.put((sub, h), blob)
+        return h, blob
+
+    blobs.update(_each_chunk(fetch, [(h,) for h in missing]))
+    return blobs
+
+
+def _load_manifest(sub: str, kind: str, local_id) -> bytes | None:
+    """JSON of a document stored as chunks; None when it has no manifest."""
+    item = _manifests_table.get_item(Key={"manifest_key": _manifest_key(sub, kind, local_id)}).get("Item")
+    if item is None:
+        return None
+    return chunks.encode(item, _fetch_chunks(sub, item["chunks"]))
+
+
+def _move_to_chunks(sub: str, kind: str, local_id) -> int:
+    """Store a plot document or post snapshot saved before chunks existed as
+    chunks (maintenance.py chunks). Returns its number of chunks, 0 when it
+    already has a manifest or there is nothing to move."""
+    if "Item" in _manifests_table.get_item(Key={"manifest_key": _manifest_key(sub, kind, local_id)},
+                                           ProjectionExpression="manifest_key"):
+        return 0
+    key = _plot_s3_key(sub, local_id) if kind == "plot" else _post_s3_key(sub, local_id)
+    try:
+        doc = orjson.loads(_s3.get_object(Bucket=_S3_BUCKET, Key=key)["Body"].read())
+    except orjson.JSONDecodeError:
+        return 0
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return 0
+        raise
+    if _save_manifest(sub, kind, local_id, doc) is None:
+        return 0
+    _s3_delete_keys([key])
+    return len(chunks.split(doc)[0]["chunks"])
+
+
+def _sweep_chunks(sub: str, live_manifests: set[str], dry_run: bool) -> dict:
+    """Drop manifests of documents that are gone, and delete chunks that have
+    been unused for _ORPHAN_S3_GRACE."""
+    cutoff = (datetime.now(timezone.utc) - _ORPHAN_S3_GRACE).isoformat()
+    manifests = _scan_all(
+        _manifests_table,
+        FilterExpression="begins_with(manifest_key, :p) AND saved_at < :t",
+        ProjectionExpression="manifest_key",
+        ExpressionAttributeValues={":p": f"{sub}#", ":t": cutoff},
+    )
+    dead = [m["manifest_key"] for m in manifests if m["manifest_key"] not in live_manifests]
+    released = _scan_all(
+        _chunks_table,
+        FilterExpression="begins_with(chunk_key, :p) AND #r <= :zero AND released_at < :t",
+        ProjectionExpression="chunk_key, released_at",
+        ExpressionAttributeNames={"#r": "refs"},
+        ExpressionAttributeValues={":p": f"{sub}#", ":zero": 0, ":t": cutoff},
+    )
+    if dry_run:
+        return {"manifests": len(dead), "chunks": len(released)}
+
+    _drop_manifests(sub, dead)
+    deleted = _each_chunk(_delete_released_chunk, [(item,) for item in released])
+    return {"manifests": len(dead), "chunks": sum(deleted)}
+
+
+def _delete_released_chunk(item: dict) -> bool:
+    """Delete a chunk found unused (chunk_key, released_at), unless a save
+    has taken it back since.
+
+    The row is marked deleting before the object is deleted and removed only
+    while still marked. A save taking the chunk meanwhile clears the mark and
+    uploads the chunk, possibly before the delete here, so then the object is
+    put back (it is the same bytes) and the row left to the save.
+    """
+    sub, chunk_hash = item["chunk_key"].split("#", 1)
+    key, token = {"chunk_key": item["chunk_key"]}, uuid.uuid4().hex
+    try:
+        _chunks_table.update_item(
+            Key=key,
+            UpdateExpression="SET deleting = :d",
+            ConditionExpression="#r <= :zero AND released_at = :t",
+            ExpressionAttributeNames={"#r": "refs"},
+            ExpressionAttributeValues={":d": token, ":zero": 0, ":t": item["released_at"]},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    s3_key = _chunk_s3_key(sub, chunk_hash)
+    try:
+        blob = _s3.get_object(Bucket=_S3_BUCKET, Key=s3_key)["Body"].read()
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            raise
+        blob = None
+    _s3.delete_object(Bucket=_S3_BUCKET, Key=s3_key)
+    try:
+        _chunks_table.delete_item(Key=key, ConditionExpression="deleting = :d",
+                                  ExpressionAttributeValues={":d": token})
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        if blob is not None:
+            _s3.put_object(Bucket=_S3_BUCKET, Key=s3_key, Body=blob, ContentType="application/json")
+        return False
+    return True
+
+# ---------------------------------------------------------------------------
+# Ordering keys
+# ---------------------------------------------------------------------------
+# Episodes and plots carry a lexicographic ``order_key`` (a base-62 fraction,
+# "0.<digits>") and a ``parent_key`` ("{sub}#{work_id}" / "{sub}#{episode_id}").
+# The parent_key-order_key GSI returns children already sorted, and moving a
+# child only rewrites that child's key. Children of parents created before
+# ordering keys existed are listed with a Scan until ``maintenance.py
+# order-keys`` or a reorder keys them; ``episodes_keyed`` / ``plots_keyed`` on
+# the parent marks that every child has a key.
+
+_ORDER_INDEX = storage.ORDER_INDEX
+_ORDER_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_ORDER_KEY_WIDTH = 4
+_ORDER_KEY_STEP = 32        # gap between evenly spaced keys
+_ORDER_KEY_MAX_LEN = 12     # longer keys trigger a rebalance of the parent
+_ORDER_WORKERS = 8
+
+# kind: (table global, key attribute, parent attribute, parent table global, parent marker)
+_ORDER_KINDS = {
+    "episode": ("_episodes_table", "episode_id", "work_id", "_works_table", "episodes_keyed"),
+    "plot":    ("_plots_table",    "plot_id",    "episode_id", "_episodes_table", "plots_keyed"),
+}
+
+
+def _index_key(index) -> str:
+    """Evenly spaced key for position ``index`` (used for creates and rebalancing)."""
+    value = (max(int(index), 0) + 1) * _ORDER_KEY_STEP
+    digits = []
+    for _ in range(_ORDER_KEY_WIDTH):
+        value, rem = divmod(value, len(_ORDER_DIGITS))
+        digits.append(_ORDER_DIGITS[rem])
+    return "".join(reversed(digits)).rstrip("0")
+
+
+def _order_midpoint(a: str, b: str | None) -> str:
+    """Shortest key strictly between fractions a and b (b=None means 1.0).
+
+    Neither argument may end in "0" — "0.A0" and "0.A" are the same fraction.
+    """
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _order_midpoint(a[n:], b[n:])
+    digit_a = _ORDER_DIGITS.index(a[0]) if a else 0
+    digit_b = _ORDER_DIGITS.index(b[0]) if b is not None else len(_ORDER_DIGITS)
+    if digit_b - digit_a > 1:
+        return _ORDER_DIGITS[(digit_a + digit_b) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return _ORDER_DIGITS[digit_a] + _order_midpoint(a[1:], None)
+
+
+def _key_between(before: str | None, after: str | None) -> str:
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"order keys out of order: {before!r} >= {after!r}")
+    return _order_midpoint(before or "", after)
+
+
+def _query_all(table, **kwargs) -> list[dict]:
+    items = []
+    while True:
+        res = table.query(**kwargs)
+        items.extend(res.get("Items", []))
+        if "LastEvaluatedKey" not in res:
+            return items
+        kwargs["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+
+
+def _set_order(table, key_name: str, item: dict, parent_key: str, order_key: str, pos: int) -> None:
+    """Write only the ordering attributes of one child. A child deleted since
+    it was listed stays deleted."""
+    update = _stamped({
+        "UpdateExpression": "SET parent_key = :pk, order_key = :k, order_index = :o",
+        "ExpressionAttributeValues": {":pk": parent_key, ":k": order_key, ":o": pos},
+    })
+    try:
+        table.update_item(Key={key_name: item[key_name]},
+                          ConditionExpression=f"attribute_exists({key_name})", **update)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def _rekey_children(table, key_name: str, items: list[dict], parent_key: str) -> None:
+    """Assign evenly spaced keys to items (already in the wanted order), for
+    backfills and rebalancing. Content, stats and counters saved meanwhile
+    are left alone."""
+    with ContextThreadPoolExecutor(max_workers=_ORDER_WORKERS) as pool:
+        list(pool.map(lambda pos: _set_order(table, key_name, items[pos], parent_key, _index_key(pos), pos),
+                      range(len(items))))
+
+
+def _mark_keyed(kind: str, sub: str, parent_id: int) -> None:
+    _, _, parent_field, parent_table_name, marker = _ORDER_KINDS[kind]
+    try:
+        globals()[parent_table_name].update_item(
+            Key={parent_field: f"{sub}#{parent_id}"},
+            UpdateExpression=f"SET {marker} = :t",
+            ConditionExpression=f"attribute_exists({parent_field})",
+            ExpressionAttributeValues={":t": True},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def _list_children(kind: str, sub: str, parent_id: int, fields: list[str] | None = None) -> list[dict]:
+    """Children of a work (episodes) or episode (plots), sorted by order_key.
+
+    ``order_index`` in the returned items is rewritten to the position.
+    ``fields`` limits the returned attributes (see _projection).
+    """
+    table_name, _, parent_field, parent_table_name, marker = _ORDER_KINDS[kind]
+    table, parent_table = globals()[table_name], globals()[parent_table_name]
+    parent_key = f"{sub}#{parent_id}"
+    parent = parent_table.get_item(
+        Key={parent_field: parent_key},
+        ProjectionExpression=f"{parent_field}, {marker}",
+    ).get("Item") or {}
+    if parent.get(marker):
+        items = _query_all(
+            table,
+            IndexName=_ORDER_INDEX,
+            KeyConditionExpression="parent_key = :p",
+            ExpressionAttributeValues={":p": parent_key},
+            **_projection(fields),
+        )
+    else:
+        # Legacy parent: children may lack keys, so scan and sort by position.
+        items = _scan_all(
+            table,
+            FilterExpression=f"user_sub = :s AND {parent_field} = :p",
+            ExpressionAttributeValues={":s": sub, ":p": parent_id},
+        )
+        items.sort(key=lambda x: (x.get("order_index", 0), x.get("order_key", "")))
+    for pos, item in enumerate(items):
+        item["order_index"] = pos
+    return _select_fields(items, fields)
+
+
+def _backfill_order_keys(kind: str, sub: str, parent_id: int) -> int:
+    """Key the children of a legacy parent in their listed order and mark the
+    parent (maintenance.py order-keys). Returns the number of children."""
+    table_name, key_name, *_ = _ORDER_KINDS[kind]
+    items = _list_children(kind, sub, parent_id)
+    _rekey_children(globals()[table_name], key_name, items, f"{sub}#{parent_id}")
+    _mark_keyed(kind, sub, parent_id)
+    return len(items)
+
+
+def _creation_keys(kind: str, sub: str, parent_id: int, creates: list[tuple[int, int]]) -> dict[int, str]:
+    """order_key for each (local_id, order_index) created under one parent.
+
+    A child created at order_index n goes between the children now at n-1 and
+    n, so an append lands after children that reorders gave keys past the
+    evenly spaced ones. Children of a legacy parent get _index_key(n), which
+    is how its Scan listing sorts them.
+    """
+    table_name, _, parent_field, parent_table_name, marker = _ORDER_KINDS[kind]
+    parent_key = f"{sub}#{parent_id}"
+    parent = globals()[parent_table_name].get_item(
+        Key={parent_field: parent_key}, ProjectionExpression=marker,
+    ).get("Item")
+    if parent is not None and not parent.get(marker):
+        return {local_id: _index_key(index) for local_id, index in creates}
+    created = {local_id for local_id, _ in creates}
+    keys = [it["order_key"] for it in _query_all(
+        globals()[table_name],
+        IndexName=_ORDER_INDEX,
+        KeyConditionExpression="parent_key = :p",
+        ProjectionExpression="local_id, order_key",
+        ExpressionAttributeValues={":p": parent_key},
+    ) if int(it["local_id"]) not in created]
+    result = {}
+    for local_id, index in sorted(creates, key=lambda c: int(c[1] or 0)):
+        pos = min(max(int(index or 0), 0), len(keys))
+        before = keys[pos - 1] if pos else None
+        # children sharing a key (concurrent creates) must not invert the bounds
+        after = next((k for k in keys[pos:] if before is None or k > before), None)
+        result[local_id] = _key_between(before, after)
+        bisect.insort(keys, result[local_id])
+    return result
+
+
+def _longest_increasing(keys: list) -> set[int]:
+    """Positions of a longest strictly increasing subsequence (None never included)."""
+    tails: list[int] = []       # tails[k] = position ending the best run of length k+1
+    prev: list[int | None] = [None] * len(keys)
+    for i, key in enumerate(keys):
+        if key is None:
+            continue
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[tails[mid]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        prev[i] = tails[lo - 1] if lo else None
+        if lo == len(tails):
+            tails.append(i)
+        else:
+            tails[lo] = i
+    keep, i = set(), tails[-1] if tails else None
+    while i is not None:
+        keep.add(i)
+        i = prev[i]
+    return keep
+
+
+def _reorder_children(kind: str, sub: str, parent_id: int, ordered_ids: list[int]) -> dict:
+    """Put a parent's children in ``ordered_ids`` order, rewriting as few keys as possible.
+
+    Children that already appear in a longest increasing run of keys stay put;
+    only the others get a new key between their neighbours, so moving one child
+    is a single UpdateItem. If keys grow too long the parent is rebalanced.
+    """
+    table_name, key_name, *_ = _ORDER_KINDS[kind]
+    table = globals()[table_name]
+    items = _list_children(kind, sub, parent_id)
+    by_id = {int(it["local_id"]): it for it in items}
+    wanted = [i for i in dict.fromkeys(ordered_ids) if i in by_id]
+    wanted += [i for i in by_id if i not in set(wanted)]
+    ordered = [by_id[i] for i in wanted]
+
+    keys = [it.get("order_key") for it in ordered]
+    keep = _longest_increasing(keys)
+    new_keys = list(keys)
+    moved = []
+    for pos in range(len(ordered)):
+        if pos in keep:
+            continue
+        before = new_keys[pos - 1] if pos else None
+        after = next((new_keys[j] for j in range(pos + 1, len(ordered)) if j in keep), None)
+        new_keys[pos] = _key_between(before, after)
+        moved.append(pos)
+
+    parent_key = f"{sub}#{parent_id}"
+    rebalanced = any(len(new_keys[pos]) > _ORDER_KEY_MAX_LEN for pos in moved)
+    if rebalanced:
+        _rekey_children(table, key_name, ordered, parent_key)
+    else:
+        with ContextThreadPoolExecutor(max_workers=_ORDER_WORKERS) as pool:
+            list(pool.map(lambda pos: _set_order(table, key_name, ordered[pos], parent_key, new_keys[pos], pos),
+                          moved))
+    if None in keys:
+        # a legacy parent: every child has a key now
+        _mark_keyed(kind, sub, parent_id)
+    return {"moved": len(moved), "rebalanced": rebalanced}
+
+# ---------------------------------------------------------------------------
+# Search index
+# ---------------------------------------------------------------------------
+# search_index rows (PK term_key, SK plot_id number):
+#   "{sub}#{gram}"  posting; tf = occurrences of the gram in the plot
+#   "{sub}#"        one row per indexed plot: doc_len, episode_id, work_id
+# The indexed text is kept at search/{sub}/{plot_id}.txt and diffed on the
+# next save, so an edit only rewrites the postings whose counts changed.
+
+_SEARCH_WORKERS = 8
+
+
+def _search_text_key(sub: str, plot_id) -> str:
+    return f"search/{sub}/{int(plot_id)}.txt"
+
+
+def _read_search_text(sub: str, plot_id) -> str:
+    try:
+        obj = _s3.get_object(Bucket=_S3_BUCKET, Key=_search_text_key(sub, plot_id))
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return ""
+        raise
+    return obj["Body"].read().decode("utf-8")
+
+
+def _index_plot(sub: str, plot_id: int, doc: dict) -> int:
+    """Update the plot's postings to match doc. Returns the number of rows written."""
+    text = _extract_plain_text(doc.get("content") or [], "\n")
+    old_text = _read_search_text(sub, plot_id)
+    if text == old_text:
+        return 0
+    new, old = search.grams(text), search.grams(old_text)
+
+    plot = _plots_table.get_item(
+        Key={"plot_id": f"{sub}#{plot_id}"}, ProjectionExpression="episode_id",
+    ).get("Item") or {}
+    location = {}
+    if "episode_id" in plot:
+        ep = _episodes_table.get_item(
+            Key={"episode_id": f"{sub}#{int(plot['episode_id'])}"}, ProjectionExpression="work_id",
+        ).get("Item") or {}
+        location = {"episode_id": int(plot["episode_id"]), **({"work_id": int(ep["work_id"])} if ep else {})}
+
+    writes = 0
+    with _search_table.batch_writer() as batch:
+        for gram, tf in new.items():
+            if old.get(gram) != tf:
+                batch.put_item(Item={"term_key": f"{sub}#{gram}", "plot_id": plot_id, "tf": tf})
+                writes += 1
+        for gram in old.keys() - new.keys():
+            batch.delete_item(Key={"term_key": f"{sub}#{gram}", "plot_id": plot_id})
+            writes += 1
+        if new:
+            batch.put_item(Item={"term_key": f"{sub}#", "plot_id": plot_id,
+                                 "doc_len": sum(new.values()), **location})
+        else:
+            batch.delete_item(Key={"term_key": f"{sub}#", "plot_id": plot_id})
+
+    if text:
+        _s3.put_object(Bucket=_S3_BUCKET, Key=_search_text_key(sub, plot_id),
+                       Body=text.encode("utf-8"), ContentType="text/plain; charset=utf-8")
+    else:
+        _s3.delete_object(Bucket=_S3_BUCKET, Key=_search_text_key(sub, plot_id))
+    return writes
+
+
+def _unindex_plots(sub: str, plot_ids: list[int]) -> int:
+    """Drop deleted plots from the index. Returns the number of postings removed."""
+    def unindex(plot_id):
+        grams = search.grams(_read_search_text(sub, plot_id))
+        with _search_table.batch_writer() as batch:
+            for gram in grams:
+                batch.delete_item(Key={"term_key": f"{sub}#{gram}", "plot_id": int(plot_id)})
+            batch.delete_item(Key={"term_key": f"{sub}#", "plot_id": int(plot_id)})
+        return len(grams)
+
+    if not plot_ids:
+        return 0
+    with ContextThreadPoolExecutor(max_workers=_SEARCH_WORKERS) as pool:
+        removed = sum(pool.map(unindex, plot_ids))
+    _s3_delete_keys([_search_text_key(sub, plot_id) for plot_id in plot_ids])
+    return removed
+
+
+def _search_postings(sub: str, gram: str) -> dict[int, int]:
+    rows = _query_all(
+        _search_table,
+        KeyConditionExpression="term_key = :t",
+        ExpressionAttributeValues={":t": f"{sub}#{gram}"},
+        ProjectionExpression="plot_id, tf",
+    )
+    return {int(r["plot_id"]): int(r["tf"]) for r in rows}
+
+
+def _search(sub: str, query: str, limit: int, work_id: int | None = None) -> dict:
+    grams = search.query_grams(query)
+    with ContextThreadPoolExecutor(max_workers=_SEARCH_WORKERS) as pool:
+        docs_future = pool.submit(_query_all, _search_table,
+                                  KeyConditionExpression="term_key = :t",
+                                  ExpressionAttributeValues={":t": f"{sub}#"})
+        postings = list(pool.map(lambda g: _search_postings(sub, g), grams))
+        docs = {int(d["plot_id"]): d for d in docs_future.result()}
+
+    n_docs = len(docs) or 1
+    avg_len = sum(int(d["doc_len"]) for d in docs.values()) / n_docs
+    candidates = set(docs)
+    for posting in postings:
+        candidates &= posting.keys()
+    if work_id is not None:
+        candidates = {p for p in candidates if docs[p].get("work_id") == work_id}
+
+    scores = {
+        p: sum(search.bm25(posting[p], len(posting), n_docs, int(docs[p]["doc_len"]), avg_len)
+               for posting in postings)
+        for p in candidates
+    }
+    top = sorted(scores, key=scores.get, reverse=True)[:limit]
+
+    # Snippets and titles only for the hits that are returned
+    def titles(pool, table, key_name, ids, projection):
+        keys = list(dict.fromkeys(ids))
+        items = pool.map(lambda i: table.get_item(Key={key_name: f"{sub}#{i}"},
+                                                  ProjectionExpression=projection).get("Item") or {}, keys)
+        return dict(zip(keys, items))
+
+    with ContextThreadPoolExecutor(max_workers=_SEARCH_WORKERS) as pool:
+        texts = dict(zip(top, pool.map(lambda p: _read_search_text(sub, p), top)))
+        ep_ids = [int(docs[p]["episode_id"]) for p in top if "episode_id" in docs[p]]
+        work_ids = [int(docs[p]["work_id"]) for p in top if "work_id" in docs[p]]
+        plot_items = titles(pool, _plots_table, "plot_id", top, "title")
+        ep_items = titles(pool, _episodes_table, "episode_id", ep_ids, "title")
+        work_items = titles(pool, _works_table, "work_id", work_ids, "title")
+
+    hits = []
+    for p in top:
+        doc = docs[p]
+        ep_id = int(doc["episode_id"]) if "episode_id" in doc else None
+        w_id = int(doc["work_id"]) if "work_id" in doc else None
+        hits.append({
+            "plot_id":       p,
+            "plot_title":    plot_items[p].get("title", ""),
+            "episode_id":    ep_id,
+            "episode_title": ep_items.get(ep_id, {}).get("title", ""),
+            "work_id":       w_id,
+            "work_title":    work_items.get(w_id, {}).get("title", ""),
+            "score":         round(scores[p], 4),
+            "exact":         search.find_phrase(texts[p], query) >= 0,
+            "snippet":       search.snippet(texts[p], query),
+        })
+    # Bigram matches can be scattered; exact phrase matches rank first.
+    hits.sort(key=lambda h: not h["exact"])
+    return {"query": query, "total": len(candidates), "hits": hits}
+
+# ---------------------------------------------------------------------------
+# Writing stats
+# ---------------------------------------------------------------------------
+# Each plot item carries `stats` for its own document. work_stats rows
+# (PK stats_key "{sub}#{work_id}", SK scope "work" | "episode#{id}") hold the
+# sums as flat counters and are kept current by ADDing the difference on
+# every save, so GET /works/{id}/stats is a single Query. Each ADD also bumps
+# the row's `rev`, which versions anything derived from the counters.
+
+_STATS_COUNTERS = ("plots", "chars", "chars_no_spaces", "words", "scenes")
+_STATS_DIALOGUE = "dialogue:"   # counter prefix for dialogue lines per character
+_STATS_WORKERS = 8
+
+
+def _plot_stats(doc: dict) -> dict:
+    """Length and structure counts of one TipTap document."""
+    nodes = doc.get("content") or []
+    text = _extract_plain_text(nodes, "\n")
+    dialogue: dict[str, int] = {}
+    scenes = 0
+
+    def walk(nodes):
+        nonlocal scenes
+        for node in nodes:
+            if node.get("type") == "sceneHeading":
+                scenes += 1
+            elif node.get("type") == "dialogue":
+                name = (node.get("attrs") or {}).get("characterName") or ""
+                if name and _extract_plain_text(node.get("content") or []).strip():
+                    dialogue[name] = dialogue.get(name, 0) + 1
+            elif node.get("content"):
+                walk(node["content"])
+
+    walk(nodes)
+    return {
+        "chars":           len(text.replace("\n", "")),
+        "chars_no_spaces": len("".join(text.split())),
+        "words":           len(text.split()),
+        "scenes":          scenes,
+        "dialogue":        dialogue,
+    }
+
+
+def _stats_counters(stats: dict | None) -> dict[str, int]:
+    if not stats:
+        return {}
+    counters = {"plots": 1, **{k: int(stats.get(k, 0)) for k in _STATS_COUNTERS if k != "plots"}}
+    for name, lines in (stats.get("dialogue") or {}).items():
+        counters[_STATS_DIALOGUE + name] = int(lines)
+    return counters
+
+
+def _stats_delta(old: dict | None, new: dict | None) -> dict[str, int]:
+    before, after = _stats_counters(old), _stats_counters(new)
+    delta = {k: after.get(k, 0) - before.get(k, 0) for k in before.keys() | after.keys()}
+    return {k: v for k, v in delta.items() if v}
+
+
+def _add_stats(sub: str, work_id: int, scope: str, delta: dict, must_exist: bool = False) -> None:
+    """ADD delta to one work_stats row. must_exist keeps a discount from
+    recreating a row that was already removed with its episode or work."""
+    if not delta:
+        return
+    names = {f"#s{i}": k for i, k in enumerate(delta)}
+    values = {f":s{i}": v for i, v in enumerate(delta.values())}
+    kwargs = {"ConditionExpression": "attribute_exists(stats_key)"} if must_exist else {}
+    try:
+        _stats_table.update_item(
+            Key={"stats_key": f"{sub}#{work_id}", "scope": scope},
+            UpdateExpression="ADD " + ", ".join(f"#s{i} :s{i}" for i in range(len(delta))) + ", rev :one",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={**values, ":one": 1},
+            **kwargs,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def _apply_stats_delta(sub: str, episode_id: int, delta: dict, must_exist: bool = False) -> None:
+    if not delta:
+        return
+    ep = _episodes_table.get_item(
+        Key={"episode_id": f"{sub}#{episode_id}"}, ProjectionExpression="work_id",
+    ).get("Item")
+    if not ep:
+        return
+    work_id = int(ep["work_id"])
+    _add_stats(sub, work_id, f"episode#{episode_id}", delta, must_exist)
+    _add_stats(sub, work_id, "work", delta, must_exist)
+
+
+def _discount_plot_stats(sub: str, plots: list[dict]) -> None:
+    """Subtract deleted plots (items with episode_id and stats) from the aggregates."""
+    per_episode: dict[int, dict] = {}
+    for plot in plots:
+        if not plot.get("stats") or "episode_id" not in plot:
+            continue
+        total = per_episode.setdefault(int(plot["episode_id"]), {})
+        for k, v in _stats_delta(plot["stats"], None).items():
+            total[k] = total.get(k, 0) + v
+    for episode_id, delta in per_episode.items():
+        _apply_stats_delta(sub, episode_id, delta, must_exist=True)
+
+
+def _discount_episode_stats(sub: str, work_id: int, episode_id: int) -> None:
+    row = _stats_table.delete_item(
+        Key={"stats_key": f"{sub}#{work_id}", "scope": f"episode#{episode_id}"},
+        ReturnValues="ALL_OLD",
+    ).get("Attributes")
+    if row:
+        delta = {k: -int(v) for k, v in row.items()
+                 if (k in _STATS_COUNTERS or k.startswith(_STATS_DIALOGUE)) and int(v)}
+        _add_stats(sub, work_id, "work", delta, must_exist=True)
+
+
+def _work_stats_rows(sub: str, work_id: int) -> list[dict]:
+    return _query_all(
+        _stats_table,
+        KeyConditionExpression="stats_key = :k",
+        ExpressionAttributeValues={":k": f"{sub}#{work_id}"},
+    )
+
+
+def _delete_work_stats(sub: str, work_id: int) -> int:
+    rows = _work_stats_rows(sub, work_id)
+    with _stats_table.batch_writer() as batch:
+        for row in rows:
+            batch.delete_item(Key={"stats_key": row["stats_key"], "scope": row["scope"]})
+    return len(rows)
+
+
+def _rebuild_work_stats(sub: str, work_id: int) -> dict:
+    """Recompute every plot's stats from S3 and replace the work's rows.
+
+    For plots saved before stats existed, or after the aggregates drifted.
+    """
+    rows: dict[str, dict] = {"work": {}}
+    plots = 0
+
+    def load(plot):
+        return plot, _plot_stats(_load_plot_doc(sub, plot["local_id"]))
+
+    with ContextThreadPoolExecutor(max_workers=_STATS_WORKERS) as pool:
+        for ep in _list_children("episode", sub, work_id):
+            ep_row = rows.setdefault(f"episode#{int(ep['local_id'])}", {})
+            for plot, stats in pool.map(load, _list_children("plot", sub, int(ep["local_id"]))):
+                _plots_table.update_item(
+                    Key={"plot_id": plot["plot_id"]},
+                    UpdateExpression="SET stats = :st",
+                    ExpressionAttributeValues={":st": stats},
+                )
+                for row in (ep_row, rows["work"]):
+                    for k, v in _stats_counters(stats).items():
+                        row[k] = row.get(k, 0) + v
+                plots += 1
+
+    existing = {row["scope"]: row for row in _work_stats_rows(sub, work_id)}
+    with _stats_table.batch_writer() as batch:
+        for scope in existing.keys() - rows.keys():
+            batch.delete_item(Key={"stats_key": f"{sub}#{work_id}", "scope": scope})
+        for scope, counters in rows.items():
+            # rev keeps counting up so versions derived from it never repeat
+            rev = int(existing.get(scope, {}).get("rev", 0)) + 1
+            batch.put_item(Item={"stats_key": f"{sub}#{work_id}", "scope": scope, **counters, "rev": rev})
+    return {"plots": plots, "episodes": len(rows) - 1}
+
+
+def _stats_view(row: dict) -> dict:
+    view = {k: int(row.get(k, 0)) for k in _STATS_COUNTERS}
+    dialogue = {k[len(_STATS_DIALOGUE):]: int(v) for k, v in row.items()
+                if k.startswith(_STATS_DIALOGUE) and int(v) > 0}
+    view["dialogue_lines"] = sum(dialogue.values())
+    view["dialogue"] = dict(sorted(dialogue.items(), key=lambda kv: -kv[1]))
+    return view
+
+# ---------------------------------------------------------------------------
+# Plot history
+# ---------------------------------------------------------------------------
+# Every content save is a version in plot_versions (key {sub}#{plot_id}, range
+# version). A version is either a checkpoint, whose full document is in S3 at
+# history/{sub}/{plot_id}/{version}.json, or a block delta (history.py) against
+# its "prev" version, stored inline. A chain holds fewer than
+# _HISTORY_CHECKPOINT_EVERY deltas, so any version is one Query, one S3 read
+# and a bounded number of delta applications away.
+
+_HISTORY_CHECKPOINT_EVERY = 20
+_HISTORY_DELTA_MAX_RATIO = 0.5        # a delta larger than this share of the document becomes a checkpoint
+_HISTORY_DELTA_MAX_BYTES = 64 * 1024  # items are capped at 400 KB
+_HISTORY_KEEP_RECENT = 50             # versions always kept
+_HISTORY_KEEP_DAYS = 90               # older versions: the last one of each day, up to this age
+_HISTORY_COMPACT_EVERY = 25           # compaction runs after every Nth version
+
+
+def _version_key(sub: str, plot_id) -> str:
+    return f"{sub}#{int(plot_id)}"
+
+
+def _checkpoint_s3_key(sub: str, plot_id, version) -> str:
+    return f"history/{sub}/{int(plot_id)}/{int(version)}.json"
+
+
+def _query_versions(sub: str, plot_id, low: int | None = None, high: int | None = None, **kwargs) -> list[dict]:
+    condition, values = "version_key = :k", {":k": _version_key(sub, plot_id)}
+    if low is not None:
+        condition += " AND #v BETWEEN :lo AND :hi"
+        values.update({":lo": low, ":hi": high})
+    names = {"#v": "version", **kwargs.pop("ExpressionAttributeNames", {})}
+    return _query_all(_versions_table, KeyConditionExpression=condition,
+                      ExpressionAttributeNames=names, ExpressionAttributeValues=values, **kwargs)
+
+
+def _load_checkpoint(item: dict) -> dict:
+    return json.loads(_s3.get_object(Bucket=_S3_BUCKET, Key=item["s3_key"])["Body"].read())
+
+
+def _materialize(chain: dict[int, dict], version: int) -> dict:
+    """Document of version; chain maps version -> item back to its checkpoint (KeyError otherwise)."""
+    deltas = []
+    while not chain[version].get("checkpoint"):
+        deltas.append(json.loads(chain[version]["delta"]))
+        version = int(chain[version]["prev"])
+    doc = _load_checkpoint(chain[version])
+    for delta in reversed(deltas):
+        doc = history.apply_delta(doc, delta)
+    return doc
+
+
+def _load_version(sub: str, plot_id: int, version: int) -> dict:
+    item = _versions_table.get_item(Key={"version_key": _version_key(sub, plot_id), "version": version}).get("Item")
+    if not item:
+        raise HTTPException(status_code=404, detail="버전을 찾을 수 없습니다.")
+    chain = {int(i["version"]): i for i in _query_versions(sub, plot_id, int(item["base"]), version)}
+    try:
+        return _materialize(chain, version)
+    except (KeyError, ClientError):
+        logger.error("Broken history chain for %s v%s:\n%s", _version_key(sub, plot_id), version,
+                     traceback.format_exc())
+        raise HTTPException(status_code=410, detail="이 버전은 더 이상 복원할 수 없습니다.")
+
+
+def _encode_version(item: dict, doc: dict, prev: dict | None, prev_doc: dict | None) -> str | None:
+    """Fill item in as a delta against prev, or return the checkpoint body to upload."""
+    body = json.dumps(doc, ensure_ascii=False)
+    if prev is not None and prev_doc is not None and int(prev["depth"]) + 1 < _HISTORY_CHECKPOINT_EVERY:
+        delta = json.dumps(history.make_delta(prev_doc, doc), ensure_ascii=False)
+        size = len(delta.encode())
+        if size <= _HISTORY_DELTA_MAX_BYTES and size <= _HISTORY_DELTA_MAX_RATIO * len(body.encode()):
+            item.update(checkpoint=False, base=int(prev["base"]), prev=int(prev["version"]),
+                        depth=int(prev["depth"]) + 1, delta=delta)
+            return None
+    item.update(checkpoint=True, base=int(item["version"]), depth=0)
+    return body
+
+
+def _record_version(sub: str, plot_id: int, version: int, doc: dict, saved_at: str) -> None:
+    """Store a saved document as version (allocated by _record_plot_content)."""
+    item = {"version_key": _version_key(sub, plot_id), "version": version, "saved_at": saved_at,
+            "doc_bytes": len(json.dumps(doc, ensure_ascii=False).encode()), "chars": _plot_stats(doc)["chars"]}
+    res = _versions_table.query(
+        KeyConditionExpression="version_key = :k AND #v < :n",
+        ExpressionAttributeNames={"#v": "version"},
+        ExpressionAttributeValues={":k": item["version_key"], ":n": version},
+        ScanIndexForward=False, Limit=1,
+    )
+    prev = (res.get("Items") or [None])[0]
+    prev_doc = None
+    if prev is not None and int(prev["depth"]) + 1 < _HISTORY_CHECKPOINT_EVERY:
+        try:
+            chain = {int(i["version"]): i for i in _query_versions(sub, plot_id, int(prev["base"]), int(prev["version"]))}
+            prev_doc = _materialize(chain, int(prev["version"]))
+        except (KeyError, ClientError):
+            logger.warning("History chain of %s broken before v%s; writing a checkpoint", item["version_key"], version)
+    checkpoint = _encode_version(item, doc, prev, prev_doc)
+    if checkpoint is not None:
+        item["s3_key"] = _checkpoint_s3_key(sub, plot_id, version)
+        _s3.put_object(Bucket=_S3_BUCKET, Key=item["s3_key"], Body=checkpoint, ContentType="application/json")
+    _versions_table.put_item(Item=item)
+    if version % _HISTORY_COMPACT_EVERY == 0:
+        _compact_history(sub, plot_id)
+
+
+def _retained_versions(items: list[dict], now: datetime) -> set[int]:
+    newest_first = sorted(items, key=lambda i: -int(i["version"]))
+    keep = {int(i["version"]) for i in newest_first[:_HISTORY_KEEP_RECENT]}
+    cutoff = now - timedelta(days=_HISTORY_KEEP_DAYS)
+    days = set()
+    for item in newest_first[_HISTORY_KEEP_RECENT:]:
+        saved = datetime.fromisoformat(item["saved_at"])
+        if saved >= cutoff and saved.date() not in days:
+            days.add(saved.date())
+            keep.add(int(item["version"]))
+    return keep
+
+
+def _compact_history(sub: str, plot_id: int) -> dict:
+    """Drop versions outside the retention policy and re-encode the survivors
+    so every delta points at a kept version and chains stay bounded."""
+    items = _query_versions(sub, plot_id)
+    by_version = {int(i["version"]): i for i in items}
+    keep = _retained_versions(items, datetime.now(timezone.utc))
+    if len(keep) == len(items):
+        return {"versions": len(items), "dropped": 0}
+
+    # Materialize in version order; a document is freed once nothing later needs it
+    refs = Counter(int(i["prev"]) for i in items if not i.get("checkpoint"))
+    docs: dict[int, dict] = {}
+    for version, item in sorted(by_version.items()):
+        try:
+            if item.get("checkpoint"):
+                docs[version] = _load_checkpoint(item)
+            else:
+                prev = int(item["prev"])
+                docs[version] = history.apply_delta(docs[prev], json.loads(item["delta"]))
+                refs[prev] -= 1
+                if refs[prev] == 0 and prev not in keep:
+                    del docs[prev]
+        except (KeyError, ClientError):
+            logger.warning("Dropping unrecoverable version %s of %s", version, _version_key(sub, plot_id))
+
+    final, rewritten, uploads = [], [], {}
+    prev = None
+    for version in sorted(keep & docs.keys()):
+        old = by_version[version]
+        item = {k: old[k] for k in ("version_key", "version", "saved_at", "doc_bytes", "chars") if k in old}
+        checkpoint = _encode_version(item, docs[version], prev, docs.get(int(prev["version"])) if prev else None)
+        if checkpoint is not None:
+            item["s3_key"] = _checkpoint_s3_key(sub, plot_id, version)
+            if not old.get("checkpoint"):
+                uploads[item["s3_key"]] = checkpoint
+        if any(str(old.get(k)) != str(item.get(k)) for k in ("checkpoint", "base", "prev", "depth", "delta")):
+            rewritten.append(item)
+        final.append(item)
+        prev = item
+
+    # New checkpoints first, so no rewritten item ever points at a missing object
+    for key, body in uploads.items():
+        _s3.put_object(Bucket=_S3_BUCKET, Key=key, Body=body, ContentType="application/json")
+    kept = {int(i["version"]) for i in final}
+    with _versions_table.batch_writer(overwrite_by_pkeys=["version_key", "version"]) as batch:
+        for item in rewritten:
+            batch.put_item(Item=item)
+        for version in by_version.keys() - kept:
+            batch.delete_item(Key={"version_key": _version_key(sub, plot_id), "version": version})
+    live = {i["s3_key"] for i in final if i["checkpoint"]}
+    _s3_delete_keys([i["s3_key"] for i in items if i.get("checkpoint") and i["s3_key"] not in live])
+    result = {"versions": len(kept), "dropped": len(by_version) - len(kept), "rewritten": len(rewritten)}
+    logger.info("History compaction for %s: %s", _version_key(sub, plot_id), result)
+    return result
+
+
+def _delete_history(sub: str, plot_ids: list[int]) -> int:
+    """Remove every version item and checkpoint of the given plots."""
+    deleted = 0
+    for plot_id in plot_ids:
+        items = _query_versions(sub, plot_id, ProjectionExpression="version_key, #v, s3_key")
+        with _versions_table.batch_writer(overwrite_by_pkeys=["version_key", "version"]) as batch:
+            for item in items:
+                batch.delete_item(Key={"version_key": item["version_key"], "version": item["version"]})
+        _s3_delete_keys([i["s3_key"] for i in items if i.get("s3_key")])
+        deleted += len(items)
+    return deleted
+
+# ---------------------------------------------------------------------------
+# Change feed
+# ---------------------------------------------------------------------------
+# Works, episodes, plots, characters and relations carry updated_at (set on
+# every write) and rev (bumped on every write). The sparse GSI on
+# (user_sub, updated_at) lets GET /changes query only what changed since a
+# cursor, and deletes leave a row in tombstones. A work or episode tombstone
+# stands for everything under it; cascades do not write one per child.
+
+_CHANGES_INDEX = storage.CHANGES_INDEX
+# feed name: (table global, key attribute)
+_CHANGE_KINDS = {
+    "works":      ("_works_table",      "work_id"),
+    "episodes":   ("_episodes_table",   "episode_id"),
+    "plots":      ("_plots_table",      "plot_id"),
+    "characters": ("_characters_table", "character_id"),
+    "relations":  ("_relations_table",  "relation_id"),
+}
+_CHANGES_OVERLAP = timedelta(seconds=5)  # a write stamped before a cursor can land after it
+_TOMBSTONE_DAYS = 30                     # tombstone TTL; older cursors get reset: true
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _stamp(item: dict) -> dict:
+    """Stamp an item about to be put."""
+    item["updated_at"] = _now()
+    item["rev"] = int(item.get("rev", 0)) + 1
+    return item
+
+
+def _stamped(update: dict) -> dict:
+    """update_item kwargs that also set updated_at and bump rev."""
+    expr = update["UpdateExpression"]
+    if re.search(r"\bSET\b", expr):
+        expr = re.sub(r"\bSET\b", "SET updated_at = :stamp_at,", expr, count=1)
+    else:
+        expr = f"SET updated_at = :stamp_at {expr}"
+    if re.search(r"\bADD\b", expr):
+        expr = re.sub(r"\bADD\b", "ADD rev :stamp_rev,", expr, count=1)
+    else:
+        expr = f"{expr} ADD rev :stamp_rev"
+    values = {**update.get("ExpressionAttributeValues", {}), ":stamp_at": _now(), ":stamp_rev": 1}
+    return {**update, "UpdateExpression": expr, "ExpressionAttributeValues": values}
+
+
+def _record_deletes(sub: str, deleted: list[tuple[str, int]]) -> None:
+    """Tombstones for (feed name, local id) pairs."""
+    if not deleted:
+        return
+    now = datetime.now(timezone.utc)
+    expires_at = int((now + timedelta(days=_TOMBSTONE_DAYS)).timestamp())
+    with _tombstones_table.batch_writer() as batch:
+        for kind, local_id in deleted:
+            batch.put_item(Item={
+                "user_sub":   sub,
+                "change_key": f"{now.isoformat()}#{kind}#{local_id}",
+                "kind":       kind,
+                "local_id":   int(local_id),
+                "deleted_at": now.isoformat(),
+                "expires_at": expires_at,
+            })
+
+
+def _changes_since(sub: str, since: datetime) -> dict:
+    """Items written and tombstones left after since (less the overlap).
+
+    An item deleted after its last write is left out, and so is a tombstone
+    older than the last write of an item re-created under the same id.
+    """
+    low = (since - _CHANGES_OVERLAP).astimezone(timezone.utc).isoformat()
+
+    def query(kind):
+        if kind is None:
+            return _query_all(
+                _tombstones_table,
+                KeyConditionExpression="user_sub = :s AND change_key > :c",
+                ExpressionAttributeValues={":s": sub, ":c": low},
+            )
+        return _query_all(
+            globals()[_CHANGE_KINDS[kind][0]],
+            IndexName=_CHANGES_INDEX,
+            KeyConditionExpression="user_sub = :s AND updated_at > :c",
+            ExpressionAttributeValues={":s": sub, ":c": low},
+        )
+
+    kinds = list(_CHANGE_KINDS)
+    with ContextThreadPoolExecutor(max_workers=len(kinds) + 1) as pool:
+        *written, tombstones = pool.map(query, [*kinds, None])
+
+    deleted_at: dict = {}
+    for row in tombstones:
+        key = (row["kind"], int(row["local_id"]))
+        deleted_at[key] = max(deleted_at.get(key, ""), row["deleted_at"])
+    written_at = {}
+    changes = {}
+    for kind, items in zip(kinds, written):
+        written_at.update({(kind, int(it["local_id"])): it["updated_at"] for it in items})
+        changes[kind] = [it for it in items if deleted_at.get((kind, int(it["local_id"])), "") < it["updated_at"]]
+    _attr_pointers(changes["works"] + changes["episodes"])
+    changes["deleted"] = [
+        {"kind": kind, "local_id": local_id, "deleted_at": at}
+        for (kind, local_id), at in sorted(deleted_at.items(), key=lambda kv: kv[1])
+        if written_at.get((kind, local_id), "") < at
+    ]
+    return changes
+
+# ---------------------------------------------------------------------------
+# Entity items
+# ---------------------------------------------------------------------------
+# Item / UpdateItem builders shared by the per-entity endpoints and POST /sync.
+
+
+def _work_item(sub: str, work_id: int, body: dict) -> dict:
+    return _stamp(_spill_item(sub, "works", work_id, {
+        "work_id":      f"{sub}#{work_id}",
+        "user_sub":     sub,
+        "local_id":     work_id,
+        "title":        body.get("title", ""),
+        "type":         body.get("type", "plot"),
+        "planning_doc": body.get("planning_doc", ""),
+        "created_at":   datetime.now(timezone.utc).isoformat(),
+        "episodes_keyed": True,
+    }))
+
+
+def _work_update(sub: str, work_id: int, body: dict) -> dict:
+    # large attributes are updated only when sent: a client that has not
+    # loaded a spilled value (see _attr_pointers) leaves it alone
+    large = {attr: body[attr] for attr in ("planning_doc", "work_summary") if attr in body}
+    sets, removes, large_values = _large_attr_update(sub, "works", work_id, large)
+    return {
+        "UpdateExpression": _update_expression(["title = :t", "#tp = :tp", *sets], removes),
+        "ExpressionAttributeNames": {"#tp": "type"},
+        "ExpressionAttributeValues": {
+            ":t": body.get("title", ""),
+            ":tp": body.get("type", "plot"),
+            **large_values,
+        },
+    }
+
+
+def _episode_item(sub: str, work_id: int, ep_id: int, body: dict, order_key: str) -> dict:
+    return _stamp({
+        "episode_id":  f"{sub}#{ep_id}",
+        "user_sub":    sub,
+        "local_id":    ep_id,
+        "work_id":     work_id,
+        "title":       body.get("title", ""),
+        "order_index": body.get("order_index", 0),
+        "parent_key":  f"{sub}#{work_id}",
+        "order_key":   order_key,
+        "plots_keyed": True,
+    })
+
+
+def _episode_update(sub: str, episode_id: int, body: dict) -> dict:
+    sets, removes, expr_values = ["title = :t", "order_index = :o"], [], {}
+    if "chapter_summary" in body:
+        sets_cs, removes, expr_values = _large_attr_update(
+            sub, "episodes", episode_id, {"chapter_summary": body["chapter_summary"]})
+        sets += sets_cs
+    return {
+        "UpdateExpression": _update_expression(sets, removes),
+        "ExpressionAttributeValues": {":t": body.get("title", ""), ":o": body.get("order_index", 0), **expr_values},
+    }
+
+
+def _plot_item(sub: str, episode_id: int, plot_id: int, body: dict, order_key: str) -> dict:
+    return _stamp({
+        "plot_id":     f"{sub}#{plot_id}",
+        "user_sub":    sub,
+        "local_id":    plot_id,
+        "episode_id":  episode_id,
+        "title":       body.get("title", ""),
+        "order_index": body.get("order_index", 0),
+        "parent_key":  f"{sub}#{episode_id}",
+        "order_key":   order_key,
+    })
+
+
+def _plot_update(sub: str, plot_id: int, body: dict) -> dict:
+    return {
+        "UpdateExpression": "SET title = :t, order_index = :o",
+        "ExpressionAttributeValues": {":t": body.get("title", ""), ":o": body.get("order_index", 0)},
+    }
+
+
+# A create can arrive again (an idempotency-key miss, a /sync replay). A put
+# would then drop what the create does not carry: stats, content pointers,
+# history counters, spilled-attribute pointers and summaries. Creates of
+# works, episodes and plots are conditional puts that fall back to updating
+# the metadata, leaving large attributes as they are.
+
+def _recreate_update(update_builder, sub: str, local_id: int, body: dict) -> dict:
+    return update_builder(sub, local_id, {k: v for k, v in body.items() if k not in _LARGE_ATTRS})
+
+
+def _put_created(table, key_name: str, item: dict, update: dict) -> None:
+    try:
+        table.put_item(Item=item, ConditionExpression=f"attribute_not_exists({key_name})")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        _update_entity(table, {key_name: item[key_name]}, update)
+
+
+def _character_item(sub: str, work_id: int, char_id: int, body: dict) -> dict:
+    return _stamp({
+        "character_id": f"{sub}#{char_id}",
+        "user_sub":     sub,
+        "local_id":     char_id,
+        "work_id":      work_id,
+        "name":         body.get("name", ""),
+        "color":        body.get("color", ""),
+        "properties":   body.get("properties", "{}"),
+        "memo":         body.get("memo", ""),
+    })
+
+
+def _character_update(sub: str, char_id: int, body: dict) -> dict:
+    return {
+        "UpdateExpression": "SET #n = :n, color = :c, properties = :p, memo = :m, ai_summary = :a",
+        "ExpressionAttributeNames": {"#n": "name"},
+        "ExpressionAttributeValues": {
+            ":n": body.get("name", ""), ":c": body.get("color", ""),
+            ":p": body.get("properties", "{}"), ":m": body.get("memo", ""),
+            ":a": body.get("ai_summary", ""),
+        },
+    }
+
 
+def _relation_item(sub: str, work_id: int, rel_id: int, body: dict) -> dict:
+    return _stamp({
+        "relation_id":       f"{sub}#{rel_id}",
+        "user_sub":          sub,
+        "local_id":          rel_id,
+        "work_id":           work_id,
+        "from_character_id": body.get("from_character_id"),
+        "to_character_id":   body.get("to_character_id"),
+        "relation_name":     body.get("relation_name", ""),
+    })
 
 # ---------------------------------------------------------------------------
-# App setup
+# Work duplication
 # ---------------------------------------------------------------------------
-
-app = FastAPI(title="Plot Editor Auth")
+# POST /works/{id}/duplicate copies a work, its episodes, plots, characters,
+# relations, graph layout and stats rows under new ids. Items are written with
+# BatchWriteItem (batch_writer), one table per thread. Plot documents stored
+# as chunks only gain a manifest and chunk references. Other objects (older
+# plot documents, spilled attributes) are copied with CopyObject on
+# _DUPLICATE_WORKERS threads. No document passes through the function. The
+# work item is written last, so an interrupted copy is never listed; its
+# leftovers are orphans for _sweep_orphans. Plot history is not copied, and
+# search postings are built after the response.
+#
+# New ids come from a per-user counter starting at _SERVER_ID_BASE, far above
+# the client's Date.now() ids and still exact in a JS number.
+
+_SERVER_ID_BASE = 2 ** 52
+_DUPLICATE_WORKERS = 8
+
+
+def _allocate_ids(sub: str, count: int) -> int:
+    """The first of count consecutive new ids for sub."""
+    end = _users_table.update_item(
+        Key={"sub": sub},
+        UpdateExpression="ADD server_ids :n",
+        ExpressionAttributeValues={":n": count},
+        ReturnValues="UPDATED_NEW",
+    )["Attributes"]["server_ids"]
+    return _SERVER_ID_BASE + int(end) - count
+
+
+def _copy_attr_refs(sub: str, kind: str, local_id: int, item: dict) -> list[tuple[str, str]]:
+    """Point item's spilled attributes at copies under local_id. Returns the
+    (source, target) keys to copy."""
+    copies = []
+    for attr in _LARGE_ATTRS:
+        ref = item.get(_attr_ref(attr))
+        if isinstance(ref, dict):
+            target = _attr_prefix(sub, kind, local_id) + ref["key"].rsplit("/", 1)[1]
+            copies.append((ref["key"], target))
+            item[_attr_ref(attr)] = {**ref, "key": target}
+    return copies
+
+
+def _copy_object(source: str, target: str) -> bool:
+    try:
+        _s3.copy_object(Bucket=_S3_BUCKET, Key=target, CopySource={"Bucket": _S3_BUCKET, "Key": source})
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return False
+        raise
+    return True
 
 
-from fastapi import Request as _Request
-from fastapi.responses import JSONResponse
+def _batch_put(table, items: list[dict]) -> int:
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    return len(items)
 
 
-@app.exception_handler(Exception)
-async def _unhandled_exception_handler(request: _Request, exc: Exception):
-    logger.error(
-        "Unhandled exception: %s %s\n%s",
-        request.method,
-        request.url.path,
-        traceback.format_exc(),
+def _duplicate_work(sub: str, work: dict, title: str) -> dict:
+    """Copy work (its item) and everything under it; see the section comment."""
+    work_id = int(work["local_id"])
+    episodes = _list_children("episode", sub, work_id)
+    characters = _scan_all(
+        _characters_table,
+        FilterExpression="user_sub = :s AND work_id = :w",
+        ExpressionAttributeValues={":s": sub, ":w": work_id},
     )
-    return JSONResponse(status_code=500, content={"detail": str(exc)})
-
+    relations = _scan_all(
+        _relations_table,
+        FilterExpression="user_sub = :s AND work_id = :w",
+        ExpressionAttributeValues={":s": sub, ":w": work_id},
+    )
+    layout = _graph_table.get_item(Key={"layout_id": f"{sub}#{work_id}"}).get("Item")
+    with ContextThreadPoolExecutor(max_workers=_DUPLICATE_WORKERS) as pool:
+        plots = [p for ps in pool.map(lambda ep: _list_children("plot", sub, int(ep["local_id"])), episodes)
+                 for p in ps]
+        manifests = dict(zip(
+            (int(p["local_id"]) for p in plots),
+            pool.map(lambda p: _manifests_table.get_item(
+                Key={"manifest_key": _manifest_key(sub, "plot", p["local_id"])}).get("Item"), plots),
+        ))
+
+    next_id = _allocate_ids(sub, 1 + len(episodes) + len(plots) + len(characters) + len(relations))
+    new_work_id = next_id
+    ids: dict[str, dict[int, int]] = {}
+    for kind, items in (("episodes", episodes), ("plots", plots), ("characters", characters),
+                        ("relations", relations)):
+        ids[kind] = {int(item["local_id"]): next_id + 1 + i for i, item in enumerate(items)}
+        next_id += len(items)
+
+    copies: list[tuple[str, str]] = []
+    now = _now()
+
+    def copy(item: dict, key_name: str, local_id: int, **changes) -> dict:
+        new = {**item, key_name: f"{sub}#{local_id}", "local_id": local_id, "created_at": now, **changes}
+        new.pop("rev", None)
+        return _stamp(new)
+
+    new_work = copy(work, "work_id", new_work_id, title=title)
+    copies += _copy_attr_refs(sub, "works", new_work_id, new_work)
+    new_episodes = []
+    for ep in episodes:
+        new_id = ids["episodes"][int(ep["local_id"])]
+        new_episodes.append(copy(ep, "episode_id", new_id, work_id=new_work_id, parent_key=f"{sub}#{new_work_id}"))
+        copies += _copy_attr_refs(sub, "episodes", new_id, new_episodes[-1])
+    new_plots, new_manifests, references = [], [], Counter()
+    for plot in plots:
+        old_id, new_id = int(plot["local_id"]), ids["plots"][int(plot["local_id"])]
+        new_ep = ids["episodes"][int(plot["episode_id"])]
+        new_plot = copy(plot, "plot_id", new_id, episode_id=new_ep, parent_key=f"{sub}#{new_ep}")
+        new_plot.pop("history_version", None)       # the copy starts its own history
+        if "content_s3_key" in new_plot:
+            new_plot["content_s3_key"] = _plot_s3_key(sub, new_id)
+        new_plots.append(new_plot)
+        manifest = manifests[old_id]
+        if manifest is None:
+            copies.append((_plot_s3_key(sub, old_id), _plot_s3_key(sub, new_id)))
+        else:
+            new_manifests.append({**manifest, "manifest_key": _manifest_key(sub, "plot", new_id), "saved_at": now})
+            references.update(set(manifest["chunks"]))
+    new_characters = [copy(c, "character_id", ids["characters"][int(c["local_id"])], work_id=new_work_id)
+                      for c in characters]
+    chars = ids["characters"]
+
+    def remap(character_id):
+        return chars.get(int(character_id), character_id) if character_id is not None else None
+
+    new_relations = [
+        copy(r, "relation_id", ids["relations"][int(r["local_id"])], work_id=new_work_id,
+             **{k: remap(r[k]) for k in ("from_character_id", "to_character_id") if k in r})
+        for r in relations
+    ]
+    stats_rows = []
+    for row in _work_stats_rows(sub, work_id):
+        scope = row["scope"]
+        if scope.startswith("episode#"):
+            old_ep = int(scope.split("#", 1)[1])
+            if old_ep not in ids["episodes"]:
+                continue
+            scope = f"episode#{ids['episodes'][old_ep]}"
+        stats_rows.append({**row, "stats_key": f"{sub}#{new_work_id}", "scope": scope})
+
+    # Chunk references first, so no manifest ever names an unreferenced chunk.
+    _each_chunk(_reference_chunk, [(sub, h, n) for h, n in references.items()])
+    with ContextThreadPoolExecutor(max_workers=_DUPLICATE_WORKERS) as pool:
+        writes = [
+            pool.submit(_batch_put, _episodes_table, new_episodes),
+            pool.submit(_batch_put, _plots_table, new_plots),
+            pool.submit(_batch_put, _characters_table, new_characters),
+            pool.submit(_batch_put, _relations_table, new_relations),
+            pool.submit(_batch_put, _manifests_table, new_manifests),
+            pool.submit(_batch_put, _stats_table, stats_rows),
+        ]
+        copied = sum(pool.map(lambda c: _copy_object(*c), copies))
+        for write in writes:
+            write.result()
+    if layout:
+        positions = {str(remap(node_id)): pos for node_id, pos in (layout.get("positions") or {}).items()}
+        _graph_table.put_item(Item={**{k: v for k, v in layout.items() if k not in ("auto_key", "auto_positions")},
+                                    "layout_id": f"{sub}#{new_work_id}", "positions": positions,
+                                    "updated_at": now})
+    _works_table.put_item(Item=new_work)
+    return {
+        "work_id": new_work_id,
+        "ids": {kind: {str(old): new for old, new in m.items()} for kind, m in ids.items()},
+        "copied": {"episodes": len(new_episodes), "plots": len(new_plots), "characters": len(new_characters),
+                   "relations": len(new_relations), "chunked_documents": len(new_manifests),
+                   "s3_objects": copied},
+    }
 
-_allowed_origins = [o.strip() for o in os.getenv(
-    "ALLOWED_ORIGINS",
-    "http://localhost:1420,http://localhost:5173,https://plot-editor.vercel.app",
-).split(",") if o.strip()]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=_allowed_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-app.add_middleware(
-    SessionMiddleware,
-    secret_key=_require_env("SECRET_KEY"),
-    same_site="none",
-    https_only=True,
-)
+def _index_plots(sub: str, plot_ids: list[int]) -> None:
+    with ContextThreadPoolExecutor(max_workers=_DUPLICATE_WORKERS) as pool:
+        list(pool.map(lambda plot_id: _index_plot(sub, plot_id, _load_plot_doc(sub, plot_id)), plot_ids))
 
 # ---------------------------------------------------------------------------
-# Cognito OIDC client
+# Coalescing and idempotency keys
 # ---------------------------------------------------------------------------
+# @_single_flight: concurrent identical requests (same route, user, path,
+# query and body) in this process share one execution, e.g. a double-clicked
+# summarize or a document opened in two tabs.
+# @_idempotent: a create repeated with the same Idempotency-Key header gets
+# the first response back instead of running again, across processes. The
+# key is claimed with a conditional put before the handler runs; a repeat
+# that arrives while the first is still running gets 409 and Retry-After.
 
-_region = _require_env("COGNITO_REGION")
-_pool_id = _require_env("COGNITO_USER_POOL_ID")
-_metadata_url = (
-    f"https://cognito-idp.{_region}.amazonaws.com/{_pool_id}"
-    "/.well-known/openid-configuration"
-)
+_IDEMPOTENCY_TTL = timedelta(hours=24)
+_IDEMPOTENCY_PENDING = timedelta(seconds=60)   # a claim older than this was abandoned
 
-oauth = OAuth()
-oauth.register(
-    name="oidc",
-    client_id=_require_env("COGNITO_CLIENT_ID"),
-    client_secret=_require_env("COGNITO_CLIENT_SECRET"),
-    server_metadata_url=_metadata_url,
-    client_kwargs={"scope": "phone openid email"},
-)
+_flights = resilience.SingleFlight()
 
-# ---------------------------------------------------------------------------
-# DynamoDB
-# ---------------------------------------------------------------------------
 
-_dynamodb = boto3.resource("dynamodb", region_name=_region)
-_users_table      = _dynamodb.Table("users")
-_works_table      = _dynamodb.Table("works")
-_episodes_table   = _dynamodb.Table("episodes")
-_plots_table      = _dynamodb.Table("plots")
-_characters_table = _dynamodb.Table("characters")
-_relations_table  = _dynamodb.Table("character_relations")
-_graph_table      = _dynamodb.Table("graph_layouts")
-_posts_table      = _dynamodb.Table("posts")
-_comments_table   = _dynamodb.Table("comments")
-
-_s3 = boto3.client("s3", region_name=_region)
-_S3_BUCKET = os.getenv("S3_BUCKET", "")
+def _request_sub(request: Request) -> str | None:
+    try:
+        return _require_login(request)
+    except HTTPException:
+        return None
+
+
+def _single_flight(handler):
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        request = kwargs["request"]
+        body = await request.body()
+        key = (handler.__name__, _request_sub(request), request.url.path, str(request.query_params),
+               hashlib.sha256(body).hexdigest() if body else "")
+        if key in _flights:
+            telemetry.METRICS.inc("coalesced_requests_total", {"handler": handler.__name__})
+        return await _flights.do(key, lambda: handler(*args, **kwargs))
+    return wrapper
+
+
+def _claim_idempotency_key(key: str, fingerprint: str) -> dict | None:
+    """Claim key for this request, or return the record of an earlier one with it."""
+    now = datetime.now(timezone.utc)
+    try:
+        _idempotency_table.put_item(
+            Item={"idem_key": key, "fingerprint": fingerprint, "state": "pending",
+                  "expires_at": int((now + _IDEMPOTENCY_PENDING).timestamp())},
+            ConditionExpression="attribute_not_exists(idem_key) OR expires_at < :now",
+            ExpressionAttributeValues={":now": int(now.timestamp())},
+        )
+        return None
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    record = _idempotency_table.get_item(Key={"idem_key": key}, ConsistentRead=True).get("Item") or {}
+    if record.get("fingerprint") != fingerprint:
+        raise HTTPException(status_code=422, detail="같은 Idempotency-Key 가 다른 요청에 사용되었습니다.")
+    if record.get("state") != "done":
+        raise HTTPException(status_code=409, detail="같은 요청을 처리하고 있습니다. 잠시 후 다시 시도하세요.",
+                            headers={"Retry-After": "1"})
+    return record
+
+
+def _release_idempotency_key(key: str) -> None:
+    """Drop a claim whose request will not be recorded, so a retry runs it."""
+    try:
+        _idempotency_table.delete_item(Key={"idem_key": key})
+    except Exception:
+        logger.warning("Releasing idempotency key %s failed:\n%s", key, traceback.format_exc())
+
+
+def _response_body(result) -> str:
+    """The JSON a route sends for result, encoded the way FastAPI does it."""
+    if isinstance(result, Response):
+        return bytes(result.body).decode()
+    return _JSONResponse(content=jsonable_encoder(result)).body.decode()
+
+
+def _idempotent(handler):
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        request = kwargs["request"]
+        idem_key = request.headers.get("Idempotency-Key", "").strip()
+        sub = _request_sub(request)
+        if not idem_key or sub is None:
+            return await handler(*args, **kwargs)
+        if len(idem_key) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key 는 255자 이하여야 합니다.")
+        body = await request.body()
+        fingerprint = hashlib.sha256(f"{request.method} {request.url.path}\n".encode() + body).hexdigest()
+        key = f"{sub}#{idem_key}"
+
+        async def execute():
+            record = await run_in_threadpool(_claim_idempotency_key, key, fingerprint)
+            if record is not None:
+                return _JSONResponse(content=orjson.loads(record["response"]),
+                                     headers={"Idempotent-Replayed": "true"})
+            try:
+                result = await handler(*args, **kwargs)
+                response = _response_body(result)
+            except BaseException:
+                await run_in_threadpool(_release_idempotency_key, key)
+                raise
+            try:
+                await run_in_threadpool(_idempotency_table.put_item, Item={
+                    "idem_key":    key,
+                    "fingerprint": fingerprint,
+                    "state":       "done",
+                    "response":    response,
+                    "expires_at":  int((datetime.now(timezone.utc) + _IDEMPOTENCY_TTL).timestamp()),
+                })
+            except Exception:
+                # the request did happen; a retry runs it again instead of waiting on the claim
+                logger.warning("Recording idempotency key %s failed:\n%s", key, traceback.format_exc())
+                await run_in_threadpool(_release_idempotency_key, key)
+            return result
+
+        return await _flights.do(("idempotent", key, fingerprint), execute)
+    return wrapper
 
 # ---------------------------------------------------------------------------
 # Routes
@@ -237,29 +2454,35 @@ async def me(request: Request):
 # ── Works ──────────────────────────────────────────────────────────────────
 
 @app.get("/works")
-async def get_works(request: Request):
+async def get_works(request: Request, fields: str | None = None):
     sub = _require_login(request)
+    fields = _parse_fields(fields)
     res = _works_table.scan(
         FilterExpression="user_sub = :s",
         ExpressionAttributeValues={":s": sub},
+        **_projection(fields),
     )
-    return res.get("Items", [])
+    return _JSONResponse(_attr_pointers(_select_fields(res.get("Items", []), fields)))
+
+
+@app.get("/works/{work_id}")
+async def get_work(work_id: int, request: Request):
+    """One work with its large attributes (planning_doc, work_summary)."""
+    sub = _require_login(request)
+    work = _works_table.get_item(Key={"work_id": f"{sub}#{work_id}"}).get("Item")
+    if not work:
+        raise HTTPException(status_code=404, detail="작품을 찾을 수 없습니다.")
+    return _JSONResponse((await run_in_threadpool(_hydrate_attrs, [work]))[0])
 
 
 @app.post("/works")
+@_idempotent
 async def create_work(request: Request):
     sub = _require_login(request)
     body = await request.json()
     work_id = body["work_id"]
-    _works_table.put_item(Item={
-        "work_id":      f"{sub}#{work_id}",
-        "user_sub":     sub,
-        "local_id":     work_id,
-        "title":        body.get("title", ""),
-        "type":         body.get("type", "plot"),
-        "planning_doc": body.get("planning_doc", ""),
-        "created_at":   datetime.now(timezone.utc).isoformat(),
-    })
+    _put_created(_works_table, "work_id", _work_item(sub, work_id, body),
+                 _recreate_update(_work_update, sub, work_id, body))
     return {"ok": True}
 
 
@@ -267,25 +2490,12 @@ async def create_work(request: Request):
 async def update_work(work_id: int, request: Request):
     sub = _require_login(request)
     body = await request.json()
-    update_expr = "SET title = :t, #tp = :tp, planning_doc = :pd"
-    expr_values = {
-        ":t": body.get("title", ""),
-        ":tp": body.get("type", "plot"),
-        ":pd": body.get("planning_doc", ""),
-    }
-    if "work_summary" in body:
-        update_expr += ", work_summary = :ws"
-        expr_values[":ws"] = body["work_summary"]
-    _works_table.update_item(
-        Key={"work_id": f"{sub}#{work_id}"},
-        UpdateExpression=update_expr,
-        ExpressionAttributeNames={"#tp": "type"},
-        ExpressionAttributeValues=expr_values,
-    )
+    _update_entity(_works_table, {"work_id": f"{sub}#{work_id}"}, _work_update(sub, work_id, body))
     return {"ok": True}
 
 
 @app.post("/works/{work_id}/summarize")
+@_single_flight
 async def summarize_work(work_id: int, request: Request):
     sub = _require_login(request)
 
@@ -300,22 +2510,13 @@ async def summarize_work(work_id: int, request: Request):
     work_type = (work_item or {}).get("type", "novel")
 
     # Collect episode list (needed for both types)
-    eps_res = _episodes_table.scan(
-        FilterExpression="user_sub = :s AND work_id = :w",
-        ExpressionAttributeValues={":s": sub, ":w": work_id},
-    )
-    episodes = sorted(eps_res.get("Items", []), key=lambda x: x.get("order_index", 0))
+    episodes = _list_children("episode", sub, work_id)
 
     if work_type == "plot":
         # Collect plot_summary from all plots of this work
         plot_summaries = []
         for ep in episodes:
-            ep_local_id = int(ep.get("local_id", 0))
-            plots_res = _plots_table.scan(
-                FilterExpression="user_sub = :s AND episode_id = :e",
-                ExpressionAttributeValues={":s": sub, ":e": ep_local_id},
-            )
-            ep_plots = sorted(plots_res.get("Items", []), key=lambda x: x.get("order_index", 0))
+            ep_plots = _list_children("plot", sub, int(ep.get("local_id", 0)))
             for plot in ep_plots:
                 ps = (plot.get("plot_summary") or "").strip()
                 if ps:
@@ -336,7 +2537,7 @@ async def summarize_work(work_id: int, request: Request):
     else:
         # Novel: collect chapter_summary from episodes
         chapter_summaries = []
-        for ep in episodes:
+        for ep in _hydrate_attrs(episodes):
             summary = ep.get("chapter_summary", "").strip()
             if summary:
                 chapter_summaries.append(f"[{ep.get('title', '챕터')}]\n{summary}")
@@ -353,64 +2554,102 @@ async def summarize_work(work_id: int, request: Request):
             system_prompt = "주어진 각 챕터 요약을 읽고, 이 작품 전체의 줄거리와 핵심 흐름을 간결하게 요약하세요."
             user_content = context
 
-    openai_key = os.getenv("OPENAI_API_KEY", "")
-    if not openai_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY 가 설정되지 않았습니다.")
+    summary = await _llm_invoke(system_prompt, user_content)
 
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import SystemMessage, HumanMessage
+    # Save to DynamoDB (or S3 when long, see _spill_attr)
+    _set_large_attr(_works_table, {"work_id": f"{sub}#{work_id}"}, sub, "works", work_id, "work_summary", summary)
+
+    return {"summary": summary}
 
-    llm = ChatOpenAI(model="gpt-4o-mini", api_key=openai_key)
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=user_content),
+
+@app.get("/works/{work_id}/stats")
+async def get_work_stats(work_id: int, request: Request):
+    """Totals for the work and per episode: plots, chars, chars_no_spaces,
+    words, scenes, dialogue_lines and dialogue lines per character."""
+    sub = _require_login(request)
+    rows = {row["scope"]: row for row in _work_stats_rows(sub, work_id)}
+    episodes = [
+        {"episode_id": int(scope.split("#", 1)[1]), **_stats_view(row)}
+        for scope, row in rows.items() if scope.startswith("episode#")
     ]
-    response = await llm.ainvoke(messages)
-    summary = response.content
-
-    # Save to DynamoDB
-    _works_table.update_item(
-        Key={"work_id": f"{sub}#{work_id}"},
-        UpdateExpression="SET work_summary = :ws",
-        ExpressionAttributeValues={":ws": summary},
-    )
+    return {"work": _stats_view(rows.get("work", {})), "episodes": episodes}
 
-    return {"summary": summary}
+
+@app.post("/works/{work_id}/stats/rebuild")
+async def rebuild_work_stats(work_id: int, request: Request):
+    sub = _require_login(request)
+    if not _works_table.get_item(Key={"work_id": f"{sub}#{work_id}"}).get("Item"):
+        raise HTTPException(status_code=404, detail="작품을 찾을 수 없습니다.")
+    return {"ok": True, **await run_in_threadpool(_rebuild_work_stats, sub, work_id)}
 
 
 @app.delete("/works/{work_id}")
-async def delete_work(work_id: int, request: Request):
+async def delete_work(work_id: int, request: Request, background_tasks: BackgroundTasks):
     sub = _require_login(request)
+    await _flush_plot_writes(sub)
     _works_table.delete_item(Key={"work_id": f"{sub}#{work_id}"})
+    _record_deletes(sub, [("works", work_id)])
+    # Children (episodes, plots, S3 documents, characters, relations, layout) are
+    # removed after the response is sent.
+    _defer(background_tasks, [(_cascade_delete_work, sub, work_id)])
     return {"ok": True}
 
 
+@app.post("/works/{work_id}/duplicate")
+@_idempotent
+async def duplicate_work(work_id: int, request: Request, background_tasks: BackgroundTasks):
+    """Copy a work and everything in it under new ids. Body (optional):
+    {"title"}. Returns the new work_id and the old -> new id of every copy."""
+    sub = _require_login(request)
+    body = await request.json() if await request.body() else {}
+    work = _works_table.get_item(Key={"work_id": f"{sub}#{work_id}"}).get("Item")
+    if not work:
+        raise HTTPException(status_code=404, detail="작품을 찾을 수 없습니다.")
+    await _flush_plot_writes(sub)
+    title = body.get("title") or f"{work.get('title', '')} (사본)"
+    result = await run_in_threadpool(_duplicate_work, sub, work, title)
+    background_tasks.add_task(_index_plots, sub, list(result["ids"]["plots"].values()))
+    return {"ok": True, **result}
+
+
 # ── Episodes ───────────────────────────────────────────────────────────────
 
 @app.get("/works/{work_id}/episodes")
-async def get_episodes(work_id: int, request: Request):
+async def get_episodes(work_id: int, request: Request, fields: str | None = None):
     sub = _require_login(request)
-    res = _episodes_table.scan(
-        FilterExpression="user_sub = :s AND work_id = :w",
-        ExpressionAttributeValues={":s": sub, ":w": work_id},
-    )
-    items = sorted(res.get("Items", []), key=lambda x: x.get("order_index", 0))
-    return items
+    fields = _parse_fields(fields)
+    episodes = _list_children("episode", sub, work_id, fields)
+    return _JSONResponse(_attr_pointers(_select_fields(episodes, fields)))
+
+
+@app.get("/episodes/{episode_id}")
+async def get_episode(episode_id: int, request: Request):
+    """One episode with its chapter_summary."""
+    sub = _require_login(request)
+    episode = _episodes_table.get_item(Key={"episode_id": f"{sub}#{episode_id}"}).get("Item")
+    if not episode:
+        raise HTTPException(status_code=404, detail="에피소드를 찾을 수 없습니다.")
+    return _JSONResponse((await run_in_threadpool(_hydrate_attrs, [episode]))[0])
+
+
+@app.put("/works/{work_id}/episodes/order")
+async def reorder_episodes(work_id: int, request: Request):
+    """Body: {"ids": [episode ids in display order]}. Only moved episodes are written."""
+    sub = _require_login(request)
+    body = await request.json()
+    result = await run_in_threadpool(_reorder_children, "episode", sub, work_id, body.get("ids") or [])
+    return {"ok": True, **result}
 
 
 @app.post("/works/{work_id}/episodes")
+@_idempotent
 async def create_episode(work_id: int, request: Request):
     sub = _require_login(request)
     body = await request.json()
-    ep_id = body["episode_id"]
-    _episodes_table.put_item(Item={
-        "episode_id":  f"{sub}#{ep_id}",
-        "user_sub":    sub,
-        "local_id":    ep_id,
-        "work_id":     work_id,
-        "title":       body.get("title", ""),
-        "order_index": body.get("order_index", 0),
-    })
+    episode_id = body["episode_id"]
+    order_key = _creation_keys("episode", sub, work_id, [(episode_id, body.get("order_index", 0))])[episode_id]
+    _put_created(_episodes_table, "episode_id", _episode_item(sub, work_id, episode_id, body, order_key),
+                 _recreate_update(_episode_update, sub, episode_id, body))
     return {"ok": True}
 
 
@@ -418,20 +2657,13 @@ async def create_episode(work_id: int, request: Request):
 async def update_episode(episode_id: int, request: Request):
     sub = _require_login(request)
     body = await request.json()
-    update_expr = "SET title = :t, order_index = :o"
-    expr_values = {":t": body.get("title", ""), ":o": body.get("order_index", 0)}
-    if "chapter_summary" in body:
-        update_expr += ", chapter_summary = :cs"
-        expr_values[":cs"] = body["chapter_summary"]
-    _episodes_table.update_item(
-        Key={"episode_id": f"{sub}#{episode_id}"},
-        UpdateExpression=update_expr,
-        ExpressionAttributeValues=expr_values,
-    )
+    _update_entity(_episodes_table, {"episode_id": f"{sub}#{episode_id}"},
+                   _episode_update(sub, episode_id, body))
     return {"ok": True}
 
 
 @app.post("/episodes/{episode_id}/summarize")
+@_single_flight
 async def summarize_chapter(episode_id: int, request: Request):
     sub = _require_login(request)
 
@@ -443,21 +2675,15 @@ async def summarize_chapter(episode_id: int, request: Request):
         raise HTTPException(status_code=404, detail="챕터를 찾을 수 없습니다.")
 
     # Find the plot for this episode
-    plots_res = _plots_table.scan(
-        FilterExpression="user_sub = :s AND episode_id = :e",
-        ExpressionAttributeValues={":s": sub, ":e": episode_id},
-    )
-    plots = plots_res.get("Items", [])
+    plots = _list_children("plot", sub, episode_id)
     if not plots:
         raise HTTPException(status_code=404, detail="챕터 내용이 없습니다.")
 
     # Collect all text from S3
     chapter_text = ""
     for plot in plots:
-        s3_key = f"plots/{sub}/{int(plot['local_id'])}.json"
         try:
-            obj = _s3.get_object(Bucket=_S3_BUCKET, Key=s3_key)
-            content = json.loads(obj["Body"].read())
+            content = _load_plot_doc(sub, plot["local_id"])
             chapter_text += _extract_plain_text(content.get("content", []))
         except Exception:
             logger.warning("Chapter text extraction failed for plot %s", plot.get("local_id"))
@@ -465,187 +2691,440 @@ async def summarize_chapter(episode_id: int, request: Request):
     if not chapter_text.strip():
         raise HTTPException(status_code=400, detail="챕터에 내용이 없습니다.")
 
-    openai_key = os.getenv("OPENAI_API_KEY", "")
-    if not openai_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY 가 설정되지 않았습니다.")
+    summary = await _llm_invoke(
+        "주어진 소설 챕터 내용을 읽고, 이 챕터에서 벌어진 주요 사건을 4~5줄로 간결하게 요약하세요.",
+        chapter_text.strip(),
+    )
 
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import SystemMessage, HumanMessage
+    # Save to DynamoDB (or S3 when long, see _spill_attr)
+    _set_large_attr(_episodes_table, {"episode_id": f"{sub}#{episode_id}"}, sub, "episodes", episode_id,
+                    "chapter_summary", summary)
 
-    llm = ChatOpenAI(model="gpt-4o-mini", api_key=openai_key)
-    messages = [
-        SystemMessage(content="주어진 소설 챕터 내용을 읽고, 이 챕터에서 벌어진 주요 사건을 4~5줄로 간결하게 요약하세요."),
-        HumanMessage(content=chapter_text.strip()),
-    ]
-    response = await llm.ainvoke(messages)
-    summary = response.content
-
-    # Save to DynamoDB
-    _episodes_table.update_item(
-        Key={"episode_id": f"{sub}#{episode_id}"},
-        UpdateExpression="SET chapter_summary = :cs",
-        ExpressionAttributeValues={":cs": summary},
+    return {"summary": summary}
+
+
+@app.delete("/episodes/{episode_id}")
+async def delete_episode(episode_id: int, request: Request, background_tasks: BackgroundTasks):
+    sub = _require_login(request)
+    await _flush_plot_writes(sub)
+    old = _episodes_table.delete_item(
+        Key={"episode_id": f"{sub}#{episode_id}"}, ReturnValues="ALL_OLD",
+    ).get("Attributes") or {}
+    _record_deletes(sub, [("episodes", episode_id)])
+    _defer(background_tasks, [(_cascade_delete_episode, sub, episode_id, old.get("work_id"))])
+    return {"ok": True}
+
+
+# ── Plots ──────────────────────────────────────────────────────────────────
+
+@app.get("/episodes/{episode_id}/plots")
+async def get_plots(episode_id: int, request: Request, fields: str | None = None):
+    sub = _require_login(request)
+    return _JSONResponse(_list_children("plot", sub, episode_id, _parse_fields(fields)))
+
+
+@app.put("/episodes/{episode_id}/plots/order")
+async def reorder_plots(episode_id: int, request: Request):
+    """Body: {"ids": [plot ids in display order]}. Only moved plots are written."""
+    sub = _require_login(request)
+    body = await request.json()
+    result = await run_in_threadpool(_reorder_children, "plot", sub, episode_id, body.get("ids") or [])
+    return {"ok": True, **result}
+
+
+@app.post("/episodes/{episode_id}/plots")
+@_idempotent
+async def create_plot(episode_id: int, request: Request):
+    sub = _require_login(request)
+    body = await request.json()
+    plot_id = body["plot_id"]
+    order_key = _creation_keys("plot", sub, episode_id, [(plot_id, body.get("order_index", 0))])[plot_id]
+    _put_created(_plots_table, "plot_id", _plot_item(sub, episode_id, plot_id, body, order_key),
+                 _recreate_update(_plot_update, sub, plot_id, body))
+    return {"ok": True}
+
+
+@app.put("/plots/{plot_id}")
+async def update_plot_meta(plot_id: int, request: Request):
+    sub = _require_login(request)
+    body = await request.json()
+    _update_entity(_plots_table, {"plot_id": f"{sub}#{plot_id}"}, _plot_update(sub, plot_id, body))
+    return {"ok": True}
+
+
+@app.post("/plots/{plot_id}/summarize")
+@_single_flight
+async def summarize_plot(plot_id: int, request: Request):
+    sub = _require_login(request)
+
+    try:
+        content = _load_plot_doc(sub, plot_id)
+        plot_text = _extract_plain_text(content.get("content", []))
+    except Exception:
+        raise HTTPException(status_code=404, detail="플롯 내용을 찾을 수 없습니다.")
+
+    if not plot_text.strip():
+        raise HTTPException(status_code=400, detail="플롯에 내용이 없습니다.")
+
+    summary = await _llm_invoke(
+        "주어진 플롯 내용을 읽고, 이 플롯에서 벌어진 주요 사건을 3~4줄로 간결하게 요약하세요.",
+        plot_text.strip(),
     )
 
-    return {"summary": summary}
+    _update_entity(_plots_table, {"plot_id": f"{sub}#{plot_id}"}, {
+        "UpdateExpression": "SET plot_summary = :ps",
+        "ExpressionAttributeValues": {":ps": summary},
+    })
+
+    return {"summary": summary}
+
+
+@app.delete("/plots/{plot_id}")
+async def delete_plot(plot_id: int, request: Request, background_tasks: BackgroundTasks):
+    sub = _require_login(request)
+    await _plot_writes.discard((sub, plot_id))
+    s3_key = f"plots/{sub}/{plot_id}.json"
+    try:
+        _s3.delete_object(Bucket=_S3_BUCKET, Key=s3_key)
+    except Exception:
+        logger.warning("S3 delete failed for key %s:\n%s", s3_key, traceback.format_exc())
+    old = _plots_table.delete_item(
+        Key={"plot_id": f"{sub}#{plot_id}"}, ReturnValues="ALL_OLD",
+    ).get("Attributes")
+    _record_deletes(sub, [("plots", plot_id)])
+    background_tasks.add_task(_unindex_plots, sub, [plot_id])
+    background_tasks.add_task(_delete_history, sub, [plot_id])
+    background_tasks.add_task(_drop_manifests, sub, [_manifest_key(sub, "plot", plot_id)])
+    if old:
+        background_tasks.add_task(_discount_plot_stats, sub, [old])
+    return {"ok": True}
+
+
+def _put_plot_body(sub: str, plot_id: int, body: bytes) -> bool:
+    """Store a plot body: a document as chunks, anything else as the S3 object
+    at _plot_s3_key. True when it was stored as chunks."""
+    try:
+        doc = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        doc = None
+    old = _save_manifest(sub, "plot", plot_id, doc)
+    if old is None:
+        _s3.put_object(Bucket=_S3_BUCKET, Key=_plot_s3_key(sub, plot_id), Body=body, ContentType="application/json")
+        _drop_manifests(sub, [_manifest_key(sub, "plot", plot_id)])
+        return False
+    if not old:
+        # first save as chunks: the document saved before chunks existed is superseded
+        _s3_delete_keys([_plot_s3_key(sub, plot_id)])
+    return True
+
+
+def _record_plot_content(sub: str, plot_id: int, body: bytes, background_tasks: BackgroundTasks) -> int | None:
+    """Metadata side of a content save: updated_at, stats, search postings and
+    a history version. Returns the version number (None for non-document bodies)."""
+    s3_key = _plot_s3_key(sub, plot_id)
+    try:
+        doc = json.loads(body)
+    except ValueError:
+        doc = None
+    if not isinstance(doc, dict):
+        _plots_table.update_item(
+            Key={"plot_id": f"{sub}#{plot_id}"},
+            UpdateExpression="SET content_s3_key = :k, updated_at = :t ADD rev :one",
+            ExpressionAttributeValues={":k": s3_key, ":t": _now(), ":one": 1},
+        )
+        return None
+
+    stats = _plot_stats(doc)
+    saved_at = _now()
+    old = _plots_table.update_item(
+        Key={"plot_id": f"{sub}#{plot_id}"},
+        UpdateExpression="SET content_s3_key = :k, updated_at = :t, stats = :st ADD history_version :one, rev :one",
+        ExpressionAttributeValues={":k": s3_key, ":t": saved_at, ":st": stats, ":one": 1},
+        ReturnValues="ALL_OLD",
+    ).get("Attributes") or {}
+    # The old stats come back atomically with the write, so concurrent saves
+    # of the same plot still add up to the right aggregate.
+    if "episode_id" in old:
+        background_tasks.add_task(_apply_stats_delta, sub, int(old["episode_id"]),
+                                  _stats_delta(old.get("stats"), stats))
+    background_tasks.add_task(_index_plot, sub, plot_id, doc)
+    version = int(old.get("history_version", 0)) + 1
+    background_tasks.add_task(_record_version, sub, plot_id, version, doc, saved_at)
+    return version
+
+
+# ----------------------------------------------------------------------------
+# Autosave write-behind
+# ----------------------------------------------------------------------------
+# With PLOT_WRITE_BEHIND_SECONDS > 0, PUT /plots/{id}/content only buffers the
+# body and a burst of autosaves of one plot is written once, window seconds
+# after its first save (see writebehind.py). _load_plot_doc and GET content
+# see the buffered body in this process; the other writers of the document
+# (uploads, restores, collab, deletes, sync) discard or flush it first. The
+# buffer lives in process memory, so keep it off under Lambda.
+
+def _save_plot_body(sub: str, plot_id: int, body: bytes) -> BackgroundTasks:
+    """Store a plot body outside a request; run the returned tasks afterwards."""
+    _put_plot_body(sub, plot_id, body)
+    tasks = BackgroundTasks()
+    _record_plot_content(sub, plot_id, body, tasks)
+    return tasks
+
+
+def _store_plot_content(sub: str, plot_id: int, body: bytes, background_tasks: BackgroundTasks) -> dict:
+    _put_plot_body(sub, plot_id, body)
+    return {"ok": True, "version": _record_plot_content(sub, plot_id, body, background_tasks)}
+
+
+async def _write_plot_body(key: tuple[str, int], body: bytes) -> None:
+    tasks = await run_in_threadpool(_save_plot_body, *key, body)
+    await tasks()
+
+
+_plot_writes = writebehind.WriteBehind(
+    _write_plot_body, float(os.getenv("PLOT_WRITE_BEHIND_SECONDS", "0")), "plot_content")
+
+
+async def _flush_plot_writes(sub: str) -> None:
+    await _plot_writes.flush_where(lambda key: key[0] == sub)
+
+
+@app.put("/plots/{plot_id}/content")
+async def save_plot_content(plot_id: int, request: Request, background_tasks: BackgroundTasks):
+    """Save the plot document. Buffered saves answer version null and buffered true."""
+    sub = _require_login(request)
+    body = await request.body()
+
+    async def write():
+        if _plot_writes.enabled:
+            _plot_writes.put((sub, plot_id), body)
+            return {"ok": True, "version": None, "buffered": True}
+        # off the event loop, which also carries every collab socket
+        return await run_in_threadpool(_store_plot_content, sub, plot_id, body, background_tasks)
+
+    return await _overwrite_plot(sub, plot_id, body, write)
+
+
+def _plot_content_response(sub: str, plot_id: int):
+    from fastapi.responses import Response
+
+    body = _load_manifest(sub, "plot", plot_id)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    return _content_response(_plot_s3_key(sub, plot_id))
+
+
+@app.get("/plots/{plot_id}/content")
+@_single_flight
+async def get_plot_content(plot_id: int, request: Request):
+    from fastapi.responses import Response
+
+    sub = _require_login(request)
+    body = _plot_writes.get((sub, plot_id))
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    return await run_in_threadpool(_plot_content_response, sub, plot_id)
+
+
+@app.post("/plots/{plot_id}/content/upload-url")
+async def plot_content_upload_url(plot_id: int, request: Request):
+    """Presigned POST for a new plot document; call /complete with its upload_id."""
+    sub = _require_login(request)
+    return _presigned_upload(sub)
+
+
+def _store_plot_upload(sub: str, plot_id: int, key: str, body: bytes, background_tasks: BackgroundTasks) -> dict:
+    _put_plot_body(sub, plot_id, body)
+    _s3_delete_keys([key])
+    version = _record_plot_content(sub, plot_id, body, background_tasks)
+    return {"ok": True, "bytes": len(body), "version": version}
 
 
-@app.delete("/episodes/{episode_id}")
-async def delete_episode(episode_id: int, request: Request):
+@app.post("/plots/{plot_id}/content/complete")
+async def complete_plot_content_upload(plot_id: int, request: Request, background_tasks: BackgroundTasks):
+    """Record a direct upload like PUT /plots/{id}/content does. Body:
+    {"upload_id"}. The document is read back from S3 for chunks, stats and
+    search, which is far cheaper than receiving it."""
     sub = _require_login(request)
-    _episodes_table.delete_item(Key={"episode_id": f"{sub}#{episode_id}"})
-    return {"ok": True}
-
+    key = await _upload_key(sub, request)
+    body = await run_in_threadpool(_read_upload, key)
+    await _plot_writes.discard((sub, plot_id))
+    return await _overwrite_plot(sub, plot_id, body, lambda: run_in_threadpool(
+        _store_plot_upload, sub, plot_id, key, body, background_tasks))
 
-# ── Plots ──────────────────────────────────────────────────────────────────
 
-@app.get("/episodes/{episode_id}/plots")
-async def get_plots(episode_id: int, request: Request):
+@app.get("/plots/{plot_id}/content/download-url")
+async def plot_content_download_url(plot_id: int, request: Request):
+    """Presigned GET for the plot document; url is null when nothing is saved
+    or the document is stored as chunks (read it with GET .../content)."""
     sub = _require_login(request)
-    res = _plots_table.scan(
-        FilterExpression="user_sub = :s AND episode_id = :e",
-        ExpressionAttributeValues={":s": sub, ":e": episode_id},
+    await _plot_writes.flush((sub, plot_id))
+    key = _plot_s3_key(sub, plot_id)
+    head = _head_content(key)
+    if head is None:
+        manifest = _manifests_table.get_item(Key={"manifest_key": _manifest_key(sub, "plot", plot_id)},
+                                             ProjectionExpression="doc_bytes").get("Item") or {}
+        return {"url": None, "bytes": int(manifest.get("doc_bytes", 0))}
+    return {**_presigned_url("get_object", key), "bytes": int(head["ContentLength"])}
+
+
+@app.get("/plots/{plot_id}/versions")
+async def list_plot_versions(plot_id: int, request: Request, limit: int = 50, before: int | None = None):
+    """Saved versions, newest first; pass next_before as before for the next page."""
+    sub = _require_login(request)
+    limit = max(1, min(limit, 200))
+    condition = "version_key = :k" + (" AND #v < :b" if before is not None else "")
+    values = {":k": _version_key(sub, plot_id), **({":b": before} if before is not None else {})}
+    res = _versions_table.query(
+        KeyConditionExpression=condition,
+        ProjectionExpression="#v, #s, #c, #b, #n",
+        ExpressionAttributeNames={"#v": "version", "#s": "saved_at", "#c": "checkpoint",
+                                  "#b": "doc_bytes", "#n": "chars"},
+        ExpressionAttributeValues=values,
+        ScanIndexForward=False, Limit=limit,
     )
-    items = sorted(res.get("Items", []), key=lambda x: x.get("order_index", 0))
-    return items
+    items = res.get("Items", [])
+    return {
+        "versions": [{"version": int(i["version"]), "saved_at": i["saved_at"],
+                      "checkpoint": bool(i.get("checkpoint")), "bytes": int(i.get("doc_bytes", 0)),
+                      "chars": int(i.get("chars", 0))} for i in items],
+        "next_before": int(items[-1]["version"]) if "LastEvaluatedKey" in res and items else None,
+    }
 
 
-@app.post("/episodes/{episode_id}/plots")
-async def create_plot(episode_id: int, request: Request):
+@app.get("/plots/{plot_id}/versions/diff")
+async def diff_plot_versions(plot_id: int, request: Request, from_version: int, to_version: int):
+    """Changed top-level blocks between two versions, with their plain text."""
     sub = _require_login(request)
-    body = await request.json()
-    plot_id = body["plot_id"]
-    _plots_table.put_item(Item={
-        "plot_id":     f"{sub}#{plot_id}",
-        "user_sub":    sub,
-        "local_id":    plot_id,
-        "episode_id":  episode_id,
-        "title":       body.get("title", ""),
-        "order_index": body.get("order_index", 0),
-        "updated_at":  datetime.now(timezone.utc).isoformat(),
-    })
-    return {"ok": True}
+    old, new = await run_in_threadpool(
+        lambda: (_load_version(sub, plot_id, from_version), _load_version(sub, plot_id, to_version)))
+    changes = history.diff(old, new)
+    for change in changes:
+        change["before"] = [_extract_plain_text([b]) for b in change["before"]]
+        change["after"] = [_extract_plain_text([b]) for b in change["after"]]
+    return {"from_version": from_version, "to_version": to_version, "changes": changes}
 
 
-@app.put("/plots/{plot_id}")
-async def update_plot_meta(plot_id: int, request: Request):
+@app.get("/plots/{plot_id}/versions/{version}")
+async def get_plot_version(plot_id: int, version: int, request: Request):
     sub = _require_login(request)
-    body = await request.json()
-    _plots_table.update_item(
-        Key={"plot_id": f"{sub}#{plot_id}"},
-        UpdateExpression="SET title = :t, order_index = :o",
-        ExpressionAttributeValues={":t": body.get("title", ""), ":o": body.get("order_index", 0)},
-    )
-    return {"ok": True}
+    return _JSONResponse(await run_in_threadpool(_load_version, sub, plot_id, version))
 
 
-@app.post("/plots/{plot_id}/summarize")
-async def summarize_plot(plot_id: int, request: Request):
+@app.post("/plots/{plot_id}/versions/{version}/restore")
+async def restore_plot_version(plot_id: int, version: int, request: Request, background_tasks: BackgroundTasks):
+    """Save an old version as the current content (recorded as a new version)."""
     sub = _require_login(request)
+    await _plot_writes.discard((sub, plot_id))
+    doc = await run_in_threadpool(_load_version, sub, plot_id, version)
+    body = json.dumps(doc, ensure_ascii=False).encode()
 
-    s3_key = f"plots/{sub}/{plot_id}.json"
-    try:
-        obj = _s3.get_object(Bucket=_S3_BUCKET, Key=s3_key)
-        content = json.loads(obj["Body"].read())
-        plot_text = _extract_plain_text(content.get("content", []))
-    except Exception:
-        raise HTTPException(status_code=404, detail="플롯 내용을 찾을 수 없습니다.")
+    async def write():
+        _put_plot_body(sub, plot_id, body)
+        return {"ok": True, "version": _record_plot_content(sub, plot_id, body, background_tasks)}
 
-    if not plot_text.strip():
-        raise HTTPException(status_code=400, detail="플롯에 내용이 없습니다.")
+    return await _overwrite_plot(sub, plot_id, body, write)
 
-    openai_key = os.getenv("OPENAI_API_KEY", "")
-    if not openai_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY 가 설정되지 않았습니다.")
 
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import SystemMessage, HumanMessage
+# ── Collaborative editing ──────────────────────────────────────────────────
+# One WebSocket room per plot relays ProseMirror steps between the editors
+# of that plot and saves the merged document like PUT /plots/{id}/content
+# (see collab.py). Rooms are per process, so this needs a single long-lived
+# uvicorn worker; API Gateway + Mangum does not carry WebSockets.
 
-    llm = ChatOpenAI(model="gpt-4o-mini", api_key=openai_key)
-    messages = [
-        SystemMessage(content="주어진 플롯 내용을 읽고, 이 플롯에서 벌어진 주요 사건을 3~4줄로 간결하게 요약하세요."),
-        HumanMessage(content=plot_text.strip()),
-    ]
-    response = await llm.ainvoke(messages)
-    summary = response.content
+def _websocket_sub(websocket: WebSocket) -> str | None:
+    """sub from ?token= (browsers cannot set headers on a WebSocket) or a Bearer header."""
+    auth = websocket.headers.get("Authorization", "")
+    token = auth[7:] if auth.startswith("Bearer ") else websocket.query_params.get("token", "")
+    try:
+        return pyjwt.decode(token, _JWT_SECRET, algorithms=[_JWT_ALGORITHM])["sub"]
+    except pyjwt.PyJWTError:
+        return None
 
-    _plots_table.update_item(
-        Key={"plot_id": f"{sub}#{plot_id}"},
-        UpdateExpression="SET plot_summary = :ps",
-        ExpressionAttributeValues={":ps": summary},
-    )
 
-    return {"summary": summary}
+async def _collab_load(key: tuple[str, int]) -> dict:
+    return await run_in_threadpool(_load_plot_doc, *key)
 
 
-@app.delete("/plots/{plot_id}")
-async def delete_plot(plot_id: int, request: Request):
-    sub = _require_login(request)
-    s3_key = f"plots/{sub}/{plot_id}.json"
-    try:
-        _s3.delete_object(Bucket=_S3_BUCKET, Key=s3_key)
-    except Exception:
-        logger.warning("S3 delete failed for key %s:\n%s", s3_key, traceback.format_exc())
-    _plots_table.delete_item(Key={"plot_id": f"{sub}#{plot_id}"})
-    return {"ok": True}
+async def _collab_persist(key: tuple[str, int], doc: dict) -> None:
+    await _plot_writes.discard(key)
+    await _write_plot_body(key, orjson.dumps(doc))
 
 
-@app.put("/plots/{plot_id}/content")
-async def save_plot_content(plot_id: int, request: Request):
-    sub = _require_login(request)
-    body = await request.body()
-    s3_key = f"plots/{sub}/{plot_id}.json"
-    _s3.put_object(Bucket=_S3_BUCKET, Key=s3_key, Body=body, ContentType="application/json")
-    _plots_table.update_item(
-        Key={"plot_id": f"{sub}#{plot_id}"},
-        UpdateExpression="SET content_s3_key = :k, updated_at = :t",
-        ExpressionAttributeValues={":k": s3_key, ":t": datetime.now(timezone.utc).isoformat()},
-    )
-    return {"ok": True}
+_collab = collab.Hub(_collab_load, _collab_persist)
 
 
-@app.get("/plots/{plot_id}/content")
-async def get_plot_content(plot_id: int, request: Request):
-    from fastapi.responses import Response
-    sub = _require_login(request)
-    s3_key = f"plots/{sub}/{plot_id}.json"
+async def _overwrite_plot(sub: str, plot_id: int, body: bytes, write):
+    """Run write(), a save of body made outside collab, through the plot's
+    open room so the room continues from body (see Hub.overwrite)."""
+    key = (sub, plot_id)
+    if key not in _collab.rooms:
+        return await write()
     try:
-        obj = _s3.get_object(Bucket=_S3_BUCKET, Key=s3_key)
-        return Response(content=obj["Body"].read(), media_type="application/json")
-    except ClientError as e:
-        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
-            return Response(content=b"{}", media_type="application/json")
-        logger.error("S3 get failed for key %s:\n%s", s3_key, traceback.format_exc())
-        raise
+        doc = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        doc = None
+    return await _collab.overwrite(key, doc if isinstance(doc, dict) else {}, write)
+
+
+@app.websocket("/plots/{plot_id}/collab")
+async def collab_plot(websocket: WebSocket, plot_id: int):
+    await websocket.accept()
+    sub = _websocket_sub(websocket)
+    if sub is None:
+        await websocket.close(code=4401, reason="로그인이 필요합니다.")
+        return
+    found = await run_in_threadpool(
+        _plots_table.get_item, Key={"plot_id": f"{sub}#{plot_id}"}, ProjectionExpression="plot_id",
+    )
+    if "Item" not in found:
+        await websocket.close(code=4404, reason="플롯을 찾을 수 없습니다.")
+        return
+
+    peer = collab.Peer(websocket.send_text, lambda code: websocket.close(code=code))
+    writer = asyncio.create_task(peer.run())
+    try:
+        room = await _collab.join((sub, plot_id), peer)
+    except Exception:
+        logger.exception("collab room load failed for plot %s", plot_id)
+        writer.cancel()
+        await websocket.close(code=1011)
+        return
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                data = orjson.loads(message.get("text") or message.get("bytes") or b"")
+            except orjson.JSONDecodeError:
+                data = None
+            room.receive(peer, data)
+    finally:
+        room.leave(peer)
+        writer.cancel()
 
 
 # ── Characters ─────────────────────────────────────────────────────────────
 
 @app.get("/works/{work_id}/characters")
-async def get_characters(work_id: int, request: Request):
+async def get_characters(work_id: int, request: Request, fields: str | None = None):
     sub = _require_login(request)
+    fields = _parse_fields(fields)
     res = _characters_table.scan(
         FilterExpression="user_sub = :s AND work_id = :w",
         ExpressionAttributeValues={":s": sub, ":w": work_id},
+        **_projection(fields),
     )
-    return res.get("Items", [])
+    return _JSONResponse(res.get("Items", []))
 
 
 @app.post("/works/{work_id}/characters")
+@_idempotent
 async def create_character(work_id: int, request: Request):
     sub = _require_login(request)
     body = await request.json()
-    char_id = body["character_id"]
-    _characters_table.put_item(Item={
-        "character_id": f"{sub}#{char_id}",
-        "user_sub":     sub,
-        "local_id":     char_id,
-        "work_id":      work_id,
-        "name":         body.get("name", ""),
-        "color":        body.get("color", ""),
-        "properties":   body.get("properties", "{}"),
-        "memo":         body.get("memo", ""),
-    })
+    _characters_table.put_item(Item=_character_item(sub, work_id, body["character_id"], body))
     return {"ok": True}
 
 
@@ -653,16 +3132,8 @@ async def create_character(work_id: int, request: Request):
 async def update_character(character_id: int, request: Request):
     sub = _require_login(request)
     body = await request.json()
-    _characters_table.update_item(
-        Key={"character_id": f"{sub}#{character_id}"},
-        UpdateExpression="SET #n = :n, color = :c, properties = :p, memo = :m, ai_summary = :a",
-        ExpressionAttributeNames={"#n": "name"},
-        ExpressionAttributeValues={
-            ":n": body.get("name", ""), ":c": body.get("color", ""),
-            ":p": body.get("properties", "{}"), ":m": body.get("memo", ""),
-            ":a": body.get("ai_summary", ""),
-        },
-    )
+    _update_entity(_characters_table, {"character_id": f"{sub}#{character_id}"},
+                   _character_update(sub, character_id, body))
     return {"ok": True}
 
 
@@ -670,9 +3141,85 @@ async def update_character(character_id: int, request: Request):
 async def delete_character(character_id: int, request: Request):
     sub = _require_login(request)
     _characters_table.delete_item(Key={"character_id": f"{sub}#{character_id}"})
+    _record_deletes(sub, [("characters", character_id)])
     return {"ok": True}
 
 
+def _analytics_key(sub: str, work_id: int) -> str:
+    return f"analytics/{sub}/{int(work_id)}.json"
+
+
+def _character_analytics(sub: str, work_id: int) -> dict:
+    """Co-occurrence analytics from the dialogue counts in each plot's stats.
+
+    The result is cached in S3 under a version hash of the work stats row's
+    rev (bumped whenever any plot's dialogue counts change), the episode list
+    and the character list, so a cache hit costs three requests however many
+    plots the work has.
+    """
+    from analytics import cooccurrence
+
+    episodes = _list_children("episode", sub, work_id)
+    work_row = _stats_table.get_item(
+        Key={"stats_key": f"{sub}#{work_id}", "scope": "work"}, ProjectionExpression="rev",
+    ).get("Item") or {}
+    chars = sorted(
+        ((int(c["local_id"]), c.get("name", "")) for c in _scan_all(
+            _characters_table,
+            FilterExpression="user_sub = :s AND work_id = :w",
+            ProjectionExpression="local_id, #n",
+            ExpressionAttributeNames={"#n": "name"},
+            ExpressionAttributeValues={":s": sub, ":w": work_id},
+        )),
+    )
+    version = hashlib.sha1(json.dumps([
+        int(work_row.get("rev", 0)),
+        [[int(ep["local_id"]), ep.get("title", "")] for ep in episodes],
+        chars,
+    ]).encode()).hexdigest()
+
+    try:
+        cached = json.loads(_s3.get_object(Bucket=_S3_BUCKET, Key=_analytics_key(sub, work_id))["Body"].read())
+        if cached.get("version") == version:
+            return cached
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            raise
+
+    plots = [(e, plot) for e, ep in enumerate(episodes)
+             for plot in _list_children("plot", sub, int(ep["local_id"]))]
+
+    # Plots saved before per-plot stats existed are read from S3 once here.
+    def dialogue(plot):
+        stats = plot.get("stats") or _plot_stats(_load_plot_doc(sub, plot["local_id"]))
+        return {name: int(n) for name, n in (stats.get("dialogue") or {}).items()}
+
+    with ContextThreadPoolExecutor(max_workers=_STATS_WORKERS) as pool:
+        rows = [(e, d) for (e, _), d in zip(plots, pool.map(dialogue, [p for _, p in plots]))]
+
+    char_ids = {name: char_id for char_id, name in chars}
+    speakers = sorted({name for _, d in rows for name in d} - char_ids.keys())
+    result = cooccurrence(rows, len(episodes), [name for _, name in chars] + speakers)
+    for c in result["characters"]:
+        c["character_id"] = char_ids.get(c["name"])
+    result["episodes"] = [{"episode_id": int(ep["local_id"]), "title": ep.get("title", "")} for ep in episodes]
+    result["version"] = version
+
+    _s3.put_object(Bucket=_S3_BUCKET, Key=_analytics_key(sub, work_id),
+                   Body=json.dumps(result, ensure_ascii=False).encode("utf-8"),
+                   ContentType="application/json")
+    return result
+
+
+@app.get("/works/{work_id}/character-analytics")
+@_single_flight
+async def get_character_analytics(work_id: int, request: Request):
+    """Who shares plots with whom: per-character scene and line counts,
+    degree/eigenvector centrality, per-episode timelines and co-occurring pairs."""
+    sub = _require_login(request)
+    return await run_in_threadpool(_character_analytics, sub, work_id)
+
+
 @app.get("/characters/{character_id}/dialogues")
 async def get_character_dialogues(character_id: int, request: Request):
     sub = _require_login(request)
@@ -685,28 +3232,18 @@ async def get_character_dialogues(character_id: int, request: Request):
     work_id = int(char_item["work_id"])
     char_name = char_item["name"]
 
-    eps_res = _episodes_table.scan(
-        FilterExpression="user_sub = :s AND work_id = :w",
-        ExpressionAttributeValues={":s": sub, ":w": work_id},
-    )
-    episodes = eps_res.get("Items", [])
+    episodes = _list_children("episode", sub, work_id)
 
     dialogues = []
     for ep in episodes:
         ep_local_id = int(ep["local_id"])
         ep_title = ep.get("title", "")
 
-        plots_res = _plots_table.scan(
-            FilterExpression="user_sub = :s AND episode_id = :e",
-            ExpressionAttributeValues={":s": sub, ":e": ep_local_id},
-        )
-        for plot in plots_res.get("Items", []):
+        for plot in _list_children("plot", sub, ep_local_id):
             plot_local_id = int(plot["local_id"])
             plot_title = plot.get("title", "")
-            s3_key = f"plots/{sub}/{plot_local_id}.json"
             try:
-                obj = _s3.get_object(Bucket=_S3_BUCKET, Key=s3_key)
-                content = json.loads(obj["Body"].read())
+                content = _load_plot_doc(sub, plot_local_id)
                 found = _extract_dialogues(content.get("content", []), char_name)
                 for text in found:
                     dialogues.append({
@@ -721,7 +3258,50 @@ async def get_character_dialogues(character_id: int, request: Request):
     return dialogues
 
 
+_SUMMARY_CONTEXT_TOKENS = int(os.getenv("SUMMARY_CONTEXT_TOKENS", "2000"))
+_SUMMARY_WORKERS = 8
+
+
+def _passage_lines(doc: dict) -> list[tuple[str, bool]]:
+    """(text, starts_new) per top-level block for passages.split: dialogue as
+    "name: line", and a scene heading or chapter heading starts a passage."""
+    lines = []
+    for node in doc.get("content") or []:
+        text = _extract_plain_text(node.get("content") or [], "\n")
+        name = (node.get("attrs") or {}).get("characterName") if node.get("type") == "dialogue" else None
+        lines.append((f"{name}: {text}" if name else text, node.get("type") in ("sceneHeading", "heading")))
+    return lines
+
+
+def _character_passages(sub: str, work_id: int, work_type: str, name: str, related: set[str]) -> list[str]:
+    """Passages of the work about the character, within _SUMMARY_CONTEXT_TOKENS.
+
+    Those mentioning the character weigh twice as much as those mentioning
+    only a related character; see passages.py for the ranking.
+    """
+    jobs = []
+    for ep in _list_children("episode", sub, work_id):
+        ep_title = ep.get("title", "")
+        for plot in _list_children("plot", sub, int(ep["local_id"])):
+            label = f"[{ep_title}]" if work_type == "novel" else f"[{ep_title} / {plot.get('title', '')}]"
+            jobs.append((label, int(plot["local_id"])))
+
+    def load(job):
+        label, plot_id = job
+        try:
+            return passages.split(_passage_lines(_load_plot_doc(sub, plot_id)), label)
+        except Exception:
+            logger.warning("Passage extraction failed for plot %s:\n%s", plot_id, traceback.format_exc())
+            return []
+
+    with ContextThreadPoolExecutor(max_workers=_SUMMARY_WORKERS) as pool:
+        chunks = [p for plot_passages in pool.map(load, jobs) for p in plot_passages]
+    terms = {**{n: 0.5 for n in related if n}, name: 1.0}
+    return [chunks[i] for i in passages.select(chunks, terms, _SUMMARY_CONTEXT_TOKENS)]
+
+
 @app.post("/characters/{character_id}/summarize")
+@_single_flight
 async def summarize_character(character_id: int, request: Request):
     sub = _require_login(request)
     char_item = _characters_table.get_item(
@@ -739,36 +3319,6 @@ async def summarize_character(character_id: int, request: Request):
     work_item = _works_table.get_item(Key={"work_id": f"{sub}#{work_id}"}).get("Item")
     work_type = work_item.get("type", "plot") if work_item else "plot"
 
-    eps_res = _episodes_table.scan(
-        FilterExpression="user_sub = :s AND work_id = :w",
-        ExpressionAttributeValues={":s": sub, ":w": work_id},
-    )
-    episodes = sorted(eps_res.get("Items", []), key=lambda x: x.get("order_index", 0))
-
-    all_dialogues = []
-    chapter_texts = []
-
-    for ep in episodes:
-        ep_local_id = int(ep["local_id"])
-        ep_title = ep.get("title", "")
-        plots_res = _plots_table.scan(
-            FilterExpression="user_sub = :s AND episode_id = :e",
-            ExpressionAttributeValues={":s": sub, ":e": ep_local_id},
-        )
-        for plot in plots_res.get("Items", []):
-            s3_key = f"plots/{sub}/{int(plot['local_id'])}.json"
-            try:
-                obj = _s3.get_object(Bucket=_S3_BUCKET, Key=s3_key)
-                content = json.loads(obj["Body"].read())
-                if work_type == "novel":
-                    text = _extract_plain_text(content.get("content", []))
-                    if text.strip():
-                        chapter_texts.append(f"[{ep_title}]\n{text.strip()}")
-                else:
-                    all_dialogues.extend(_extract_dialogues(content.get("content", []), char_name))
-            except Exception:
-                pass
-
     # Collect relations for this character
     rels_res = _relations_table.scan(
         FilterExpression="user_sub = :s AND work_id = :w",
@@ -800,6 +3350,7 @@ async def summarize_character(character_id: int, request: Request):
     if char_memo:
         context_parts.append(f"메모: {char_memo}")
 
+    related_names = set()
     if char_rels:
         rel_lines = []
         for r in char_rels:
@@ -807,32 +3358,23 @@ async def summarize_character(character_id: int, request: Request):
             to_id = int(r.get("to_character_id", -1))
             from_name = char_name_map.get(from_id, str(from_id))
             to_name = char_name_map.get(to_id, str(to_id))
+            related_names.update(char_name_map.get(i, "") for i in (from_id, to_id) if i != character_id)
             rel_lines.append(f"{from_name} → {r.get('relation_name', '')} → {to_name}")
         context_parts.append("관계:\n" + "\n".join(rel_lines))
 
-    if work_type == "novel" and chapter_texts:
-        context_parts.append("챕터 내용:\n" + "\n\n".join(chapter_texts))
-    elif all_dialogues:
-        dialogue_lines = "\n".join(f"- {d}" for d in all_dialogues)
-        context_parts.append(f"대사:\n{dialogue_lines}")
+    scenes = await run_in_threadpool(_character_passages, sub, work_id, work_type, char_name, related_names)
+    if scenes:
+        heading = "챕터 내용" if work_type == "novel" else "관련 장면"
+        context_parts.append(f"{heading}:\n" + "\n\n".join(scenes))
 
     context = "\n\n".join(context_parts)
 
-    openai_key = os.getenv("OPENAI_API_KEY", "")
-    if not openai_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY 가 설정되지 않았습니다.")
-
     try:
         req_body = await request.json()
     except Exception:
         req_body = {}
     existing_summary = (req_body.get("existing_summary") or "").strip()
 
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import SystemMessage, HumanMessage
-
-    llm = ChatOpenAI(model="gpt-4o-mini", api_key=openai_key)
-
     if existing_summary:
         system_prompt = "주어진 인물 정보와 기존 요약을 바탕으로, 새로운 대사와 정보를 반영하여 요약을 갱신하세요. 기존 요약의 내용을 최대한 유지하되, 달라진 부분이 있으면 자연스럽게 업데이트하세요."
         user_content = f"[기존 요약]\n{existing_summary}\n\n[최신 인물 정보]\n{context}"
@@ -840,40 +3382,30 @@ async def summarize_character(character_id: int, request: Request):
         system_prompt = "주어진 내용을 바탕으로 이 인물의 성격, 타 인물과의 관계, 그리고 지금까지의 행보를 간단히 요약하세요."
         user_content = context
 
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=user_content),
-    ]
-    response = await llm.ainvoke(messages)
-    return {"summary": response.content, "context": context}
+    summary = await _llm_invoke(system_prompt, user_content)
+    return {"summary": summary, "context": context}
 
 
 # ── Character Relations ────────────────────────────────────────────────────
 
 @app.get("/works/{work_id}/relations")
-async def get_relations(work_id: int, request: Request):
+async def get_relations(work_id: int, request: Request, fields: str | None = None):
     sub = _require_login(request)
+    fields = _parse_fields(fields)
     res = _relations_table.scan(
         FilterExpression="user_sub = :s AND work_id = :w",
         ExpressionAttributeValues={":s": sub, ":w": work_id},
+        **_projection(fields),
     )
-    return res.get("Items", [])
+    return _JSONResponse(res.get("Items", []))
 
 
 @app.post("/works/{work_id}/relations")
+@_idempotent
 async def create_relation(work_id: int, request: Request):
     sub = _require_login(request)
     body = await request.json()
-    rel_id = body["relation_id"]
-    _relations_table.put_item(Item={
-        "relation_id":       f"{sub}#{rel_id}",
-        "user_sub":          sub,
-        "local_id":          rel_id,
-        "work_id":           work_id,
-        "from_character_id": body.get("from_character_id"),
-        "to_character_id":   body.get("to_character_id"),
-        "relation_name":     body.get("relation_name", ""),
-    })
+    _relations_table.put_item(Item=_relation_item(sub, work_id, body["relation_id"], body))
     return {"ok": True}
 
 
@@ -881,11 +3413,91 @@ async def create_relation(work_id: int, request: Request):
 async def delete_relation(relation_id: int, request: Request):
     sub = _require_login(request)
     _relations_table.delete_item(Key={"relation_id": f"{sub}#{relation_id}"})
+    _record_deletes(sub, [("relations", relation_id)])
     return {"ok": True}
 
 
 # ── Graph Layout ───────────────────────────────────────────────────────────
 
+_LAYOUT_PATCH_CHUNK = 100   # nodes per UpdateItem (update expressions are capped at 4 KB)
+
+
+def _layout_position(value) -> dict | None:
+    """{"x", "y"} as Decimals (boto3 rejects floats); None removes the node."""
+    if value is None:
+        return None
+    return {axis: Decimal(str(round(float(value[axis]), 2))) for axis in ("x", "y")}
+
+
+def _parse_positions(body) -> dict:
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="잘못된 좌표입니다.")
+    try:
+        return {str(node_id): _layout_position(pos) for node_id, pos in body.items()}
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="잘못된 좌표입니다.")
+
+
+def _patch_layout(sub: str, work_id: int, changes: dict) -> None:
+    key = {"layout_id": f"{sub}#{work_id}"}
+    now = datetime.now(timezone.utc).isoformat()
+    items = list(changes.items())
+    for start in range(0, len(items), _LAYOUT_PATCH_CHUNK):
+        chunk = items[start:start + _LAYOUT_PATCH_CHUNK]
+        sets = [f"positions.#n{i} = :p{i}" for i, (_, pos) in enumerate(chunk) if pos is not None]
+        removes = [f"positions.#n{i}" for i, (_, pos) in enumerate(chunk) if pos is None]
+        update = {
+            "UpdateExpression": "SET " + ", ".join(sets + ["updated_at = :t"])
+                                + (" REMOVE " + ", ".join(removes) if removes else ""),
+            "ConditionExpression": "attribute_exists(positions)",
+            "ExpressionAttributeNames": {f"#n{i}": node_id for i, (node_id, _) in enumerate(chunk)},
+            "ExpressionAttributeValues": {":t": now, **{f":p{i}": pos for i, (_, pos) in enumerate(chunk)
+                                                        if pos is not None}},
+        }
+        try:
+            _graph_table.update_item(Key=key, **update)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            # First write for this work: a nested path needs its parent map.
+            _graph_table.update_item(
+                Key=key,
+                UpdateExpression="SET positions = if_not_exists(positions, :empty)",
+                ExpressionAttributeValues={":empty": {}},
+            )
+            _graph_table.update_item(Key=key, **update)
+
+
+def _auto_layout(sub: str, work_id: int) -> dict:
+    """Force-directed positions for every character of the work.
+
+    The result is stored with a hash of the characters and relations it was
+    computed from, so it is only recomputed after either changes.
+    """
+    from layout import force_layout
+
+    chars = _scan_user_items(_characters_table, sub, "local_id", "work_id", [work_id])
+    rels = _scan_user_items(_relations_table, sub, "from_character_id, to_character_id", "work_id", [work_id])
+    node_ids = [str(i) for i in sorted(int(c["local_id"]) for c in chars)]
+    edges = sorted({(str(int(r["from_character_id"])), str(int(r["to_character_id"])))
+                    for r in rels if r.get("from_character_id") is not None
+                    and r.get("to_character_id") is not None})
+    fingerprint = hashlib.sha1(json.dumps([node_ids, edges]).encode()).hexdigest()
+
+    key = {"layout_id": f"{sub}#{work_id}"}
+    cached = _graph_table.get_item(Key=key, ProjectionExpression="auto_key, auto_positions").get("Item") or {}
+    if cached.get("auto_key") == fingerprint:
+        return cached.get("auto_positions", {})
+
+    positions = {node_id: _layout_position(pos) for node_id, pos in force_layout(node_ids, edges).items()}
+    _graph_table.update_item(
+        Key=key,
+        UpdateExpression="SET auto_key = :k, auto_positions = :p",
+        ExpressionAttributeValues={":k": fingerprint, ":p": positions},
+    )
+    return positions
+
+
 @app.get("/graph-layout/{work_id}")
 async def get_graph_layout(work_id: int, request: Request):
     sub = _require_login(request)
@@ -896,15 +3508,365 @@ async def get_graph_layout(work_id: int, request: Request):
 @app.put("/graph-layout/{work_id}")
 async def save_graph_layout(work_id: int, request: Request):
     sub = _require_login(request)
-    positions = await request.json()
-    _graph_table.put_item(Item={
-        "layout_id":  f"{sub}#{work_id}",
-        "positions":  positions,
-        "updated_at": datetime.now(timezone.utc).isoformat(),
-    })
+    positions = _parse_positions(await request.json())
+    _graph_table.update_item(
+        Key={"layout_id": f"{sub}#{work_id}"},
+        UpdateExpression="SET positions = :p, updated_at = :t",
+        ExpressionAttributeValues={
+            ":p": {node_id: pos for node_id, pos in positions.items() if pos is not None},
+            ":t": datetime.now(timezone.utc).isoformat(),
+        },
+    )
     return {"ok": True}
 
 
+@app.patch("/graph-layout/{work_id}")
+async def patch_graph_layout(work_id: int, request: Request):
+    """Body: {node_id: {"x", "y"} | null}. Only the listed nodes are written; null removes one."""
+    sub = _require_login(request)
+    changes = _parse_positions(await request.json())
+    if changes:
+        await run_in_threadpool(_patch_layout, sub, work_id, changes)
+    return {"ok": True, "updated": len(changes)}
+
+
+@app.get("/graph-layout/{work_id}/auto")
+async def auto_graph_layout(work_id: int, request: Request):
+    """Suggested positions for all characters; the client applies them with PATCH."""
+    sub = _require_login(request)
+    return await run_in_threadpool(_auto_layout, sub, work_id)
+
+
+# ── Export ─────────────────────────────────────────────────────────────────
+
+_EXPORT_PREFETCH = 4        # plot documents fetched ahead of the writer
+
+
+def _export_entries(sub: str, work_id: int):
+    """(episode, plot) pairs in reading order; plot is None for an empty episode.
+
+    Plots are listed one episode at a time as the export advances.
+    """
+    for ep in _list_children("episode", sub, work_id):
+        plots = _list_children("plot", sub, int(ep["local_id"]))
+        if not plots:
+            yield ep, None
+        for plot in plots:
+            yield ep, plot
+
+
+def _export_stream(sub: str, work_id: int, writer):
+    """Write the manuscript plot by plot.
+
+    At most _EXPORT_PREFETCH documents are in flight or buffered, so memory
+    stays flat regardless of the size of the work.
+    """
+    pool = ContextThreadPoolExecutor(max_workers=_EXPORT_PREFETCH)
+    pending = deque()
+    entries = _export_entries(sub, work_id)
+
+    def fill():
+        while len(pending) < _EXPORT_PREFETCH:
+            entry = next(entries, None)
+            if entry is None:
+                return
+            ep, plot = entry
+            fut = pool.submit(_load_plot_doc, sub, plot["local_id"]) if plot else None
+            pending.append((ep, plot, fut))
+
+    try:
+        yield writer.begin()
+        current_ep, number = None, 0
+        fill()
+        while pending:
+            ep, plot, fut = pending.popleft()
+            fill()
+            if ep["episode_id"] != current_ep:
+                current_ep, number = ep["episode_id"], 0
+                yield writer.episode(ep.get("title", ""))
+            if plot is None:
+                continue
+            number += 1
+            yield writer.plot(number, plot.get("title", ""), fut.result())
+        yield writer.end()
+    except Exception:
+        logger.error("Export failed for work %s:\n%s", work_id, traceback.format_exc())
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+@app.get("/works/{work_id}/export")
+async def export_work(work_id: int, request: Request, format: str = "txt"):
+    """Stream the whole manuscript as txt, md, fountain or docx."""
+    from fastapi.responses import StreamingResponse
+
+    sub = _require_login(request)
+    if format not in WRITERS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 형식입니다: {format}")
+    work_item = _works_table.get_item(Key={"work_id": f"{sub}#{work_id}"}).get("Item")
+    if not work_item:
+        raise HTTPException(status_code=404, detail="작품을 찾을 수 없습니다.")
+
+    title = work_item.get("title") or "manuscript"
+    writer = WRITERS[format](title, work_item.get("type", "novel"))
+    filename = f"{title}.{writer.extension}"
+    return StreamingResponse(
+        _export_stream(sub, work_id, writer),
+        media_type=writer.media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=\"export.{writer.extension}\"; "
+                                   f"filename*=UTF-8''{quote(filename)}",
+        },
+    )
+
+
+# ── Search ─────────────────────────────────────────────────────────────────
+
+@app.get("/search")
+async def search_plots(request: Request, q: str = "", limit: int = 20, work_id: int | None = None):
+    """Full-text search over the caller's plots, optionally within one work."""
+    sub = _require_login(request)
+    if not search.query_grams(q):
+        raise HTTPException(status_code=400, detail="검색어를 입력하세요.")
+    return await run_in_threadpool(_search, sub, q, max(1, min(limit, 100)), work_id)
+
+
+# ── Bulk sync ──────────────────────────────────────────────────────────────
+
+_SYNC_MAX_OPERATIONS = 500
+_SYNC_UPDATE_WORKERS = 8
+
+# entity: (table global, key attribute, parent attribute, item builder, update builder)
+_SYNC_ENTITIES = {
+    "work":      ("_works_table",      "work_id",      None,         _work_item,      _work_update),
+    "episode":   ("_episodes_table",   "episode_id",   "work_id",    _episode_item,   _episode_update),
+    "plot":      ("_plots_table",      "plot_id",      "episode_id", _plot_item,      _plot_update),
+    "character": ("_characters_table", "character_id", "work_id",    _character_item, _character_update),
+    "relation":  ("_relations_table",  "relation_id",  "work_id",    _relation_item,  None),
+}
+
+
+def _get_user_items(table, key_name: str, sub: str, local_ids: list[int], projection: str) -> dict:
+    """GetItem each id concurrently; returns {local_id: item} for those that exist."""
+    if not local_ids:
+        return {}
+    def get(local_id):
+        return table.get_item(Key={key_name: f"{sub}#{local_id}"}, ProjectionExpression=projection).get("Item")
+    with ContextThreadPoolExecutor(max_workers=_SYNC_UPDATE_WORKERS) as pool:
+        items = pool.map(get, local_ids)
+    return {i: item for i, item in zip(local_ids, items) if item}
+
+
+def _plan_sync(operations: list) -> tuple[dict, list]:
+    """Collapse the ordered operation list into one final write per entity.
+
+    Operations on different entities are independent, so only the order
+    per entity matters: create+update becomes one put with the merged body,
+    repeated updates merge, and a trailing delete wins.
+    """
+    plans: dict = {}
+    errors = []
+    for index, op in enumerate(operations):
+        kind = op.get("op") if isinstance(op, dict) else None
+        entity = op.get("entity") if isinstance(op, dict) else None
+        spec = _SYNC_ENTITIES.get(entity)
+        local_id = op.get("id") if isinstance(op, dict) else None
+        data = (op.get("data") or {}) if isinstance(op, dict) else {}
+        if spec is None or kind not in ("create", "update", "delete"):
+            errors.append((index, "알 수 없는 작업입니다."))
+            continue
+        if not isinstance(local_id, int) or not isinstance(data, dict):
+            errors.append((index, "id 가 올바르지 않습니다."))
+            continue
+        parent_field = spec[2]
+        if kind == "create" and parent_field and not isinstance(data.get(parent_field), int):
+            errors.append((index, f"{parent_field} 가 필요합니다."))
+            continue
+        if kind == "update" and spec[4] is None:
+            errors.append((index, "수정할 수 없는 항목입니다."))
+            continue
+
+        plan = plans.setdefault((entity, local_id), {"indexes": [], "kind": None, "data": {}})
+        plan["indexes"].append(index)
+        if kind == "delete":
+            plan.update(kind="delete", data={})
+        elif kind == "create":
+            plan.update(kind="put", data=dict(data))
+        else:
+            if plan["kind"] != "put":
+                plan["kind"] = "update"
+            plan["data"].update(data)
+    return plans, errors
+
+
+def _apply_sync(sub: str, operations: list) -> tuple[list[dict], list]:
+    """Apply a /sync batch. Returns per-operation results (request order) and
+    the cascade deletes to run in the background."""
+    plans, errors = _plan_sync(operations)
+    results: list = [None] * len(operations)
+    for index, message in errors:
+        results[index] = {"index": index, "ok": False, "error": message}
+    # Creates of works, episodes and plots that exist become metadata updates,
+    # as in the create handlers (see _recreate_update).
+    for entity in ("work", "episode", "plot"):
+        table_name, key_name, *_ = _SYNC_ENTITIES[entity]
+        existing = _get_user_items(globals()[table_name], key_name, sub,
+                                   [i for (e, i), plan in plans.items() if e == entity and plan["kind"] == "put"],
+                                   key_name)
+        for local_id in existing:
+            plan = plans[(entity, local_id)]
+            plan.update(kind="update", data={k: v for k, v in plan["data"].items() if k not in _LARGE_ATTRS})
+    # Created episodes and plots go between their neighbours' current keys.
+    order_keys = {}
+    for entity in _ORDER_KINDS:
+        parent_field = _SYNC_ENTITIES[entity][2]
+        by_parent: dict[int, list] = {}
+        for (e, local_id), plan in plans.items():
+            if e == entity and plan["kind"] == "put":
+                by_parent.setdefault(plan["data"][parent_field], []).append(
+                    (local_id, plan["data"].get("order_index", 0)))
+        for parent_id, creates in by_parent.items():
+            for local_id, key in _creation_keys(entity, sub, parent_id, creates).items():
+                order_keys[(entity, local_id)] = key
+
+    def finish(plan, error=None):
+        for index in plan["indexes"]:
+            results[index] = {"index": index, "ok": True} if error is None \
+                else {"index": index, "ok": False, "error": error}
+
+    # Deleted plots/episodes are read first so their stats can be discounted
+    doomed = {
+        entity: _get_user_items(globals()[_SYNC_ENTITIES[entity][0]], _SYNC_ENTITIES[entity][1], sub,
+                                [i for (e, i), plan in plans.items() if e == entity and plan["kind"] == "delete"],
+                                projection)
+        for entity, projection in (("plot", "episode_id, stats"), ("episode", "work_id"))
+    }
+    cascades = []
+    plot_keys = []
+    deleted_plots = []
+    deleted = []
+    updates = []
+    for entity, (table_name, key_name, parent_field, build_item, build_update) in _SYNC_ENTITIES.items():
+        table = globals()[table_name]
+        writes = [((e, local_id), plan) for (e, local_id), plan in plans.items()
+                  if e == entity and plan["kind"] in ("put", "delete")]
+        # BatchWriteItem in 25-item chunks; a failed chunk fails only its own ops
+        for start in range(0, len(writes), 25):
+            chunk = writes[start:start + 25]
+            try:
+                with table.batch_writer() as batch:
+                    for (_, local_id), plan in chunk:
+                        if plan["kind"] == "delete":
+                            batch.delete_item(Key={key_name: f"{sub}#{local_id}"})
+                        elif entity in _ORDER_KINDS:
+                            batch.put_item(Item=build_item(sub, plan["data"][parent_field], local_id, plan["data"],
+                                                           order_keys[(entity, local_id)]))
+                        elif parent_field:
+                            batch.put_item(Item=build_item(sub, plan["data"][parent_field], local_id, plan["data"]))
+                        else:
+                            batch.put_item(Item=build_item(sub, local_id, plan["data"]))
+            except Exception as e:
+                logger.error("Sync batch write failed for %s:\n%s", table_name, traceback.format_exc())
+                for _, plan in chunk:
+                    finish(plan, str(e))
+                continue
+            for (_, local_id), plan in chunk:
+                finish(plan)
+                if plan["kind"] == "delete":
+                    deleted.append((f"{entity}s", local_id))
+                    if entity == "plot":
+                        plot_keys.append(_plot_s3_key(sub, local_id))
+                        deleted_plots.append(local_id)
+                    elif entity == "work":
+                        cascades.append((_cascade_delete_work, sub, local_id))
+                    elif entity == "episode":
+                        work_id = doomed["episode"].get(local_id, {}).get("work_id")
+                        cascades.append((_cascade_delete_episode, sub, local_id, work_id))
+        updates.extend(
+            (table, {key_name: f"{sub}#{local_id}"}, local_id, build_update, plan)
+            for (e, local_id), plan in plans.items() if e == entity and plan["kind"] == "update"
+        )
+
+    _record_deletes(sub, deleted)
+    if plot_keys:
+        try:
+            _s3_delete_keys(plot_keys)
+        except Exception:
+            logger.warning("S3 delete failed during sync:\n%s", traceback.format_exc())
+        cascades.append((_unindex_plots, sub, deleted_plots))
+        cascades.append((_delete_history, sub, deleted_plots))
+        cascades.append((_drop_manifests, sub, [_manifest_key(sub, "plot", i) for i in deleted_plots]))
+        # before any episode cascade, which would otherwise discount them twice
+        cascades.insert(0, (_discount_plot_stats, sub,
+                            [doomed["plot"][i] for i in deleted_plots if i in doomed["plot"]]))
+
+    # UpdateItem can't be batched; run them concurrently instead
+    def run_update(update):
+        table, key, local_id, build_update, plan = update
+        try:
+            _update_entity(table, key, build_update(sub, local_id, plan["data"]))
+            finish(plan)
+        except Exception as e:
+            logger.error("Sync update failed for %s:\n%s", key, traceback.format_exc())
+            finish(plan, str(e))
+
+    if updates:
+        with ContextThreadPoolExecutor(max_workers=_SYNC_UPDATE_WORKERS) as pool:
+            list(pool.map(run_update, updates))
+    return results, cascades
+
+
+@app.post("/sync")
+@_idempotent
+async def sync(request: Request, background_tasks: BackgroundTasks):
+    """Apply an ordered batch of create/update/delete operations.
+
+    Body: {"operations": [{"op": "create"|"update"|"delete",
+                           "entity": "work"|"episode"|"plot"|"character"|"relation",
+                           "id": <local id>, "data": {...}}, ...]}
+    ``data`` takes the same fields as the single-entity endpoints; creates of
+    child entities also carry their parent id (work_id / episode_id).
+    """
+    sub = _require_login(request)
+    body = await request.json()
+    operations = body.get("operations") or []
+    if len(operations) > _SYNC_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {_SYNC_MAX_OPERATIONS}개까지 처리할 수 있습니다.")
+    await _flush_plot_writes(sub)
+    results, cascades = await run_in_threadpool(_apply_sync, sub, operations)
+    _defer(background_tasks, cascades)
+    return {"ok": all(r["ok"] for r in results), "results": results}
+
+
+# ── Changes ────────────────────────────────────────────────────────────────
+
+@app.get("/changes")
+async def get_changes(request: Request, since: str | None = None):
+    """Works, episodes, plots, characters and relations written since the
+    cursor, and the ones deleted ("deleted"), with the cursor for next time.
+
+    Without since, or with a cursor older than the tombstones kept, only a
+    fresh cursor comes back with reset: true, and the client reloads fully.
+    Items written right before the cursor can come back twice.
+    """
+    sub = _require_login(request)
+    cursor = _now()
+    if since is None:
+        return {"cursor": cursor, "reset": True}
+    try:
+        # an unencoded "+00:00" arrives as " 00:00"
+        since_at = datetime.fromisoformat(since.replace(" ", "+"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since 가 올바르지 않습니다.")
+    if since_at.tzinfo is None:
+        raise HTTPException(status_code=400, detail="since 에 시간대가 필요합니다.")
+    if since_at < datetime.now(timezone.utc) - timedelta(days=_TOMBSTONE_DAYS):
+        return {"cursor": cursor, "reset": True}
+    changes = await run_in_threadpool(_changes_since, sub, since_at)
+    return _JSONResponse({"cursor": cursor, "reset": False, **changes})
+
+
 # ── Community helpers ──────────────────────────────────────────────────────
 
 def _sub_to_color(sub: str) -> str:
@@ -937,29 +3899,33 @@ def _decode_token_payload(request: Request) -> dict:
 # ── Community Posts ────────────────────────────────────────────────────────
 
 @app.get("/posts")
-async def get_posts(request: Request):
+async def get_posts(request: Request, fields: str | None = None):
     """Return up to 50 most recent public posts (no login required)."""
-    res = _posts_table.scan(Limit=200)
+    fields = _parse_fields(fields)
+    res = _posts_table.scan(Limit=200, **_projection(fields, "created_at"))
     items = res.get("Items", [])
     # Sort by created_at descending and cap at 50
     items.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return items[:50]
+    return _JSONResponse(await run_in_threadpool(_hydrate_attrs, _select_fields(items[:50], fields)))
 
 
 @app.get("/posts/mine")
-async def get_my_posts(request: Request):
+async def get_my_posts(request: Request, fields: str | None = None):
     """Return posts created by the logged-in user."""
     sub = _require_login(request)
+    fields = _parse_fields(fields)
     res = _posts_table.scan(
         FilterExpression="author_sub = :s",
         ExpressionAttributeValues={":s": sub},
+        **_projection(fields, "created_at"),
     )
     items = res.get("Items", [])
     items.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return items
+    return _JSONResponse(await run_in_threadpool(_hydrate_attrs, _select_fields(items, fields)))
 
 
 @app.post("/posts")
+@_idempotent
 async def create_post(request: Request):
     """Create a community post, upload content snapshot to S3."""
     sub = _require_login(request)
@@ -972,9 +3938,10 @@ async def create_post(request: Request):
     post_id = body["post_id"]
     content_snapshot = body.get("content_snapshot")
 
-    # Upload snapshot to S3
-    s3_key = f"posts/{sub}/{post_id}.json"
-    if content_snapshot is not None:
+    # Store the snapshot as chunks, or as one S3 object when it has no block
+    # list (large ones are uploaded directly, see /posts/{id}/content/upload-url)
+    s3_key = _post_s3_key(sub, post_id)
+    if content_snapshot is not None and _save_manifest(sub, "post", post_id, content_snapshot) is None:
         _s3.put_object(
             Bucket=_S3_BUCKET,
             Key=s3_key,
@@ -982,7 +3949,7 @@ async def create_post(request: Request):
             ContentType="application/json",
         )
 
-    _posts_table.put_item(Item={
+    _posts_table.put_item(Item=_spill_item(sub, "posts", post_id, {
         "post_id":       f"{sub}#{post_id}",
         "local_id":      str(post_id),
         "author_sub":    sub,
@@ -1002,7 +3969,7 @@ async def create_post(request: Request):
         "comment_count": 0,
         "created_at":    datetime.now(timezone.utc).isoformat(),
         "updated_at":    datetime.now(timezone.utc).isoformat(),
-    })
+    }))
     return {"ok": True, "post_id": post_id}
 
 
@@ -1012,12 +3979,13 @@ async def delete_post(post_id: int, request: Request):
     item = _posts_table.get_item(Key={"post_id": f"{sub}#{post_id}"}).get("Item")
     if not item:
         raise HTTPException(status_code=404, detail="게시글을 찾을 수 없습니다.")
-    s3_key = item.get("content_s3_key", "")
-    if s3_key:
+    s3_keys = [k for k in [item.get("content_s3_key", ""), *_attr_keys(item)] if k]
+    if s3_keys:
         try:
-            _s3.delete_object(Bucket=_S3_BUCKET, Key=s3_key)
+            _s3_delete_keys(s3_keys)
         except Exception:
             pass
+    _drop_manifests(sub, [_manifest_key(sub, "post", post_id)])
     _posts_table.delete_item(Key={"post_id": f"{sub}#{post_id}"})
     return {"ok": True}
 
@@ -1052,42 +4020,115 @@ async def toggle_post_like(post_id: str, request: Request):
         return {"ok": True, "liked": True, "like_count": int(item.get("like_count", 0)) + 1}
 
 
-@app.get("/posts/{post_id}/content")
-async def get_post_content(post_id: str, request: Request):
-    """Return the full content snapshot from S3 (no auth required for reading)."""
+def _post_s3_key(sub: str, post_id) -> str:
+    return f"posts/{sub}/{post_id}.json"
+
+
+def _find_post(post_id: str) -> dict:
+    """A post item by local id (author_sub, local_id, content_s3_key)."""
     # post_id may be "sub#local_id" or just numeric local_id
     # We scan for the item to find the s3 key
     res = _posts_table.scan(
         FilterExpression="local_id = :lid",
+        ProjectionExpression="author_sub, local_id, content_s3_key",
         ExpressionAttributeValues={":lid": str(post_id)},
     )
     items = res.get("Items", [])
     if not items:
         raise HTTPException(status_code=404, detail="게시글을 찾을 수 없습니다.")
-    s3_key = items[0].get("content_s3_key", "")
+    return items[0]
+
+
+@app.get("/posts/{post_id}/content")
+@_single_flight
+async def get_post_content(post_id: str, request: Request):
+    """Return the full content snapshot (no auth required for reading)."""
+    from fastapi.responses import Response
+
+    post = _find_post(post_id)
+    body = _load_manifest(post["author_sub"], "post", post["local_id"])
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    s3_key = post.get("content_s3_key", "")
     if not s3_key:
         return {}
     try:
-        obj = _s3.get_object(Bucket=_S3_BUCKET, Key=s3_key)
-        return json.loads(obj["Body"].read())
+        return _content_response(s3_key, missing=None)
     except Exception:
         raise HTTPException(status_code=404, detail="콘텐츠를 찾을 수 없습니다.")
 
 
+@app.get("/posts/{post_id}/content/download-url")
+async def post_content_download_url(post_id: str, request: Request):
+    """Presigned GET for the content snapshot (no auth, like /content); url is
+    null when there is none or it is stored as chunks."""
+    s3_key = _find_post(post_id).get("content_s3_key", "")
+    if not s3_key or _head_content(s3_key) is None:
+        return {"url": None}
+    return _presigned_url("get_object", s3_key)
+
+
+@app.post("/posts/{post_id}/content/upload-url")
+async def post_content_upload_url(post_id: int, request: Request):
+    """Presigned POST for a snapshot of one of the caller's posts; call /complete with its upload_id."""
+    sub = _require_login(request)
+    return _presigned_upload(sub)
+
+
+def _complete_post_upload(sub: str, post_id: int, key: str) -> dict:
+    body = _read_upload(key)
+    live_key = _post_s3_key(sub, post_id)
+    try:
+        _posts_table.update_item(
+            Key={"post_id": f"{sub}#{post_id}"},
+            UpdateExpression="SET content_s3_key = :k, content_bytes = :b, updated_at = :t",
+            ConditionExpression="attribute_exists(post_id)",
+            ExpressionAttributeValues={":k": live_key, ":b": len(body),
+                                       ":t": datetime.now(timezone.utc).isoformat()},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise HTTPException(status_code=404, detail="게시글을 찾을 수 없습니다.")
+        raise
+    # into chunks, like a snapshot sent with POST /posts
+    try:
+        snapshot = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        snapshot = None
+    if _save_manifest(sub, "post", post_id, snapshot) is not None:
+        _s3_delete_keys([live_key, key])
+    else:
+        _s3.copy_object(Bucket=_S3_BUCKET, Key=live_key, CopySource={"Bucket": _S3_BUCKET, "Key": key})
+        _drop_manifests(sub, [_manifest_key(sub, "post", post_id)])
+        _s3_delete_keys([key])
+    return {"ok": True, "bytes": len(body)}
+
+
+@app.post("/posts/{post_id}/content/complete")
+async def complete_post_content_upload(post_id: int, request: Request):
+    """Body: {"upload_id"} from /upload-url."""
+    sub = _require_login(request)
+    key = await _upload_key(sub, request)
+    return await run_in_threadpool(_complete_post_upload, sub, post_id, key)
+
+
 # ── Community Comments ─────────────────────────────────────────────────────
 
 @app.get("/posts/{post_id}/comments")
-async def get_comments(post_id: str, request: Request):
+async def get_comments(post_id: str, request: Request, fields: str | None = None):
+    fields = _parse_fields(fields)
     res = _comments_table.scan(
         FilterExpression="post_id = :pid",
         ExpressionAttributeValues={":pid": str(post_id)},
+        **_projection(fields, "created_at"),
     )
     items = res.get("Items", [])
     items.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return items
+    return _JSONResponse(_select_fields(items, fields))
 
 
 @app.post("/posts/{post_id}/comments")
+@_idempotent
 async def create_comment(post_id: str, request: Request):
     sub = _require_login(request)
     payload = _decode_token_payload(request)
@@ -1179,6 +4220,29 @@ async def toggle_comment_like(comment_id: str, request: Request):
         return {"ok": True, "liked": True, "like_count": int(item.get("like_count", 0)) + 1}
 
 
+# ── Maintenance ────────────────────────────────────────────────────────────
+
+@app.post("/maintenance/orphans/sweep")
+async def sweep_orphans(request: Request, dry_run: bool = False):
+    """Delete the caller's episodes/plots/characters/relations/layouts/S3
+    documents left behind by deletes that predate cascading delete."""
+    sub = _require_login(request)
+    return await run_in_threadpool(_sweep_orphans, sub, dry_run)
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus text format, for a scraper holding METRICS_TOKEN as a
+    bearer token. Without METRICS_TOKEN the endpoint does not exist."""
+    from fastapi.responses import PlainTextResponse
+    token = os.getenv("METRICS_TOKEN", "")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="인증이 필요합니다.")
+    return PlainTextResponse(telemetry.METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/logout")
 async def logout(request: Request) -> RedirectResponse:
     # JWT는 stateless — 토큰 삭제는 프론트엔드에서 처리
@@ -1198,12 +4262,60 @@ async def logout(request: Request) -> RedirectResponse:
     return RedirectResponse(url="/")
 
 
+# ---------------------------------------------------------------------------
+# Deferred cascades
+# ---------------------------------------------------------------------------
+# Under Mangum, background tasks run before the invocation returns, so a large
+# cascade delete would still count against API Gateway's 29 s timeout. On
+# Lambda (AWS_LAMBDA_FUNCTION_NAME set) the tasks go to this function as one
+# asynchronous Event invocation instead, which Lambda retries on failure;
+# whatever a cascade still leaves behind is removed by _sweep_orphans.
+# Elsewhere, or when the invocation can't be sent, they stay background tasks.
+
+_DEFERRED_TASKS = {fn.__name__: fn for fn in (
+    _cascade_delete_work, _cascade_delete_episode, _discount_plot_stats,
+    _unindex_plots, _delete_history, _drop_manifests,
+)}
+
+
+@functools.cache
+def _lambda_client():
+    import boto3
+    return boto3.client("lambda")
+
+
+def _defer(background_tasks: BackgroundTasks, tasks: list[tuple]) -> None:
+    """Run tasks, (fn, *args) each, in order after the response."""
+    function_name = os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+    if function_name and tasks and all(fn.__name__ in _DEFERRED_TASKS for fn, *_ in tasks):
+        payload = orjson.dumps({"deferred": [[fn.__name__, *args] for fn, *args in tasks]}, default=_json_default)
+        try:
+            _lambda_client().invoke(FunctionName=function_name, InvocationType="Event", Payload=payload)
+            return
+        except Exception:
+            logger.warning("Deferring %s failed, running it in this invocation:\n%s",
+                           [fn.__name__ for fn, *_ in tasks], traceback.format_exc())
+    for fn, *args in tasks:
+        background_tasks.add_task(fn, *args)
+
+
+def _run_deferred(tasks: list) -> None:
+    for name, *args in tasks:
+        _DEFERRED_TASKS[name](*args)
+
 # ---------------------------------------------------------------------------
 # Dev entry-point & AWS Lambda Handler
 # ---------------------------------------------------------------------------
 
 from mangum import Mangum
-handler = Mangum(app)
+_mangum = Mangum(app)
+
+
+def handler(event, context):
+    if isinstance(event, dict) and "deferred" in event:
+        _run_deferred(event["deferred"])
+        return {"ok": True}
+    return _mangum(event, context)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,685 @@
+"""Maintenance jobs over whole tables: backfills and integrity checks.
+
+A job is a list of phases, and a phase is a parallel segmented Scan of one
+table (Segment / TotalSegments) whose pages a pool of --workers threads hands
+to the job. After every page the segment's LastEvaluatedKey, the counters and
+the job's state are committed together; the checkpoint file gets the latest
+commit every CHECKPOINT_SECONDS and at the end of every phase, so --resume
+continues from there. A page can be processed twice after a crash, so every
+job is idempotent.
+
+Reads and writes are paced against --read-units / --write-units per second
+by the capacity DynamoDB reports: each Scan page's own and, for the calls
+made inside main.py's helpers, the total of their trace (telemetry.traced;
+instrument_boto3 has every call report its capacity).
+
+Jobs:
+
+    order-keys  give the children of parents created before ordering keys
+                their order_key (_backfill_order_keys)
+    stamps      set updated_at / rev on items written before the change feed
+    stats       rebuild every work's writing stats (_rebuild_work_stats)
+    search      reindex every plot; only changed postings are written
+    chunks      move plot documents and post snapshots saved before the chunk
+                store into it (_move_to_chunks)
+    check       report orphans and items missing order keys, stamps or stats
+                (read-only)
+    sweep       delete what _sweep_orphans deletes for one user, for every
+                user at once: orphans table by table as check finds them,
+                then S3 objects nothing points to
+
+Runs against the backend main.py is configured with (backend/.env).
+
+    python maintenance.py check
+    python maintenance.py search --segments 16 --workers 8 --read-units 100 --write-units 50
+    python maintenance.py search --resume
+    python maintenance.py sweep --dry-run
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_EXCEPTION, wait
+from datetime import datetime
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+import main
+import telemetry
+from telemetry import ContextThreadPoolExecutor
+
+CHECKPOINT_SECONDS = 5.0
+SAMPLE_KEYS = 20        # keys listed per problem in check's report
+
+# charged to --read-units; every other DynamoDB call to --write-units
+_READ_OPERATIONS = {"GetItem", "Query", "Scan", "BatchGetItem", "TransactGetItems"}
+
+
+class CapacityLimiter:
+    """Paces callers to rate capacity units per second (None: no limit).
+
+    Units are charged after a call, once its cost is known. A call that
+    overdraws the bucket sleeps until the debt has refilled, so later callers
+    queue up behind it.
+    """
+
+    def __init__(self, rate: float | None):
+        self.rate = rate
+        self.tokens = rate or 0.0       # one second of burst
+        self.updated = time.monotonic()
+        self.spent = 0.0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def spend(self, units: float) -> None:
+        with self._lock:
+            self.spent += units
+            if not self.rate:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - units
+            self.updated = now
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += delay
+        if delay:
+            time.sleep(delay)
+
+
+def _consumed(response: dict) -> float:
+    capacity = response.get("ConsumedCapacity") or {}
+    if isinstance(capacity, list):
+        return sum(c.get("CapacityUnits", 0) for c in capacity)
+    return capacity.get("CapacityUnits", 0)
+
+
+def _charged(run: "Run", fn, *args, **kwargs):
+    """Call fn (a main.py helper) and charge the capacity its DynamoDB calls
+    reported to the run's limiters."""
+    reads = writes = 0.0
+    try:
+        with telemetry.traced() as trace:
+            return fn(*args, **kwargs)
+    finally:
+        for call in trace.calls:
+            if call["service"] != "dynamodb":
+                continue
+            if call["operation"] in _READ_OPERATIONS:
+                reads += call.get("capacity", 0)
+            else:
+                writes += call.get("capacity", 0)
+        run.reads.spend(reads)
+        run.writes.spend(writes)
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Phase:
+    """A segmented Scan of table (a main.py table global) feeding handle."""
+
+    def __init__(self, name: str, table: str, handle, **scan):
+        self.name = name
+        self.table = table
+        self.handle = handle        # (run, items) -> Counter
+        self.scan = scan
+
+    def segments(self, run: "Run") -> int:
+        return run.args.segments
+
+    def page(self, run: "Run", segment: int, start) -> tuple[list[dict], dict | None]:
+        """The items of the segment's page at start, and where the next page starts."""
+        kwargs = {**self.scan, "Segment": segment, "TotalSegments": run.args.segments,
+                  "Limit": run.args.page_size, "ReturnConsumedCapacity": "TOTAL"}
+        if start is not None:
+            kwargs["ExclusiveStartKey"] = start
+        res = getattr(main, self.table).scan(**kwargs)
+        run.reads.spend(_consumed(res))
+        return res.get("Items", []), res.get("LastEvaluatedKey")
+
+
+class ObjectPhase(Phase):
+    """A listing of the S3 objects under prefix (one segment) feeding handle."""
+
+    def __init__(self, name: str, prefix: str, handle):
+        super().__init__(name, None, handle)
+        self.prefix = prefix
+
+    def segments(self, run: "Run") -> int:
+        return 1
+
+    def page(self, run: "Run", segment: int, start) -> tuple[list[dict], str | None]:
+        kwargs = {"Bucket": main._S3_BUCKET, "Prefix": self.prefix, "MaxKeys": run.args.page_size}
+        if start is not None:
+            kwargs["ContinuationToken"] = start
+        res = main._s3.list_objects_v2(**kwargs)
+        return res.get("Contents", []), res.get("NextContinuationToken") if res.get("IsTruncated") else None
+
+
+class Run:
+    """One run of a job: limits, progress, counters and state."""
+
+    def __init__(self, args, checkpoint: dict | None = None):
+        checkpoint = checkpoint or {}
+        self.args = args
+        self.path = args.checkpoint
+        self.reads = CapacityLimiter(args.read_units)
+        self.writes = CapacityLimiter(args.write_units)
+        self.progress: dict[str, list[dict]] = checkpoint.get("phases", {})
+        self.counts = Counter(checkpoint.get("counts", {}))
+        self.state: dict[str, set] = {name: set(keys) for name, keys in checkpoint.get("state", {}).items()}
+        self.started_at: str = checkpoint.get("started_at") or main._now()
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._commits = 0
+        self._written = -1              # commit number of the snapshot on disk
+        self._saved_at = time.monotonic()
+
+    def remember(self, name: str, keys) -> None:
+        with self.lock:
+            self.state.setdefault(name, set()).update(keys)
+
+    def known(self, name: str) -> set:
+        return self.state.get(name, set())
+
+    def _snapshot_now(self, finished: bool = False) -> dict:
+        return {
+            "job": self.args.job,
+            "segments": self.args.segments,
+            "finished": finished,
+            "started_at": self.started_at,
+            "phases": {name: [dict(s) for s in segments] for name, segments in self.progress.items()},
+            "counts": dict(self.counts),
+            "state": {name: sorted(keys) for name, keys in self.state.items()},
+        }
+
+    def commit(self, phase: str, segment: int, last_key: dict | None, scanned: int, counts: Counter) -> None:
+        with self.lock:
+            self.progress[phase][segment] = {"start": last_key, "done": last_key is None}
+            self.counts[f"{phase}_scanned"] += scanned
+            self.counts.update(counts)
+            self._commits += 1
+            if time.monotonic() - self._saved_at < CHECKPOINT_SECONDS:
+                return
+            self._saved_at = time.monotonic()
+            number, snapshot = self._commits, self._snapshot_now()
+        self._write(number, snapshot)
+
+    def save(self, finished: bool = False) -> None:
+        with self.lock:
+            number, snapshot = self._commits, self._snapshot_now(finished)
+        self._write(number, snapshot)
+
+    def _write(self, number: int, snapshot: dict) -> None:
+        """Replace the checkpoint file, unless a later commit is already on disk."""
+        with self._file_lock:
+            if number < self._written:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f, default=_json_default)
+            os.replace(tmp, self.path)
+            self._written = number
+
+
+def _scan_segment(run: Run, phase: Phase, segment: int) -> None:
+    progress = run.progress[phase.name][segment]
+    while not progress["done"] and not run.stop.is_set():
+        items, last_key = phase.page(run, segment, progress["start"])
+        counts = phase.handle(run, items) if items else Counter()
+        run.commit(phase.name, segment, last_key, len(items), counts)
+        progress = run.progress[phase.name][segment]
+
+
+def run_phase(run: Run, phase: Phase) -> None:
+    segments = run.progress.setdefault(
+        phase.name, [{"start": None, "done": False} for _ in range(phase.segments(run))])
+    pending = [n for n, s in enumerate(segments) if not s["done"]]
+    if not pending:
+        return
+    started = time.perf_counter()
+    with ContextThreadPoolExecutor(max_workers=run.args.workers) as pool:
+        futures = [pool.submit(_scan_segment, run, phase, n) for n in pending]
+        try:
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+        except BaseException:
+            run.stop.set()
+            raise
+        finally:
+            # Let the other segments commit the page they are on.
+            wait(futures)
+            run.save()
+    print(f"{phase.name}: {run.counts[f'{phase.name}_scanned']} items "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+# Each job returns its phases; handlers take (run, items) and return counts.
+
+
+def _order_keys_handler(kind: str):
+    def handle(run: Run, items: list[dict]) -> Counter:
+        counts = Counter()
+        for parent in items:
+            keyed = _charged(run, main._backfill_order_keys, kind, parent["user_sub"], int(parent["local_id"]))
+            counts[f"{kind}_parents_keyed"] += 1
+            counts[f"{kind}s_keyed"] += keyed
+        return counts
+    return handle
+
+
+def order_keys_job(args) -> list[Phase]:
+    phases = []
+    for kind in ("episode", "plot"):
+        _, _, _, parent_table, marker = main._ORDER_KINDS[kind]
+        phases.append(Phase(
+            f"{kind}_parents", parent_table, _order_keys_handler(kind),
+            FilterExpression=f"attribute_not_exists({marker})",
+            ProjectionExpression="user_sub, local_id",
+        ))
+    return phases
+
+
+def _stamps_handler(table_name: str, key_name: str):
+    def handle(run: Run, items: list[dict]) -> Counter:
+        table = getattr(main, table_name)
+        counts = Counter()
+        for item in items:
+            try:
+                res = table.update_item(
+                    Key={key_name: item[key_name]},
+                    ConditionExpression="attribute_exists(#k) AND attribute_not_exists(updated_at)",
+                    ExpressionAttributeNames={"#k": key_name},
+                    ReturnConsumedCapacity="TOTAL",
+                    # Conditional, so one UpdateItem per item: BatchWriteItem
+                    # cannot make a write depend on what is stored.
+                    **main._stamped({"UpdateExpression": ""}),
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                counts["stamps_skipped"] += 1       # deleted or written since the scan
+                continue
+            run.writes.spend(_consumed(res) or 1)
+            counts["stamped"] += 1
+        return counts
+    return handle
+
+
+def stamps_job(args) -> list[Phase]:
+    return [
+        Phase(kind, table_name, _stamps_handler(table_name, key_name),
+              FilterExpression="attribute_not_exists(updated_at)",
+              ProjectionExpression="#k",
+              ExpressionAttributeNames={"#k": key_name})
+        for kind, (table_name, key_name) in main._CHANGE_KINDS.items()
+    ]
+
+
+def _stats_handler(run: Run, items: list[dict]) -> Counter:
+    counts = Counter()
+    for work in items:
+        result = _charged(run, main._rebuild_work_stats, work["user_sub"], int(work["local_id"]))
+        counts["works_rebuilt"] += 1
+        counts["plots_counted"] += result["plots"]
+    return counts
+
+
+def stats_job(args) -> list[Phase]:
+    return [Phase("works", "_works_table", _stats_handler, ProjectionExpression="user_sub, local_id")]
+
+
+def _search_handler(run: Run, items: list[dict]) -> Counter:
+    counts = Counter()
+    for plot in items:
+        sub, plot_id = plot["user_sub"], int(plot["local_id"])
+        doc = _charged(run, main._load_plot_doc, sub, plot_id)
+        written = _charged(run, main._index_plot, sub, plot_id, doc)
+        counts["plots_reindexed" if written else "plots_unchanged"] += 1
+        counts["postings_written"] += written
+    return counts
+
+
+def search_job(args) -> list[Phase]:
+    return [Phase("plots", "_plots_table", _search_handler, ProjectionExpression="user_sub, local_id")]
+
+
+def _chunks_handler(kind: str, sub_attr: str):
+    def handle(run: Run, items: list[dict]) -> Counter:
+        counts = Counter()
+        for item in items:
+            moved = _charged(run, main._move_to_chunks, item[sub_attr], kind, item["local_id"])
+            counts[f"{kind}s_moved" if moved else f"{kind}s_skipped"] += 1
+            counts["chunks_referenced"] += moved
+        return counts
+    return handle
+
+
+def chunks_job(args) -> list[Phase]:
+    return [
+        Phase("plots", "_plots_table", _chunks_handler("plot", "user_sub"),
+              ProjectionExpression="user_sub, local_id"),
+        Phase("posts", "_posts_table", _chunks_handler("post", "author_sub"),
+              ProjectionExpression="author_sub, local_id"),
+    ]
+
+
+def _check_handler(name: str, key, parent=None, parent_set: str | None = None, keep: str | None = None,
+                   required: tuple[str, ...] = ()):
+    """Record items whose parent (a key in the parent_set state) is missing
+    as orphan_{name}, and those lacking a required attribute as
+    missing_{attr}_{name}. Live items' keys go to the keep state."""
+    def handle(run: Run, items: list[dict]) -> Counter:
+        parents = run.known(parent_set) if parent_set else set()
+        live, problems = [], {}
+        for item in items:
+            if parent_set and parent(item) not in parents:
+                problems.setdefault(f"orphan_{name}", []).append(key(item))
+                continue
+            live.append(key(item))
+            for attr in required:
+                if attr not in item:
+                    problems.setdefault(f"missing_{attr}_{name}", []).append(key(item))
+        if keep:
+            run.remember(keep, live)
+        for problem, keys in problems.items():
+            run.remember(f"problem:{problem}", keys)
+        return Counter()
+    return handle
+
+
+def _user_key(item: dict, attr: str) -> str:
+    return f"{item['user_sub']}#{int(item[attr])}"
+
+
+def check_job(args) -> list[Phase]:
+    """Phases run in parent-before-child order; the children of an orphan
+    are orphans too, as in _sweep_orphans."""
+    stamped = "user_sub, local_id, updated_at"
+    return [
+        Phase("works", "_works_table",
+              _check_handler("works", lambda w: w["work_id"], keep="works", required=("updated_at",)),
+              ProjectionExpression="work_id, user_sub, local_id, updated_at"),
+        Phase("episodes", "_episodes_table",
+              _check_handler("episodes", lambda e: e["episode_id"], lambda e: _user_key(e, "work_id"),
+                             "works", keep="episodes", required=("order_key", "updated_at")),
+              ProjectionExpression=f"episode_id, work_id, order_key, {stamped}"),
+        Phase("plots", "_plots_table",
+              _check_handler("plots", lambda p: p["plot_id"], lambda p: _user_key(p, "episode_id"),
+                             "episodes", keep="plots", required=("order_key", "updated_at", "stats")),
+              ProjectionExpression=f"plot_id, episode_id, order_key, stats, {stamped}"),
+        Phase("characters", "_characters_table",
+              _check_handler("characters", lambda c: c["character_id"], lambda c: _user_key(c, "work_id"),
+                             "works", required=("updated_at",)),
+              ProjectionExpression=f"character_id, work_id, {stamped}"),
+        Phase("relations", "_relations_table",
+              _check_handler("relations", lambda r: r["relation_id"], lambda r: _user_key(r, "work_id"),
+                             "works", required=("updated_at",)),
+              ProjectionExpression=f"relation_id, work_id, {stamped}"),
+        Phase("graph_layouts", "_graph_table",
+              _check_handler("graph_layouts", lambda l: l["layout_id"], lambda l: l["layout_id"], "works"),
+              ProjectionExpression="layout_id"),
+        Phase("plot_versions", "_versions_table",
+              _check_handler("plot_versions", lambda v: v["version_key"], lambda v: v["version_key"], "plots"),
+              ProjectionExpression="version_key"),
+    ]
+
+
+def _sweep_cutoff(run: Run) -> str:
+    """Items written after this are left alone: their parent may have been
+    created after its phase was scanned, and an S3 object may be uploaded
+    before the item that points to it."""
+    return (datetime.fromisoformat(run.started_at) - main._ORPHAN_S3_GRACE).isoformat()
+
+
+def _written_at(item: dict) -> str:
+    return item.get("updated_at") or item.get("saved_at") or ""
+
+
+def _exists(run: Run, table_name: str, key_name: str, key: str) -> bool:
+    res = _charged(run, getattr(main, table_name).get_item, Key={key_name: key},
+                   ProjectionExpression="#k", ExpressionAttributeNames={"#k": key_name})
+    return "Item" in res
+
+
+def _delete_items(table, key: tuple[str, ...], items: list[dict]) -> None:
+    with table.batch_writer(overwrite_by_pkeys=list(key)) as batch:
+        for item in items:
+            batch.delete_item(Key={k: item[k] for k in key})
+
+
+def _sweep_parents_handler(keep: str, key_name: str):
+    """Record the keys of a table with no parent and the spilled attributes
+    its items point to."""
+    def handle(run: Run, items: list[dict]) -> Counter:
+        run.remember(keep, [item[key_name] for item in items])
+        run.remember("attr_keys", [k for item in items for k in main._attr_keys(item)])
+        return Counter()
+    return handle
+
+
+def _sweep_children_handler(name: str, table_name: str, key: tuple[str, ...], parent,
+                            parent_set: str, parent_table: str, parent_key: str, keep: str | None = None):
+    """Delete items whose parent (a key in the parent_set state) is missing,
+    counted as name. An item written after the cutoff, or whose parent exists
+    when looked up (created after its phase), is live. Live items' keys go to
+    the keep state along with what they point to (attribute values, history
+    checkpoints); deleted items' keys to "swept", so their children are
+    orphans without a lookup, --dry-run included."""
+    def handle(run: Run, items: list[dict]) -> Counter:
+        cutoff = _sweep_cutoff(run)
+        parents, swept = run.known(parent_set), run.known("swept")
+        live, orphans = [], []
+        for item in items:
+            owner = parent(item)
+            if owner in parents or _written_at(item) >= cutoff or (
+                    owner not in swept and _exists(run, parent_table, parent_key, owner)):
+                live.append(item)
+            else:
+                orphans.append(item)
+        if keep:
+            run.remember(keep, [item[key[0]] for item in live])
+        run.remember("attr_keys", [k for item in live for k in main._attr_keys(item)])
+        run.remember("checkpoints", [item["s3_key"] for item in live if item.get("s3_key")])
+        run.remember("swept", [item[key[0]] for item in orphans])
+        if orphans and not run.args.dry_run:
+            _charged(run, _delete_items, getattr(main, table_name), key, orphans)
+        return Counter({name: len(orphans)})
+    return handle
+
+
+# manifest kind: (state, table global, key attribute) of the documents that own one
+_MANIFEST_OWNERS = {"plot": ("plots", "_plots_table", "plot_id"), "post": ("posts", "_posts_table", "post_id")}
+
+
+def _sweep_manifests_handler(run: Run, items: list[dict]) -> Counter:
+    """Drop manifests of documents that are gone (releasing their chunks)."""
+    cutoff = _sweep_cutoff(run)
+    dead: dict[str, list[str]] = {}
+    for item in items:
+        sub, kind, local_id = item["manifest_key"].rsplit("#", 2)
+        state, table_name, key_name = _MANIFEST_OWNERS[kind]
+        owner = f"{sub}#{local_id}"
+        if item.get("saved_at", "") >= cutoff or owner in run.known(state) or (
+                owner not in run.known("swept") and _exists(run, table_name, key_name, owner)):
+            continue
+        dead.setdefault(sub, []).append(item["manifest_key"])
+    if not run.args.dry_run:
+        for sub, keys in dead.items():
+            _charged(run, main._drop_manifests, sub, keys)
+    return Counter(manifests=sum(len(keys) for keys in dead.values()))
+
+
+def _sweep_chunks_handler(run: Run, items: list[dict]) -> Counter:
+    """Delete chunks unused since before the cutoff (scanned with refs <= 0)."""
+    cutoff = _sweep_cutoff(run)
+    released = [item for item in items if item.get("released_at", cutoff) < cutoff]
+    if run.args.dry_run:
+        return Counter(chunks=len(released))
+    return Counter(chunks=sum(_charged(run, main._delete_released_chunk, item) for item in released))
+
+
+def _sweep_objects_handler(name: str, live=None):
+    """Delete listed S3 objects older than the cutoff unless live(run, key)."""
+    def handle(run: Run, objects: list[dict]) -> Counter:
+        cutoff = datetime.fromisoformat(_sweep_cutoff(run))
+        dead = [obj["Key"] for obj in objects
+                if obj["LastModified"] < cutoff and not (live and live(run, obj["Key"]))]
+        if dead and not run.args.dry_run:
+            main._s3_delete_keys(dead)
+        return Counter({name: len(dead)})
+    return handle
+
+
+def _live_plot_object(run: Run, key: str) -> bool:
+    _, sub, name = key.split("/", 2)         # plots/{sub}/{plot_id}.json
+    return f"{sub}#{name.removesuffix('.json')}" in run.known("plots")
+
+
+def sweep_job(args) -> list[Phase]:
+    """Phases run in parent-before-child order as in check; the S3 listings
+    come last, once every item that can point to an object has been seen."""
+    stamped = "user_sub, updated_at"
+    return [
+        Phase("works", "_works_table", _sweep_parents_handler("works", "work_id"),
+              ProjectionExpression="work_id, planning_doc_ref, work_summary_ref"),
+        Phase("episodes", "_episodes_table",
+              _sweep_children_handler("episodes", "_episodes_table", ("episode_id",),
+                                      lambda e: _user_key(e, "work_id"), "works", "_works_table", "work_id",
+                                      keep="episodes"),
+              ProjectionExpression=f"episode_id, work_id, chapter_summary_ref, {stamped}"),
+        Phase("plots", "_plots_table",
+              _sweep_children_handler("plots", "_plots_table", ("plot_id",),
+                                      lambda p: _user_key(p, "episode_id"), "episodes", "_episodes_table",
+                                      "episode_id", keep="plots"),
+              ProjectionExpression=f"plot_id, episode_id, {stamped}"),
+        Phase("characters", "_characters_table",
+              _sweep_children_handler("characters", "_characters_table", ("character_id",),
+                                      lambda c: _user_key(c, "work_id"), "works", "_works_table", "work_id"),
+              ProjectionExpression=f"character_id, work_id, {stamped}"),
+        Phase("relations", "_relations_table",
+              _sweep_children_handler("relations", "_relations_table", ("relation_id",),
+                                      lambda r: _user_key(r, "work_id"), "works", "_works_table", "work_id"),
+              ProjectionExpression=f"relation_id, work_id, {stamped}"),
+        Phase("graph_layouts", "_graph_table",
+              _sweep_children_handler("graph_layouts", "_graph_table", ("layout_id",),
+                                      lambda l: l["layout_id"], "works", "_works_table", "work_id"),
+              ProjectionExpression="layout_id, updated_at"),
+        Phase("posts", "_posts_table", _sweep_parents_handler("posts", "post_id"),
+              ProjectionExpression="post_id, content_preview_ref"),
+        Phase("plot_versions", "_versions_table",
+              _sweep_children_handler("plot_versions", "_versions_table", ("version_key", "version"),
+                                      lambda v: v["version_key"], "plots", "_plots_table", "plot_id"),
+              ProjectionExpression="version_key, #v, saved_at, s3_key",
+              ExpressionAttributeNames={"#v": "version"}),
+        Phase("manifests", "_manifests_table", _sweep_manifests_handler,
+              ProjectionExpression="manifest_key, saved_at"),
+        Phase("chunks", "_chunks_table", _sweep_chunks_handler,
+              FilterExpression="#r <= :zero",
+              ProjectionExpression="chunk_key, released_at",
+              ExpressionAttributeNames={"#r": "refs"},
+              ExpressionAttributeValues={":zero": 0}),
+        ObjectPhase("plot_objects", "plots/", _sweep_objects_handler("s3_objects", _live_plot_object)),
+        ObjectPhase("attr_objects", "attrs/", _sweep_objects_handler(
+            "attr_objects", lambda run, key: key in run.known("attr_keys"))),
+        ObjectPhase("history_objects", "history/", _sweep_objects_handler(
+            "history_objects", lambda run, key: key in run.known("checkpoints"))),
+        # direct uploads never completed
+        ObjectPhase("upload_objects", "uploads/", _sweep_objects_handler("upload_objects")),
+    ]
+
+
+JOBS = {
+    "order-keys": order_keys_job,
+    "stamps":     stamps_job,
+    "stats":      stats_job,
+    "search":     search_job,
+    "chunks":     chunks_job,
+    "check":      check_job,
+    "sweep":      sweep_job,
+}
+
+
+def report(run: Run, elapsed: float) -> dict:
+    result = {
+        "job": run.args.job,
+        "seconds": round(elapsed, 2),
+        **dict(sorted(run.counts.items())),
+        "read_units": round(run.reads.spent, 1),
+        "read_wait_s": round(run.reads.waited, 2),
+        "write_units": round(run.writes.spent, 1),
+        "write_wait_s": round(run.writes.waited, 2),
+    }
+    problems = {name.removeprefix("problem:"): sorted(keys)
+                for name, keys in sorted(run.state.items()) if name.startswith("problem:")}
+    result.update({name: len(keys) for name, keys in problems.items()})
+    width = max(len(key) for key in result)
+    for key, value in result.items():
+        print(f"{key:<{width}}  {value}")
+    for name, keys in problems.items():
+        print(f"\n{name}:")
+        for key in keys[:SAMPLE_KEYS]:
+            print(f"  {key}")
+        if len(keys) > SAMPLE_KEYS:
+            print(f"  ... {len(keys) - SAMPLE_KEYS} more")
+    return {**result, "problems": problems}
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("job", choices=JOBS)
+    parser.add_argument("--segments", type=int, default=8, help="TotalSegments of each Scan")
+    parser.add_argument("--workers", type=int, default=8, help="segments scanned at the same time")
+    parser.add_argument("--page-size", type=int, default=500, help="Scan Limit; progress is committed per page")
+    parser.add_argument("--read-units", type=float, help="read capacity units per second (default: no limit)")
+    parser.add_argument("--write-units", type=float, help="write capacity units per second (default: no limit)")
+    parser.add_argument("--checkpoint", help="progress file (default: maintenance-<job>.json)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    parser.add_argument("--restart", action="store_true", help="discard an unfinished checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="sweep: count orphans without deleting")
+    parser.add_argument("--json", help="write the result to this file")
+    args = parser.parse_args(argv)
+    args.checkpoint = args.checkpoint or f"maintenance-{args.job}.json"
+
+    checkpoint = None
+    if os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as f:
+            saved = json.load(f)
+        if args.resume:
+            if saved["job"] != args.job or saved["segments"] != args.segments:
+                parser.error(f"{args.checkpoint} is a {saved['job']} run with --segments {saved['segments']}")
+            checkpoint = saved
+        elif not saved.get("finished") and not args.restart:
+            parser.error(f"{args.checkpoint} holds an unfinished run: pass --resume or --restart")
+    elif args.resume:
+        parser.error(f"no checkpoint at {args.checkpoint}")
+
+    run = Run(args, checkpoint)
+    started = time.perf_counter()
+    try:
+        for phase in JOBS[args.job](args):
+            run_phase(run, phase)
+    except KeyboardInterrupt:
+        print(f"interrupted; continue with --resume (checkpoint: {args.checkpoint})", file=sys.stderr)
+        return 130
+    run.save(finished=True)
+    result = report(run, time.perf_counter() - started)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, default=_json_default)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
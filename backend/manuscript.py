@@ -0,0 +1,345 @@
+"""Manuscript writers for GET /works/{work_id}/export.
+
+A writer turns a work into bytes one plot at a time, so the endpoint can
+stream the export while it is still fetching later plots. Block layout
+follows the client-side .docx export (src/components/Export): scene
+headings are numbered S#n across the whole work, dialogue is
+"name<TAB>text", narration is centred and stage directions are indented.
+"""
+
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+
+def _text(node: dict) -> str:
+    """Inline text of a TipTap node (hardBreak becomes a newline)."""
+    if node.get("type") == "text":
+        return node.get("text", "")
+    if node.get("type") == "hardBreak":
+        return "\n"
+    return "".join(_text(child) for child in node.get("content") or [])
+
+
+def _has_block_children(node: dict) -> bool:
+    return any(child.get("type") not in ("text", "hardBreak") for child in node.get("content") or [])
+
+
+class ManuscriptWriter:
+    """Plain text writer; the other formats override the block hooks."""
+
+    extension = "txt"
+    media_type = "text/plain; charset=utf-8"
+
+    def __init__(self, work_title: str, work_type: str):
+        self.work_title = work_title
+        self.work_type = work_type
+        self.scene_count = 0
+
+    # -- stream structure ------------------------------------------------------
+    def begin(self) -> bytes:
+        return self._encode([self.work_title, ""])
+
+    def episode(self, title: str) -> bytes:
+        return self._encode(["", title, "-" * 40, ""])
+
+    def plot(self, number: int, title: str, doc: dict) -> bytes:
+        lines = []
+        if self.work_type == "plot":
+            lines += [f"P{number}. {title}", ""]
+        for node in doc.get("content") or []:
+            lines += self.block(node)
+        return self._encode(lines)
+
+    def end(self) -> bytes:
+        return b""
+
+    def _encode(self, lines: list[str]) -> bytes:
+        return "".join(line + "\n" for line in lines).encode("utf-8")
+
+    # -- blocks -----------------------------------------------------------------
+    def block(self, node: dict) -> list[str]:
+        kind = node.get("type")
+        if kind == "sceneHeading":
+            self.scene_count += 1
+            attrs = node.get("attrs") or {}
+            extra = " · ".join(v for v in (attrs.get("location"), attrs.get("time")) if v)
+            return self.scene_heading(self.scene_count, _text(node), extra)
+        if kind == "dialogue":
+            return self.dialogue((node.get("attrs") or {}).get("characterName", ""), _text(node))
+        if kind == "narration":
+            return self.narration(_text(node))
+        if kind == "stageDirection":
+            return self.stage_direction(_text(node))
+        if kind == "heading":
+            return self.heading(int((node.get("attrs") or {}).get("level", 1)), _text(node))
+        if kind == "pageBreak":
+            return self.page_break()
+        if kind == "listItem" or _has_block_children(node):
+            lines = []
+            for child in node.get("content") or []:
+                lines += self.block(child)
+            return lines
+        return self.paragraph(_text(node))
+
+    def scene_heading(self, number: int, text: str, extra: str) -> list[str]:
+        return [f"S#{number} {text}" + (f"    {extra}" if extra else ""), ""]
+
+    def dialogue(self, name: str, text: str) -> list[str]:
+        return [f"{name}\t{text}", ""]
+
+    def narration(self, text: str) -> list[str]:
+        return [text, ""]
+
+    def stage_direction(self, text: str) -> list[str]:
+        return ["    " + text.replace("\n", "\n    "), ""]
+
+    def heading(self, level: int, text: str) -> list[str]:
+        return [text, ""]
+
+    def paragraph(self, text: str) -> list[str]:
+        return [text]
+
+    def page_break(self) -> list[str]:
+        return ["\f"]
+
+
+class MarkdownWriter(ManuscriptWriter):
+    extension = "md"
+    media_type = "text/markdown; charset=utf-8"
+
+    def begin(self) -> bytes:
+        return self._encode([f"# {self.work_title}", ""])
+
+    def episode(self, title: str) -> bytes:
+        return self._encode([f"## {title}", ""])
+
+    def plot(self, number: int, title: str, doc: dict) -> bytes:
+        lines = [f"### P{number}. {title}", ""] if self.work_type == "plot" else []
+        for node in doc.get("content") or []:
+            lines += self.block(node)
+        return self._encode(lines)
+
+    def scene_heading(self, number, text, extra):
+        return [f"**S#{number} {text}**" + (f" _{extra}_" if extra else ""), ""]
+
+    def dialogue(self, name, text):
+        return [f"**{name}** {text}".replace("\n", "  \n"), ""]
+
+    def narration(self, text):
+        return [f"_{text}_", ""]
+
+    def stage_direction(self, text):
+        return ["> " + text.replace("\n", "\n> "), ""]
+
+    def heading(self, level, text):
+        return ["#" * min(level + 3, 6) + " " + text, ""]
+
+    def paragraph(self, text):
+        return [text.replace("\n", "  \n"), ""]
+
+    def page_break(self):
+        return ["---", ""]
+
+
+class FountainWriter(ManuscriptWriter):
+    """Fountain screenplay markup (https://fountain.io/syntax)."""
+
+    extension = "fountain"
+
+    def begin(self) -> bytes:
+        return self._encode([f"Title: {self.work_title}", ""])
+
+    def episode(self, title: str) -> bytes:
+        return self._encode([f"# {title}", ""])
+
+    def plot(self, number: int, title: str, doc: dict) -> bytes:
+        lines = [f"## {title}", ""] if self.work_type == "plot" else []
+        for node in doc.get("content") or []:
+            lines += self.block(node)
+        return self._encode(lines)
+
+    def scene_heading(self, number, text, extra):
+        # "." forces a scene heading; "#n#" is the scene number
+        heading = " - ".join(part for part in (text, extra) if part)
+        return [f".{heading} #{number}#", ""]
+
+    def dialogue(self, name, text):
+        # "@" forces a character cue for names that are not upper-case latin
+        return [f"@{name}", text, ""]
+
+    def narration(self, text):
+        return [f">{line}<" for line in text.split("\n")] + [""]
+
+    def stage_direction(self, text):
+        return [f"!{text}", ""]
+
+    def heading(self, level, text):
+        return ["#" * min(level + 2, 6) + " " + text, ""]
+
+    def paragraph(self, text):
+        return [f"!{text}", ""] if text else []
+
+    def page_break(self):
+        return ["===", ""]
+
+
+# ---------------------------------------------------------------------------
+# .docx
+# ---------------------------------------------------------------------------
+
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+</Types>"""
+
+_PACKAGE_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+_DOCUMENT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+_W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def _heading_style(style_id: str, name: str, size: int) -> str:
+    return (f'<w:style w:type="paragraph" w:styleId="{style_id}"><w:name w:val="{name}"/>'
+            f'<w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/>'
+            f'<w:pPr><w:keepNext/><w:spacing w:before="240" w:after="120"/></w:pPr>'
+            f'<w:rPr><w:b/><w:sz w:val="{size}"/></w:rPr></w:style>')
+
+
+_STYLES = (
+    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles {_W}>'
+    '<w:docDefaults><w:rPrDefault><w:rPr><w:sz w:val="22"/></w:rPr></w:rPrDefault></w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>'
+    '<w:pPr><w:spacing w:after="60"/></w:pPr></w:style>'
+    + _heading_style("Title", "Title", 40)
+    + _heading_style("Heading1", "heading 1", 32)
+    + _heading_style("Heading2", "heading 2", 26)
+    + _heading_style("Heading3", "heading 3", 24)
+    + "</w:styles>"
+)
+
+
+def _run(text: str, props: str = "") -> str:
+    parts = []
+    for i, line in enumerate(_INVALID_XML.sub("", text).split("\n")):
+        if i:
+            parts.append("<w:br/>")
+        parts.append(f'<w:t xml:space="preserve">{escape(line)}</w:t>')
+    rpr = f"<w:rPr>{props}</w:rPr>" if props else ""
+    return f"<w:r>{rpr}{''.join(parts)}</w:r>"
+
+
+def _para(runs: str, ppr: str = "") -> str:
+    return f"<w:p>{f'<w:pPr>{ppr}</w:pPr>' if ppr else ''}{runs}</w:p>"
+
+
+class _Sink:
+    """Write-only, non-seekable target for ZipFile; drained after each plot."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+class DocxWriter(ManuscriptWriter):
+    """WordprocessingML streamed through a non-seekable ZipFile.
+
+    ZipFile falls back to data descriptors when it cannot seek, so entries are
+    emitted as they are compressed and only one plot is held in memory.
+    """
+
+    extension = "docx"
+    media_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+    def begin(self) -> bytes:
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        self._zip.writestr("_rels/.rels", _PACKAGE_RELS)
+        self._zip.writestr("word/_rels/document.xml.rels", _DOCUMENT_RELS)
+        self._zip.writestr("word/styles.xml", _STYLES)
+        self._doc = self._zip.open("word/document.xml", "w")
+        self._write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {_W}><w:body>')
+        self._write(_para(_run(self.work_title), '<w:pStyle w:val="Title"/>'))
+        return self._sink.drain()
+
+    def episode(self, title: str) -> bytes:
+        self._write(_para(_run(title), '<w:pStyle w:val="Heading1"/>'))
+        return self._sink.drain()
+
+    def plot(self, number: int, title: str, doc: dict) -> bytes:
+        if self.work_type == "plot":
+            self._write(_para(_run(f"P{number} - {title}", "<w:b/>"),
+                              '<w:pBdr><w:bottom w:val="single" w:sz="4" w:space="1" w:color="6366F1"/></w:pBdr>'
+                              '<w:spacing w:before="400" w:after="200"/>'))
+        for node in doc.get("content") or []:
+            self._write("".join(self.block(node)))
+        return self._sink.drain()
+
+    def end(self) -> bytes:
+        self._write("<w:sectPr/></w:body></w:document>")
+        self._doc.close()
+        self._zip.close()
+        return self._sink.drain()
+
+    def _write(self, xml: str) -> None:
+        self._doc.write(xml.encode("utf-8"))
+
+    def scene_heading(self, number, text, extra):
+        runs = _run(f"S#{number} {text}", '<w:b/><w:color w:val="A78BFA"/>')
+        if extra:
+            runs += '<w:r><w:tab/></w:r>' + _run(extra, '<w:i/><w:color w:val="A78BFA"/>')
+        return [_para(runs, '<w:tabs><w:tab w:val="right" w:pos="8640"/></w:tabs>'
+                            '<w:spacing w:before="240" w:after="120"/>')]
+
+    def dialogue(self, name, text):
+        return [_para(_run(name, "<w:b/>") + "<w:r><w:tab/></w:r>" + _run(text),
+                      '<w:spacing w:after="120"/>')]
+
+    def narration(self, text):
+        return [_para(""), _para(_run(text, '<w:i/><w:color w:val="9CA3AF"/>'), '<w:jc w:val="center"/>'),
+                _para("")]
+
+    def stage_direction(self, text):
+        return [_para(""), _para(_run(text, '<w:i/><w:color w:val="6B7280"/>'), '<w:ind w:left="360"/>'),
+                _para("")]
+
+    def heading(self, level, text):
+        return [_para(_run(text), f'<w:pStyle w:val="Heading{min(level + 1, 3)}"/>')]
+
+    def paragraph(self, text):
+        return [_para(_run(text) if text else "")]
+
+    def page_break(self):
+        return ['<w:p><w:r><w:br w:type="page"/></w:r></w:p>']
+
+
+WRITERS = {
+    "txt": ManuscriptWriter,
+    "md": MarkdownWriter,
+    "fountain": FountainWriter,
+    "docx": DocxWriter,
+}
@@ -0,0 +1,81 @@
+"""Passage retrieval for LLM prompts (POST /characters/{id}/summarize).
+
+A work's text is cut into passages: runs of consecutive lines (a scene of a
+plot, or paragraphs of a chapter) of up to PASSAGE_CHARS. Only passages
+that mention one of the query terms (the character and the characters it is
+related to) are candidates. Candidates are ranked with BM25 over the
+character bigrams of search.py, weighted per term, and taken best first
+until the token budget is spent, then put back in reading order.
+
+Only the query's grams are counted, so ranking a whole work costs a few
+substring counts per passage rather than tokenizing it.
+"""
+
+import numpy as np
+
+import search
+
+PASSAGE_CHARS = 600
+CHARS_PER_TOKEN = 2     # Korean prose with the gpt-4o tokenizer, roughly
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split(lines: list[tuple[str, bool]], label: str, max_chars: int = PASSAGE_CHARS) -> list[str]:
+    """Passages of "label\\nline\\nline...". lines are (text, starts_new), where
+    starts_new forces a break (e.g. at a scene heading); a line longer than
+    max_chars becomes a passage of its own."""
+    passages, current, size = [], [], 0
+    for text, starts_new in lines:
+        text = text.strip()
+        if not text:
+            continue
+        if current and (starts_new or size + len(text) > max_chars):
+            passages.append("\n".join([label, *current]))
+            current, size = [], 0
+        current.append(text)
+        size += len(text) + 1
+    if current:
+        passages.append("\n".join([label, *current]))
+    return passages
+
+
+def select(passages: list[str], terms: dict[str, float], budget: int) -> list[int]:
+    """Indices (in reading order) of the passages to put in a prompt of at
+    most budget tokens. terms maps each query term to its weight; a passage
+    is a candidate only if it contains one of them."""
+    names = {term: search.normalize(term) for term in terms if term.strip()}
+    if not passages or not names:
+        return []
+    texts = [search.normalize(p) for p in passages]
+    candidates = [i for i, text in enumerate(texts) if any(name in text for name in names.values())]
+    if not candidates:
+        return []
+
+    # A gram never spans a word boundary, so substring counts are gram
+    # counts; lengths in characters stand in for lengths in grams.
+    term_grams = {term: list(search.grams(name)) for term, name in names.items()}
+    vocab = sorted({g for grams in term_grams.values() for g in grams})
+    tf = np.array([[text.count(g) for g in vocab] for text in texts], dtype=np.float64)
+    doc_len = np.array([len(text) for text in texts], dtype=np.float64)
+    df = (tf > 0).sum(axis=0)
+    idf = np.log(1 + (len(texts) - df + 0.5) / (df + 0.5))
+    norm = search.BM25_K1 * (1 - search.BM25_B + search.BM25_B * doc_len[candidates] / doc_len.mean())
+    tf = tf[candidates]
+    gram_scores = idf * tf * (search.BM25_K1 + 1) / (tf + norm[:, None])
+
+    weights = np.zeros(len(vocab))
+    for term, grams in term_grams.items():
+        for g in grams:
+            weights[vocab.index(g)] += terms[term]
+    scores = gram_scores @ weights
+
+    chosen, left = [], budget
+    for k in np.lexsort((candidates, -scores)):
+        cost = estimate_tokens(passages[candidates[k]])
+        if cost <= left:
+            chosen.append(candidates[k])
+            left -= cost
+    return sorted(chosen)
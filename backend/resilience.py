@@ -0,0 +1,95 @@
+"""Retries and request coalescing for backend calls.
+
+aretry() runs a call again after a throttling or transient error, sleeping a
+full-jitter exponential backoff between attempts. DynamoDB and S3 calls get
+the same from botocore's adaptive retry mode (storage.py), which also slows
+the client down while a table is being throttled; aretry() is for the calls
+botocore does not make (the LLM).
+
+SingleFlight lets concurrent identical calls share one execution: the first
+caller starts it and every caller, the first included, awaits its result.
+"""
+
+import asyncio
+import os
+import random
+
+from botocore.exceptions import ClientError, ConnectionClosedError, EndpointConnectionError, ReadTimeoutError
+
+MAX_ATTEMPTS = int(os.getenv("BACKEND_MAX_ATTEMPTS", "5"))
+BASE_DELAY = 0.2        # seconds; the cap of the first backoff
+MAX_DELAY = 8.0
+
+THROTTLING_CODES = {
+    "ProvisionedThroughputExceededException", "ThrottlingException", "Throttling", "RequestLimitExceeded",
+    "TooManyRequestsException", "RequestThrottled", "RequestThrottledException", "SlowDown",
+}
+_TRANSIENT_CODES = {
+    "InternalServerError", "InternalError", "ServiceUnavailable", "ServiceUnavailableException",
+    "RequestTimeout", "RequestTimeoutException",
+}
+_TRANSIENT_STATUS = {500, 502, 503, 504}
+# openai exceptions, matched by name so this module does not import openai
+_TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+
+def is_throttling(exc: BaseException) -> bool:
+    if isinstance(exc, ClientError):
+        return exc.response.get("Error", {}).get("Code") in THROTTLING_CODES
+    return getattr(exc, "status_code", None) == 429
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if is_throttling(exc):
+        return True
+    if isinstance(exc, ClientError):
+        return (exc.response.get("Error", {}).get("Code") in _TRANSIENT_CODES
+                or exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") in _TRANSIENT_STATUS)
+    if isinstance(exc, (ConnectionClosedError, EndpointConnectionError, ReadTimeoutError)):
+        return True
+    return getattr(exc, "status_code", None) in _TRANSIENT_STATUS or type(exc).__name__ in _TRANSIENT_ERRORS
+
+
+def backoff(attempt: int) -> float:
+    """Seconds to wait before retry number attempt + 1 (full jitter)."""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+async def aretry(call, attempts: int = MAX_ATTEMPTS):
+    """await call() until it succeeds, fails for good or runs out of attempts."""
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt + 1 >= attempts or not is_retryable(e):
+                raise
+            await asyncio.sleep(backoff(attempt))
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The execution runs as its own task, so a caller that goes away (client
+    disconnect) does not cancel it for the others. The key is released as
+    soon as the execution finishes; later calls start a new one.
+    """
+
+    def __init__(self):
+        self._flights: dict = {}
+
+    def __contains__(self, key) -> bool:
+        return key in self._flights
+
+    async def do(self, key, call):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()    # retrieved, even if every caller went away
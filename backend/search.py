@@ -0,0 +1,73 @@
+"""Tokenization and ranking for the per-user full-text index (GET /search).
+
+Korean has no reliable word boundaries for a naive tokenizer (조사 attach to
+nouns: 철수가, 철수는), so text is indexed as character bigrams within each
+word; a one-character word is indexed as itself. A query matches a plot
+when every query gram is present, and hits are ranked with BM25.
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+
+_WORD = re.compile(r"\w+")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def grams(text: str) -> Counter:
+    """Term frequencies of the bigrams (and one-character words) in text."""
+    counts = Counter()
+    for word in _WORD.findall(normalize(text)):
+        if len(word) == 1:
+            counts[word] += 1
+        else:
+            counts.update(word[i:i + 2] for i in range(len(word) - 1))
+    return counts
+
+
+def query_grams(query: str) -> list[str]:
+    """Distinct grams a plot must contain to match the query.
+
+    One-character words only match standalone words in the text, so they
+    are dropped when the query has longer words to match on.
+    """
+    words = _WORD.findall(normalize(query))
+    long_words = [w for w in words if len(w) > 1]
+    return list(grams(" ".join(long_words or words)))
+
+
+def bm25(tf: int, df: int, n_docs: int, doc_len: int, avg_len: float) -> float:
+    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / (avg_len or 1))
+    return idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+
+def find_phrase(text: str, query: str) -> int:
+    """Offset of the query in text ignoring case and spacing, or -1."""
+    words = _WORD.findall(normalize(query))
+    if not words:
+        return -1
+    pattern = r"\W*".join(re.escape(w) for w in words)
+    match = re.search(pattern, unicodedata.normalize("NFKC", text), re.IGNORECASE)
+    return match.start() if match else -1
+
+
+def snippet(text: str, query: str, width: int = 40) -> str:
+    """A single-line excerpt around the first match of the query."""
+    text = unicodedata.normalize("NFKC", text)
+    pos = find_phrase(text, query)
+    if pos < 0:
+        hits = [m.start() for g in query_grams(query)
+                for m in [re.search(re.escape(g), text, re.IGNORECASE)] if m]
+        pos = min(hits, default=0)
+    start = max(0, pos - width)
+    end = min(len(text), pos + len(query) + width)
+    excerpt = " ".join(text[start:end].split())
+    return ("…" if start > 0 else "") + excerpt + ("…" if end < len(text) else "")
@@ -0,0 +1,137 @@
+"""Storage backends.
+
+main.py reaches storage through two interfaces, the parts of boto3 it has
+always used:
+
+    Table      a DynamoDB Table resource: get/put/update/delete_item, query,
+               scan and batch_writer with DynamoDB expression strings
+    BlobStore  an S3 client: get/put/head/delete/copy_object, delete_objects,
+               list_objects_v2, generate_presigned_url/post
+
+STORAGE_BACKEND picks the implementation:
+
+    dynamodb (default)  DynamoDB + S3 through boto3
+    local               SQLite + files under LOCAL_DATA_DIR (default ./data),
+                        for self-hosting and network-free runs
+    memory              in-process dicts, lost on exit (bench.py)
+
+The local backends report their calls to telemetry like the boto3 hooks do,
+so Server-Timing, timing logs and /metrics work the same on every backend.
+"""
+
+import os
+from typing import Protocol
+
+import telemetry
+
+ORDER_INDEX = "parent_key-order_key-index"
+CHANGES_INDEX = "user_sub-updated_at-index"
+_CHANGES_GSI = {CHANGES_INDEX: ("user_sub", "updated_at")}
+_ORDER_GSI = {ORDER_INDEX: ("parent_key", "order_key")}
+
+# table name: (hash key, range key, {gsi name: (hash key, range key)})
+TABLES = {
+    "users":               ("sub",          None,         {}),
+    "works":               ("work_id",      None,         _CHANGES_GSI),
+    "episodes":            ("episode_id",   None,         {**_ORDER_GSI, **_CHANGES_GSI}),
+    "plots":               ("plot_id",      None,         {**_ORDER_GSI, **_CHANGES_GSI}),
+    "characters":          ("character_id", None,         _CHANGES_GSI),
+    "character_relations": ("relation_id",  None,         _CHANGES_GSI),
+    "graph_layouts":       ("layout_id",    None,         {}),
+    "posts":               ("post_id",      None,         {}),
+    "comments":            ("comment_id",   None,         {}),
+    "search_index":        ("term_key",     "plot_id",    {}),
+    "work_stats":          ("stats_key",    "scope",      {}),
+    "plot_versions":       ("version_key",  "version",    {}),
+    "tombstones":          ("user_sub",     "change_key", {}),
+    "idempotency_keys":    ("idem_key",     None,         {}),
+    "content_chunks":      ("chunk_key",    None,         {}),
+    "content_manifests":   ("manifest_key", None,         {}),
+}
+
+
+class Table(Protocol):
+    name: str
+
+    def get_item(self, **kwargs) -> dict: ...
+    def put_item(self, **kwargs) -> dict: ...
+    def update_item(self, **kwargs) -> dict: ...
+    def delete_item(self, **kwargs) -> dict: ...
+    def query(self, **kwargs) -> dict: ...
+    def scan(self, **kwargs) -> dict: ...
+    def batch_writer(self, overwrite_by_pkeys=None): ...
+
+
+class BlobStore(Protocol):
+    def get_object(self, **kwargs) -> dict: ...
+    def put_object(self, **kwargs) -> dict: ...
+    def head_object(self, **kwargs) -> dict: ...
+    def delete_object(self, **kwargs) -> dict: ...
+    def delete_objects(self, **kwargs) -> dict: ...
+    def copy_object(self, **kwargs) -> dict: ...
+    def list_objects_v2(self, **kwargs) -> dict: ...
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, HttpMethod=None) -> str: ...
+    def generate_presigned_post(self, Bucket, Key, Fields=None, Conditions=None, ExpiresIn=3600) -> dict: ...
+
+
+class Storage:
+    """The tables and blob store of one backend."""
+
+    def __init__(self, backend: str, tables: dict[str, Table], blobs: BlobStore):
+        self.backend = backend
+        self.tables = tables
+        self.blobs = blobs
+
+    def table(self, name: str) -> Table:
+        return self.tables[name]
+
+
+def _record_call(service, operation, resource, seconds, response) -> None:
+    error = (response.get("Error") or {}).get("Code")
+    telemetry.record(service, operation, resource, seconds, None if error else response, error)
+
+
+def dynamodb_storage(region: str) -> Storage:
+    """boto3 with botocore's adaptive retry mode: throttling and transient
+    errors are retried with jittered exponential backoff, and a client-side
+    rate limiter slows requests down while the service is throttling."""
+    import boto3
+    from botocore.config import Config
+
+    config = Config(retries={"mode": os.getenv("AWS_RETRY_MODE", "adaptive"),
+                             "max_attempts": int(os.getenv("AWS_MAX_ATTEMPTS", "8"))})
+    dynamodb = boto3.resource("dynamodb", region_name=region, config=config)
+    s3 = boto3.client("s3", region_name=region, config=config)
+    telemetry.instrument_boto3(dynamodb.meta.client)
+    telemetry.instrument_boto3(s3)
+    return Storage("dynamodb", {name: dynamodb.Table(name) for name in TABLES}, s3)
+
+
+def local_storage(data_dir: str) -> Storage:
+    from local_aws import FileS3, SQLiteDatabase, SQLiteTable
+
+    os.makedirs(data_dir, exist_ok=True)
+    db = SQLiteDatabase(os.path.join(data_dir, "plot_editor.sqlite3"))
+    tables = {name: SQLiteTable(db, name, hash_key, range_key, indexes, on_call=_record_call)
+              for name, (hash_key, range_key, indexes) in TABLES.items()}
+    return Storage("local", tables, FileS3(os.path.join(data_dir, "blobs"), on_call=_record_call))
+
+
+def memory_storage() -> Storage:
+    from local_aws import MemoryS3, MemoryTable
+
+    tables = {name: MemoryTable(name, hash_key, range_key, indexes, on_call=_record_call)
+              for name, (hash_key, range_key, indexes) in TABLES.items()}
+    return Storage("memory", tables, MemoryS3(on_call=_record_call))
+
+
+def open_storage(region: str) -> Storage:
+    """The backend selected by STORAGE_BACKEND."""
+    backend = os.getenv("STORAGE_BACKEND", "dynamodb").lower()
+    if backend == "dynamodb":
+        return dynamodb_storage(region)
+    if backend == "local":
+        return local_storage(os.getenv("LOCAL_DATA_DIR", os.path.join(os.path.dirname(__file__), "data")))
+    if backend == "memory":
+        return memory_storage()
+    raise ValueError(f"STORAGE_BACKEND 은 dynamodb, local, memory 중 하나여야 합니다: {backend}")
@@ -0,0 +1,316 @@
+"""Request timing and backend-call accounting.
+
+TimingMiddleware opens a trace for every HTTP request. boto3 event hooks
+(instrument_boto3) and timed() record each DynamoDB / S3 / LLM call into the
+current trace: latency, items returned vs scanned, consumed capacity and S3
+bytes read. Each request then produces a Server-Timing header, one JSON log
+line on the "timing" logger and updates the in-process Prometheus metrics
+served by GET /metrics (per Lambda container / uvicorn worker).
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger("timing")
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# DynamoDB operations that accept ReturnConsumedCapacity
+_CAPACITY_OPERATIONS = {
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+}
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+class Metrics:
+    """Counters and histograms rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._histograms: dict[tuple, list] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, labels: dict, value: float = 1.0) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: dict, value: float) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.setdefault(key, [0] * len(_DURATION_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(_DURATION_BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @staticmethod
+    def _escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @classmethod
+    def _labels(cls, labels, extra: str = "") -> str:
+        parts = [f'{k}="{cls._escape(v)}"' for k, v in labels] + ([extra] if extra else [])
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), hist in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in zip(_DURATION_BUCKETS, hist):
+                le = 'le="%g"' % bound
+                lines.append(f"{name}_bucket{self._labels(labels, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{self._labels(labels, le)} {hist[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {hist[-2]:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {hist[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+# ---------------------------------------------------------------------------
+# Traces
+# ---------------------------------------------------------------------------
+
+class Trace:
+    """Backend calls made while serving one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.calls: list[dict] = []
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def add(self, call: dict) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> dict:
+        services: dict[str, dict] = {}
+        with self._lock:
+            calls = list(self.calls)
+        for call in calls:
+            total = services.setdefault(call["service"], {"calls": 0, "ms": 0.0})
+            total["calls"] += 1
+            total["ms"] += call["ms"]
+            for field in ("items", "scanned", "capacity", "bytes", "tokens", "retries", "errors"):
+                if field in call:
+                    total[field] = total.get(field, 0) + call[field]
+        for total in services.values():
+            total["ms"] = round(total["ms"], 2)
+            if "capacity" in total:
+                total["capacity"] = round(total["capacity"], 2)
+        return services
+
+    def server_timing(self) -> str:
+        entries = [f'{service};dur={total["ms"]:.1f};desc="{total["calls"]} calls"'
+                   for service, total in self.summary().items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def _capacity(consumed) -> float:
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return float(sum(c.get("CapacityUnits", 0) for c in consumed or []))
+
+
+def record(service: str, operation: str, resource: str, seconds: float,
+           response: dict | None = None, error: str | None = None) -> None:
+    """Account one backend call to the current request and the metrics."""
+    call = {"service": service, "operation": operation, "resource": resource, "ms": seconds * 1000}
+    response = response or {}
+    if "Count" in response:
+        call["items"] = int(response["Count"])
+        call["scanned"] = int(response.get("ScannedCount", response["Count"]))
+    elif "Item" in response or (operation == "GetItem" and not error):
+        call["items"] = 1 if response.get("Item") else 0
+    elif "Responses" in response:
+        call["items"] = sum(len(items) for items in response["Responses"].values())
+    if response.get("ConsumedCapacity"):
+        call["capacity"] = _capacity(response["ConsumedCapacity"])
+    if service == "s3" and operation == "GetObject" and "ContentLength" in response:
+        call["bytes"] = int(response["ContentLength"])
+    elif "BytesRead" in response.get("ResponseMetadata", {}):
+        # only reported by the local_aws fakes
+        call["bytes"] = int(response["ResponseMetadata"]["BytesRead"])
+    if "tokens" in response:
+        call["tokens"] = int(response["tokens"])
+    if response.get("ResponseMetadata", {}).get("RetryAttempts"):
+        call["retries"] = int(response["ResponseMetadata"]["RetryAttempts"])
+    if error:
+        call["errors"] = 1
+        call["error"] = error
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(call)
+
+    labels = {"service": service, "operation": operation}
+    METRICS.inc("backend_calls_total", labels)
+    METRICS.observe("backend_call_duration_seconds", labels, seconds)
+    if error:
+        METRICS.inc("backend_errors_total", {**labels, "error": error})
+    resource_labels = {"service": service, "resource": resource}
+    for field, metric in (("items", "backend_items_returned_total"),
+                          ("scanned", "dynamodb_items_scanned_total"),
+                          ("capacity", "dynamodb_consumed_capacity_total"),
+                          ("bytes", "backend_bytes_read_total"),
+                          ("tokens", "llm_tokens_total"),
+                          ("retries", "backend_retries_total")):
+        if call.get(field):
+            METRICS.inc(metric, resource_labels, call[field])
+
+
+@contextmanager
+def timed(service: str, operation: str, resource: str = ""):
+    """Time a block as one backend call. The yielded dict is recorded as its
+    response, e.g. info["tokens"] = usage."""
+    info: dict = {}
+    start = time.perf_counter()
+    try:
+        yield info
+    except Exception as e:
+        record(service, operation, resource, time.perf_counter() - start, info, type(e).__name__)
+        raise
+    record(service, operation, resource, time.perf_counter() - start, info)
+
+
+@contextmanager
+def traced():
+    """Record the calls made in the block, including those of the
+    ContextThreadPoolExecutor tasks it submits, into a fresh Trace."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def instrument_boto3(client) -> None:
+    """Record every API call of a boto3 client (pass table.meta.client for resources)."""
+    service = client.meta.service_model.service_name
+    events = client.meta.events
+
+    def provide_params(params, model, context, **_):
+        context["timing_resource"] = params.get("TableName") or params.get("Bucket") \
+            or ",".join(params.get("RequestItems") or {})
+        # fallback start if a before-call handler (e.g. a Stubber) answers first
+        context["timing_start"] = time.perf_counter()
+        if service == "dynamodb" and model.name in _CAPACITY_OPERATIONS:
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    def before_call(context, **_):
+        context["timing_start"] = time.perf_counter()
+
+    def after_call(parsed, model, context, **_):
+        if "timing_start" in context:
+            error = (parsed.get("Error") or {}).get("Code")
+            # a failed call still reports how often botocore retried it
+            response = {"ResponseMetadata": parsed.get("ResponseMetadata", {})} if error else parsed
+            record(service, model.name, context.get("timing_resource", ""),
+                   time.perf_counter() - context["timing_start"], response, error)
+
+    def after_call_error(exception, context, event_name, **_):
+        if "timing_start" in context:
+            record(service, event_name.rsplit(".", 1)[-1], context.get("timing_resource", ""),
+                   time.perf_counter() - context["timing_start"], None, type(exception).__name__)
+
+    events.register(f"provide-client-params.{service}", provide_params)
+    events.register(f"before-call.{service}", before_call)
+    events.register(f"after-call.{service}", after_call)
+    events.register(f"after-call-error.{service}", after_call_error)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks run in a copy of the submitting context,
+    so calls made from worker threads are still counted to the request."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+class TimingMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed to the last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _current_trace.set(trace)
+        status = 500
+        response_seconds = None
+
+        async def send_with_timing(message):
+            nonlocal status, response_seconds
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", trace.server_timing())
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                response_seconds = trace.elapsed()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            seconds = response_seconds if response_seconds is not None else trace.elapsed()
+            labels = {"method": scope["method"], "route": path}
+            METRICS.inc("http_requests_total", {**labels, "status": str(status)})
+            METRICS.observe("http_request_duration_seconds", labels, seconds)
+            slowest = sorted(trace.calls, key=lambda c: -c["ms"])[:3]
+            logger.info(json.dumps({
+                "method":      scope["method"],
+                "route":       path,
+                "path":        scope["path"],
+                "status":      status,
+                "duration_ms": round(seconds * 1000, 2),
+                # includes background tasks that ran after the response
+                "total_ms":    round(trace.elapsed() * 1000, 2),
+                "backend":     trace.summary(),
+                "slowest":     [{k: (round(v, 2) if k == "ms" else v) for k, v in c.items()} for c in slowest],
+            }, ensure_ascii=False))
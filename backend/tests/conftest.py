@@ -0,0 +1,57 @@
+"""main.py on the in-memory backend, set up the way bench.py runs it.
+
+Every test gets fresh tables and bucket; ``client`` is logged in as u1.
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench  # noqa: E402  sets the environment main.py reads at import
+import storage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def store():
+    fresh = storage.memory_storage()
+    bench.install_storage(fresh)
+    return fresh
+
+
+@pytest.fixture
+def client():
+    return bench.client_for("u1")
+
+
+@pytest.fixture
+def rng():
+    return random.Random(7)
+
+
+@pytest.fixture
+def sync(client):
+    """POST /sync with the given operations; returns the response body."""
+    def run(*operations, headers=None):
+        response = client.post("/sync", json={"operations": list(operations)}, headers=headers or {})
+        response.raise_for_status()
+        return response.json()
+    return run
+
+
+def create(entity: str, local_id: int, **data) -> dict:
+    return {"op": "create", "entity": entity, "id": local_id, "data": data}
+
+
+@pytest.fixture
+def work(sync):
+    """Work 1 with episode 10 holding plots 100..102."""
+    sync(
+        create("work", 1, title="작품", type="plot"),
+        create("episode", 10, work_id=1, title="1화", order_index=0),
+        *(create("plot", 100 + i, episode_id=10, title=f"플롯 {i}", order_index=i) for i in range(3)),
+    )
+    return 1
@@ -0,0 +1,40 @@
+import json
+
+import main
+
+
+def _doc(*speakers):
+    return {"type": "doc", "content": [
+        {"type": "dialogue", "attrs": {"characterName": name}, "content": [{"type": "text", "text": "대사"}]}
+        for name in speakers
+    ]}
+
+
+def _save(client, plot_id, doc):
+    client.put(f"/plots/{plot_id}/content", content=json.dumps(doc, ensure_ascii=False)).raise_for_status()
+
+
+def _pairs(client):
+    return {(p["a"], p["b"]) for p in client.get("/works/1/character-analytics").json()["pairs"]}
+
+
+def test_cache_hit_does_not_list_plots(client, work, monkeypatch):
+    _save(client, 100, _doc("민수", "지아"))
+    assert _pairs(client) == {("민수", "지아")}
+
+    listed = []
+    list_children = main._list_children
+    monkeypatch.setattr(main, "_list_children", lambda kind, *a, **kw: listed.append(kind) or list_children(kind, *a, **kw))
+    assert _pairs(client) == {("민수", "지아")}
+    assert "plot" not in listed
+
+
+def test_line_moved_between_plots_refreshes_the_cache(client, work):
+    _save(client, 100, _doc("민수", "지아"))
+    _save(client, 101, _doc("서준"))
+    assert _pairs(client) == {("민수", "지아")}
+
+    # the work's totals end up where they started, the co-occurrence does not
+    _save(client, 100, _doc("민수"))
+    _save(client, 101, _doc("지아", "서준"))
+    assert _pairs(client) == {("서준", "지아")}
@@ -0,0 +1,61 @@
+import json
+
+import main
+from conftest import create
+
+
+class _FakeLambda:
+    def __init__(self):
+        self.events = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        assert InvocationType == "Event"
+        self.events.append(json.loads(Payload))
+
+
+def _children(table):
+    return main._scan_all(table, FilterExpression="user_sub = :s", ExpressionAttributeValues={":s": "u1"})
+
+
+def test_cascade_runs_in_this_process_off_lambda(client, work, monkeypatch):
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    client.delete("/works/1").raise_for_status()
+    assert _children(main._episodes_table) == [] and _children(main._plots_table) == []
+
+
+def test_cascade_is_handed_to_an_event_invocation_on_lambda(client, sync, work, monkeypatch):
+    fake = _FakeLambda()
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "plot-editor-backend-dev-api")
+    monkeypatch.setattr(main, "_lambda_client", lambda: fake)
+    sync(create("character", 50, work_id=1, name="민수"))
+
+    client.delete("/works/1").raise_for_status()
+    assert [task[0] for task in fake.events[0]["deferred"]] == ["_cascade_delete_work"]
+    assert len(_children(main._plots_table)) == 3     # left for the deferred invocation
+
+    assert main.handler(fake.events[0], None) == {"ok": True}
+    assert _children(main._episodes_table) == _children(main._plots_table) == _children(main._characters_table) == []
+
+
+def test_failed_invocation_falls_back_to_a_background_task(client, work, monkeypatch):
+    class Down:
+        def invoke(self, **kwargs):
+            raise RuntimeError("throttled")
+
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "plot-editor-backend-dev-api")
+    monkeypatch.setattr(main, "_lambda_client", lambda: Down())
+    client.delete("/episodes/10").raise_for_status()
+    assert _children(main._plots_table) == []
+
+
+def test_sync_cascades_keep_their_order_in_one_invocation(client, sync, work, monkeypatch):
+    client.put("/plots/100/content", content=json.dumps(
+        {"type": "doc", "content": [{"type": "narration", "content": [{"type": "text", "text": "비"}]}]})).raise_for_status()
+    fake = _FakeLambda()
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "plot-editor-backend-dev-api")
+    monkeypatch.setattr(main, "_lambda_client", lambda: fake)
+
+    sync({"op": "delete", "entity": "plot", "id": 100})
+    assert [task[0] for task in fake.events[0]["deferred"]][0] == "_discount_plot_stats"
+    main.handler(fake.events[0], None)
+    assert client.get("/works/1/stats").json()["work"]["plots"] == 0
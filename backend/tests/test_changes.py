@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta, timezone
+
+import main
+from conftest import create
+
+
+def _changes(client, since):
+    response = client.get("/changes", params={"since": since})
+    response.raise_for_status()
+    return response.json()
+
+
+def test_first_call_resets(client):
+    body = client.get("/changes").json()
+    assert body["reset"] is True
+    assert set(body) == {"cursor", "reset"}
+
+
+def test_old_cursor_resets(client):
+    stale = (datetime.now(timezone.utc) - timedelta(days=main._TOMBSTONE_DAYS + 1)).isoformat()
+    assert _changes(client, stale)["reset"] is True
+
+
+def test_writes_and_deletes_since_the_cursor(client, sync, work):
+    cursor = client.get("/changes").json()["cursor"]
+    sync(
+        {"op": "update", "entity": "plot", "id": 100, "data": {"title": "새 제목"}},
+        {"op": "delete", "entity": "plot", "id": 101},
+        create("character", 50, work_id=1, name="민수"),
+    )
+    body = _changes(client, cursor)
+    assert body["reset"] is False
+    assert [p["local_id"] for p in body["plots"] if p["title"] == "새 제목"] == [100]
+    assert 101 not in {p["local_id"] for p in body["plots"]}
+    assert [c["local_id"] for c in body["characters"]] == [50]
+    assert {"kind": "plots", "local_id": 101} in [{k: d[k] for k in ("kind", "local_id")} for d in body["deleted"]]
+
+    later = _changes(client, body["cursor"])
+    # only what was written right before the cursor may come back
+    assert {d["local_id"] for d in later["deleted"]} <= {101}
+
+
+def test_content_save_shows_up_as_a_plot_change(client, work):
+    cursor = client.get("/changes").json()["cursor"]
+    client.put("/plots/102/content", content='{"type": "doc", "content": []}').raise_for_status()
+    assert 102 in {p["local_id"] for p in _changes(client, cursor)["plots"]}
+
+
+def test_cursor_needs_a_timezone(client):
+    assert client.get("/changes", params={"since": "2026-01-01T00:00:00"}).status_code == 400
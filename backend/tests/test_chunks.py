@@ -0,0 +1,83 @@
+import json
+from collections import Counter
+
+import bench
+import chunks
+import main
+
+
+def _refs(sub="u1"):
+    rows = main._scan_all(main._chunks_table)
+    return {row["chunk_key"].split("#", 1)[1]: int(row["refs"]) for row in rows if row["chunk_key"].startswith(f"{sub}#")}
+
+
+def test_refs_follow_manifests(rng):
+    doc = bench.plot_doc(rng, ["민수"], 40)
+    hashes = chunks.split(doc)[0]["chunks"]
+
+    main._save_manifest("u1", "plot", 1, doc)
+    assert _refs() == {h: 1 for h in hashes}
+    main._save_manifest("u1", "plot", 2, doc)
+    assert set(_refs().values()) == {2}
+    assert json.loads(main._load_manifest("u1", "plot", 2)) == doc
+
+    edited = json.loads(json.dumps(doc))
+    edited["content"] = edited["content"][: len(edited["content"]) // 2]
+    main._save_manifest("u1", "plot", 1, edited)
+    # every chunk counts the manifests using it
+    assert _refs() == Counter(set(chunks.split(edited)[0]["chunks"])) + Counter(set(hashes))
+
+    main._drop_manifests("u1", [main._manifest_key("u1", "plot", 1), main._manifest_key("u1", "plot", 2)])
+    assert set(_refs().values()) == {0}
+    assert all("released_at" in row for row in main._scan_all(main._chunks_table))
+
+
+def test_resaving_the_same_document_uploads_nothing(rng):
+    doc = bench.plot_doc(rng, ["민수"], 20)
+    main._save_manifest("u1", "plot", 1, doc)
+    puts = []
+    put_object = main._s3.put_object
+    main._s3.put_object = lambda **kw: puts.append(kw["Key"]) or put_object(**kw)
+    try:
+        main._save_manifest("u1", "plot", 1, doc)
+    finally:
+        main._s3.put_object = put_object
+    assert puts == []
+    assert set(_refs().values()) == {1}
+
+
+def test_failed_upload_leaves_no_refs(rng, monkeypatch):
+    doc = bench.plot_doc(rng, ["민수"], 20)
+    put_object = main._s3.put_object
+    failed = []
+
+    def flaky(**kw):
+        if kw["Key"].startswith("chunks/") and not failed:
+            failed.append(kw["Key"])
+            raise RuntimeError("upload failed")
+        return put_object(**kw)
+
+    monkeypatch.setattr(main._s3, "put_object", flaky)
+    try:
+        main._save_manifest("u1", "plot", 1, doc)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("the failed upload was swallowed")
+    assert set(_refs().values()) <= {0}
+
+
+def test_sweep_keeps_a_chunk_taken_back_midway(rng, monkeypatch):
+    main._acquire_chunk("u1", "h", b"blob")
+    main._release_chunk("u1", "h")
+    row = main._chunks_table.get_item(Key={"chunk_key": "u1#h"})["Item"]
+    delete_object = main._s3.delete_object
+
+    def racing(**kw):
+        main._acquire_chunk("u1", "h", b"blob")     # a save uploads it again first
+        return delete_object(**kw)
+
+    monkeypatch.setattr(main._s3, "delete_object", racing)
+    assert main._delete_released_chunk(row) is False
+    assert _refs() == {"h": 1}
+    assert main._s3.get_object(Bucket=main._S3_BUCKET, Key="chunks/u1/h.json")["Body"].read() == b"blob"
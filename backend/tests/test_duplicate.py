@@ -0,0 +1,53 @@
+import json
+
+import bench
+import main
+from conftest import create
+
+
+def test_copy_gets_new_ids_with_every_reference_remapped(client, sync, work, rng):
+    sync(
+        create("episode", 11, work_id=1, title="2화", order_index=1),
+        create("plot", 110, episode_id=11, title="플롯", order_index=0),
+        create("character", 50, work_id=1, name="민수"),
+        create("character", 51, work_id=1, name="지아"),
+        create("relation", 60, work_id=1, from_character_id=50, to_character_id=51, relation_name="친구"),
+    )
+    doc = bench.plot_doc(rng, ["민수", "지아"], 12)
+    client.put("/plots/110/content", content=json.dumps(doc, ensure_ascii=False)).raise_for_status()
+    client.put("/graph-layout/1", json={"50": {"x": 1, "y": 2}, "51": {"x": 3, "y": 4}}).raise_for_status()
+
+    result = client.post("/works/1/duplicate", json={"title": "사본"}).json()
+    ids = {kind: {int(old): new for old, new in m.items()} for kind, m in result["ids"].items()}
+    new_work = result["work_id"]
+    assert new_work >= main._SERVER_ID_BASE
+    assert set(ids["episodes"]) == {10, 11} and set(ids["plots"]) == {100, 101, 102, 110}
+    assert set(ids["characters"]) == {50, 51} and set(ids["relations"]) == {60}
+    new_ids = [new_work, *(new for m in ids.values() for new in m.values())]
+    assert len(set(new_ids)) == len(new_ids)
+
+    episodes = client.get(f"/works/{new_work}/episodes").json()
+    assert [(e["local_id"], e["title"]) for e in episodes] == [(ids["episodes"][10], "1화"), (ids["episodes"][11], "2화")]
+    plots = client.get(f"/episodes/{ids['episodes'][11]}/plots").json()
+    assert [p["local_id"] for p in plots] == [ids["plots"][110]]
+    assert client.get(f"/plots/{ids['plots'][110]}/content").json() == doc
+
+    relation, = client.get(f"/works/{new_work}/relations").json()
+    assert relation["from_character_id"] == ids["characters"][50]
+    assert relation["to_character_id"] == ids["characters"][51]
+    layout = client.get(f"/graph-layout/{new_work}").json()
+    assert set(layout) == {str(ids["characters"][50]), str(ids["characters"][51])}
+
+
+def test_original_is_untouched(client, work):
+    before = client.get("/episodes/10/plots").json()
+    client.post("/works/1/duplicate").raise_for_status()
+    assert client.get("/episodes/10/plots").json() == before
+    titles = sorted(w["title"] for w in client.get("/works").json())
+    assert titles == ["작품", "작품 (사본)"]
+
+
+def test_second_copy_gets_fresh_ids(client, work):
+    first = client.post("/works/1/duplicate").json()
+    second = client.post("/works/1/duplicate").json()
+    assert second["work_id"] > max(first["ids"]["plots"].values())
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import bench
+import main
+
+
+def _docs(rng, count):
+    """count successive edits of one document: a block changed or added each time."""
+    doc = bench.plot_doc(rng, ["민수", "지아"], 8)
+    docs = []
+    for i in range(count):
+        doc = json.loads(json.dumps(doc))
+        if i % 3 == 2:
+            doc["content"].append({"type": "narration", "content": [{"type": "text", "text": f"추가 {i}"}]})
+        else:
+            doc["content"][i % len(doc["content"])]["content"] = [{"type": "text", "text": f"수정 {i}"}]
+        docs.append(doc)
+    return docs
+
+
+def test_versions_round_trip_through_deltas_and_checkpoints(client, work, rng, monkeypatch):
+    monkeypatch.setattr(main, "_HISTORY_CHECKPOINT_EVERY", 4)
+    docs = _docs(rng, 10)
+    for doc in docs:
+        client.put("/plots/100/content", content=json.dumps(doc, ensure_ascii=False)).raise_for_status()
+
+    versions = client.get("/plots/100/versions").json()["versions"]
+    assert [v["version"] for v in versions] == list(range(10, 0, -1))
+    checkpoints = [v["version"] for v in versions if v["checkpoint"]]
+    assert 1 in checkpoints and len(checkpoints) < len(versions)
+    for version, doc in enumerate(docs, start=1):
+        assert client.get(f"/plots/100/versions/{version}").json() == doc
+
+
+def test_compaction_keeps_retained_versions_restorable(rng, monkeypatch):
+    monkeypatch.setattr(main, "_HISTORY_CHECKPOINT_EVERY", 4)
+    monkeypatch.setattr(main, "_HISTORY_KEEP_RECENT", 3)
+    monkeypatch.setattr(main, "_HISTORY_COMPACT_EVERY", 10 ** 6)
+    docs = _docs(rng, 12)
+    now = datetime.now(timezone.utc)
+    # versions 1-9 saved over three old days (three a day), 10-12 just now
+    saved = [now - timedelta(days=30 - v // 3, minutes=v) for v in range(9)] + [now] * 3
+    for version, (doc, at) in enumerate(zip(docs, saved), start=1):
+        main._record_version("u1", 100, version, doc, at.isoformat())
+
+    result = main._compact_history("u1", 100)
+    kept = sorted(int(i["version"]) for i in main._query_versions("u1", 100))
+    assert result["versions"] == len(kept)
+    assert kept[-3:] == [10, 11, 12]
+    assert len(kept) == 3 + 3          # and the last save of each old day
+    for version in kept:
+        assert main._load_version("u1", 100, version) == docs[version - 1]
+    live = {i["s3_key"] for i in main._query_versions("u1", 100) if i.get("checkpoint")}
+    stored = set(main._list_s3_keys("history/u1/100/"))
+    assert stored == live
@@ -0,0 +1,82 @@
+import pytest
+
+import bench
+import main
+from conftest import create
+
+
+def test_repeat_gets_the_first_response_without_running_again(client, sync, work):
+    key = {"Idempotency-Key": "save-1"}
+    first = sync(create("episode", 11, work_id=1, title="2화", order_index=1), headers=key)
+    sync({"op": "delete", "entity": "episode", "id": 11})
+
+    replay = client.post("/sync", json={"operations": [create("episode", 11, work_id=1, title="2화",
+                                                                order_index=1)]}, headers=key)
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first
+    assert [e["local_id"] for e in client.get("/works/1/episodes").json()] == [10]
+
+
+def test_key_reused_for_another_request_is_rejected(client, sync, work):
+    key = {"Idempotency-Key": "save-2"}
+    sync(create("episode", 11, work_id=1, title="2화"), headers=key)
+    response = client.post("/sync", json={"operations": [create("episode", 12, work_id=1, title="3화")]},
+                           headers=key)
+    assert response.status_code == 422
+
+
+def test_failed_request_releases_its_key(client, work, monkeypatch):
+    key = {"Idempotency-Key": "save-3"}
+    operations = {"operations": [create("episode", 11, work_id=1, title="2화")]}
+
+    def broken(sub, operations):
+        raise RuntimeError("storage down")
+
+    monkeypatch.setattr(main, "_apply_sync", broken)
+    with pytest.raises(RuntimeError):
+        client.post("/sync", json=operations, headers=key)
+    monkeypatch.undo()
+
+    response = client.post("/sync", json=operations, headers=key)
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+
+
+def test_keys_are_per_user(client, sync, work):
+    key = {"Idempotency-Key": "shared"}
+    sync(create("episode", 11, work_id=1, title="2화"), headers=key)
+    response = bench.client_for("u2").post("/sync", json={"operations": [create("work", 5, title="남의 작품")]}, headers=key)
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+
+
+def test_result_the_route_can_encode_is_recorded(client, work, monkeypatch):
+    # int keys need the route encoder's OPT_NON_STR_KEYS
+    monkeypatch.setattr(main, "_apply_sync", lambda sub, operations: ([{"index": 0, "ok": True, "ids": {11: 12}}], []))
+    key = {"Idempotency-Key": "save-4"}
+    operations = {"operations": [create("episode", 11, work_id=1, title="2화")]}
+    first = client.post("/sync", json=operations, headers=key)
+    assert first.status_code == 200
+
+    replay = client.post("/sync", json=operations, headers=key)
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+
+
+def test_failed_recording_releases_the_key(client, work, monkeypatch):
+    key = {"Idempotency-Key": "save-5"}
+    operations = {"operations": [create("episode", 11, work_id=1, title="2화")]}
+    put_item = main._idempotency_table.put_item
+
+    def put_pending_only(Item, **kwargs):
+        if Item["state"] == "done":
+            raise RuntimeError("throttled")
+        return put_item(Item=Item, **kwargs)
+
+    monkeypatch.setattr(main._idempotency_table, "put_item", put_pending_only)
+    assert client.post("/sync", json=operations, headers=key).status_code == 200
+    monkeypatch.undo()
+
+    retry = client.post("/sync", json=operations, headers=key)
+    assert retry.status_code == 200
+    assert "Idempotent-Replayed" not in retry.headers
@@ -0,0 +1,18 @@
+import telemetry
+
+
+def test_label_values_are_escaped():
+    metrics = telemetry.Metrics()
+    metrics.inc("errors_total", {"error": 'bad "quote" \\ and\nnewline'})
+    assert metrics.render().splitlines()[1] == 'errors_total{error="bad \\"quote\\" \\\\ and\\nnewline"} 1'
+
+
+def test_metrics_need_the_token(client, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setenv("METRICS_TOKEN", "scrape")
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape"})
+    assert response.status_code == 200
+    assert "# TYPE" in response.text
@@ -0,0 +1,96 @@
+import pytest
+
+import main
+from conftest import create
+
+
+def test_key_between_bounds():
+    first = main._key_between(None, None)
+    after = main._key_between(first, None)
+    before = main._key_between(None, first)
+    assert before < first < after
+    middle = main._key_between(first, after)
+    assert first < middle < after
+
+
+def test_key_between_keeps_order_under_repeated_inserts():
+    keys = [main._key_between(None, None)]
+    for _ in range(50):
+        keys.insert(0, main._key_between(None, keys[0]))      # always at the front
+    for _ in range(50):
+        keys.insert(1, main._key_between(keys[0], keys[1]))   # always second
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_key_between_rejects_out_of_order():
+    with pytest.raises(ValueError):
+        main._key_between("V", "V")
+
+
+def _order(client):
+    return [p["local_id"] for p in client.get("/episodes/10/plots").json()]
+
+
+def test_reorder_moves_only_what_moved(client, sync, work):
+    sync(*(create("plot", 103 + i, episode_id=10, title=f"플롯 {3 + i}", order_index=3 + i) for i in range(3)))
+    assert _order(client) == [100, 101, 102, 103, 104, 105]
+
+    response = client.put("/episodes/10/plots/order", json={"ids": [105, 100, 101, 102, 103, 104]})
+    assert response.json() == {"ok": True, "moved": 1, "rebalanced": False}
+    assert _order(client) == [105, 100, 101, 102, 103, 104]
+
+    # ids left out keep their relative order after the listed ones
+    client.put("/episodes/10/plots/order", json={"ids": [102, 101]})
+    assert _order(client) == [102, 101, 105, 100, 103, 104]
+
+
+def test_reorder_rebalances_long_keys(client, work, monkeypatch):
+    monkeypatch.setattr(main, "_ORDER_KEY_MAX_LEN", 4)
+    for _ in range(60):
+        order = _order(client)
+        result = client.put("/episodes/10/plots/order", json={"ids": [order[-1], *order[:-1]]}).json()
+        if result["rebalanced"]:
+            break
+    else:
+        pytest.fail("keys never grew past the limit")
+    assert _order(client) == order[-1:] + order[:-1]
+    plots = main._query_all(main._plots_table, IndexName=main._ORDER_INDEX,
+                            KeyConditionExpression="parent_key = :p", ExpressionAttributeValues={":p": "u1#10"})
+    assert all(len(p["order_key"]) <= 4 for p in plots)
+
+
+def test_rekey_writes_only_the_order(client, work):
+    stale = main._list_children("plot", "u1", 10)
+    client.put("/plots/100/content", content='{"type": "doc", "content": []}').raise_for_status()
+    client.delete("/plots/101").raise_for_status()
+
+    main._rekey_children(main._plots_table, "plot_id", stale[::-1], "u1#10")
+    plot = main._plots_table.get_item(Key={"plot_id": "u1#100"})["Item"]
+    assert int(plot["history_version"]) == 1 and "stats" in plot
+    assert main._plots_table.get_item(Key={"plot_id": "u1#101"}).get("Item") is None
+    assert _order(client) == [102, 100]
+
+
+def test_legacy_parent_is_listed_without_writes_and_keyed_by_a_reorder(client, work):
+    main._episodes_table.update_item(Key={"episode_id": "u1#10"}, UpdateExpression="REMOVE plots_keyed")
+    for i, plot_id in enumerate([102, 100, 101]):
+        main._plots_table.update_item(Key={"plot_id": f"u1#{plot_id}"},
+                                      UpdateExpression="SET order_index = :o REMOVE order_key, parent_key",
+                                      ExpressionAttributeValues={":o": i})
+    assert _order(client) == [102, 100, 101]
+    assert all("order_key" not in p for p in main._scan_all(main._plots_table))
+
+    client.put("/episodes/10/plots/order", json={"ids": [100, 101, 102]}).raise_for_status()
+    assert main._episodes_table.get_item(Key={"episode_id": "u1#10"})["Item"]["plots_keyed"] is True
+    assert _order(client) == [100, 101, 102]
+
+
+def test_append_after_a_reorder_lands_last(client, sync, work):
+    client.put("/episodes/10/plots/order", json={"ids": [101, 102, 100]}).raise_for_status()
+    client.post("/episodes/10/plots", json={"plot_id": 103, "title": "끝", "order_index": 3}).raise_for_status()
+    assert _order(client) == [101, 102, 100, 103]
+
+    sync(create("plot", 104, episode_id=10, title="끝 2", order_index=5),
+         create("plot", 105, episode_id=10, title="가운데", order_index=1))
+    assert _order(client) == [101, 105, 102, 100, 103, 104]
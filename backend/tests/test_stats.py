@@ -0,0 +1,39 @@
+import json
+
+import main
+from conftest import create
+
+
+def test_create_sent_again_keeps_the_plot_stats(client, sync, work):
+    client.put("/plots/100/content", content=json.dumps(
+        {"type": "doc", "content": [{"type": "narration", "content": [{"type": "text", "text": "비가 온다"}]}]},
+        ensure_ascii=False)).raise_for_status()
+    stats = client.get("/works/1/stats").json()
+
+    sync(create("plot", 100, episode_id=10, title="다시 보낸 생성", order_index=0))
+    client.post("/episodes/10/plots", json={"plot_id": 100, "title": "또 보낸 생성"}).raise_for_status()
+    plot = main._plots_table.get_item(Key={"plot_id": "u1#100"})["Item"]
+    assert plot["title"] == "또 보낸 생성"
+    assert "stats" in plot and int(plot["history_version"]) == 1
+
+    client.put("/plots/100/content", content=json.dumps(
+        {"type": "doc", "content": [{"type": "narration", "content": [{"type": "text", "text": "비가 온다"}]}]},
+        ensure_ascii=False)).raise_for_status()
+    assert client.get("/works/1/stats").json() == stats
+
+
+def test_work_and_episode_creates_sent_again_keep_what_they_do_not_carry(client, sync, work):
+    planning_doc = "기획 " * 5000
+    client.put("/works/1", json={"title": "작품", "planning_doc": planning_doc}).raise_for_status()
+    client.put("/episodes/10", json={"title": "1화", "chapter_summary": "요약"}).raise_for_status()
+
+    sync(create("work", 1, title="다시 보낸 작품", type="plot", planning_doc=""),
+         create("episode", 10, work_id=1, title="다시 보낸 1화", order_index=0))
+    client.post("/works", json={"work_id": 1, "title": "또 보낸 작품", "planning_doc": ""}).raise_for_status()
+    client.post("/works/1/episodes", json={"episode_id": 10, "title": "또 보낸 1화"}).raise_for_status()
+
+    assert client.get("/works/1").json()["planning_doc"] == planning_doc
+    episode = client.get("/episodes/10").json()
+    assert (episode["title"], episode["chapter_summary"]) == ("또 보낸 1화", "요약")
+    assert main._works_table.get_item(Key={"work_id": "u1#1"})["Item"]["title"] == "또 보낸 작품"
+    assert [p["local_id"] for p in client.get("/episodes/10/plots").json()] == [100, 101, 102]
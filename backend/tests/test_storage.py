@@ -0,0 +1,64 @@
+import pytest
+from botocore.exceptions import ClientError
+
+import storage
+
+
+@pytest.fixture(params=["memory", "local"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return storage.memory_storage()
+    return storage.local_storage(str(tmp_path))
+
+
+def test_conditional_put_and_update_expressions(backend):
+    plots = backend.table("plots")
+    plots.put_item(Item={"plot_id": "u1#1", "title": "a", "rev": 1})
+    with pytest.raises(ClientError) as exc:
+        plots.put_item(Item={"plot_id": "u1#1"}, ConditionExpression="attribute_not_exists(plot_id)")
+    assert exc.value.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+    old = plots.update_item(
+        Key={"plot_id": "u1#1"},
+        UpdateExpression="SET #t = :t REMOVE missing ADD rev :one",
+        ExpressionAttributeNames={"#t": "title"},
+        ExpressionAttributeValues={":t": "b", ":one": 1},
+        ReturnValues="ALL_OLD",
+    )["Attributes"]
+    assert old["title"] == "a"
+    assert plots.get_item(Key={"plot_id": "u1#1"})["Item"] == {"plot_id": "u1#1", "title": "b", "rev": 2}
+
+
+def test_index_query_sorts_by_range_key_and_pages(backend):
+    plots = backend.table("plots")
+    with plots.batch_writer() as batch:
+        for i, key in enumerate(["c", "a", "b", "d"]):
+            batch.put_item(Item={"plot_id": f"u1#{i}", "parent_key": "u1#10", "order_key": key})
+        batch.put_item(Item={"plot_id": "u1#9", "parent_key": "u1#11", "order_key": "a"})
+
+    kwargs = {"IndexName": storage.ORDER_INDEX, "KeyConditionExpression": "parent_key = :p",
+              "ExpressionAttributeValues": {":p": "u1#10"}, "Limit": 3}
+    first = plots.query(**kwargs)
+    rest = plots.query(**kwargs, ExclusiveStartKey=first["LastEvaluatedKey"])
+    assert [i["order_key"] for i in first["Items"] + rest["Items"]] == ["a", "b", "c", "d"]
+    newest = plots.query(**{**kwargs, "Limit": 1}, ScanIndexForward=False)["Items"]
+    assert newest[0]["order_key"] == "d"
+
+
+def test_blob_store_round_trip(backend):
+    blobs = backend.blobs
+    blobs.put_object(Bucket="b", Key="plots/u1/1.json", Body=b"{}", ContentType="application/json")
+    blobs.put_object(Bucket="b", Key="plots/u1/2.json", Body=b"[]")
+    assert blobs.get_object(Bucket="b", Key="plots/u1/1.json")["Body"].read() == b"{}"
+    listed = blobs.list_objects_v2(Bucket="b", Prefix="plots/u1/")["Contents"]
+    assert [o["Key"] for o in listed] == ["plots/u1/1.json", "plots/u1/2.json"]
+
+    blobs.delete_objects(Bucket="b", Delete={"Objects": [{"Key": "plots/u1/1.json"}]})
+    with pytest.raises(ClientError):
+        blobs.get_object(Bucket="b", Key="plots/u1/1.json")
+
+
+def test_local_backend_persists(tmp_path):
+    storage.local_storage(str(tmp_path)).table("works").put_item(Item={"work_id": "u1#1", "title": "작품"})
+    reopened = storage.local_storage(str(tmp_path)).table("works")
+    assert reopened.get_item(Key={"work_id": "u1#1"})["Item"]["title"] == "작품"
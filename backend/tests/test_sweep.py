@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+import main
+from conftest import create
+
+
+def test_young_children_of_a_missing_parent_are_kept(sync, monkeypatch):
+    # children synced ahead of their work, which has not arrived yet
+    sync(
+        create("episode", 10, work_id=1, title="1화", order_index=0),
+        create("plot", 100, episode_id=10, title="플롯", order_index=0),
+        create("character", 50, work_id=1, name="민수"),
+    )
+    counts = main._sweep_orphans("u1")
+    assert counts["episodes"] == counts["plots"] == counts["characters"] == 0
+
+    monkeypatch.setattr(main, "_ORPHAN_S3_GRACE", timedelta(0))
+    counts = main._sweep_orphans("u1")
+    assert counts["episodes"] == counts["plots"] == counts["characters"] == 1
+    assert main._episodes_table.get_item(Key={"episode_id": "u1#10"}).get("Item") is None
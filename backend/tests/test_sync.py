@@ -0,0 +1,43 @@
+import main
+from conftest import create
+
+
+def test_plan_collapses_operations_per_entity():
+    plans, errors = main._plan_sync([
+        create("work", 1, title="a"),
+        {"op": "update", "entity": "work", "id": 1, "data": {"title": "b"}},
+        {"op": "update", "entity": "episode", "id": 10, "data": {"title": "x"}},
+        {"op": "update", "entity": "episode", "id": 10, "data": {"order_index": 2}},
+        create("plot", 100, episode_id=10, title="p"),
+        {"op": "delete", "entity": "plot", "id": 100},
+    ])
+    assert errors == []
+    assert plans[("work", 1)] == {"indexes": [0, 1], "kind": "put", "data": {"title": "b"}}
+    assert plans[("episode", 10)]["kind"] == "update"
+    assert plans[("episode", 10)]["data"] == {"title": "x", "order_index": 2}
+    assert plans[("plot", 100)] == {"indexes": [4, 5], "kind": "delete", "data": {}}
+
+
+def test_plan_rejects_bad_operations():
+    plans, errors = main._plan_sync([
+        {"op": "create", "entity": "scene", "id": 1},
+        {"op": "create", "entity": "work", "id": "1"},
+        create("episode", 10, title="no parent"),
+        {"op": "update", "entity": "relation", "id": 5, "data": {}},
+        "not an object",
+    ])
+    assert plans == {}
+    assert [index for index, _ in errors] == [0, 1, 2, 3, 4]
+
+
+def test_sync_applies_and_reports_per_operation(client, sync, work):
+    result = sync(
+        {"op": "update", "entity": "plot", "id": 100, "data": {"title": "바뀐 제목"}},
+        {"op": "delete", "entity": "plot", "id": 101},
+        create("episode", 11, title="부모 없음"),
+    )
+    assert not result["ok"]
+    assert [r["ok"] for r in result["results"]] == [True, True, False]
+    plots = client.get("/episodes/10/plots").json()
+    assert [(p["local_id"], p["title"]) for p in plots] == [(100, "바뀐 제목"), (102, "플롯 2")]
+
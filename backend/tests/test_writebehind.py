@@ -0,0 +1,73 @@
+import asyncio
+
+import main
+from writebehind import WriteBehind
+
+
+def test_value_stays_readable_while_it_is_written():
+    async def run():
+        stored, started, release = {}, asyncio.Event(), asyncio.Event()
+
+        async def write(key, value):
+            started.set()
+            await release.wait()
+            stored[key] = value
+
+        buffer = WriteBehind(write, 60, "test")
+        buffer.put("k", "v1")
+        flushing = asyncio.create_task(buffer.flush("k"))
+        await started.wait()
+        seen_during_write = buffer.get("k")
+        buffer.put("k", "v2")
+        seen_after_put = buffer.get("k")
+        release.set()
+        await flushing
+        seen_after_write = buffer.get("k")
+        await buffer.close()
+        return seen_during_write, seen_after_put, seen_after_write, stored
+
+    during, after_put, after_write, stored = asyncio.run(run())
+    assert (during, after_put, after_write) == ("v1", "v2", "v2")
+    assert stored == {"k": "v2"}
+
+
+def test_failed_write_stays_readable_and_is_retried():
+    async def run():
+        attempts = []
+
+        async def write(key, value):
+            attempts.append(value)
+            if len(attempts) == 1:
+                raise RuntimeError("storage down")
+
+        buffer = WriteBehind(write, 60, "test")
+        buffer.put("k", "v1")
+        await buffer.flush("k")
+        seen = buffer.get("k")
+        await buffer.close()
+        return seen, attempts, buffer.get("k")
+
+    seen, attempts, after_close = asyncio.run(run())
+    assert seen == "v1"
+    assert attempts == ["v1", "v1"]
+    assert after_close is None
+
+
+def test_content_save_and_read_run_off_the_event_loop(client, work, monkeypatch):
+    on_loop = []
+
+    def spy(fn):
+        def run(*args):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(fn.__name__)
+            except RuntimeError:
+                pass
+            return fn(*args)
+        return run
+
+    for name in ("_put_plot_body", "_record_plot_content", "_load_manifest"):
+        monkeypatch.setattr(main, name, spy(getattr(main, name)))
+    client.put("/plots/100/content", content='{"type": "doc", "content": []}').raise_for_status()
+    client.get("/plots/100/content").raise_for_status()
+    assert on_loop == []
@@ -0,0 +1,126 @@
+"""Write-behind buffer for bursts of writes to the same key.
+
+put() keeps only the latest value per key and writes it window seconds after
+the first put of a burst, so an autosave burst of N puts costs one write.
+get() returns a value that is still waiting or being written
+(read-your-writes, in this process). flush() writes a key now, discard() drops it, and close() writes
+everything before shutdown. Writes of one key never overlap, so they land in
+put order. A failed write stays pending, unless a newer put replaced it, and
+is retried with backoff.
+
+Counted in telemetry as write_behind_{puts,writes,coalesced,failures}_total;
+coalesced is the number of writes saved.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import resilience
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """write(key, value) is the coroutine that stores a value."""
+
+    def __init__(self, write, window: float, name: str):
+        self.write = write
+        self.window = window
+        self.name = name
+        self._pending: dict = {}        # key -> value not written yet
+        self._in_flight: dict = {}      # key -> value being written
+        self._timers: dict = {}         # key -> task sleeping until the write
+        self._locks: dict = {}          # key -> [lock held while writing, users]
+        self._failures: dict = {}       # key -> failed writes in a row
+        self._closing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _count(self, event: str) -> None:
+        telemetry.METRICS.inc(f"write_behind_{event}_total", {"buffer": self.name})
+
+    def get(self, key):
+        """The newest value of key not known to be stored yet, or None."""
+        if key in self._pending:
+            return self._pending[key]
+        return self._in_flight.get(key)
+
+    def put(self, key, value) -> None:
+        self._count("puts")
+        if key in self._pending:
+            self._count("coalesced")
+        self._pending[key] = value
+        if key not in self._timers:
+            self._schedule(key, self.window)
+
+    def _schedule(self, key, delay: float) -> None:
+        self._timers[key] = asyncio.create_task(self._write_later(key, delay))
+
+    async def _write_later(self, key, delay: float) -> None:
+        await asyncio.sleep(delay)
+        if self._timers.get(key) is asyncio.current_task():
+            del self._timers[key]
+        await self.flush(key)
+
+    def _cancel_timer(self, key) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+    @asynccontextmanager
+    async def _writing(self, key):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def flush(self, key) -> None:
+        """Write key's pending value now, after any write of it in progress."""
+        async with self._writing(key):
+            if key not in self._pending:
+                return
+            value = self._in_flight[key] = self._pending.pop(key)
+            self._cancel_timer(key)
+            try:
+                await self.write(key, value)
+            except Exception:
+                self._count("failures")
+                failures = self._failures[key] = self._failures.get(key, 0) + 1
+                logger.exception("write-behind %s: writing %s failed (%d in a row)", self.name, key, failures)
+                if key not in self._pending:
+                    self._pending[key] = value
+                if key not in self._timers and not self._closing:
+                    self._schedule(key, self.window + resilience.backoff(failures))
+                return
+            finally:
+                del self._in_flight[key]
+            self._failures.pop(key, None)
+            self._count("writes")
+
+    async def flush_where(self, predicate) -> None:
+        await asyncio.gather(*(self.flush(key) for key in list(self._pending) if predicate(key)))
+
+    async def discard(self, key) -> None:
+        """Drop key's pending value, after any write of it in progress."""
+        async with self._writing(key):
+            self._pending.pop(key, None)
+            self._cancel_timer(key)
+
+    async def close(self) -> None:
+        """Write everything pending (shutdown); failed writes are not retried."""
+        self._closing = True
+        for key in list(self._timers):
+            self._cancel_timer(key)
+        await asyncio.gather(*(self.flush(key) for key in list(self._pending)))
+        if self._pending:
+            logger.error("write-behind %s: %d writes lost at shutdown: %s",
+                         self.name, len(self._pending), list(self._pending))
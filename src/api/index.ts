@@ -7,7 +7,57 @@ export function getToken(): string | null { return localStorage.getItem(TOKEN_KE
 export function setToken(token: string) { localStorage.setItem(TOKEN_KEY, token); }
 export function clearToken() { localStorage.removeItem(TOKEN_KEY); }
 
-async function apiFetch(method: string, path: string, body?: unknown): Promise<any> {
+/** sub claim of the stored token, unverified: it only names the local cache. */
+export function tokenSub(): string | null {
+  const token = getToken();
+  try {
+    const payload = token?.split('.')[1]?.replace(/-/g, '+').replace(/_/g, '/');
+    return payload ? (JSON.parse(atob(payload)).sub ?? null) : null;
+  } catch {
+    return null;
+  }
+}
+
+// Throttled / unavailable responses are retried with full-jitter exponential
+// backoff (or the server's Retry-After). POSTs are only retried when they
+// carry an Idempotency-Key, so a retried create is never applied twice.
+const RETRY_STATUSES = new Set([429, 502, 503, 504]);
+const MAX_ATTEMPTS = 4;
+const BACKOFF_BASE_MS = 200;
+const BACKOFF_MAX_MS = 5000;
+
+function retryDelay(attempt: number, res?: Response): number {
+  const after = Number(res?.headers.get('Retry-After'));
+  if (after > 0) return after * 1000;
+  return Math.random() * Math.min(BACKOFF_MAX_MS, BACKOFF_BASE_MS * 2 ** attempt);
+}
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function fetchWithRetry(url: string, init: RequestInit, retryable: boolean, idempotent: boolean): Promise<Response> {
+  for (let attempt = 1; ; attempt++) {
+    const last = !retryable || attempt >= MAX_ATTEMPTS;
+    let res: Response;
+    try {
+      res = await fetch(url, init);
+    } catch (err) {
+      if (last) throw err;
+      await sleep(retryDelay(attempt - 1));
+      continue;
+    }
+    // 409: an idempotent repeat that arrived while the first is still running
+    const again = RETRY_STATUSES.has(res.status) || (res.status === 409 && idempotent);
+    if (!again || last) return res;
+    await sleep(retryDelay(attempt - 1, res));
+  }
+}
+
+interface FetchOptions {
+  /** Send an Idempotency-Key (the same one on every retry); for creates. */
+  idempotent?: boolean;
+}
+
+async function apiFetch(method: string, path: string, body?: unknown, options: FetchOptions = {}): Promise<any> {
   const headers: Record<string, string> = {};
   let bodyStr: string | undefined;
   if (body !== undefined) {
@@ -16,11 +66,10 @@ async function apiFetch(method: string, path: string, body?: unknown): Promise<a
   }
   const token = getToken();
   if (token) headers['Authorization'] = `Bearer ${token}`;
-  const res = await fetch(`${BASE}${path}`, {
-    method,
-    headers,
-    body: bodyStr,
-  });
+  const idempotent = options.idempotent ?? false;
+  if (idempotent) headers['Idempotency-Key'] = crypto.randomUUID();
+  const res = await fetchWithRetry(`${BASE}${path}`, { method, headers, body: bodyStr },
+    method !== 'POST' || idempotent, idempotent);
   if (!res.ok) {
     const text = await res.text().catch(() => '');
     const err = new Error(`API ${method} ${path} → ${res.status}: ${text}`);
@@ -31,8 +80,41 @@ async function apiFetch(method: string, path: string, body?: unknown): Promise<a
   return res.json().catch(() => null);
 }
 
+// Documents larger than this go straight to S3 through a presigned URL
+// instead of through the API (request bodies are capped by API Gateway).
+const DIRECT_UPLOAD_BYTES = 1024 * 1024;
+
+interface UploadTarget { upload_id: string; url: string; fields: Record<string, string> }
+
+/** Presigned POST for `${path}/upload-url`, or null when the backend can't
+ *  issue browser-usable URLs (local storage backends). */
+async function directUploadTarget(path: string): Promise<UploadTarget | null> {
+  const target = await apiFetch('POST', `${path}/upload-url`);
+  return /^https?:\/\//.test(target?.url ?? '') ? target : null;
+}
+
+async function uploadDirect(path: string, target: UploadTarget, body: string): Promise<void> {
+  // S3 POST policy: the signed fields first, the file last
+  const form = new FormData();
+  for (const [name, value] of Object.entries(target.fields)) form.append(name, value);
+  form.append('file', new Blob([body], { type: 'application/json' }));
+  const res = await fetch(target.url, { method: 'POST', body: form });
+  if (!res.ok) throw new Error(`POST ${path} (S3) → ${res.status}`);
+  await apiFetch('POST', `${path}/complete`, { upload_id: target.upload_id });
+}
+
 // ── Normalizers ──────────────────────────────────────────────────────────────
 
+// Attributes list requests ask for. Large values stored apart come back as
+// `<attr>_ref` pointers only; fetchWork / fetchEpisode load them.
+const WORK_FIELDS = 'local_id,title,type,created_at,planning_doc,work_summary';
+const EPISODE_FIELDS = 'local_id,work_id,title,order_index,chapter_summary';
+
+function unloadedAttrs(item: any): string[] | undefined {
+  const attrs = Object.keys(item).filter((k) => k.endsWith('_ref')).map((k) => k.slice(0, -4));
+  return attrs.length ? attrs : undefined;
+}
+
 function normalizeWork(item: any): Work {
   return {
     id: Number(item.local_id),
@@ -41,6 +123,7 @@ function normalizeWork(item: any): Work {
     created_at: item.created_at || '',
     planning_doc: item.planning_doc || '',
     work_summary: item.work_summary || '',
+    unloaded: unloadedAttrs(item),
   };
 }
 
@@ -51,6 +134,7 @@ function normalizeEpisode(item: any): Episode {
     title: item.title || '',
     order_index: Number(item.order_index ?? 0),
     chapter_summary: item.chapter_summary || '',
+    unloaded: unloadedAttrs(item),
   };
 }
 
@@ -96,18 +180,23 @@ export async function fetchMe(): Promise<{ sub: string; email: string }> {
 // ── Works ─────────────────────────────────────────────────────────────────────
 
 export async function fetchWorks(): Promise<Work[]> {
-  const items = await apiFetch('GET', '/works');
+  const items = await apiFetch('GET', `/works?fields=${WORK_FIELDS}`);
   const works = (items as any[]).map(normalizeWork);
   return works.sort((a, b) => a.created_at.localeCompare(b.created_at));
 }
 
+/** One work with every attribute loaded. */
+export async function fetchWork(id: number): Promise<Work> {
+  return normalizeWork(await apiFetch('GET', `/works/${id}`));
+}
+
 export async function apiCreateWork(
   id: number,
   title: string,
   type: WorkType,
   planningDoc = '',
 ): Promise<void> {
-  await apiFetch('POST', '/works', { work_id: id, title, type, planning_doc: planningDoc });
+  await apiFetch('POST', '/works', { work_id: id, title, type, planning_doc: planningDoc }, { idempotent: true });
 }
 
 export async function apiUpdateWork(
@@ -123,6 +212,13 @@ export async function apiDeleteWork(id: number): Promise<void> {
   await apiFetch('DELETE', `/works/${id}`);
 }
 
+export async function apiDuplicateWork(
+  id: number,
+  title?: string,
+): Promise<{ work_id: number; ids: Record<string, Record<string, number>> }> {
+  return apiFetch('POST', `/works/${id}/duplicate`, title ? { title } : {}, { idempotent: true });
+}
+
 export async function summarizeWork(workId: number, existingSummary = ''): Promise<{ summary: string }> {
   return apiFetch('POST', `/works/${workId}/summarize`, { existing_summary: existingSummary });
 }
@@ -130,12 +226,17 @@ export async function summarizeWork(workId: number, existingSummary = ''): Promi
 // ── Episodes ──────────────────────────────────────────────────────────────────
 
 export async function fetchEpisodes(workId: number): Promise<Episode[]> {
-  const items = await apiFetch('GET', `/works/${workId}/episodes`);
+  const items = await apiFetch('GET', `/works/${workId}/episodes?fields=${EPISODE_FIELDS}`);
   return (items as any[])
     .map(normalizeEpisode)
     .sort((a, b) => a.order_index - b.order_index);
 }
 
+/** One episode with every attribute loaded. */
+export async function fetchEpisode(id: number): Promise<Episode> {
+  return normalizeEpisode(await apiFetch('GET', `/episodes/${id}`));
+}
+
 export async function apiCreateEpisode(
   workId: number,
   id: number,
@@ -146,7 +247,7 @@ export async function apiCreateEpisode(
     episode_id: id,
     title,
     order_index: orderIndex,
-  });
+  }, { idempotent: true });
 }
 
 export async function apiUpdateEpisode(
@@ -157,6 +258,10 @@ export async function apiUpdateEpisode(
   await apiFetch('PUT', `/episodes/${id}`, { title, order_index: orderIndex });
 }
 
+export async function apiReorderEpisodes(workId: number, episodeIds: number[]): Promise<void> {
+  await apiFetch('PUT', `/works/${workId}/episodes/order`, { ids: episodeIds });
+}
+
 export async function apiDeleteEpisode(id: number): Promise<void> {
   await apiFetch('DELETE', `/episodes/${id}`);
 }
@@ -200,7 +305,7 @@ export async function apiCreatePlot(
     plot_id: id,
     title,
     order_index: orderIndex,
-  });
+  }, { idempotent: true });
 }
 
 export async function apiUpdatePlotMeta(
@@ -212,6 +317,10 @@ export async function apiUpdatePlotMeta(
 }
 
 export async function apiSavePlotContent(id: number, content: string): Promise<void> {
+  if (new Blob([content]).size > DIRECT_UPLOAD_BYTES) {
+    const target = await directUploadTarget(`/plots/${id}/content`);
+    if (target) return uploadDirect(`/plots/${id}/content`, target, content);
+  }
   const token = getToken();
   const headers: Record<string, string> = { 'Content-Type': 'application/json' };
   if (token) headers['Authorization'] = `Bearer ${token}`;
@@ -223,6 +332,10 @@ export async function apiSavePlotContent(id: number, content: string): Promise<v
   if (!res.ok) throw new Error(`PUT /plots/${id}/content → ${res.status}`);
 }
 
+export async function apiReorderPlots(episodeId: number, plotIds: number[]): Promise<void> {
+  await apiFetch('PUT', `/episodes/${episodeId}/plots/order`, { ids: plotIds });
+}
+
 export async function apiDeletePlot(id: number): Promise<void> {
   await apiFetch('DELETE', `/plots/${id}`);
 }
@@ -250,7 +363,7 @@ export async function apiCreateCharacter(
     color,
     properties,
     memo,
-  });
+  }, { idempotent: true });
 }
 
 export async function apiUpdateCharacter(
@@ -302,13 +415,86 @@ export async function apiCreateRelation(
     from_character_id: fromId,
     to_character_id: toId,
     relation_name: name,
-  });
+  }, { idempotent: true });
 }
 
 export async function apiDeleteRelation(id: number): Promise<void> {
   await apiFetch('DELETE', `/relations/${id}`);
 }
 
+// ── Bulk sync ──────────────────────────────────────────────────────────────────
+
+export type SyncEntity = 'work' | 'episode' | 'plot' | 'character' | 'relation';
+
+export interface SyncOperation {
+  op: 'create' | 'update' | 'delete';
+  entity: SyncEntity;
+  id: number;
+  data?: Record<string, unknown>;
+}
+
+export interface SyncResult {
+  index: number;
+  ok: boolean;
+  error?: string;
+}
+
+// Server limit per POST /sync request
+const SYNC_BATCH_SIZE = 500;
+
+/** Apply ordered create/update/delete operations in as few requests as possible. */
+export async function apiSync(operations: SyncOperation[]): Promise<void> {
+  for (let start = 0; start < operations.length; start += SYNC_BATCH_SIZE) {
+    const batch = operations.slice(start, start + SYNC_BATCH_SIZE);
+    const res: { ok: boolean; results: SyncResult[] } = await apiFetch('POST', '/sync', {
+      operations: batch,
+    }, { idempotent: true });
+    const failed = res.results.filter((r) => !r.ok);
+    if (failed.length > 0) {
+      const first = batch[failed[0].index];
+      throw new Error(
+        `API POST /sync → ${failed.length} failed (${first.op} ${first.entity} ${first.id}: ${failed[0].error})`,
+      );
+    }
+  }
+}
+
+// ── Changes ────────────────────────────────────────────────────────────────────
+
+export type ChangeKind = 'works' | 'episodes' | 'plots' | 'characters' | 'relations';
+
+export interface Changes {
+  cursor: string;
+  reset: boolean;
+  works: Work[];
+  episodes: Episode[];
+  plots: Plot[];          // metadata only; content is fetched per plot
+  characters: Character[];
+  relations: (CharacterRelation & { work_id: number })[];
+  // A work / episode deletion also removes everything under it
+  deleted: { kind: ChangeKind; local_id: number; deleted_at: string }[];
+}
+
+/** Entities written or deleted since `since` (the cursor of the previous
+ *  call). Without a cursor, or when `reset` is true, reload everything and
+ *  keep the returned cursor. Items may repeat across calls; apply as upserts. */
+export async function fetchChanges(since?: string): Promise<Changes> {
+  const query = since ? `?since=${encodeURIComponent(since)}` : '';
+  const res = await apiFetch('GET', `/changes${query}`);
+  return {
+    cursor: res.cursor,
+    reset: Boolean(res.reset),
+    works: (res.works ?? []).map(normalizeWork),
+    episodes: (res.episodes ?? []).map(normalizeEpisode),
+    plots: (res.plots ?? []).map((item: any) => normalizePlot(item)),
+    characters: (res.characters ?? []).map(normalizeCharacter),
+    relations: (res.relations ?? []).map((item: any) => ({
+      ...normalizeRelation(item), work_id: Number(item.work_id),
+    })),
+    deleted: (res.deleted ?? []).map((d: any) => ({ ...d, local_id: Number(d.local_id) })),
+  };
+}
+
 // ── Community Posts ────────────────────────────────────────────────────────────
 
 function normalizePost(item: any): CommunityPost {
@@ -354,13 +540,25 @@ function normalizeComment(item: any): CommunityComment {
   };
 }
 
+// Attributes read by normalizePost / normalizeComment; the server projects
+// list responses down to these (skips liked_by, content_s3_key, ...).
+const POST_LIST_FIELDS = [
+  'local_id', 'post_id', 'author_sub', 'author_name', 'author_color', 'work_id', 'work_title',
+  'episode_title', 'work_type', 'post_title', 'description', 'tags', 'view_count', 'like_count',
+  'comment_count', 'created_at', 'content_preview',
+].join(',');
+const COMMENT_LIST_FIELDS = [
+  'local_id', 'comment_id', 'post_id', 'author_sub', 'author_name', 'author_color', 'text',
+  'like_count', 'created_at', 'parent_comment_id',
+].join(',');
+
 export async function fetchPosts(): Promise<CommunityPost[]> {
-  const items = await apiFetch('GET', '/posts');
+  const items = await apiFetch('GET', `/posts?fields=${POST_LIST_FIELDS}`);
   return (items as any[]).map(normalizePost);
 }
 
 export async function fetchMyPosts(): Promise<CommunityPost[]> {
-  const items = await apiFetch('GET', '/posts/mine');
+  const items = await apiFetch('GET', `/posts/mine?fields=${POST_LIST_FIELDS}`);
   return (items as any[]).map(normalizePost);
 }
 
@@ -378,7 +576,17 @@ export interface CreatePostData {
 }
 
 export async function apiCreatePost(data: CreatePostData): Promise<void> {
-  await apiFetch('POST', '/posts', data);
+  const snapshot = JSON.stringify(data.content_snapshot);
+  if (new Blob([snapshot]).size > DIRECT_UPLOAD_BYTES) {
+    const target = await directUploadTarget(`/posts/${data.post_id}/content`);
+    if (target) {
+      const meta: Partial<CreatePostData> = { ...data };
+      delete meta.content_snapshot;
+      await apiFetch('POST', '/posts', meta, { idempotent: true });
+      return uploadDirect(`/posts/${data.post_id}/content`, target, snapshot);
+    }
+  }
+  await apiFetch('POST', '/posts', data, { idempotent: true });
 }
 
 export async function apiDeletePost(postId: string): Promise<void> {
@@ -390,7 +598,7 @@ export async function fetchPostContent(postId: string): Promise<PlotFullContent
 }
 
 export async function fetchComments(postId: string): Promise<CommunityComment[]> {
-  const items = await apiFetch('GET', `/posts/${postId}/comments`);
+  const items = await apiFetch('GET', `/posts/${postId}/comments?fields=${COMMENT_LIST_FIELDS}`);
   return (items as any[]).map(normalizeComment);
 }
 
@@ -400,7 +608,7 @@ export async function apiCreateComment(postId: string, text: string, parentComme
     comment_id: commentId,
     text,
     ...(parentCommentId ? { parent_comment_id: parentCommentId } : {}),
-  });
+  }, { idempotent: true });
 }
 
 export async function apiDeleteComment(commentId: string): Promise<void> {
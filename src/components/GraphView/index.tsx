@@ -235,26 +235,62 @@ export default function GraphView() {
       .catch(() => {});
   }, [selectedWorkId]);
 
+  const movedNodeIds = useRef<Set<string>>(new Set());
+
+  // 움직인 노드만 PATCH 로 저장
+  const scheduleLayoutSave = useCallback(() => {
+    // 1초 debounce 후 클라우드 저장
+    if (layoutSaveTimeout.current) clearTimeout(layoutSaveTimeout.current);
+    layoutSaveTimeout.current = setTimeout(() => {
+      if (!selectedWorkId || movedNodeIds.current.size === 0) return;
+      const moved: Record<string, { x: number; y: number }> = {};
+      movedNodeIds.current.forEach((id) => {
+        if (nodePositions.current[id]) moved[id] = nodePositions.current[id];
+      });
+      movedNodeIds.current = new Set();
+      const token = getToken();
+      const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+      if (token) headers['Authorization'] = `Bearer ${token}`;
+      fetch(`${import.meta.env.VITE_API_BASE_URL}/graph-layout/${selectedWorkId}`, {
+        method: 'PATCH',
+        headers,
+        body: JSON.stringify(moved),
+      }).catch(() => {});
+    }, 1000);
+  }, [selectedWorkId]);
+
   const handleNodesChange = useCallback((changes: Parameters<typeof onNodesChange>[0]) => {
     onNodesChange(changes);
-    setNodes((nds) => {
-      nds.forEach((n) => { nodePositions.current[n.id] = n.position; });
-      // 1초 debounce 후 클라우드 저장
-      if (layoutSaveTimeout.current) clearTimeout(layoutSaveTimeout.current);
-      layoutSaveTimeout.current = setTimeout(() => {
-        if (!selectedWorkId) return;
-        const token = getToken();
-        const headers: Record<string, string> = { 'Content-Type': 'application/json' };
-        if (token) headers['Authorization'] = `Bearer ${token}`;
-        fetch(`${import.meta.env.VITE_API_BASE_URL}/graph-layout/${selectedWorkId}`, {
-          method: 'PUT',
-          headers,
-          body: JSON.stringify(nodePositions.current),
-        }).catch(() => {});
-      }, 1000);
-      return nds;
+    let moved = false;
+    changes.forEach((c) => {
+      if (c.type === 'position' && c.position) {
+        nodePositions.current[c.id] = c.position;
+        movedNodeIds.current.add(c.id);
+        moved = true;
+      }
     });
-  }, [onNodesChange, setNodes, selectedWorkId]);
+    if (moved) scheduleLayoutSave();
+  }, [onNodesChange, scheduleLayoutSave]);
+
+  // 서버에서 계산한 force-directed 배치 적용
+  const handleAutoLayout = useCallback(async () => {
+    if (!selectedWorkId) return;
+    const token = getToken();
+    const headers: Record<string, string> = token ? { Authorization: `Bearer ${token}` } : {};
+    try {
+      const r = await fetch(`${import.meta.env.VITE_API_BASE_URL}/graph-layout/${selectedWorkId}/auto`, { headers });
+      if (!r.ok) return;
+      const positions: Record<string, { x: number; y: number }> = await r.json();
+      Object.entries(positions).forEach(([id, pos]) => {
+        nodePositions.current[id] = pos;
+        movedNodeIds.current.add(id);
+      });
+      setNodes((nds) => nds.map((n) => (positions[n.id] ? { ...n, position: positions[n.id] } : n)));
+      scheduleLayoutSave();
+    } catch (e) {
+      console.error('Auto layout failed:', e);
+    }
+  }, [selectedWorkId, setNodes, scheduleLayoutSave]);
 
   useEffect(() => {
     const count = workChars.length;
@@ -455,6 +491,13 @@ export default function GraphView() {
       >
         🖼️ PNG 내보내기
       </button>
+      <button
+        onClick={(e) => { e.stopPropagation(); handleAutoLayout(); }}
+        className="absolute top-3 right-36 z-10 px-3 py-1.5 text-xs bg-white border border-gray-300 text-gray-600 rounded shadow hover:bg-gray-50 transition-colors"
+        title="인물 관계를 기준으로 노드를 자동 배치"
+      >
+        ✨ 자동 배치
+      </button>
 
       {/* Connect mode hint banner */}
       {connectingFrom && (
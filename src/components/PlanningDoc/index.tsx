@@ -37,8 +37,13 @@ const FontSize = Extension.create({
 
 export default function PlanningDoc() {
   const { selectedWorkId, works, planningDoc, savePlanningDoc } = useStore();
+  // true until a planning doc stored apart has been fetched (see selectWork)
+  const planningDocPending = !!works
+    .find((w) => w.id === selectedWorkId)?.unloaded?.includes('planning_doc');
   const saveTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
   const isLoadingRef = useRef(false);
+  const pendingRef = useRef(planningDocPending);
+  pendingRef.current = planningDocPending;
 
   const editor = useEditor({
     extensions: [
@@ -76,7 +81,7 @@ export default function PlanningDoc() {
       },
     },
     onUpdate: ({ editor }) => {
-      if (isLoadingRef.current || !selectedWorkId) return;
+      if (isLoadingRef.current || !selectedWorkId || pendingRef.current) return;
       savePlanningDoc(selectedWorkId, JSON.stringify(editor.getJSON()));
     },
   });
@@ -96,7 +101,7 @@ export default function PlanningDoc() {
       editor.commands.setContent(`<p>${planningDoc}</p>`);
     }
     setTimeout(() => { isLoadingRef.current = false; }, 50);
-  }, [selectedWorkId, editor]);
+  }, [selectedWorkId, editor, planningDocPending]);
 
   const handleExport = useCallback(async () => {
     if (!editor) return;
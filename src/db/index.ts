@@ -98,6 +98,8 @@ export interface Work {
   created_at: string;
   planning_doc?: string;
   work_summary?: string;
+  // large attributes not in list responses yet (see api.fetchWork)
+  unloaded?: string[];
 }
 
 export interface Episode {
@@ -106,6 +108,7 @@ export interface Episode {
   title: string;
   order_index: number;
   chapter_summary?: string;
+  unloaded?: string[];
 }
 
 export interface Plot {
@@ -0,0 +1,135 @@
+import type { Work, Episode, Plot, Character, CharacterRelation } from '../db';
+import type { Changes } from '../api';
+
+// Local copy of the user's entities as the server had them at `cursor`,
+// kept in IndexedDB so reopening the app costs one GET /changes instead of
+// reloading everything. Lists are cached per parent and only whole: a
+// change to an episode, plot, character or relation drops the one list it
+// belongs to (order keys move without touching siblings), and a changed plot
+// also drops its cached content. Works are few and upserted in place.
+
+export interface EntityCache {
+  cursor: string;
+  works: Work[];
+  episodes: Record<number, Episode[]>;            // by work
+  plots: Record<number, Plot[]>;                  // by episode, content not included
+  contents: Record<number, string>;               // plot content by plot id
+  characters: Record<number, Character[]>;        // by work
+  relations: Record<number, CharacterRelation[]>; // by work
+}
+
+export function emptyCache(cursor: string): EntityCache {
+  return { cursor, works: [], episodes: {}, plots: {}, contents: {}, characters: {}, relations: {} };
+}
+
+const DB_NAME = 'plot-editor-cache';
+const STORE = 'entities';
+
+function openDb(): Promise<IDBDatabase> {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(DB_NAME, 1);
+    req.onupgradeneeded = () => req.result.createObjectStore(STORE);
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+export async function readCache(sub: string): Promise<EntityCache | null> {
+  if (typeof indexedDB === 'undefined') return null;
+  try {
+    const db = await openDb();
+    return await new Promise((resolve, reject) => {
+      const req = db.transaction(STORE).objectStore(STORE).get(sub);
+      req.onsuccess = () => resolve((req.result as EntityCache | undefined) ?? null);
+      req.onerror = () => reject(req.error);
+    });
+  } catch {
+    return null;
+  }
+}
+
+export async function writeCache(sub: string, cache: EntityCache): Promise<void> {
+  if (typeof indexedDB === 'undefined') return;
+  try {
+    const db = await openDb();
+    await new Promise<void>((resolve, reject) => {
+      const tx = db.transaction(STORE, 'readwrite');
+      tx.objectStore(STORE).put(cache, sub);
+      tx.oncomplete = () => resolve();
+      tx.onerror = () => reject(tx.error);
+    });
+  } catch (err) {
+    console.warn('cache write failed:', err);
+  }
+}
+
+function dropEpisode(cache: EntityCache, episodeId: number): void {
+  for (const plot of cache.plots[episodeId] ?? []) delete cache.contents[plot.id];
+  delete cache.plots[episodeId];
+}
+
+function dropWork(cache: EntityCache, workId: number): void {
+  for (const ep of cache.episodes[workId] ?? []) dropEpisode(cache, ep.id);
+  delete cache.episodes[workId];
+  delete cache.characters[workId];
+  delete cache.relations[workId];
+}
+
+/** Parent id of the cached list holding `id`, if any. */
+function parentOf<T extends { id: number }>(lists: Record<number, T[]>, id: number): number | undefined {
+  for (const [parentId, items] of Object.entries(lists)) {
+    if (items.some((item) => item.id === id)) return Number(parentId);
+  }
+  return undefined;
+}
+
+/** The cache brought up to `changes.cursor` (see fetchChanges). */
+export function applyChanges(cache: EntityCache, changes: Changes): EntityCache {
+  const next: EntityCache = {
+    ...cache,
+    cursor: changes.cursor,
+    episodes: { ...cache.episodes },
+    plots: { ...cache.plots },
+    contents: { ...cache.contents },
+    characters: { ...cache.characters },
+    relations: { ...cache.relations },
+  };
+  let works = [...cache.works];
+
+  for (const { kind, local_id: id } of changes.deleted) {
+    if (kind === 'works') {
+      works = works.filter((w) => w.id !== id);
+      dropWork(next, id);
+    } else if (kind === 'episodes') {
+      const workId = parentOf(next.episodes, id);
+      if (workId !== undefined) delete next.episodes[workId];
+      dropEpisode(next, id);
+    } else if (kind === 'plots') {
+      const episodeId = parentOf(next.plots, id);
+      if (episodeId !== undefined) delete next.plots[episodeId];
+      delete next.contents[id];
+    } else if (kind === 'characters') {
+      const workId = parentOf(next.characters, id);
+      if (workId !== undefined) delete next.characters[workId];
+    } else {
+      const workId = parentOf(next.relations, id);
+      if (workId !== undefined) delete next.relations[workId];
+    }
+  }
+
+  for (const work of changes.works) {
+    const idx = works.findIndex((w) => w.id === work.id);
+    if (idx === -1) works.push(work);
+    else works[idx] = work;
+  }
+  for (const ep of changes.episodes) delete next.episodes[ep.work_id];
+  for (const plot of changes.plots) {
+    delete next.plots[plot.episode_id];
+    delete next.contents[plot.id];
+  }
+  for (const ch of changes.characters) delete next.characters[ch.work_id];
+  for (const rel of changes.relations) delete next.relations[rel.work_id];
+
+  next.works = works.sort((a, b) => a.created_at.localeCompare(b.created_at));
+  return next;
+}
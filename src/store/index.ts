@@ -1,6 +1,7 @@
 import { create } from 'zustand';
 import type { Work, Episode, Plot, Character, CharacterRelation, WorkType } from '../db';
 import * as api from '../api';
+import { applyChanges, emptyCache, readCache, writeCache, type EntityCache } from './cache';
 
 const newId = () => Date.now();
 
@@ -19,6 +20,9 @@ interface PendingUpdates {
   episodes: Set<number>;
   plots: Set<number>;
   characters: Set<number>;
+  // Parents whose child order changed: work ids (episodes) / episode ids (plots)
+  episodeOrder: Set<number>;
+  plotOrder: Set<number>;
 }
 
 interface PendingDeletes {
@@ -38,6 +42,8 @@ function emptyUpdates(): PendingUpdates {
     episodes: new Set(),
     plots: new Set(),
     characters: new Set(),
+    episodeOrder: new Set(),
+    plotOrder: new Set(),
   };
 }
 function emptyDeletes(): PendingDeletes {
@@ -177,6 +183,67 @@ function findCharacter(
   return undefined;
 }
 
+// A large attribute set or fetched here is no longer pending a load.
+function markLoaded<T extends { unloaded?: string[] }>(item: T, attr: string): T {
+  const unloaded = item.unloaded?.filter((a) => a !== attr);
+  return { ...item, unloaded: unloaded?.length ? unloaded : undefined };
+}
+
+// Work fields sent by saveAll; planning_doc only once it has been loaded.
+function workData(w: Work) {
+  return w.unloaded?.includes('planning_doc')
+    ? { title: w.title, type: w.type }
+    : { title: w.title, type: w.type, planning_doc: w.planning_doc || '' };
+}
+
+// ── Entity cache ──────────────────────────────────────────────────────────────
+// The server's entities as of the last GET /changes (see ./cache). Loads read
+// a cached list or plot content before the network; syncCache brings the
+// cache up to date on startup, when a work is opened and after saveAll.
+
+let cache: EntityCache | null = null;
+let cacheSub: string | null = null;
+let syncing: Promise<EntityCache | null> | null = null;
+let cacheWriteTimer: ReturnType<typeof setTimeout> | null = null;
+
+function saveCache(): void {
+  if (cacheWriteTimer) clearTimeout(cacheWriteTimer);
+  cacheWriteTimer = setTimeout(() => {
+    if (cache && cacheSub) writeCache(cacheSub, cache);
+  }, 500);
+}
+
+async function runSync(sub: string): Promise<EntityCache> {
+  if (cacheSub !== sub) {
+    cache = await readCache(sub);
+    cacheSub = sub;
+  }
+  const changes = await api.fetchChanges(cache?.cursor);
+  if (changes.reset || !cache) {
+    // No usable cursor: reload the works; everything else fills in per parent.
+    cache = { ...emptyCache(changes.cursor), works: await api.fetchWorks() };
+  } else {
+    cache = applyChanges(cache, changes);
+  }
+  saveCache();
+  return cache;
+}
+
+/** Apply the changes since the cache's cursor; concurrent callers share one sync. */
+function syncCache(): Promise<EntityCache | null> {
+  const sub = api.tokenSub();
+  if (!sub) return Promise.resolve(null);
+  if (!syncing) {
+    syncing = runSync(sub)
+      .catch((err) => {
+        console.error('syncCache failed:', err);
+        return null;
+      })
+      .finally(() => { syncing = null; });
+  }
+  return syncing;
+}
+
 // ── Store ─────────────────────────────────────────────────────────────────────
 
 export const useStore = create<AppState>((set, get) => ({
@@ -225,8 +292,8 @@ export const useStore = create<AppState>((set, get) => ({
 
   loadWorks: async () => {
     try {
-      const works = await api.fetchWorks();
-      set({ works });
+      const synced = await syncCache();
+      set({ works: synced ? synced.works : await api.fetchWorks() });
     } catch {
       set({ works: [] });
     }
@@ -234,7 +301,16 @@ export const useStore = create<AppState>((set, get) => ({
 
   loadEpisodes: async (workId) => {
     try {
-      const episodes = await api.fetchEpisodes(workId);
+      const base = cache;
+      const cached = base?.episodes[workId];
+      // chapter summaries stored apart are loaded one episode at a time
+      const episodes = cached ?? await Promise.all(
+        (await api.fetchEpisodes(workId)).map((ep) => (ep.unloaded ? api.fetchEpisode(ep.id) : ep)),
+      );
+      if (!cached && base && cache === base) {
+        base.episodes[workId] = episodes;
+        saveCache();
+      }
       set((s) => ({ episodes: { ...s.episodes, [workId]: episodes } }));
     } catch {
       set((s) => ({ episodes: { ...s.episodes, [workId]: [] } }));
@@ -243,14 +319,21 @@ export const useStore = create<AppState>((set, get) => ({
 
   loadPlots: async (episodeId) => {
     try {
-      const plotMetas = await api.fetchPlots(episodeId);
-      // Fetch S3 content for each plot in parallel
+      const base = cache;
+      const cached = base?.plots[episodeId];
+      const plotMetas = cached ?? await api.fetchPlots(episodeId);
+      // Fetch S3 content for each plot not cached, in parallel
       const plots = await Promise.all(
         plotMetas.map(async (plot) => ({
           ...plot,
-          content: await api.fetchPlotContent(plot.id),
+          content: base?.contents[plot.id] ?? await api.fetchPlotContent(plot.id),
         })),
       );
+      if (base && cache === base) {
+        base.plots[episodeId] = plotMetas;
+        for (const plot of plots) base.contents[plot.id] = plot.content;
+        saveCache();
+      }
       set((s) => ({ plots: { ...s.plots, [episodeId]: plots } }));
     } catch {
       set((s) => ({ plots: { ...s.plots, [episodeId]: [] } }));
@@ -259,7 +342,13 @@ export const useStore = create<AppState>((set, get) => ({
 
   loadCharacters: async (workId) => {
     try {
-      const chars = await api.fetchCharacters(workId);
+      const base = cache;
+      const cached = base?.characters[workId];
+      const chars = cached ?? await api.fetchCharacters(workId);
+      if (!cached && base && cache === base) {
+        base.characters[workId] = chars;
+        saveCache();
+      }
       set((s) => ({ characters: { ...s.characters, [workId]: chars } }));
     } catch {
       set((s) => ({ characters: { ...s.characters, [workId]: [] } }));
@@ -268,7 +357,13 @@ export const useStore = create<AppState>((set, get) => ({
 
   loadRelations: async (workId) => {
     try {
-      const items = await api.fetchRelations(workId);
+      const base = cache;
+      const cached = base?.relations[workId];
+      const items = cached ?? await api.fetchRelations(workId);
+      if (!cached && base && cache === base) {
+        base.relations[workId] = items;
+        saveCache();
+      }
       const { characters } = get();
       const charMap = new Map((characters[workId] || []).map((c) => [c.id, c]));
       const enriched = items.map((rel) => ({
@@ -363,6 +458,8 @@ export const useStore = create<AppState>((set, get) => ({
         episodes: new Set([...pu.episodes].filter((eid) => !episodeIds.includes(eid))),
         plots: new Set([...pu.plots].filter((pid) => !plotIds.includes(pid))),
         characters: new Set([...pu.characters].filter((cid) => !charIds.includes(cid))),
+        episodeOrder: new Set([...pu.episodeOrder].filter((wid) => wid !== id)),
+        plotOrder: new Set([...pu.plotOrder].filter((eid) => !episodeIds.includes(eid))),
       };
 
       const newEpisodes = { ...s.episodes };
@@ -456,7 +553,9 @@ export const useStore = create<AppState>((set, get) => ({
       for (const [wId, eps] of Object.entries(s.episodes)) {
         const idx = eps.findIndex((e) => e.id === id);
         if (idx !== -1) {
-          newEpisodes[Number(wId)] = eps.map((e, i) => (i === idx ? { ...e, chapter_summary: summary } : e));
+          newEpisodes[Number(wId)] = eps.map((e, i) =>
+            i === idx ? markLoaded({ ...e, chapter_summary: summary }, 'chapter_summary') : e,
+          );
           break;
         }
       }
@@ -512,6 +611,7 @@ export const useStore = create<AppState>((set, get) => ({
           ...pu,
           episodes: new Set([...pu.episodes].filter((eid) => eid !== id)),
           plots: new Set([...pu.plots].filter((pid) => !plotIds.includes(pid))),
+          plotOrder: new Set([...pu.plotOrder].filter((eid) => eid !== id)),
         },
         pendingDeletes: {
           ...pd,
@@ -531,7 +631,7 @@ export const useStore = create<AppState>((set, get) => ({
       episodes: { ...s.episodes, [workId]: reordered },
       pendingUpdates: {
         ...s.pendingUpdates,
-        episodes: new Set([...s.pendingUpdates.episodes, ...reordered.map((e) => e.id)]),
+        episodeOrder: new Set([...s.pendingUpdates.episodeOrder, workId]),
       },
       isDirty: true,
     }));
@@ -609,7 +709,7 @@ export const useStore = create<AppState>((set, get) => ({
       plots: { ...s.plots, [episodeId]: plots },
       pendingUpdates: {
         ...s.pendingUpdates,
-        plots: new Set([...s.pendingUpdates.plots, ...plots.map((p) => p.id)]),
+        plotOrder: new Set([...s.pendingUpdates.plotOrder, episodeId]),
       },
       isDirty: true,
     }));
@@ -647,7 +747,9 @@ export const useStore = create<AppState>((set, get) => ({
   savePlanningDoc: (workId, content) => {
     set((s) => ({
       planningDoc: content,
-      works: s.works.map((w) => (w.id === workId ? { ...w, planning_doc: content } : w)),
+      works: s.works.map((w) =>
+        w.id === workId ? markLoaded({ ...w, planning_doc: content }, 'planning_doc') : w,
+      ),
       pendingUpdates: {
         ...s.pendingUpdates,
         works: new Set([...s.pendingUpdates.works, workId]),
@@ -909,32 +1011,54 @@ export const useStore = create<AppState>((set, get) => ({
         (id) => !deletedCharSet.has(id) && !createdCharSet.has(id),
       );
 
-      // Step 3: Deletes (order: relations → characters → plots → episodes → works)
-      await Promise.all(relsToDelete.map((id) => api.apiDeleteRelation(id)));
-      await Promise.all(charsToDelete.map((id) => api.apiDeleteCharacter(id)));
-      await Promise.all(plotsToDelete.map((id) => api.apiDeletePlot(id)));
-      await Promise.all(episodesToDelete.map((id) => api.apiDeleteEpisode(id)));
-      await Promise.all(worksToDelete.map((id) => api.apiDeleteWork(id)));
+      // Steps 3–5: Deletes → creates (parent before child) → updates, sent as
+      // one ordered batch through POST /sync instead of one request per entity.
+      const ops: api.SyncOperation[] = [
+        ...relsToDelete.map((id) => ({ op: 'delete', entity: 'relation', id }) as const),
+        ...charsToDelete.map((id) => ({ op: 'delete', entity: 'character', id }) as const),
+        ...plotsToDelete.map((id) => ({ op: 'delete', entity: 'plot', id }) as const),
+        ...episodesToDelete.map((id) => ({ op: 'delete', entity: 'episode', id }) as const),
+        ...worksToDelete.map((id) => ({ op: 'delete', entity: 'work', id }) as const),
+      ];
 
-      // Step 4: Creates (parent before child)
       for (const id of worksToCreate) {
         const w = works.find((x) => x.id === id);
-        if (w) await api.apiCreateWork(w.id, w.title, w.type, w.planning_doc || '');
+        if (w) {
+          ops.push({
+            op: 'create', entity: 'work', id,
+            data: workData(w),
+          });
+        }
       }
       for (const id of episodesToCreate) {
         const ep = findEpisode(episodes, id);
-        if (ep) await api.apiCreateEpisode(ep.work_id, ep.id, ep.title, ep.order_index);
+        if (ep) {
+          ops.push({
+            op: 'create', entity: 'episode', id,
+            data: { work_id: ep.work_id, title: ep.title, order_index: ep.order_index },
+          });
+        }
       }
       for (const id of plotsToCreate) {
         const pl = findPlot(plots, id);
-        if (pl) await api.apiCreatePlot(pl.episode_id, pl.id, pl.title, pl.order_index);
+        if (pl) {
+          ops.push({
+            op: 'create', entity: 'plot', id,
+            data: { episode_id: pl.episode_id, title: pl.title, order_index: pl.order_index },
+          });
+        }
       }
       for (const id of charsToCreate) {
         const ch = findCharacter(characters, id);
-        if (ch)
-          await api.apiCreateCharacter(
-            ch.work_id, ch.id, ch.name, ch.color, ch.properties, ch.memo,
-          );
+        if (ch) {
+          ops.push({
+            op: 'create', entity: 'character', id,
+            data: {
+              work_id: ch.work_id, name: ch.name, color: ch.color,
+              properties: ch.properties, memo: ch.memo,
+            },
+          });
+        }
       }
       for (const id of relsToCreate) {
         const rel = relations.find((r) => r.id === id);
@@ -947,31 +1071,82 @@ export const useStore = create<AppState>((set, get) => ({
             break;
           }
         }
-        await api.apiCreateRelation(
-          relWorkId, rel.id, rel.from_character_id, rel.to_character_id, rel.relation_name,
-        );
+        ops.push({
+          op: 'create', entity: 'relation', id,
+          data: {
+            work_id: relWorkId,
+            from_character_id: rel.from_character_id,
+            to_character_id: rel.to_character_id,
+            relation_name: rel.relation_name,
+          },
+        });
       }
 
-      // Step 5: Updates (parallel per type)
+      for (const id of worksToUpdate) {
+        const w = works.find((x) => x.id === id);
+        if (w) {
+          ops.push({
+            op: 'update', entity: 'work', id,
+            data: workData(w),
+          });
+        }
+      }
+      for (const id of episodesToUpdate) {
+        const ep = findEpisode(episodes, id);
+        if (ep) {
+          ops.push({
+            op: 'update', entity: 'episode', id,
+            data: { title: ep.title, order_index: ep.order_index },
+          });
+        }
+      }
+      for (const id of plotsToUpdate) {
+        const pl = findPlot(plots, id);
+        if (pl) {
+          ops.push({
+            op: 'update', entity: 'plot', id,
+            data: { title: pl.title, order_index: pl.order_index },
+          });
+        }
+      }
+      for (const id of charsToUpdate) {
+        const ch = findCharacter(characters, id);
+        if (ch) {
+          ops.push({
+            op: 'update', entity: 'character', id,
+            data: {
+              name: ch.name, color: ch.color, properties: ch.properties,
+              memo: ch.memo, ai_summary: ch.ai_summary,
+            },
+          });
+        }
+      }
+
+      await api.apiSync(ops);
+
+      // Child order: send the final order of every parent whose children were
+      // reordered or created; the server only rewrites keys of moved items.
+      const episodeOrderIds = new Set(
+        [...pu.episodeOrder].filter((wid) => !deletedWorkSet.has(wid)),
+      );
+      for (const id of episodesToCreate) {
+        const ep = findEpisode(episodes, id);
+        if (ep) episodeOrderIds.add(ep.work_id);
+      }
+      const plotOrderIds = new Set(
+        [...pu.plotOrder].filter((eid) => !deletedEpSet.has(eid)),
+      );
+      for (const id of plotsToCreate) {
+        const pl = findPlot(plots, id);
+        if (pl) plotOrderIds.add(pl.episode_id);
+      }
       await Promise.all([
-        ...worksToUpdate.map((id) => {
-          const w = works.find((x) => x.id === id);
-          return w ? api.apiUpdateWork(w.id, w.title, w.type, w.planning_doc || '') : Promise.resolve();
-        }),
-        ...episodesToUpdate.map((id) => {
-          const ep = findEpisode(episodes, id);
-          return ep ? api.apiUpdateEpisode(ep.id, ep.title, ep.order_index) : Promise.resolve();
-        }),
-        ...plotsToUpdate.map((id) => {
-          const pl = findPlot(plots, id);
-          return pl ? api.apiUpdatePlotMeta(pl.id, pl.title, pl.order_index) : Promise.resolve();
-        }),
-        ...charsToUpdate.map((id) => {
-          const ch = findCharacter(characters, id);
-          return ch
-            ? api.apiUpdateCharacter(ch.id, ch.name, ch.color, ch.properties, ch.memo, ch.ai_summary)
-            : Promise.resolve();
-        }),
+        ...[...episodeOrderIds].map((wid) =>
+          api.apiReorderEpisodes(wid, (episodes[wid] ?? []).map((e) => e.id)),
+        ),
+        ...[...plotOrderIds].map((eid) =>
+          api.apiReorderPlots(eid, (plots[eid] ?? []).map((p) => p.id)),
+        ),
       ]);
 
       // Step 6: Plot content → S3 (parallel, skip deleted)
@@ -994,6 +1169,8 @@ export const useStore = create<AppState>((set, get) => ({
         isDirty: false,
         isSaving: false,
       });
+      // what was just written comes back as changes and refreshes the cache
+      syncCache();
     } catch (err) {
       console.error('saveAll failed:', err);
       set({ isSaving: false });
@@ -1036,9 +1213,33 @@ export const useStore = create<AppState>((set, get) => ({
       planningDoc: work?.planning_doc ?? '',
     });
 
-    get().loadEpisodes(id);
-    get().loadCharacters(id);
-    get().loadRelations(id);
+    // Changes made since the last sync (other devices, AI summaries) first,
+    // so cached lists of this work are current.
+    syncCache().then(() => {
+      if (get().selectedWorkId !== id) return;
+      get().loadEpisodes(id);
+      get().loadCharacters(id);
+      get().loadRelations(id);
+    });
+    if (work?.unloaded) {
+      // planning_doc / work_summary stored apart are not in the works list
+      api.fetchWork(id).then((full) => {
+        set((s) => {
+          const current = s.works.find((w) => w.id === id);
+          if (!current?.unloaded) return {};
+          const merged = current.unloaded.reduce<Work>(
+            (w, attr) => markLoaded({ ...w, [attr]: (full as any)[attr] }, attr),
+            current,
+          );
+          return {
+            works: s.works.map((w) => (w.id === id ? merged : w)),
+            ...(s.selectedWorkId === id && current.unloaded.includes('planning_doc')
+              ? { planningDoc: merged.planning_doc ?? '' }
+              : {}),
+          };
+        });
+      }).catch((err) => console.error('fetchWork failed:', err));
+    }
   },
 
   selectEpisode: (id) => {
@@ -1090,7 +1291,9 @@ export const useStore = create<AppState>((set, get) => ({
 
   setWorkSummary: (workId: number, summary: string) => {
     set((s) => ({
-      works: s.works.map((w) => (w.id === workId ? { ...w, work_summary: summary } : w)),
+      works: s.works.map((w) =>
+        w.id === workId ? markLoaded({ ...w, work_summary: summary }, 'work_summary') : w,
+      ),
     }));
   },
 